@@ -5,17 +5,27 @@ Các tác tử AI cho hệ thống Biên Soạn Quy Trình Công Nghệ Chế T
 import os
 import json
 import logging
-from typing import Dict, List, Any, Optional, Union
-from langchain_openai import ChatOpenAI
-from crewai import Agent, Task, Crew, Process
-from crewai_tools import FileReadTool
+from typing import Dict, List, Any, Optional, Union, TYPE_CHECKING
 import config
 import utils
+import llm_cache
+import token_usage
+import streaming
+import catalogs
+import catalog_registry
+
+# crewai, langchain_openai, file_tools and crew_llm (which import crewai) are imported inside the
+# functions that need them, so CLI paths that never build an agent do not pay for them
+if TYPE_CHECKING:
+    from file_tools import CachedFileReadTool
 
 logger = logging.getLogger(__name__)
 
-# Khởi tạo tools phổ biến
-file_tool = FileReadTool()
+# Công cụ đọc file dùng chung giữa các crew, mỗi loại tác tử một công cụ (xem get_file_tool)
+_file_tools: Dict[str, "CachedFileReadTool"] = {}
+
+# Các catalog đã cảnh báo là không tìm thấy (chỉ cảnh báo một lần cho mỗi mã chi tiết)
+_missing_catalogs = set()
 
 # Define agent types
 AGENT_TYPES = {
@@ -30,25 +40,32 @@ AGENT_TYPES = {
 # Configure the catalog mappings
 CATALOG_CONFIG = {
     AGENT_TYPES["MATERIALS_ENGINEER"]: {
-        "catalog_path": "materials_catalogs/SC-2023-A001.txt",
+        "catalog_kind": "materials",  # Resolved per part number through catalog_registry
         "forbidden_files": [
             "materials_catalogs/materials_summary.txt",
             "materials_catalogs/AISI_4140.txt",
             "materials_catalogs/alloy_steel.txt"
         ],
+        "catalog_sections": [
+            "PRIMARY MATERIAL SPECIFICATION",
+            "ALTERNATIVE MATERIALS",
+            "MATERIAL SELECTION GUIDELINES",
+            "RECOMMENDATION"
+        ],
         "fallback_guidance": "standard material properties"
     },
     AGENT_TYPES["TOOLING_SPECIALIST"]: {
-        "catalog_path": "tooling_catalogs/SC-2023-A001.txt",
+        "catalog_kind": "tooling",  # Resolved per part number through catalog_registry
         "forbidden_files": [
             "tooling_catalogs/tooling_summary.txt",
             "tooling_catalogs/cutting_tools.txt",
             "tooling_catalogs/fixtures.txt"
         ],
+        "catalog_sections": [],  # The whole tooling catalog is relevant to tool selection
         "fallback_guidance": "standard tooling knowledge"
     },
     AGENT_TYPES["PROCESS_PLANNER"]: {
-        "catalog_path": "process_standards/SC-2023-A001.txt",
+        "catalog_kind": "process",  # Resolved per part number through catalog_registry
         "forbidden_files": [
             "tooling_recommendations.txt (with or without leading slash)",
             "/tooling_recommendations.txt (with leading slash)",
@@ -57,19 +74,33 @@ CATALOG_CONFIG = {
             "process_standards/general_machining.txt",
             "process_standards/cutting_parameters.txt"
         ],
+        "catalog_sections": [
+            "STANDARD OPERATION SEQUENCE",
+            "MACHINING PARAMETERS",
+            "WORKHOLDING STRATEGIES",
+            "INSPECTION CHECKPOINTS",
+            "PRODUCTION OPTIMIZATION"
+        ],
         "fallback_guidance": "standard manufacturing practices"
     },
     AGENT_TYPES["QUALITY_ENGINEER"]: {
-        "catalog_path": "quality_standards/SC-2023-A001.txt",
+        "catalog_kind": "quality",  # Resolved per part number through catalog_registry
         "forbidden_files": [
             "quality_standards/general_standards.txt",
             "quality_standards/inspection_methods.txt",
             "quality_standards/acceptance_criteria.txt"
         ],
+        "catalog_sections": [
+            "APPLICABLE QUALITY STANDARDS",
+            "INSPECTION REQUIREMENTS",
+            "ACCEPTANCE CRITERIA",
+            "QUALITY CONTROL CHECKPOINTS",
+            "MEASUREMENT UNCERTAINTY"
+        ],
         "fallback_guidance": "standard quality practices"
     },
     AGENT_TYPES["PROJECT_MANAGER"]: {
-        "catalog_path": "",  # Project manager doesn't have a specific catalog
+        "catalog_kind": None,  # Project manager doesn't have a specific catalog
         "forbidden_files": [
             "/path/to/manufacturing_plan_document.txt",
             "/material_selection_analysis.txt",
@@ -77,24 +108,125 @@ CATALOG_CONFIG = {
             "/process_plan.txt",
             "/quality_assessment.txt"
         ],
+        "catalog_sections": [],
         "fallback_guidance": "standard project management practices"
     }
 }
 
-def generate_file_access_restrictions(agent_type: str) -> str:
+def get_catalog_config(agent_type: str, part_number: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns the agent's catalog configuration with the catalog path resolved for a part number
+    
+    Args:
+        agent_type: The type of agent (materials_engineer, tooling_specialist, etc.)
+        part_number: Part number from the drawing header (PART NUMBER:)
+        
+    Returns:
+        Copy of the CATALOG_CONFIG entry with "catalog_path" set ("" when there is no catalog)
+    """
+    catalog_config = dict(CATALOG_CONFIG[agent_type])
+    kind = catalog_config.get("catalog_kind")
+    catalog_path = catalog_registry.get_catalog_path(kind, part_number) if kind else None
+    if kind and not catalog_path and (kind, part_number) not in _missing_catalogs:
+        _missing_catalogs.add((kind, part_number))
+        logger.warning(f"Không tìm thấy catalog {kind} cho mã chi tiết: {part_number}")
+    catalog_config["catalog_path"] = catalog_path or ""
+    return catalog_config
+
+def get_file_tool(agent_type: str, part_number: Optional[str] = None) -> "CachedFileReadTool":
+    """
+    Returns the shared file-read tool for an agent type and part number
+    
+    The tool serves files from the in-process catalog store and only allows the agent's
+    own catalog for the part number; every other path is rejected in code.
+    
+    Args:
+        agent_type: The type of agent (materials_engineer, tooling_specialist, etc.)
+        part_number: Part number from the drawing header
+        
+    Returns:
+        CachedFileReadTool: Tool restricted to the agent's catalog
+    """
+    from file_tools import CachedFileReadTool
+    
+    catalog_path = get_catalog_config(agent_type, part_number)["catalog_path"] if agent_type in CATALOG_CONFIG else ""
+    key = f"{agent_type}:{catalog_path}"
+    if key not in _file_tools:
+        _file_tools[key] = CachedFileReadTool(allowed_paths=[catalog_path] if catalog_path else [])
+    return _file_tools[key]
+
+def is_catalog_injected(agent_type: str) -> bool:
+    """
+    Whether the agent's catalog sections are injected into its task descriptions
+    instead of being read through the file-read tool
+    
+    Args:
+        agent_type: The type of agent (materials_engineer, tooling_specialist, etc.)
+        
+    Returns:
+        True if catalog injection is enabled and the agent type has a catalog
+    """
+    return config.CATALOG_INJECTION and bool(CATALOG_CONFIG.get(agent_type, {}).get("catalog_kind"))
+
+def generate_catalog_context(agent_type: str, part_number: Optional[str] = None) -> str:
+    """
+    Creates the reference catalog block with only the sections relevant to the agent's task
+    
+    Args:
+        agent_type: The type of agent (materials_engineer, tooling_specialist, etc.)
+        part_number: Part number from the drawing header
+        
+    Returns:
+        Formatted catalog text to append to the task description
+    """
+    catalog_config = get_catalog_config(agent_type, part_number)
+    catalog_text = None
+    if catalog_config["catalog_path"]:
+        catalog_text = catalogs.render_catalog_sections(
+            catalog_config["catalog_path"], catalog_config["catalog_sections"]
+        )
+    
+    if catalog_text is None:
+        return f"""
+        REFERENCE CATALOG: No part catalog is available for this part.
+        Rely on the context from previous agents and {catalog_config['fallback_guidance']}."""
+    
+    return f"""
+        REFERENCE CATALOG (relevant sections of "{catalog_config['catalog_path']}", provided directly here):
+        
+        ```
+{catalog_text}
+        ```"""
+
+def generate_file_access_restrictions(agent_type: str, part_number: Optional[str] = None) -> str:
     """
     Creates standardized file access restriction text for agent backstories and tasks
     
     Args:
         agent_type: The type of agent (materials_engineer, tooling_specialist, etc.)
+        part_number: Part number from the drawing header
         
     Returns:
         Formatted restriction text
     """
     if agent_type not in CATALOG_CONFIG:
         return ""
+    
+    if is_catalog_injected(agent_type):
+        catalog_config = CATALOG_CONFIG[agent_type]
+        return f"""
+        IMPORTANT FILE ACCESS RESTRICTIONS:
         
-    config = CATALOG_CONFIG[agent_type]
+        1. DO NOT attempt to access ANY files. The relevant sections of the part catalog
+           are provided directly in your task description.
+        
+        2. Use ONLY the information provided directly in your context from previous agents and 
+           the catalog sections provided in your task description.
+        
+        3. If you need information that is not available there, make reasonable assumptions
+           based on {catalog_config['fallback_guidance']}."""
+        
+    config = get_catalog_config(agent_type, part_number)
     
     # Using raw string for the template to avoid escape sequence issues
     restriction_text = f"""
@@ -129,18 +261,40 @@ def generate_file_access_restrictions(agent_type: str) -> str:
     return restriction_text
 
 # Khởi tạo mô hình LLM
-def get_llm(model_name: str = None, temperature: float = None):
-    """Tạo một mô hình LLM với các tham số cụ thể"""
+def get_llm(model_name: str = None, temperature: float = None, usage_tag: str = None):
+    """Tạo một mô hình LLM với các tham số cụ thể; usage_tag là nhãn thống kê token của các lần gọi"""
+    from langchain_openai import ChatOpenAI
+    
     model = model_name or config.DEFAULT_MODEL
     temp = temperature if temperature is not None else config.TEMPERATURE
     
     return ChatOpenAI(
         openai_api_key=config.OPENAI_API_KEY,
+        base_url=config.OPENAI_BASE_URL,
         model=model,
-        temperature=temp
+        temperature=temp,
+        cache=llm_cache.get_langchain_cache(),
+        streaming=config.STREAM_OUTPUT,
+        stream_usage=config.STREAM_OUTPUT,
+        callbacks=[
+            token_usage.TokenUsageCallback(usage_tag or "other", model),
+            streaming.TokenStreamCallback(usage_tag or "other")
+        ]
     )
 
-def create_agent(agent_type, role, goal, backstory_content, allow_delegation=False, temperature=None):
+def get_crew_llm(temperature: float = None, usage_tag: str = None):
+    """
+    LLM for CrewAI agents: get_llm wrapped in a crewai BaseLLM.
+
+    CrewAI rebuilds any other LLM object as its own crewai.LLM and drops the LangChain cache,
+    token usage and token streaming callbacks, so agents get this wrapper instead.
+    """
+    from crew_llm import ChatModelLLM
+    
+    return ChatModelLLM(get_llm(temperature=temperature, usage_tag=usage_tag))
+
+def create_agent(agent_type, role, goal, backstory_content, allow_delegation=False, temperature=None,
+                 part_number=None):
     """
     Utility function to create an agent with standard configurations and file restrictions
     
@@ -151,12 +305,15 @@ def create_agent(agent_type, role, goal, backstory_content, allow_delegation=Fal
         backstory_content: The agent-specific backstory content (before file restrictions)
         allow_delegation: Whether the agent can delegate tasks
         temperature: Optional temperature override for the agent's LLM
+        part_number: Part number used to resolve the agent's catalog
         
     Returns:
         Agent: Configured agent
     """
     # Generate file access restrictions if applicable
-    file_restrictions = generate_file_access_restrictions(agent_type)
+    file_restrictions = generate_file_access_restrictions(agent_type, part_number)
+    
+    from crewai import Agent
     
     # Combine backstory with restrictions
     full_backstory = f"{backstory_content}\n\n{file_restrictions}" if file_restrictions else backstory_content
@@ -167,12 +324,12 @@ def create_agent(agent_type, role, goal, backstory_content, allow_delegation=Fal
         backstory=full_backstory,
         verbose=config.VERBOSE,
         allow_delegation=allow_delegation,
-        tools=[file_tool] if agent_type != AGENT_TYPES["PROJECT_MANAGER"] else [],
-        llm=get_llm(temperature=temperature)
+        tools=[get_file_tool(agent_type, part_number)] if agent_type != AGENT_TYPES["PROJECT_MANAGER"] and not is_catalog_injected(agent_type) else [],
+        llm=get_crew_llm(temperature=temperature, usage_tag=agent_type)
     )
 
 # 1. Tác tử Phân Tích Bản Vẽ (Design Analyzer Agent)
-def create_design_analyzer_agent():
+def create_design_analyzer_agent(part_number: str = None):
     """Tạo tác tử phân tích bản vẽ kỹ thuật"""
     
     backstory_content = """You are an expert mechanical engineer specialized in CAD analysis and design interpretation.
@@ -188,11 +345,12 @@ def create_design_analyzer_agent():
         agent_type=AGENT_TYPES["DESIGN_ANALYZER"],
         role="Design Analysis Engineer",
         goal="Analyze technical drawings to extract all relevant manufacturing specifications",
-        backstory_content=backstory_content
+        backstory_content=backstory_content,
+        part_number=part_number
     )
 
 # 1.5 Tác tử Lựa Chọn Vật Liệu Tối Ưu (Material Selection Specialist)
-def create_material_selection_agent():
+def create_material_selection_agent(part_number: str = None):
     """Tạo tác tử lựa chọn vật liệu tối ưu"""
     
     backstory_content = """You are a highly skilled materials engineer with extensive knowledge of engineering 
@@ -207,11 +365,12 @@ def create_material_selection_agent():
         agent_type=AGENT_TYPES["MATERIALS_ENGINEER"],
         role="Materials Engineer",
         goal="Select optimal materials for manufacturing based on design requirements, performance, cost, and manufacturability",
-        backstory_content=backstory_content
+        backstory_content=backstory_content,
+        part_number=part_number
     )
 
 # 1.8 Tác tử Lựa Chọn Dụng Cụ Gia Công (Tooling Selection Specialist)
-def create_tooling_selection_agent():
+def create_tooling_selection_agent(part_number: str = None):
     """Tạo tác tử lựa chọn dụng cụ gia công"""
     
     backstory_content = """You are an expert tooling engineer with decades of experience in selecting and 
@@ -228,11 +387,12 @@ def create_tooling_selection_agent():
         agent_type=AGENT_TYPES["TOOLING_SPECIALIST"],
         role="Tooling Specialist",
         goal="Select optimal tooling and fixtures for manufacturing operations based on part geometry, material, and precision requirements",
-        backstory_content=backstory_content
+        backstory_content=backstory_content,
+        part_number=part_number
     )
 
 # 2. Tác tử Lập Quy Trình Gia Công (Process Planning Agent)
-def create_process_planning_agent():
+def create_process_planning_agent(part_number: str = None):
     """Tạo tác tử lập quy trình gia công"""
     
     backstory_content = """You are a manufacturing process expert with decades of experience.
@@ -245,11 +405,12 @@ def create_process_planning_agent():
         agent_type=AGENT_TYPES["PROCESS_PLANNER"],
         role="Manufacturing Process Planner",
         goal="Create detailed manufacturing process plans based on design specifications",
-        backstory_content=backstory_content
+        backstory_content=backstory_content,
+        part_number=part_number
     )
 
 # 3. Tác tử Kiểm Tra Chất Lượng (Quality Control Agent)
-def create_quality_control_agent():
+def create_quality_control_agent(part_number: str = None):
     """Tạo tác tử kiểm tra chất lượng"""
     
     backstory_content = """You are a meticulous quality assurance engineer with expertise in 
@@ -262,11 +423,12 @@ def create_quality_control_agent():
         agent_type=AGENT_TYPES["QUALITY_ENGINEER"],
         role="Quality Assurance Engineer",
         goal="Evaluate manufacturing plans to ensure they meet quality standards and specifications",
-        backstory_content=backstory_content
+        backstory_content=backstory_content,
+        part_number=part_number
     )
 
 # 4. Tác tử Điều Phối (Orchestrator Agent)
-def create_orchestrator_agent():
+def create_orchestrator_agent(part_number: str = None):
     """Tạo tác tử điều phối tổng thể"""
     
     backstory_content = """You are a seasoned manufacturing project manager who excels at
@@ -281,12 +443,14 @@ def create_orchestrator_agent():
         goal="Coordinate the overall manufacturing process planning and optimize for quality and efficiency",
         backstory_content=backstory_content,
         allow_delegation=True,
-        temperature=0.4  # Nhiệt độ cao hơn cho sự sáng tạo
+        temperature=0.4,  # Nhiệt độ cao hơn cho sự sáng tạo
+        part_number=part_number
     )
 
 # Định nghĩa các Task cho từng Agent
 def create_analyze_drawing_task(agent, drawing_path: str):
     """Tạo task cho việc phân tích bản vẽ kỹ thuật"""
+    from crewai import Task
     
     # Load the drawing content directly
     try:
@@ -322,7 +486,7 @@ def create_analyze_drawing_task(agent, drawing_path: str):
         expected_output="A comprehensive analysis of the technical drawing with all manufacturing specifications"
     )
 
-def create_material_selection_task(agent, context=None):
+def create_material_selection_task(agent, context=None, part_number: str = None):
     """Tạo task cho việc lựa chọn vật liệu tối ưu"""
     
     description_content = """
@@ -345,10 +509,11 @@ def create_material_selection_task(agent, context=None):
         agent=agent,
         description_content=description_content,
         expected_output="A detailed material selection analysis with optimal recommendations and alternatives",
-        context=context
+        context=context,
+        part_number=part_number
     )
 
-def create_tooling_selection_task(agent, context=None):
+def create_tooling_selection_task(agent, context=None, part_number: str = None):
     """Tạo task cho việc lựa chọn dụng cụ gia công"""
     
     description_content = """
@@ -377,10 +542,11 @@ def create_tooling_selection_task(agent, context=None):
         agent=agent,
         description_content=description_content,
         expected_output="A comprehensive tooling plan with specific recommendations for each manufacturing operation",
-        context=context
+        context=context,
+        part_number=part_number
     )
 
-def create_process_plan_task(agent, context=None):
+def create_process_plan_task(agent, context=None, part_number: str = None):
     """Tạo task cho việc lập quy trình gia công"""
     
     description_content = """
@@ -407,10 +573,11 @@ def create_process_plan_task(agent, context=None):
         agent=agent,
         description_content=description_content,
         expected_output="A step-by-step manufacturing process plan",
-        context=context
+        context=context,
+        part_number=part_number
     )
 
-def create_quality_review_task(agent, context=None):
+def create_quality_review_task(agent, context=None, part_number: str = None):
     """Tạo task cho việc kiểm tra chất lượng"""
     
     description_content = """
@@ -432,10 +599,11 @@ def create_quality_review_task(agent, context=None):
         agent=agent,
         description_content=description_content,
         expected_output="A quality assessment report with recommendations",
-        context=context
+        context=context,
+        part_number=part_number
     )
 
-def create_finalize_plan_task(agent, context=None):
+def create_finalize_plan_task(agent, context=None, part_number: str = None):
     """Tạo task cho việc hoàn thiện quy trình"""
     
     description_content = """
@@ -456,15 +624,26 @@ def create_finalize_plan_task(agent, context=None):
     (materials, tooling, processes, and quality measures) integrated into a cohesive strategy.
     """
     
+    expected_output = "A finalized manufacturing plan ready for implementation"
+    output_pydantic = None
+    if config.STRUCTURED_PLAN:
+        # Typed output: setups, tools, operations with cutting parameters and inspection points
+        from plan_schema import ManufacturingPlanOutput, OUTPUT_INSTRUCTIONS
+        expected_output = f"{expected_output}. {OUTPUT_INSTRUCTIONS}"
+        output_pydantic = ManufacturingPlanOutput
+    
     return create_task(
         agent_type=AGENT_TYPES["PROJECT_MANAGER"],
         agent=agent,
         description_content=description_content,
-        expected_output="A finalized manufacturing plan ready for implementation",
-        context=context
+        expected_output=expected_output,
+        context=context,
+        part_number=part_number,
+        output_pydantic=output_pydantic
     )
 
-def create_task(agent_type, agent, description_content, expected_output, context=None):
+def create_task(agent_type, agent, description_content, expected_output, context=None, part_number=None,
+                output_pydantic=None):
     """
     Utility function to create a task with standard configurations and file restrictions
     
@@ -474,19 +653,28 @@ def create_task(agent_type, agent, description_content, expected_output, context
         description_content: The task-specific description content (before file restrictions)
         expected_output: Expected output description
         context: Optional context from previous tasks
+        part_number: Part number used to resolve the agent's catalog
+        output_pydantic: Optional pydantic model for structured task output
         
     Returns:
         Task: Configured task
     """
     # Generate file access restrictions if applicable
-    file_restrictions = generate_file_access_restrictions(agent_type)
+    file_restrictions = generate_file_access_restrictions(agent_type, part_number)
+    
+    from crewai import Task
     
     # Combine description with restrictions
     full_description = f"{description_content}\n\n{file_restrictions}" if file_restrictions else description_content
     
+    # Inject the relevant catalog sections so the agent does not need a file-read tool call
+    if is_catalog_injected(agent_type):
+        full_description = f"{full_description}\n\n{generate_catalog_context(agent_type, part_number)}"
+    
     return Task(
         description=full_description,
         agent=agent,
         expected_output=expected_output,
-        context=context
+        context=context,
+        output_pydantic=output_pydantic
     ) 
\ No newline at end of file
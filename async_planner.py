@@ -0,0 +1,306 @@
+"""
+Lập kế hoạch bất đồng bộ: một vòng lặp sự kiện điều khiển nhiều lượt lập kế hoạch cùng lúc
+bằng lời gọi LLM bất đồng bộ (ainvoke), có giới hạn đồng thời (backpressure) và hủy được
+"""
+
+import os
+import time
+import asyncio
+import logging
+import functools
+import contextvars
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+import config
+import utils
+import agents
+import batch
+import stages
+import plan_cache
+import plan_model
+import plan_index
+import checkpoint
+import revisions
+import streaming
+import tracing
+import token_usage
+
+logger = logging.getLogger(__name__)
+
+# Tác tử (chỉ dùng lấy vai trò/mục tiêu/backstory) theo (công đoạn, mã chi tiết), dùng chung giữa các lượt chạy
+_stage_agents: Dict[tuple, Any] = {}
+
+def _get_stage_agent(stage: str, part_number: Optional[str]):
+    key = (stage, part_number)
+    if key not in _stage_agents:
+        _stage_agents[key] = stages.create_stage_agent(stage, part_number)
+    return _stage_agents[key]
+
+async def _run_blocking(fn, *args):
+    """
+    Chạy một hàm chặn (đọc/ghi file, checkpoint, tạo task) trong executor mặc định để không
+    chặn vòng lặp sự kiện; context (lượt chạy, span truy vết) được chuyển sang luồng thực thi
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(context.run, fn, *args))
+
+def _stage_messages(stage: str, drawing_path: str, part_number: Optional[str], context: str):
+    """Tác tử của công đoạn và các message gửi LLM (tạo task đọc bản vẽ và catalog)"""
+    agent = _get_stage_agent(stage, part_number)
+    task = stages.create_stage_task(stage, agent, drawing_path, part_number=part_number)
+    messages = [(message["role"], message["content"]) for message in stages.build_stage_messages(stage, agent, task, context)]
+    return agent, messages
+
+def _complete_stage(run_id: str, drawing_path: str, stage: str, output: str) -> None:
+    """Lưu output của công đoạn vào checkpoint và phát ra luồng sự kiện"""
+    checkpoint.save_stage_output(run_id, stage, output)
+    streaming.stage_completed(drawing_path, stage, output, run_id=run_id)
+
+def _require_catalog_injection() -> None:
+    """
+    Công đoạn bất đồng bộ là một lời gọi LLM không có công cụ đọc file, nên catalog phải được
+    chèn vào prompt; khi tắt CATALOG_INJECTION task yêu cầu tác tử tự đọc catalog và công đoạn
+    sẽ chạy mà không có dữ liệu catalog
+    """
+    if not config.CATALOG_INJECTION:
+        raise ValueError(
+            "Lập kế hoạch bất đồng bộ cần CATALOG_INJECTION=True (công đoạn không có công cụ đọc catalog); "
+            "bật lại hoặc chạy không dùng --async"
+        )
+
+def _get_stage_llm(stage: str, agent, stage_llms: Dict[str, Any]):
+    """
+    LLM của công đoạn, cùng nhiệt độ với tác tử của công đoạn đó
+
+    stage_llms thuộc về một lô (xem run_batch_async), nên client bất đồng bộ chỉ dùng trong vòng lặp
+    sự kiện của lô đó và cấu hình mô hình (DEFAULT_MODEL, OPENAI_BASE_URL...) được đọc lại mỗi lô.
+    """
+    if stage not in stage_llms:
+        stage_llms[stage] = agents.get_llm(
+            temperature=getattr(agent.llm, "temperature", None),
+            usage_tag=stages.STAGE_AGENT_TYPES[stage]
+        )
+    return stage_llms[stage]
+
+async def execute_stage_async(stage: str, drawing_path: str, outputs: Dict[str, str],
+                              part_number: Optional[str] = None,
+                              llm_semaphore: Optional[asyncio.Semaphore] = None,
+                              stage_llms: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Thực thi một công đoạn bằng một lời gọi LLM bất đồng bộ
+
+    Catalog được chèn vào mô tả task (xem agents.generate_catalog_context, cần CATALOG_INJECTION)
+    nên công đoạn không cần vòng lặp gọi công cụ của tác tử CrewAI.
+
+    Args:
+        stage: Tên công đoạn
+        drawing_path: Đường dẫn đến file bản vẽ
+        outputs: Output của các công đoạn phía trước
+        part_number: Mã chi tiết dùng để tra cứu catalog
+        llm_semaphore: Giới hạn số lời gọi LLM đồng thời (dùng chung giữa các lượt chạy)
+        stage_llms: LLM theo công đoạn dùng chung trong lô (mặc định tạo mới)
+
+    Returns:
+        Output dạng văn bản của công đoạn
+
+    Raises:
+        ValueError: CATALOG_INJECTION bị tắt
+    """
+    _require_catalog_injection()
+    if stage == "analyze_drawing":
+        analysis = await _run_blocking(stages.parsed_drawing_analysis, drawing_path)
+        if analysis is not None:
+            logger.info(f"Bỏ qua công đoạn {stage} bằng LLM: đã phân tích sạch bản vẽ {drawing_path}")
+            return analysis
+
+    context = await stages.aprepare_stage_context(stage, outputs, llm_semaphore)
+    agent, messages = await _run_blocking(_stage_messages, stage, drawing_path, part_number, context)
+    llm = _get_stage_llm(stage, agent, stage_llms if stage_llms is not None else {})
+
+    logger.info(f"Đang chạy công đoạn {stage} (bất đồng bộ) cho bản vẽ: {drawing_path}")
+    with tracing.span(f"stage:{stage}", "stage", stage=stage, drawing=drawing_path, agent_role=agent.role):
+        if llm_semaphore is None:
+            response = await llm.ainvoke(messages)
+        else:
+            async with llm_semaphore:
+                response = await llm.ainvoke(messages)
+    return response.content
+
+async def run_manufacturing_planning_async(drawing_path: str,
+                                           llm_semaphore: Optional[asyncio.Semaphore] = None,
+                                           stage_llms: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Phiên bản bất đồng bộ của main.run_manufacturing_planning
+
+    Output mỗi công đoạn được lưu checkpoint như bản đồng bộ; khi lượt chạy bị hủy
+    (asyncio.CancelledError) checkpoint được đánh dấu "cancelled" và có thể --resume.
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+        llm_semaphore: Giới hạn số lời gọi LLM đồng thời
+        stage_llms: LLM theo công đoạn dùng chung trong lô (mặc định tạo mới cho lượt chạy này)
+
+    Returns:
+        Dict chứa kế hoạch sản xuất
+
+    Raises:
+        ValueError: CATALOG_INJECTION bị tắt
+    """
+    logger.info(f"Bắt đầu quy trình lập kế hoạch sản xuất (bất đồng bộ) cho bản vẽ: {drawing_path}")
+    _require_catalog_injection()
+    stage_llms = {} if stage_llms is None else stage_llms
+
+    if not os.path.exists(drawing_path):
+        logger.error(f"Không tìm thấy file bản vẽ: {drawing_path}")
+        raise FileNotFoundError(f"Không tìm thấy file bản vẽ: {drawing_path}")
+
+    plan_key, cached_plan = await _run_blocking(plan_cache.lookup, drawing_path)
+    if cached_plan is not None:
+        # Lần dùng lại không gọi LLM: kế hoạch giữ run_id và token_usage của lượt chạy đã lập nó (plan_cache.hit)
+        return cached_plan
+
+    # Thông tin bản vẽ được lấy lúc bắt đầu lập kế hoạch và lưu cùng kế hoạch
+    drawing_info = await _run_blocking(plan_index.drawing_metadata, drawing_path)
+    run_id = await _run_blocking(checkpoint.create_checkpoint, drawing_path)
+    # Mỗi task asyncio có bản sao context riêng nên sự kiện token được gắn đúng lượt chạy
+    streaming.current_run.set({"run_id": run_id, "drawing": drawing_path})
+    part_number = await _run_blocking(stages.get_drawing_part_number, drawing_path)
+
+    outputs = {}
+    # Lời gọi LLM của các lượt chạy đồng thời được tính riêng cho từng lượt chạy
+    with token_usage.track_run(run_id):
+        try:
+            for stage in stages.STAGE_ORDER:
+                outputs[stage] = await execute_stage_async(
+                    stage, drawing_path, outputs, part_number, llm_semaphore, stage_llms
+                )
+                await _run_blocking(_complete_stage, run_id, drawing_path, stage, outputs[stage])
+            await _run_blocking(checkpoint.update_status, run_id, "completed")
+            await _run_blocking(revisions.record_planned_revision, drawing_path, outputs)
+        except asyncio.CancelledError:
+            # Việc ghi trạng thái vẫn hoàn tất nếu task bị hủy thêm lần nữa trong lúc chờ
+            await asyncio.shield(_run_blocking(checkpoint.update_status, run_id, "cancelled"))
+            logger.warning(f"Đã hủy lượt chạy {run_id}, có thể tiếp tục với: --resume {run_id}")
+            raise
+        except Exception as e:
+            await _run_blocking(checkpoint.update_status, run_id, "failed")
+            logger.error(f"Lỗi khi chạy quy trình: {str(e)}")
+            logger.error(f"Có thể tiếp tục lượt chạy với: --resume {run_id}")
+            raise
+        usage = stages.stage_usage_report(run_id)
+
+    logger.info(f"Đã hoàn thành quy trình lập kế hoạch sản xuất cho bản vẽ: {drawing_path}")
+    manufacturing_plan = {
+        "source_drawing": drawing_path,
+        **drawing_info,
+        "run_id": run_id,
+        "timestamp": datetime.now().isoformat(),
+        "plan": outputs[stages.STAGE_ORDER[-1]],
+        "structured_plan": plan_model.structured_plan(outputs[stages.STAGE_ORDER[-1]]),
+        "stage_outputs": outputs,
+        "token_usage": usage
+    }
+    if plan_key is not None:
+        await _run_blocking(plan_cache.store_plan, plan_key, manufacturing_plan)
+    return manufacturing_plan
+
+async def _plan_one_async(index: int, drawing_path: str, output_dir: str,
+                          llm_semaphore: asyncio.Semaphore, stage_llms: Dict[str, Any]) -> Dict[str, Any]:
+    """Lập kế hoạch cho một bản vẽ và ghi kết quả riêng của nó (xem batch._plan_one)"""
+    started = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(drawing_path))[0]
+    record = {
+        "index": index,
+        "source_drawing": drawing_path,
+        "status": "failed",
+        "output_path": None,
+        "error": None,
+        "latency_seconds": 0.0
+    }
+
+    try:
+        plan = await run_manufacturing_planning_async(drawing_path, llm_semaphore, stage_llms)
+        record["output_path"] = await _run_blocking(utils.save_data, plan, f"{index:04d}_{stem}_plan.json", output_dir)
+        record["status"] = "succeeded"
+        streaming.emit("plan_saved", run_id=plan["run_id"], drawing=drawing_path, output_path=record["output_path"])
+    except Exception as e:
+        logger.error(f"Lỗi khi lập kế hoạch cho bản vẽ {drawing_path}: {str(e)}")
+        record["error"] = str(e)
+        streaming.emit("run_failed", drawing=drawing_path, error=str(e))
+
+    record["latency_seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+async def run_batch_async(drawing_paths: List[str], concurrency: int = None, llm_concurrency: int = None,
+                          output_dir: str = None) -> Dict[str, Any]:
+    """
+    Lập kế hoạch cho nhiều bản vẽ trên một vòng lặp sự kiện
+
+    Một hàng đợi có giới hạn cấp bản vẽ cho `concurrency` coroutine làm việc, nên bản vẽ
+    chỉ được nạp khi có chỗ (backpressure); mọi lời gọi LLM đi qua một semaphore chung
+    `llm_concurrency`. Khi bị hủy (Ctrl+C), các lượt chạy dở được đánh dấu "cancelled".
+
+    Args:
+        drawing_paths: Danh sách đường dẫn bản vẽ
+        concurrency: Số lượt lập kế hoạch đồng thời tối đa
+        llm_concurrency: Số lời gọi LLM đồng thời tối đa
+        output_dir: Thư mục lưu kết quả; mặc định là một thư mục batch mới trong DATA_PATH
+
+    Returns:
+        Dict tóm tắt lô (cùng cấu trúc với batch.run_batch)
+
+    Raises:
+        ValueError: CATALOG_INJECTION bị tắt
+    """
+    _require_catalog_injection()
+    concurrency = max(1, concurrency or config.ASYNC_MAX_CONCURRENT_PLANS)
+    llm_concurrency = max(1, llm_concurrency or config.ASYNC_MAX_CONCURRENT_LLM_CALLS)
+    llm_semaphore = asyncio.Semaphore(llm_concurrency)
+    # LLM theo công đoạn của lô này: client bất đồng bộ gắn với vòng lặp sự kiện đang chạy
+    stage_llms: Dict[str, Any] = {}
+    started_at = datetime.now()
+    if output_dir is None:
+        output_dir = os.path.join(config.DATA_PATH, f"batch_{started_at.strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    logger.info(
+        f"Bắt đầu lập kế hoạch bất đồng bộ cho {len(drawing_paths)} bản vẽ: "
+        f"{concurrency} lượt đồng thời, {llm_concurrency} lời gọi LLM đồng thời"
+    )
+
+    jobs: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    records = []
+
+    async def worker():
+        while True:
+            item = await jobs.get()
+            try:
+                if item is None:
+                    return
+                record = await _plan_one_async(item[0], item[1], output_dir, llm_semaphore, stage_llms)
+                records.append(record)
+                logger.info(
+                    f"[{len(records)}/{len(drawing_paths)}] {record['source_drawing']}: "
+                    f"{record['status']} ({record['latency_seconds']}s)"
+                )
+            finally:
+                jobs.task_done()
+
+    wall_start = time.perf_counter()
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        for index, path in enumerate(drawing_paths):
+            await jobs.put((index, path))
+        for _ in workers:
+            await jobs.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    wall_time = time.perf_counter() - wall_start
+
+    return batch.summarize_batch(
+        records, started_at, wall_time, concurrency, output_dir,
+        extra={"llm_concurrency": llm_concurrency, "token_usage": stages.stage_usage_report()}
+    )
@@ -8,9 +8,22 @@ import logging
 import autogen
 from typing import Dict, List, Any, Optional, Union
 import config
+import llm_cache
+import tracing
 
 logger = logging.getLogger(__name__)
 
+def get_config_list() -> List[Dict[str, Any]]:
+    """Tạo danh sách cấu hình mô hình LLM cho các tác tử AutoGen"""
+    entry = {
+        "model": config.DEFAULT_MODEL,
+        "api_key": config.OPENAI_API_KEY,
+        "temperature": config.TEMPERATURE
+    }
+    if config.OPENAI_BASE_URL:
+        entry["base_url"] = config.OPENAI_BASE_URL
+    return [entry]
+
 def create_code_execution_agent(part_specs: Dict):
     """
     Tạo một tác tử AutoGen có khả năng chạy mã để tính toán tối ưu quy trình sản xuất.
@@ -22,13 +35,7 @@ def create_code_execution_agent(part_specs: Dict):
         Kết quả của tính toán
     """
     # Cấu hình cho mô hình LLM
-    config_list = [
-        {
-            "model": config.DEFAULT_MODEL,
-            "api_key": config.OPENAI_API_KEY,
-            "temperature": config.TEMPERATURE
-        }
-    ]
+    config_list = get_config_list()
     
     # Tạo một assistant có khả năng chạy mã
     assistant = autogen.AssistantAgent(
@@ -59,6 +66,8 @@ def create_code_execution_agent(part_specs: Dict):
         """
     )
     
+    tracing.register_autogen_agents([assistant, user_proxy])
+    
     # Khởi tạo thư mục làm việc
     os.makedirs("execution_env", exist_ok=True)
     
@@ -83,7 +92,8 @@ def create_code_execution_agent(part_specs: Dict):
         # Khởi động cuộc hội thoại giữa các tác tử
         user_proxy.initiate_chat(
             assistant,
-            message=optimization_prompt
+            message=optimization_prompt,
+            cache=llm_cache.get_autogen_cache()
         )
         
         # Kiểm tra và tải kết quả
@@ -100,24 +110,18 @@ def create_code_execution_agent(part_specs: Dict):
         logger.error(f"Lỗi khi chạy tác tử AutoGen: {str(e)}")
         return {"error": str(e)}
 
-def create_manufacturing_team_chat(drawing_path: str):
+def _build_team_chat(drawing_path: str) -> Dict[str, Any]:
     """
-    Tạo một nhóm chat giữa các tác tử AutoGen cho quy trình sản xuất.
+    Tạo các tác tử, nhóm chat và tin nhắn mở đầu cho quy trình sản xuất.
     
     Args:
         drawing_path: Đường dẫn đến file bản vẽ
         
     Returns:
-        Kết quả của cuộc thảo luận
+        Dict gồm user_proxy, manager, groupchat, project_manager và message mở đầu
     """
     # Cấu hình cho mô hình LLM
-    config_list = [
-        {
-            "model": config.DEFAULT_MODEL,
-            "api_key": config.OPENAI_API_KEY,
-            "temperature": config.TEMPERATURE
-        }
-    ]
+    config_list = get_config_list()
     
     # Tạo các tác tử trong nhóm
     design_engineer = autogen.AssistantAgent(
@@ -214,11 +218,14 @@ def create_manufacturing_team_chat(drawing_path: str):
     )
     
     manager = autogen.GroupChatManager(groupchat=groupchat, llm_config={"config_list": config_list})
+    tracing.register_autogen_agents(groupchat.agents + [manager])
     
-    # Bắt đầu cuộc trò chuyện
-    user_proxy.initiate_chat(
-        manager,
-        message=f"""
+    return {
+        "user_proxy": user_proxy,
+        "manager": manager,
+        "groupchat": groupchat,
+        "project_manager": project_manager,
+        "message": f"""
         We need to create a manufacturing plan for a new mechanical part.
         Here is the technical drawing specification:
         
@@ -245,7 +252,12 @@ def create_manufacturing_team_chat(drawing_path: str):
         
         Let's approach this systematically to create a complete plan ready for implementation.
         """
-    )
+    }
+
+def _collect_team_result(team: Dict[str, Any]) -> Dict[str, Any]:
+    """Lấy kế hoạch cuối cùng của Project Manager từ cuộc thảo luận"""
+    groupchat = team["groupchat"]
+    project_manager = team["project_manager"]
     
     # Trả về kết quả cuối cùng từ Project Manager
     for message in reversed(groupchat.messages):
@@ -258,4 +270,46 @@ def create_manufacturing_team_chat(drawing_path: str):
             {"sender": msg.get("sender"), "content": msg.get("content")} 
             for msg in groupchat.messages
         ]
-    } 
\ No newline at end of file
+    } 
+
+def create_manufacturing_team_chat(drawing_path: str):
+    """
+    Tạo một nhóm chat giữa các tác tử AutoGen cho quy trình sản xuất.
+    
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+        
+    Returns:
+        Kết quả của cuộc thảo luận
+    """
+    team = _build_team_chat(drawing_path)
+    
+    # Bắt đầu cuộc trò chuyện
+    team["user_proxy"].initiate_chat(
+        team["manager"],
+        cache=llm_cache.get_autogen_cache(),
+        message=team["message"]
+    )
+    
+    return _collect_team_result(team)
+
+async def a_create_manufacturing_team_chat(drawing_path: str):
+    """
+    Phiên bản bất đồng bộ của create_manufacturing_team_chat: các lượt trả lời của tác tử
+    dùng lời gọi LLM bất đồng bộ nên một vòng lặp sự kiện có thể chạy nhiều nhóm chat cùng lúc.
+    
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+        
+    Returns:
+        Kết quả của cuộc thảo luận
+    """
+    team = _build_team_chat(drawing_path)
+    
+    await team["user_proxy"].a_initiate_chat(
+        team["manager"],
+        cache=llm_cache.get_autogen_cache(),
+        message=team["message"]
+    )
+    
+    return _collect_team_result(team)
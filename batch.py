@@ -0,0 +1,207 @@
+"""
+Chế độ lập kế hoạch hàng loạt cho nhiều bản vẽ kỹ thuật
+"""
+
+import os
+import glob
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Any, Callable
+import config
+import utils
+import streaming
+
+logger = logging.getLogger(__name__)
+
+# Các định dạng bản vẽ được hỗ trợ (khớp với utils.load_drawing_file)
+SUPPORTED_EXTENSIONS = ('.txt', '.md', '.pdf')
+
+# Phần mở rộng của file manifest liệt kê bản vẽ
+MANIFEST_EXTENSIONS = ('.json', '.lst', '.manifest')
+
+def _read_manifest(manifest_path: str) -> List[str]:
+    """
+    Đọc danh sách bản vẽ từ file manifest
+
+    Manifest JSON có thể là một danh sách đường dẫn hoặc một dict có khóa "drawings".
+    Các manifest khác chứa một đường dẫn mỗi dòng, dòng bắt đầu bằng '#' là chú thích.
+    Đường dẫn tương đối được tính theo thư mục chứa manifest.
+
+    Args:
+        manifest_path: Đường dẫn đến file manifest
+
+    Returns:
+        Danh sách đường dẫn bản vẽ
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        if manifest_path.lower().endswith('.json'):
+            data = json.load(f)
+            entries = data.get("drawings", []) if isinstance(data, dict) else data
+        else:
+            entries = [line.strip() for line in f]
+
+    paths = []
+    for entry in entries:
+        if not entry or entry.startswith('#'):
+            continue
+        paths.append(entry if os.path.isabs(entry) else os.path.join(base_dir, entry))
+    return paths
+
+def collect_drawing_paths(source: str) -> List[str]:
+    """
+    Xác định danh sách bản vẽ cần lập kế hoạch từ thư mục, mẫu glob hoặc manifest
+
+    Args:
+        source: Thư mục, mẫu glob (vd: "drawings/*.txt") hoặc file manifest
+
+    Returns:
+        Danh sách đường dẫn bản vẽ (không trùng lặp, giữ nguyên thứ tự)
+    """
+    if os.path.isdir(source):
+        candidates = sorted(
+            os.path.join(source, name) for name in os.listdir(source)
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+        )
+    elif os.path.isfile(source) and source.lower().endswith(MANIFEST_EXTENSIONS):
+        candidates = _read_manifest(source)
+    else:
+        candidates = sorted(
+            path for path in glob.glob(source, recursive=True)
+            if os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+        )
+
+    # Loại bỏ bản vẽ trùng lặp
+    seen = set()
+    paths = []
+    for path in candidates:
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            paths.append(path)
+
+    if not paths:
+        raise FileNotFoundError(f"Không tìm thấy bản vẽ nào từ: {source}")
+
+    return paths
+
+def _plan_one(index: int, drawing_path: str, plan_fn: Callable[[str], Dict[str, Any]],
+              output_dir: str) -> Dict[str, Any]:
+    """Lập kế hoạch cho một bản vẽ và ghi kết quả riêng của nó"""
+    started = time.perf_counter()
+    stem = os.path.splitext(os.path.basename(drawing_path))[0]
+    record = {
+        "index": index,
+        "source_drawing": drawing_path,
+        "status": "failed",
+        "output_path": None,
+        "error": None,
+        "latency_seconds": 0.0
+    }
+
+    try:
+        plan = plan_fn(drawing_path)
+        # Tiền tố theo thứ tự tránh trùng tên khi hai bản vẽ cùng tên nằm ở thư mục khác nhau
+        record["output_path"] = utils.save_data(plan, f"{index:04d}_{stem}_plan.json", directory=output_dir)
+        record["status"] = "succeeded"
+        streaming.emit("plan_saved", run_id=plan.get("run_id"), drawing=drawing_path, output_path=record["output_path"])
+    except Exception as e:
+        logger.error(f"Lỗi khi lập kế hoạch cho bản vẽ {drawing_path}: {str(e)}")
+        record["error"] = str(e)
+        streaming.emit("run_failed", drawing=drawing_path, error=str(e))
+
+    record["latency_seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+def run_batch(drawing_paths: List[str], plan_fn: Callable[[str], Dict[str, Any]],
+              concurrency: int = None, output_dir: str = None) -> Dict[str, Any]:
+    """
+    Chạy lập kế hoạch cho nhiều bản vẽ trên một nhóm luồng có giới hạn
+
+    Các lượt chạy chủ yếu chờ độ trễ của LLM (I/O), nên chạy song song bằng luồng
+    cho thông lượng gần tuyến tính theo số luồng cho tới giới hạn tốc độ của API.
+
+    Args:
+        drawing_paths: Danh sách đường dẫn bản vẽ
+        plan_fn: Hàm lập kế hoạch cho một bản vẽ (vd: main.run_manufacturing_planning)
+        concurrency: Số bản vẽ được xử lý đồng thời tối đa
+        output_dir: Thư mục lưu kết quả; mặc định là một thư mục batch mới trong DATA_PATH
+
+    Returns:
+        Dict tóm tắt lô: thời gian thực, độ trễ từng bản vẽ và các lỗi
+    """
+    concurrency = max(1, concurrency or config.BATCH_CONCURRENCY)
+    started_at = datetime.now()
+    if output_dir is None:
+        output_dir = os.path.join(config.DATA_PATH, f"batch_{started_at.strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    logger.info(f"Bắt đầu lập kế hoạch hàng loạt cho {len(drawing_paths)} bản vẽ với {concurrency} luồng")
+
+    wall_start = time.perf_counter()
+    records = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="planner") as executor:
+        futures = [
+            executor.submit(_plan_one, index, path, plan_fn, output_dir)
+            for index, path in enumerate(drawing_paths)
+        ]
+        for future in as_completed(futures):
+            record = future.result()
+            records.append(record)
+            logger.info(
+                f"[{len(records)}/{len(drawing_paths)}] {record['source_drawing']}: "
+                f"{record['status']} ({record['latency_seconds']}s)"
+            )
+    wall_time = time.perf_counter() - wall_start
+
+    return summarize_batch(records, started_at, wall_time, concurrency, output_dir)
+
+def summarize_batch(records: List[Dict[str, Any]], started_at: datetime, wall_time: float,
+                    concurrency: int, output_dir: str, extra: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Tổng hợp và lưu tóm tắt một lô
+
+    Args:
+        records: Kết quả từng bản vẽ (xem _plan_one)
+        started_at: Thời điểm bắt đầu lô
+        wall_time: Thời gian thực của lô (giây)
+        concurrency: Số bản vẽ được xử lý đồng thời tối đa
+        output_dir: Thư mục lưu kết quả
+        extra: Các trường bổ sung vào tóm tắt
+
+    Returns:
+        Dict tóm tắt lô
+    """
+    records.sort(key=lambda r: r["index"])
+    latencies = [r["latency_seconds"] for r in records]
+    failures = [r for r in records if r["status"] != "succeeded"]
+
+    summary = {
+        "started_at": started_at.isoformat(),
+        "finished_at": datetime.now().isoformat(),
+        "concurrency": concurrency,
+        "total": len(records),
+        "succeeded": len(records) - len(failures),
+        "failed": len(failures),
+        "wall_time_seconds": round(wall_time, 3),
+        "sum_latency_seconds": round(sum(latencies), 3),
+        "mean_latency_seconds": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "max_latency_seconds": max(latencies) if latencies else 0.0,
+        # Tỉ lệ tổng độ trễ / thời gian thực: mức tăng tốc so với chạy tuần tự
+        "speedup": round(sum(latencies) / wall_time, 2) if wall_time > 0 else 0.0,
+        "output_dir": output_dir,
+        "drawings": records,
+        "failures": [{"source_drawing": r["source_drawing"], "error": r["error"]} for r in failures]
+    }
+
+    summary.update(extra or {})
+    summary["summary_path"] = utils.save_data(summary, "batch_summary.json", directory=output_dir)
+    logger.info(
+        f"Hoàn thành lô: {summary['succeeded']}/{summary['total']} thành công "
+        f"trong {summary['wall_time_seconds']}s"
+    )
+    return summary
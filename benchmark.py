@@ -0,0 +1,384 @@
+"""
+Bộ đo hiệu năng ngoại tuyến: chạy quy trình lập kế hoạch với LLM giả lập cục bộ (fake_llm) để đo
+chi phí của framework, tuần tự hóa và khả năng mở rộng theo số luồng mà không cần mạng
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, List, Any, Callable
+import config
+import utils
+import batch
+import stages
+import fake_llm
+import main as planner
+
+logger = logging.getLogger(__name__)
+
+def _timing_stats(samples: List[float]) -> Dict[str, float]:
+    """Thống kê thời gian (ms) của các lần đo (giây)"""
+    samples_ms = sorted(sample * 1000 for sample in samples)
+    return {
+        "calls": len(samples_ms),
+        "mean_ms": round(statistics.mean(samples_ms), 3),
+        "median_ms": round(statistics.median(samples_ms), 3),
+        "p95_ms": round(samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))], 3),
+        "min_ms": round(samples_ms[0], 3)
+    }
+
+def _time_calls(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Đo `repeat` lần gọi fn"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return _timing_stats(samples)
+
+@contextmanager
+def _isolated_data(work_dir: str):
+    """Ghi checkpoint, lịch sử bản vẽ, chỉ mục kế hoạch và bộ nhớ đệm vào thư mục tạm thay vì DATA_PATH"""
+    names = (
+        "CHECKPOINT_PATH", "REVISIONS_PATH", "CATALOG_REGISTRY_PATH", "PLAN_INDEX_PATH",
+        "PLAN_CACHE", "PLAN_CACHE_PATH", "LLM_CACHE_MODE", "STREAM_OUTPUT"
+    )
+    saved = {name: getattr(config, name) for name in names}
+    config.CHECKPOINT_PATH = os.path.join(work_dir, "checkpoints")
+    config.REVISIONS_PATH = os.path.join(work_dir, "revisions")
+    config.CATALOG_REGISTRY_PATH = os.path.join(work_dir, "catalog_registry.json")
+    # Kế hoạch do utils.save_data lưu được lập chỉ mục vào chỉ mục tạm, không vào chỉ mục thật
+    config.PLAN_INDEX_PATH = os.path.join(work_dir, "plan_index.sqlite")
+    config.PLAN_CACHE_PATH = os.path.join(work_dir, "plan_cache.sqlite")
+    # Bộ nhớ đệm (LLM và kho kế hoạch) sẽ trả lời thay LLM giả lập và streaming in token ra màn hình
+    config.PLAN_CACHE = False
+    config.LLM_CACHE_MODE = "off"
+    config.STREAM_OUTPUT = False
+    try:
+        yield work_dir
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+def _replicate_drawing(drawing_path: str, count: int, directory: str) -> List[str]:
+    """Tạo `count` bản sao của bản vẽ để mỗi lượt chạy có file và checkpoint riêng"""
+    os.makedirs(directory, exist_ok=True)
+    stem, ext = os.path.splitext(os.path.basename(drawing_path))
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"{stem}_{index:04d}{ext}")
+        if not os.path.exists(path):
+            shutil.copyfile(drawing_path, path)
+        paths.append(path)
+    return paths
+
+def bench_utils(drawing_path: str, repeat: int, work_dir: str) -> Dict[str, Dict[str, float]]:
+    """
+    Đo các hàm tiện ích trên đường đi của mỗi lượt chạy
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+        repeat: Số lần gọi mỗi hàm
+        work_dir: Thư mục tạm để ghi file
+
+    Returns:
+        Thống kê thời gian theo tên hàm
+    """
+    drawing_text = utils.load_drawing_file(drawing_path)
+    part_specs = utils.extract_technical_specs(drawing_text)
+    # Kế hoạch mẫu có kích thước gần với kế hoạch thật (output của sáu công đoạn)
+    sample_plan = {
+        "source_drawing": drawing_path,
+        "plan": drawing_text,
+        "stage_outputs": {stage: drawing_text for stage in stages.STAGE_ORDER}
+    }
+    output_dir = os.path.join(work_dir, "save_data")
+
+    # Tắt log INFO của từng lần gọi để không đo thời gian ghi log
+    utils_logger = logging.getLogger(utils.__name__)
+    level = utils_logger.level
+    utils_logger.setLevel(logging.WARNING)
+    try:
+        return {
+            "load_drawing_file": _time_calls(lambda: utils.load_drawing_file(drawing_path), repeat),
+            "extract_technical_specs": _time_calls(lambda: utils.extract_technical_specs(drawing_text), repeat),
+            "calculate_machining_time": _time_calls(lambda: utils.calculate_machining_time(part_specs), repeat),
+            "save_data": _time_calls(lambda: utils.save_data(sample_plan, "benchmark_plan.json", directory=output_dir), repeat)
+        }
+    finally:
+        utils_logger.setLevel(level)
+
+def bench_crew(drawing_path: str, server: fake_llm.FakeLLMServer) -> Dict[str, Any]:
+    """
+    Đo dựng crew và kickoff cho một bản vẽ, tách độ trễ giả lập của LLM khỏi chi phí còn lại
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+        server: Máy chủ LLM giả lập đang dùng
+
+    Returns:
+        Dict thời gian dựng crew, kickoff, chi phí ngoài LLM và chi tiết theo công đoạn
+    """
+    stage_reports = {}
+    last = {"time": 0.0, "stats": server.stats()}
+
+    def on_stage(stage: str, task_output: Any) -> None:
+        now, stats = time.perf_counter(), server.stats()
+        seconds = now - last["time"]
+        llm_seconds = stats["latency_seconds"] - last["stats"]["latency_seconds"]
+        stage_reports[stage] = {
+            "seconds": round(seconds, 4),
+            "llm_requests": stats["requests"] - last["stats"]["requests"],
+            "llm_seconds": round(llm_seconds, 4),
+            "overhead_seconds": round(seconds - llm_seconds, 4),
+            "output_chars": len(task_output.raw)
+        }
+        last["time"], last["stats"] = now, stats
+
+    started = time.perf_counter()
+    crew = planner.create_manufacturing_crew(drawing_path, stage_callback=on_stage)
+    create_seconds = time.perf_counter() - started
+
+    before = server.stats()
+    last["time"], last["stats"] = time.perf_counter(), before
+    started = time.perf_counter()
+    crew.kickoff()
+    kickoff_seconds = time.perf_counter() - started
+    llm_seconds = server.stats()["latency_seconds"] - before["latency_seconds"]
+
+    return {
+        "create_seconds": round(create_seconds, 4),
+        "kickoff_seconds": round(kickoff_seconds, 4),
+        "llm_requests": server.stats()["requests"] - before["requests"],
+        "llm_seconds": round(llm_seconds, 4),
+        "overhead_seconds": round(create_seconds + kickoff_seconds - llm_seconds, 4),
+        "stages": stage_reports
+    }
+
+def bench_scaling(drawing_path: str, drawing_counts: List[int], concurrency_levels: List[int],
+                  server: fake_llm.FakeLLMServer, work_dir: str) -> List[Dict[str, Any]]:
+    """
+    Đo lập kế hoạch hàng loạt đầu cuối (batch.run_batch + main.run_manufacturing_planning)
+    theo số bản vẽ và số luồng
+
+    Args:
+        drawing_path: Bản vẽ mẫu được nhân bản
+        drawing_counts: Các số lượng bản vẽ cần đo
+        concurrency_levels: Các mức đồng thời cần đo
+        server: Máy chủ LLM giả lập đang dùng
+        work_dir: Thư mục tạm cho bản vẽ và kết quả
+
+    Returns:
+        Danh sách kết quả theo (số bản vẽ, mức đồng thời)
+    """
+    results = []
+    for count in drawing_counts:
+        drawing_paths = _replicate_drawing(drawing_path, count, os.path.join(work_dir, "drawings"))
+        serial_wall_time = None
+        for concurrency in concurrency_levels:
+            before = server.stats()
+            output_dir = os.path.join(work_dir, f"batch_{count}x{concurrency}")
+            summary = batch.run_batch(drawing_paths, planner.run_manufacturing_planning,
+                                      concurrency=concurrency, output_dir=output_dir)
+            after = server.stats()
+
+            llm_seconds = after["latency_seconds"] - before["latency_seconds"]
+            latency_sum = sum(record["latency_seconds"] for record in summary["drawings"])
+            if concurrency == 1 or serial_wall_time is None:
+                serial_wall_time = summary["wall_time_seconds"]
+            results.append({
+                "drawings": count,
+                "concurrency": concurrency,
+                "succeeded": summary["succeeded"],
+                "failed": summary["failed"],
+                "wall_time_seconds": summary["wall_time_seconds"],
+                "throughput_per_minute": round(count / summary["wall_time_seconds"] * 60, 2) if summary["wall_time_seconds"] else None,
+                "speedup": round(serial_wall_time / summary["wall_time_seconds"], 2) if summary["wall_time_seconds"] else None,
+                "mean_latency_seconds": summary["mean_latency_seconds"],
+                "llm_requests": after["requests"] - before["requests"],
+                "overhead_seconds_per_drawing": round((latency_sum - llm_seconds) / count, 4)
+            })
+            logger.info(f"Đã đo {count} bản vẽ x {concurrency} luồng: {summary['wall_time_seconds']}s")
+    return results
+
+def run_benchmarks(drawing_path: str, drawing_counts: List[int], concurrency_levels: List[int],
+                   latency: float, output_tokens: int, repeat: int, include_crew: bool = True) -> Dict[str, Any]:
+    """
+    Chạy toàn bộ bộ đo với LLM giả lập
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ mẫu
+        drawing_counts: Các số lượng bản vẽ cho phép đo hàng loạt
+        concurrency_levels: Các mức đồng thời cho phép đo hàng loạt
+        latency: Độ trễ giả lập của mỗi lời gọi LLM (giây)
+        output_tokens: Số token của mỗi câu trả lời giả lập
+        repeat: Số lần gọi mỗi hàm tiện ích
+        include_crew: Có đo crew CrewAI (create_manufacturing_crew/kickoff) hay không
+
+    Returns:
+        Dict kết quả đo
+    """
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "settings": {
+            "drawing": drawing_path,
+            "drawing_counts": drawing_counts,
+            "concurrency_levels": concurrency_levels,
+            "llm_latency_seconds": latency,
+            "llm_output_tokens": output_tokens,
+            "repeat": repeat,
+            "context_compression": config.CONTEXT_COMPRESSION
+        }
+    }
+
+    work_dir = tempfile.mkdtemp(prefix="planning_benchmark_")
+    try:
+        with _isolated_data(work_dir), fake_llm.FakeLLMServer(latency, output_tokens) as server, fake_llm.use_fake_llm(server):
+            results["utils"] = bench_utils(drawing_path, repeat, work_dir)
+            if include_crew:
+                results["crew"] = bench_crew(drawing_path, server)
+            results["scaling"] = bench_scaling(drawing_path, drawing_counts, concurrency_levels, server, work_dir)
+            results["llm"] = server.stats()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def _comparable_metrics(results: Dict[str, Any]) -> Dict[str, float]:
+    """Các chỉ số dùng để so sánh giữa hai lần đo (càng nhỏ càng tốt)"""
+    metrics = {f"utils.{name}.median_ms": stats["median_ms"] for name, stats in results.get("utils", {}).items()}
+    if "crew" in results:
+        metrics["crew.overhead_seconds"] = results["crew"]["overhead_seconds"]
+    for entry in results.get("scaling", []):
+        key = f"scaling.{entry['drawings']}x{entry['concurrency']}"
+        metrics[f"{key}.wall_time_seconds"] = entry["wall_time_seconds"]
+        metrics[f"{key}.overhead_seconds_per_drawing"] = entry["overhead_seconds_per_drawing"]
+    return metrics
+
+def compare_with_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25,
+                          min_delta_seconds: float = 0.005, min_delta_ms: float = 0.05) -> List[Dict[str, Any]]:
+    """
+    So sánh kết quả đo với một lần đo trước
+
+    Args:
+        results: Kết quả đo hiện tại
+        baseline: Kết quả đo dùng làm mốc
+        tolerance: Mức tăng tương đối cho phép (0.25 = 25%)
+        min_delta_seconds: Mức tăng tuyệt đối tối thiểu (giây) để tính là chậm đi, bỏ qua nhiễu đo
+        min_delta_ms: Như trên cho các chỉ số ms của hàm tiện ích
+
+    Returns:
+        Danh sách các chỉ số chậm đi vượt ngưỡng
+    """
+    current, reference = _comparable_metrics(results), _comparable_metrics(baseline)
+    regressions = []
+    for name, value in current.items():
+        base = reference.get(name)
+        if base is None or value is None:
+            continue
+        min_delta = min_delta_ms if name.endswith("_ms") else min_delta_seconds
+        if value > base * (1 + tolerance) and value - base > min_delta:
+            regressions.append({
+                "metric": name,
+                "baseline": base,
+                "current": value,
+                "change": round(value / base - 1, 3) if base else None
+            })
+    return regressions
+
+def _parse_int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+def parse_arguments():
+    """Xử lý tham số dòng lệnh"""
+    parser = argparse.ArgumentParser(
+        description='Đo hiệu năng quy trình lập kế hoạch với LLM giả lập cục bộ (không cần mạng)'
+    )
+    parser.add_argument('--drawing', '-d', type=str, default='drawings/sample_part.txt',
+                        help='Bản vẽ mẫu (được nhân bản cho phép đo hàng loạt)')
+    parser.add_argument('--drawings', type=_parse_int_list, default=[1, 4, 8],
+                        help='Các số lượng bản vẽ, phân tách bằng dấu phẩy (mặc định: 1,4,8)')
+    parser.add_argument('--concurrency', '-j', type=_parse_int_list, default=[1, 4],
+                        help='Các mức đồng thời, phân tách bằng dấu phẩy (mặc định: 1,4)')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='Độ trễ giả lập của mỗi lời gọi LLM, giây (mặc định: 0.05)')
+    parser.add_argument('--output-tokens', type=int, default=300,
+                        help='Số token của mỗi câu trả lời giả lập (mặc định: 300)')
+    parser.add_argument('--repeat', type=int, default=50,
+                        help='Số lần gọi mỗi hàm tiện ích (mặc định: 50)')
+    parser.add_argument('--skip-crew', action='store_true',
+                        help='Bỏ qua phép đo create_manufacturing_crew/kickoff')
+    parser.add_argument('--output', '-o', type=str, default=None,
+                        help='File JSON kết quả (mặc định: DATA_PATH/benchmarks/benchmark_<thời điểm>.json)')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='File kết quả của lần đo trước để phát hiện chậm đi')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Mức chậm đi tương đối cho phép so với baseline (mặc định: 0.25)')
+    return parser.parse_args()
+
+def main():
+    """Chạy bộ đo, lưu kết quả và trả mã lỗi 1 nếu có bản vẽ lập kế hoạch thất bại hoặc chậm đi so với baseline"""
+    args = parse_arguments()
+    config.setup_logging()
+
+    results = run_benchmarks(
+        args.drawing, args.drawings, args.concurrency, args.latency, args.output_tokens,
+        args.repeat, include_crew=not args.skip_crew
+    )
+
+    regressions = None
+    if args.baseline:
+        regressions = compare_with_baseline(results, utils.load_data(args.baseline), args.tolerance)
+        results["baseline"] = {"path": args.baseline, "tolerance": args.tolerance, "regressions": regressions}
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        output_path = args.output
+    else:
+        output_path = utils.save_data(results, "benchmark.json", directory=os.path.join(config.DATA_PATH, "benchmarks"))
+
+    print("\n===== KẾT QUẢ ĐO HIỆU NĂNG (LLM GIẢ LẬP) =====")
+    for name, stats in results["utils"].items():
+        print(f"  {name:<26} trung vị {stats['median_ms']:>9.3f} ms, p95 {stats['p95_ms']:>9.3f} ms")
+    if "crew" in results:
+        crew = results["crew"]
+        print(
+            f"Crew: dựng {crew['create_seconds']}s, kickoff {crew['kickoff_seconds']}s "
+            f"({crew['llm_requests']} lời gọi LLM, {crew['llm_seconds']}s độ trễ giả lập), "
+            f"chi phí ngoài LLM {crew['overhead_seconds']}s"
+        )
+    for entry in results["scaling"]:
+        print(
+            f"  {entry['drawings']:>4} bản vẽ x {entry['concurrency']:>2} luồng: {entry['wall_time_seconds']}s, "
+            f"{entry['throughput_per_minute']} bản vẽ/phút, tăng tốc {entry['speedup']}x, "
+            f"chi phí ngoài LLM {entry['overhead_seconds_per_drawing']}s/bản vẽ"
+        )
+    print(f"Kết quả đã lưu vào: {output_path}")
+
+    # Số liệu đo hàng loạt chỉ có nghĩa khi mọi bản vẽ được lập kế hoạch thành công
+    failures = [entry for entry in results["scaling"] if entry["succeeded"] < entry["drawings"]]
+    if failures:
+        print("\nLập kế hoạch thất bại trong phép đo hàng loạt:")
+        for entry in failures:
+            print(f"  - {entry['drawings']} bản vẽ x {entry['concurrency']} luồng: {entry['succeeded']} thành công, {entry['failed']} thất bại")
+
+    if regressions:
+        print(f"\nChậm đi so với {args.baseline}:")
+        for regression in regressions:
+            print(f"  - {regression['metric']}: {regression['baseline']} -> {regression['current']} (+{regression['change']:.0%})")
+    if failures or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Sổ đăng ký catalog theo mã chi tiết: ánh xạ mã chi tiết (và Document ID/phiên bản) tới file catalog
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+# Loại catalog -> thư mục chứa catalog đó
+CATALOG_DIRECTORIES = {
+    "materials": "materials_catalogs",
+    "tooling": "tooling_catalogs",
+    "process": "process_standards",
+    "quality": "quality_standards"
+}
+
+CATALOG_EXTENSIONS = ('.txt', '.md')
+
+# Chỉ đọc phần đầu của catalog để lấy thông tin nhận dạng
+HEADER_LINES = 20
+
+HEADER_FIELD_RE = re.compile(r'^\s*(Document ID|Revision|Date|Part Number):\s*(.+?)\s*$', re.IGNORECASE)
+
+REGISTRY_VERSION = 1
+
+_registry: Optional[Dict[str, Any]] = None
+_registry_lock = threading.Lock()
+
+def _read_header(path: str) -> Dict[str, str]:
+    """Đọc các trường nhận dạng ở phần đầu của một catalog"""
+    fields = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for _, line in zip(range(HEADER_LINES), f):
+            match = HEADER_FIELD_RE.match(line)
+            if match:
+                fields[match.group(1).lower().replace(' ', '_')] = match.group(2)
+    return fields
+
+def _revision_key(revision: Optional[str]):
+    """Khóa so sánh phiên bản: số so sánh theo giá trị, chữ so sánh theo thứ tự từ điển"""
+    revision = revision or ""
+    return (1, int(revision), "") if revision.isdigit() else (0, 0, revision)
+
+def _scan_directory(kind: str, directory: str) -> List[Dict[str, Any]]:
+    """
+    Quét một thư mục catalog
+
+    Args:
+        kind: Loại catalog (materials, tooling, process, quality)
+        directory: Thư mục cần quét
+
+    Returns:
+        Danh sách bản ghi catalog (mã chi tiết, Document ID, phiên bản, đường dẫn)
+    """
+    records = []
+    if not os.path.isdir(directory):
+        return records
+
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() not in CATALOG_EXTENSIONS:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            header = _read_header(path)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning(f"Bỏ qua catalog không đọc được {path}: {str(e)}")
+            continue
+
+        records.append({
+            "kind": kind,
+            # Catalog không ghi mã chi tiết được nhận dạng theo tên file (vd: SC-2023-A001.txt)
+            "part_number": header.get("part_number") or os.path.splitext(name)[0],
+            "document_id": header.get("document_id"),
+            "revision": header.get("revision"),
+            "date": header.get("date"),
+            "path": path.replace(os.sep, '/')
+        })
+
+    return records
+
+def _directory_signature(directory: str) -> Optional[int]:
+    """mtime của thư mục, thay đổi khi có file được thêm, xóa hoặc đổi tên"""
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+def build_registry(previous: Optional[Dict[str, Any]] = None, force: bool = False) -> Dict[str, Any]:
+    """
+    Lập sổ đăng ký catalog, chỉ quét lại các thư mục đã thay đổi so với lần lập trước
+
+    Args:
+        previous: Sổ đăng ký trước đó (nếu có)
+        force: Quét lại toàn bộ các thư mục
+
+    Returns:
+        Dict sổ đăng ký gồm chữ ký thư mục, bản ghi theo thư mục và các chỉ mục tra cứu
+    """
+    usable = previous if previous and previous.get("version") == REGISTRY_VERSION else None
+    directories = {}
+    records_by_directory = {}
+    rescanned = []
+
+    for kind, directory in CATALOG_DIRECTORIES.items():
+        signature = _directory_signature(directory)
+        directories[directory] = signature
+        if not force and usable and usable["directories"].get(directory) == signature:
+            records_by_directory[directory] = usable["records"].get(directory, [])
+        else:
+            records_by_directory[directory] = _scan_directory(kind, directory)
+            rescanned.append(directory)
+
+    # Chỉ mục tra cứu: mã chi tiết -> loại -> catalog (phiên bản mới nhất), và Document ID -> catalog
+    parts: Dict[str, Dict[str, Any]] = {}
+    documents: Dict[str, Any] = {}
+    for records in records_by_directory.values():
+        for record in records:
+            kinds = parts.setdefault(record["part_number"], {})
+            current = kinds.get(record["kind"])
+            if current is None or _revision_key(record["revision"]) > _revision_key(current["revision"]):
+                kinds[record["kind"]] = record
+            if record["document_id"]:
+                documents[record["document_id"]] = record
+
+    if rescanned:
+        logger.info(f"Đã quét lại các thư mục catalog: {', '.join(rescanned)}")
+
+    return {
+        "version": REGISTRY_VERSION,
+        "built_at": datetime.now().isoformat(),
+        "directories": directories,
+        "records": records_by_directory,
+        "parts": parts,
+        "documents": documents
+    }
+
+def _save_registry(registry: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(config.CATALOG_REGISTRY_PATH)), exist_ok=True)
+    tmp_path = f"{config.CATALOG_REGISTRY_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, ensure_ascii=False)
+    os.replace(tmp_path, config.CATALOG_REGISTRY_PATH)
+
+def get_registry(force_rebuild: bool = False) -> Dict[str, Any]:
+    """
+    Lấy sổ đăng ký catalog: tải một lần mỗi tiến trình từ file đã lưu và chỉ quét lại
+    những thư mục có mtime thay đổi
+
+    Args:
+        force_rebuild: Quét lại toàn bộ các thư mục catalog
+
+    Returns:
+        Dict sổ đăng ký
+    """
+    global _registry
+
+    with _registry_lock:
+        if _registry is not None and not force_rebuild:
+            return _registry
+
+        previous = None
+        if os.path.exists(config.CATALOG_REGISTRY_PATH):
+            try:
+                with open(config.CATALOG_REGISTRY_PATH, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Không đọc được sổ đăng ký catalog, sẽ lập lại: {str(e)}")
+
+        registry = build_registry(previous, force=force_rebuild)
+        if previous is None or registry["directories"] != previous.get("directories") or force_rebuild:
+            _save_registry(registry)
+        _registry = registry
+        return _registry
+
+def resolve_catalogs(part_number: str) -> Dict[str, str]:
+    """
+    Tra cứu các file catalog của một mã chi tiết
+
+    Args:
+        part_number: Mã chi tiết (vd: SC-2023-A001)
+
+    Returns:
+        Dict đường dẫn catalog theo loại (materials, tooling, process, quality); rỗng nếu không có
+    """
+    entries = get_registry()["parts"].get(part_number, {})
+    return {kind: record["path"] for kind, record in entries.items()}
+
+def get_catalog_path(kind: str, part_number: Optional[str]) -> Optional[str]:
+    """
+    Tra cứu file catalog của một loại cho một mã chi tiết
+
+    Args:
+        kind: Loại catalog (materials, tooling, process, quality)
+        part_number: Mã chi tiết
+
+    Returns:
+        Đường dẫn catalog hoặc None nếu không có
+    """
+    if not part_number:
+        return None
+    record = get_registry()["parts"].get(part_number, {}).get(kind)
+    return record["path"] if record else None
+
+def get_document(document_id: str) -> Optional[Dict[str, Any]]:
+    """Tra cứu bản ghi catalog theo Document ID"""
+    return get_registry()["documents"].get(document_id)
+
+def main():
+    """Xem hoặc lập lại sổ đăng ký catalog từ dòng lệnh"""
+    parser = argparse.ArgumentParser(description='Sổ đăng ký catalog theo mã chi tiết')
+    parser.add_argument('part_number', nargs='?', help='Mã chi tiết cần tra cứu')
+    parser.add_argument('--rebuild', action='store_true', help='Quét lại toàn bộ các thư mục catalog')
+    args = parser.parse_args()
+
+    config.setup_logging()
+
+    registry = get_registry(force_rebuild=args.rebuild)
+    if args.part_number:
+        catalogs = resolve_catalogs(args.part_number)
+        if not catalogs:
+            print(f"Không có catalog nào cho mã chi tiết: {args.part_number}")
+            sys.exit(1)
+        for kind, path in catalogs.items():
+            print(f"{kind}: {path}")
+    else:
+        print(f"Sổ đăng ký: {config.CATALOG_REGISTRY_PATH}")
+        print(f"Số mã chi tiết: {len(registry['parts'])}, số tài liệu: {len(registry['documents'])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Đọc và lập chỉ mục các catalog tham chiếu theo phần "==== X ====" và mục đánh số
+"""
+
+import os
+import re
+import logging
+import threading
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tiêu đề phần dạng "==== TURNING OPERATIONS TOOLING ===="
+SECTION_HEADER_RE = re.compile(r'^=+\s*([^=\s].*?)\s*=+\s*$')
+
+# Mục đánh số ở đầu dòng dạng "1. ROUGH TURNING OPERATIONS:"
+SUBSECTION_HEADER_RE = re.compile(r'^(\d+)\.\s+(.+?):?\s*$')
+
+# Trường thông tin ở phần đầu catalog dạng "Document ID: TC-SC2023-A001-001"
+METADATA_RE = re.compile(r'^([A-Za-z][A-Za-z ]*?):\s*(.+)$')
+
+# Kho nội dung catalog dùng chung trong tiến trình: đường dẫn tuyệt đối -> ((mtime, kích thước), nội dung, chỉ mục)
+_store: Dict[str, Any] = {}
+_store_lock = threading.Lock()
+_store_stats = {"reads": 0, "hits": 0, "misses": 0, "bytes_read": 0}
+
+def _load_entry(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Lấy mục của catalog trong kho dùng chung, đọc lại từ đĩa khi mtime hoặc kích thước thay đổi
+
+    Args:
+        path: Đường dẫn đến file catalog
+
+    Returns:
+        Dict gồm nội dung và chỉ mục (chỉ mục được lập khi cần), hoặc None nếu file không tồn tại
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    key = os.path.abspath(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _store_lock:
+        _store_stats["reads"] += 1
+        entry = _store.get(key)
+        if entry and entry["signature"] == signature:
+            _store_stats["hits"] += 1
+            return entry
+
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    entry = {"signature": signature, "text": text, "index": None}
+    with _store_lock:
+        _store_stats["misses"] += 1
+        _store_stats["bytes_read"] += stat.st_size
+        _store[key] = entry
+    return entry
+
+def read_catalog_text(path: str) -> Optional[str]:
+    """
+    Đọc nội dung catalog qua kho dùng chung
+
+    Args:
+        path: Đường dẫn đến file catalog
+
+    Returns:
+        Nội dung file hoặc None nếu file không tồn tại
+    """
+    entry = _load_entry(path)
+    return entry["text"] if entry else None
+
+def store_stats() -> Dict[str, Any]:
+    """
+    Thống kê kho catalog dùng chung
+
+    Returns:
+        Dict số lần đọc, trúng, trượt, số byte đọc từ đĩa, tỉ lệ trúng và số file đang lưu
+    """
+    with _store_lock:
+        stats = dict(_store_stats)
+        stats["files"] = len(_store)
+    stats["hit_rate"] = round(stats["hits"] / stats["reads"], 4) if stats["reads"] else 0.0
+    return stats
+
+def parse_catalog(text: str) -> Dict[str, Any]:
+    """
+    Phân tích nội dung catalog thành chỉ mục theo phần và mục đánh số
+
+    Args:
+        text: Nội dung catalog
+
+    Returns:
+        Dict gồm tiêu đề, thông tin phần đầu (Document ID, Revision, Part Number...),
+        văn bản phần đầu và các phần theo tên (mỗi phần có văn bản và các mục đánh số)
+    """
+    lines = text.splitlines()
+    index = {
+        "title": lines[0].strip() if lines else "",
+        "metadata": {},
+        "preamble": "",
+        "sections": {}
+    }
+
+    preamble: List[str] = []
+    section = None
+    subsection = None
+
+    for line in lines:
+        header = SECTION_HEADER_RE.match(line)
+        if header:
+            name = header.group(1).strip().upper()
+            section = {"text": [line], "subsections": {}}
+            index["sections"][name] = section
+            subsection = None
+            continue
+
+        if section is None:
+            preamble.append(line)
+            field = METADATA_RE.match(line.strip())
+            if field:
+                index["metadata"][field.group(1).strip()] = field.group(2).strip()
+            continue
+
+        section["text"].append(line)
+        numbered = SUBSECTION_HEADER_RE.match(line)
+        if numbered:
+            subsection = {"title": numbered.group(2).strip(), "text": [line]}
+            section["subsections"][numbered.group(1)] = subsection
+        elif subsection is not None:
+            subsection["text"].append(line)
+
+    index["preamble"] = "\n".join(preamble).strip()
+    for section in index["sections"].values():
+        section["text"] = "\n".join(section["text"]).strip()
+        for subsection in section["subsections"].values():
+            subsection["text"] = "\n".join(subsection["text"]).strip()
+
+    return index
+
+def load_catalog_index(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Tải chỉ mục của một catalog, chỉ phân tích lại khi file thay đổi (mtime/kích thước)
+
+    Args:
+        path: Đường dẫn đến file catalog
+
+    Returns:
+        Chỉ mục catalog hoặc None nếu file không tồn tại
+    """
+    entry = _load_entry(path)
+    if entry is None:
+        return None
+
+    # Chỉ mục gắn với nội dung đã đọc nên tự mất hiệu lực khi file thay đổi
+    if entry["index"] is None:
+        entry["index"] = parse_catalog(entry["text"])
+        logger.info(f"Đã lập chỉ mục catalog {path}: {len(entry['index']['sections'])} phần")
+    return entry["index"]
+
+def select_sections(index: Dict[str, Any], selectors: List[str]) -> List[str]:
+    """
+    Chọn văn bản các phần theo danh sách bộ chọn
+
+    Bộ chọn là tên phần ("MACHINING PARAMETERS"), tiền tố tên phần ("RECOMMENDATION")
+    hoặc một mục đánh số trong phần ("MACHINING PARAMETERS#1"). Danh sách rỗng chọn tất cả.
+
+    Args:
+        index: Chỉ mục catalog
+        selectors: Danh sách bộ chọn
+
+    Returns:
+        Danh sách văn bản các phần/mục được chọn, theo thứ tự bộ chọn
+    """
+    sections = index["sections"]
+    if not selectors:
+        return [section["text"] for section in sections.values()]
+
+    selected = []
+    for selector in selectors:
+        name, _, number = selector.upper().partition('#')
+        matches = [key for key in sections if key == name] or [key for key in sections if key.startswith(name)]
+        for key in matches:
+            if number:
+                subsection = sections[key]["subsections"].get(number)
+                if subsection:
+                    selected.append(f"==== {key} ====\n\n{subsection['text']}")
+            else:
+                selected.append(sections[key]["text"])
+
+    return selected
+
+def render_catalog_sections(path: str, selectors: List[str]) -> Optional[str]:
+    """
+    Tạo văn bản gồm phần đầu và các phần liên quan của catalog để chèn vào mô tả task
+
+    Args:
+        path: Đường dẫn đến file catalog
+        selectors: Danh sách bộ chọn phần (xem select_sections)
+
+    Returns:
+        Văn bản catalog đã chọn lọc, hoặc None nếu không có file catalog
+    """
+    index = load_catalog_index(path)
+    if index is None:
+        return None
+
+    selected = select_sections(index, selectors)
+    if not selected:
+        # Catalog không có phần nào khớp: dùng toàn bộ để không mất thông tin
+        logger.warning(f"Không có phần nào khớp {selectors} trong catalog {path}, dùng toàn bộ catalog")
+        selected = select_sections(index, [])
+
+    return "\n\n".join([index["preamble"]] + selected)
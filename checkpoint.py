@@ -0,0 +1,109 @@
+"""
+Lưu và khôi phục output của từng công đoạn theo lượt chạy (checkpoint)
+"""
+
+import os
+import json
+import uuid
+import logging
+from datetime import datetime
+from typing import Dict, Any
+import config
+import stages
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+def get_checkpoint_dir(run_id: str) -> str:
+    """Thư mục checkpoint của một lượt chạy"""
+    return os.path.join(config.CHECKPOINT_PATH, run_id)
+
+def _write_json(file_path: str, data: Any) -> None:
+    """Ghi JSON nguyên tử: ghi ra file tạm rồi đổi tên, tránh checkpoint dở dang khi bị ngắt"""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, file_path)
+
+def create_checkpoint(drawing_path: str) -> str:
+    """
+    Tạo thư mục checkpoint cho một lượt chạy mới
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+
+    Returns:
+        Mã lượt chạy (run ID)
+    """
+    run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    directory = get_checkpoint_dir(run_id)
+    os.makedirs(directory, exist_ok=True)
+
+    _write_json(os.path.join(directory, MANIFEST_FILE), {
+        "run_id": run_id,
+        "drawing_path": os.path.abspath(drawing_path),
+        "created_at": datetime.now().isoformat(),
+        "status": "running"
+    })
+    logger.info(f"Đã tạo checkpoint cho lượt chạy: {run_id}")
+    return run_id
+
+def load_manifest(run_id: str) -> Dict[str, Any]:
+    """
+    Tải thông tin của một lượt chạy
+
+    Args:
+        run_id: Mã lượt chạy
+
+    Returns:
+        Dict manifest của lượt chạy
+    """
+    manifest_path = os.path.join(get_checkpoint_dir(run_id), MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Không tìm thấy checkpoint cho lượt chạy: {run_id}")
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def update_status(run_id: str, status: str) -> None:
+    """Cập nhật trạng thái của lượt chạy (running, failed, completed)"""
+    manifest = load_manifest(run_id)
+    manifest["status"] = status
+    manifest["updated_at"] = datetime.now().isoformat()
+    _write_json(os.path.join(get_checkpoint_dir(run_id), MANIFEST_FILE), manifest)
+
+def save_stage_output(run_id: str, stage: str, output: str) -> None:
+    """
+    Lưu output của một công đoạn vừa hoàn thành
+
+    Args:
+        run_id: Mã lượt chạy
+        stage: Tên công đoạn
+        output: Output dạng văn bản của công đoạn
+    """
+    _write_json(os.path.join(get_checkpoint_dir(run_id), f"{stage}.json"), {
+        "stage": stage,
+        "output": output,
+        "completed_at": datetime.now().isoformat()
+    })
+    logger.info(f"Đã lưu checkpoint công đoạn {stage} của lượt chạy {run_id}")
+
+def load_stage_outputs(run_id: str) -> Dict[str, str]:
+    """
+    Tải output của các công đoạn đã hoàn thành
+
+    Args:
+        run_id: Mã lượt chạy
+
+    Returns:
+        Dict output theo tên công đoạn, theo thứ tự công đoạn
+    """
+    directory = get_checkpoint_dir(run_id)
+    outputs = {}
+    for stage in stages.STAGE_ORDER:
+        stage_path = os.path.join(directory, f"{stage}.json")
+        if os.path.exists(stage_path):
+            with open(stage_path, 'r', encoding='utf-8') as f:
+                outputs[stage] = json.load(f)["output"]
+    return outputs
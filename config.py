@@ -17,13 +17,6 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 VERBOSE = os.getenv("VERBOSE", "True").lower() == "true"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
-# Ensure logs directory exists
-logs_path = os.getenv("LOGS_PATH", "./logs")
-os.makedirs(logs_path, exist_ok=True)
-
-# Thiết lập logging
-logging_level = getattr(logging, LOG_LEVEL)
-
 # Create a custom formatter that handles Unicode characters
 class UnicodeStreamHandler(logging.StreamHandler):
     def emit(self, record):
@@ -42,14 +35,34 @@ class UnicodeStreamHandler(logging.StreamHandler):
         except Exception:
             self.handleError(record)
 
-logging.basicConfig(
-    level=logging_level,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(logs_path, "manufacturing_agents.log"), encoding='utf-8'),
-        UnicodeStreamHandler() if sys.platform == 'win32' else logging.StreamHandler()
-    ]
-)
+_logging_configured = False
+
+def setup_logging():
+    """
+    Thiết lập logging ra file và màn hình
+
+    Được gọi bởi các điểm vào (main.py, run_autogen.py, service.py...) thay vì khi import
+    config, nên việc import các mô-đun không tạo thư mục logs hay mở file log.
+    """
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+
+    # Ensure logs directory exists
+    logs_path = os.getenv("LOGS_PATH", "./logs")
+    os.makedirs(logs_path, exist_ok=True)
+
+    # Thiết lập logging
+    logging.basicConfig(
+        level=getattr(logging, LOG_LEVEL),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler(os.path.join(logs_path, "manufacturing_agents.log"), encoding='utf-8'),
+            UnicodeStreamHandler() if sys.platform == 'win32' else logging.StreamHandler()
+        ]
+    )
+
 logger = logging.getLogger(__name__)
 
 # Đường dẫn dữ liệu
@@ -64,4 +77,114 @@ TEMPERATURE = float(os.getenv("TEMPERATURE", "0.3"))
 
 # Cấu hình tác tử
 MAX_ITERATIONS = int(os.getenv("MAX_ITERATIONS", "5"))
-TIMEOUT = 1800  # 30 phút
\ No newline at end of file
+TIMEOUT = 1800  # 30 phút
+
+# Cấu hình chế độ hàng loạt
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Cấu hình bộ nhớ đệm phản hồi LLM
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off").lower()  # off | on | replay (chỉ đọc)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_PATH, "llm_cache.sqlite"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "512"))
+LLM_CACHE_MAX_AGE_HOURS = float(os.getenv("LLM_CACHE_MAX_AGE_HOURS", "720"))  # 0 = không giới hạn
+
+# Cấu hình đường ống công đoạn (chế độ hàng loạt)
+PIPELINE_DEFAULT_STAGE_CONCURRENCY = int(os.getenv("PIPELINE_DEFAULT_STAGE_CONCURRENCY", "2"))
+PIPELINE_STAGE_CONCURRENCY = os.getenv("PIPELINE_STAGE_CONCURRENCY", "")  # vd: "process_plan=4,finalize_plan=3"
+
+# Thư mục checkpoint theo lượt chạy
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join(DATA_PATH, "checkpoints"))
+
+# Trạng thái phiên bản bản vẽ đã lập kế hoạch (chế độ tăng dần)
+REVISIONS_PATH = os.getenv("REVISIONS_PATH", os.path.join(DATA_PATH, "revisions"))
+
+# Chèn các phần catalog liên quan vào mô tả task thay vì để tác tử đọc file bằng công cụ
+CATALOG_INJECTION = os.getenv("CATALOG_INJECTION", "True").lower() == "true"
+
+# Sổ đăng ký catalog theo mã chi tiết
+CATALOG_REGISTRY_PATH = os.getenv("CATALOG_REGISTRY_PATH", os.path.join(DATA_PATH, "catalog_registry.json"))
+
+# Nén output của các công đoạn phía trước trước khi đưa vào context của công đoạn sau
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "off").lower()  # off | extractive | llm
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Phát trực tiếp output công đoạn và token LLM (bật bằng --stream)
+STREAM_OUTPUT = os.getenv("STREAM_OUTPUT", "False").lower() == "true"
+
+# Chế độ bất đồng bộ (--async): số lượt lập kế hoạch và số lời gọi LLM đồng thời tối đa
+ASYNC_MAX_CONCURRENT_PLANS = int(os.getenv("ASYNC_MAX_CONCURRENT_PLANS", "32"))
+ASYNC_MAX_CONCURRENT_LLM_CALLS = int(os.getenv("ASYNC_MAX_CONCURRENT_LLM_CALLS", "16"))
+
+# Chế độ dịch vụ HTTP/JSON (service.py)
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "4"))
+SERVICE_WARM_PARTS = os.getenv("SERVICE_WARM_PARTS", "")  # vd: "SC-2023-A001,SC-2023-A002"
+SERVICE_MAX_JOBS = int(os.getenv("SERVICE_MAX_JOBS", "1000"))
+
+# Ghi vết span theo công đoạn, lời gọi LLM và công cụ (bật bằng --trace)
+TRACING = os.getenv("TRACING", "False").lower() == "true"
+
+# Địa chỉ API tương thích OpenAI (proxy nội bộ hoặc LLM giả lập của benchmark.py); mặc định là API OpenAI
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+
+# Mô hình thời gian gia công (machining.py): lượng dư phôi mỗi phía (mm) và vị trí chế độ cắt
+# trong khoảng khuyến nghị của catalog dụng cụ (0 = cận dưới, 1 = cận trên)
+MACHINING_STOCK_ALLOWANCE = float(os.getenv("MACHINING_STOCK_ALLOWANCE", "2.5"))
+MACHINING_PARAMETER_POSITION = float(os.getenv("MACHINING_PARAMETER_POSITION", "0.5"))
+
+# Tối ưu chế độ cắt (cutting_optimizer.py): mục tiêu "time" hoặc "cost", số điểm lưới mỗi tham số,
+# tuổi bền dao tối thiểu (phút), số vòng quay trục chính tối đa, đơn giá máy, thời gian và giá thay dao
+OPTIMIZER_OBJECTIVE = os.getenv("OPTIMIZER_OBJECTIVE", "time")
+OPTIMIZER_GRID_POINTS = int(os.getenv("OPTIMIZER_GRID_POINTS", "9"))
+OPTIMIZER_MIN_TOOL_LIFE = float(os.getenv("OPTIMIZER_MIN_TOOL_LIFE", "10"))
+OPTIMIZER_MAX_SPINDLE_SPEED = float(os.getenv("OPTIMIZER_MAX_SPINDLE_SPEED", "6000"))
+MACHINE_RATE_PER_HOUR = float(os.getenv("MACHINE_RATE_PER_HOUR", "60"))
+TOOL_CHANGE_MINUTES = float(os.getenv("TOOL_CHANGE_MINUTES", "1.0"))
+TOOL_EDGE_COST = float(os.getenv("TOOL_EDGE_COST", "5.0"))
+
+# Tác tử tính toán của run_autogen.py --mode code: "builtin" (cutting_optimizer) hoặc "llm" (AutoGen viết và chạy mã)
+CODE_AGENT_ENGINE = os.getenv("CODE_AGENT_ENGINE", "builtin")
+
+# Bỏ qua công đoạn analyze_drawing bằng LLM khi bản vẽ được spec_parser phân tích sạch (bật bằng --skip-analysis)
+SKIP_ANALYZE_STAGE = os.getenv("SKIP_ANALYZE_STAGE", "False").lower() == "true"
+
+# Trích xuất PDF (pdf_extract.py): số tiến trình (0 = số CPU), số trang mỗi khoảng gửi cho một
+# tiến trình và bộ nhớ đệm văn bản trang theo mã băm nội dung file
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_CACHE = os.getenv("PDF_CACHE", "True").lower() == "true"
+PDF_CACHE_PATH = os.getenv("PDF_CACHE_PATH", os.path.join(DATA_PATH, "pdf_cache.sqlite"))
+PDF_CACHE_MAX_MB = float(os.getenv("PDF_CACHE_MAX_MB", "1024"))
+
+# Kho kế hoạch theo nội dung (plan_cache.py): trả ngay kế hoạch đã lưu khi bản vẽ, catalog, prompt
+# và cấu hình mô hình không đổi (bật bằng --plan-cache); giới hạn dung lượng và tuổi (0 = không giới hạn)
+PLAN_CACHE = os.getenv("PLAN_CACHE", "False").lower() == "true"
+PLAN_CACHE_PATH = os.getenv("PLAN_CACHE_PATH", os.path.join(DATA_PATH, "plan_cache.sqlite"))
+PLAN_CACHE_MAX_MB = float(os.getenv("PLAN_CACHE_MAX_MB", "256"))
+PLAN_CACHE_MAX_AGE_HOURS = float(os.getenv("PLAN_CACHE_MAX_AGE_HOURS", "0"))
+
+# Xuất kế hoạch sang Parquet (plan_export.py): thư mục bộ dữ liệu và cột phân vùng ("date", "part_number" hoặc rỗng)
+PARQUET_EXPORT_PATH = os.getenv("PARQUET_EXPORT_PATH", os.path.join(DATA_PATH, "analytics"))
+PARQUET_PARTITION_BY = os.getenv("PARQUET_PARTITION_BY", "") or None
+
+# Chỉ mục SQLite của các kế hoạch đã lưu (plan_index.py), cập nhật mỗi khi utils.save_data ghi một kế hoạch
+PLAN_INDEX = os.getenv("PLAN_INDEX", "True").lower() == "true"
+PLAN_INDEX_PATH = os.getenv("PLAN_INDEX_PATH", os.path.join(DATA_PATH, "plan_index.sqlite"))
+
+# Kế hoạch có cấu trúc (plan_schema.py, plan_model.py): task finalize_plan trả về JSON theo lược đồ
+# ManufacturingPlanOutput, lưu gọn trong khóa "structured_plan" của kế hoạch
+STRUCTURED_PLAN = os.getenv("STRUCTURED_PLAN", "True").lower() == "true"
+
+# Lập lịch xưởng (scheduler.py): số máy theo loại và thời gian tìm kiếm cục bộ (giây, 0 = chỉ điều độ)
+SCHEDULER_MACHINES = os.getenv(
+    "SCHEDULER_MACHINES", "CNC Lathe=2,CNC Mill=2,Cylindrical Grinder=1,Heat Treatment=1,Inspection=1"
+)
+SCHEDULER_SEARCH_SECONDS = float(os.getenv("SCHEDULER_SEARCH_SECONDS", "2"))
+
+# Gom lần gá nhiều chi tiết (setup_optimizer.py): thời gian đổi đồ gá, thay một dụng cụ, gá từ đầu cho
+# loại máy không có trong mô hình thời gian gia công (phút) và thời gian cải thiện thứ tự mỗi loại máy (giây)
+SETUP_FIXTURE_MINUTES = float(os.getenv("SETUP_FIXTURE_MINUTES", "20"))
+SETUP_TOOL_MINUTES = float(os.getenv("SETUP_TOOL_MINUTES", "3"))
+SETUP_FULL_MINUTES = float(os.getenv("SETUP_FULL_MINUTES", "30"))
+SETUP_SEARCH_SECONDS = float(os.getenv("SETUP_SEARCH_SECONDS", "2"))
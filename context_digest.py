@@ -0,0 +1,208 @@
+"""
+Nén output của các công đoạn phía trước thành bản tóm lược có cấu trúc trong giới hạn token
+"""
+
+import re
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+import config
+import agents
+from token_usage import count_tokens
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MODES = ("off", "extractive", "llm")
+
+# Dòng tiêu đề: markdown "#", dòng in hoa hoặc dòng kết thúc bằng dấu ":"
+HEADING_RE = re.compile(r'^(#{1,6}\s+\S.*|[A-Z0-9][A-Z0-9 &/().,-]{3,}:?|[^.!?]{3,80}:)$')
+
+# Mục liệt kê: "-", "*", "•" hoặc "1." / "1)"
+LIST_ITEM_RE = re.compile(r'^([-*•]|\d+[.)])\s+')
+
+# Dòng có số liệu kỹ thuật: kích thước, dung sai, chế độ cắt, độ nhám, độ cứng...
+QUANTITY_RE = re.compile(
+    r'\d+(\.\d+)?\s*(mm|µm|um|m/min|mm/rev|rpm|min|h|hrs?|HRC|HB|MPa|%|°|Ra)\b|±|Ø|\bIT\d+\b',
+    re.IGNORECASE
+)
+
+LLM_DIGEST_PROMPT = """Condense the following output of the "{stage}" manufacturing planning stage into a structured digest
+of at most {budget} tokens. Keep every decision, specification, material grade, tool, cutting parameter,
+tolerance, operation and numeric value; drop explanations, repetitions and filler. Use short headings and bullet points.
+
+{text}"""
+
+def _line_priority(line: str) -> int:
+    """Độ ưu tiên giữ lại của một dòng (số nhỏ hơn được giữ trước)"""
+    if QUANTITY_RE.search(line):
+        return 0
+    if HEADING_RE.match(line):
+        return 1
+    if LIST_ITEM_RE.match(line):
+        return 2
+    return 3
+
+def extractive_digest(text: str, budget: int) -> str:
+    """
+    Tóm lược trích xuất: giữ dòng có số liệu, tiêu đề và mục liệt kê theo thứ tự ưu tiên
+    cho đến khi hết giới hạn token, giữ nguyên thứ tự dòng gốc
+
+    Args:
+        text: Output của một công đoạn
+        budget: Giới hạn token của bản tóm lược
+
+    Returns:
+        Bản tóm lược
+    """
+    lines: List[Tuple[int, int, str]] = []
+    seen = set()
+    for position, raw in enumerate(text.splitlines()):
+        line = raw.strip()
+        if not line or line in seen:
+            continue
+        seen.add(line)
+        lines.append((_line_priority(line), position, line))
+
+    kept = []
+    used = 0
+    for priority, position, line in sorted(lines):
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            # Dòng văn xuôi dài có thể không vừa nhưng dòng ngắn hơn phía sau vẫn vừa
+            continue
+        kept.append((position, line))
+        used += cost
+
+    return "\n".join(line for _, line in sorted(kept))
+
+def _bounded_digest(digest: str, budget: int) -> str:
+    """Bản tóm lược bằng LLM, tóm lược trích xuất lại nếu nó vượt giới hạn"""
+    if count_tokens(digest) > budget:
+        return extractive_digest(digest, budget)
+    return digest
+
+def llm_digest(stage: str, text: str, budget: int) -> str:
+    """
+    Tóm lược bằng LLM (đi qua bộ nhớ đệm LLM như mọi lần gọi khác); quay về tóm lược
+    trích xuất nếu lỗi hoặc bản tóm lược vượt giới hạn
+
+    Args:
+        stage: Tên công đoạn tạo ra output
+        text: Output của công đoạn
+        budget: Giới hạn token của bản tóm lược
+
+    Returns:
+        Bản tóm lược
+    """
+    try:
+        llm = agents.get_llm(temperature=0.0, usage_tag="context_digest")
+        digest = llm.invoke(LLM_DIGEST_PROMPT.format(stage=stage, budget=budget, text=text)).content
+    except Exception as e:
+        logger.warning(f"Không tóm lược được output của {stage} bằng LLM, dùng tóm lược trích xuất: {str(e)}")
+        return extractive_digest(text, budget)
+    return _bounded_digest(digest, budget)
+
+async def allm_digest(stage: str, text: str, budget: int,
+                      llm_semaphore: Optional[asyncio.Semaphore] = None) -> str:
+    """
+    Phiên bản bất đồng bộ của llm_digest: gọi LLM bằng ainvoke, trong giới hạn số lời gọi LLM
+    đồng thời của llm_semaphore
+
+    Args:
+        stage: Tên công đoạn tạo ra output
+        text: Output của công đoạn
+        budget: Giới hạn token của bản tóm lược
+        llm_semaphore: Giới hạn số lời gọi LLM đồng thời (dùng chung với các công đoạn)
+
+    Returns:
+        Bản tóm lược
+    """
+    prompt = LLM_DIGEST_PROMPT.format(stage=stage, budget=budget, text=text)
+    try:
+        llm = agents.get_llm(temperature=0.0, usage_tag="context_digest")
+        if llm_semaphore is None:
+            digest = (await llm.ainvoke(prompt)).content
+        else:
+            async with llm_semaphore:
+                digest = (await llm.ainvoke(prompt)).content
+    except Exception as e:
+        logger.warning(f"Không tóm lược được output của {stage} bằng LLM, dùng tóm lược trích xuất: {str(e)}")
+        return extractive_digest(text, budget)
+    return _bounded_digest(digest, budget)
+
+def _digest_shares(stage_outputs: Dict[str, str], budget: int, mode: str) -> Dict[str, Optional[int]]:
+    """
+    Phần giới hạn token của từng output, chia theo tỉ lệ kích thước; None nếu output đã nằm
+    trong phần giới hạn của nó (giữ nguyên)
+    """
+    if mode not in COMPRESSION_MODES or mode == "off":
+        raise ValueError(f"Chế độ nén context không hợp lệ: {mode} (hợp lệ: extractive, llm)")
+
+    sizes = {stage: count_tokens(text) for stage, text in stage_outputs.items()}
+    total = sum(sizes.values()) or 1
+    shares = {}
+    for stage in stage_outputs:
+        share = max(1, budget * sizes[stage] // total)
+        shares[stage] = None if sizes[stage] <= share else share
+    return shares
+
+def _join_digests(digests: Dict[str, str]) -> str:
+    return "\n\n".join(f"[{stage.upper()} — DIGEST]\n{digest}" for stage, digest in digests.items())
+
+def build_digest(stage_outputs: Dict[str, str], budget: int, mode: str = None) -> str:
+    """
+    Nén output của các công đoạn phía trước thành một bản tóm lược có cấu trúc
+
+    Giới hạn token được chia cho các output theo tỉ lệ kích thước của chúng; output đã nằm
+    trong phần giới hạn của nó được giữ nguyên.
+
+    Args:
+        stage_outputs: Output theo tên công đoạn, theo thứ tự đưa vào context
+        budget: Tổng giới hạn token của bản tóm lược
+        mode: "extractive" hoặc "llm" (mặc định là CONTEXT_COMPRESSION)
+
+    Returns:
+        Bản tóm lược, mỗi công đoạn một phần
+    """
+    mode = mode or config.CONTEXT_COMPRESSION
+    digests = {}
+    for stage, share in _digest_shares(stage_outputs, budget, mode).items():
+        text = stage_outputs[stage]
+        if share is None:
+            digests[stage] = text.strip()
+        elif mode == "llm":
+            digests[stage] = llm_digest(stage, text, share)
+        else:
+            digests[stage] = extractive_digest(text, share)
+    return _join_digests(digests)
+
+async def abuild_digest(stage_outputs: Dict[str, str], budget: int, mode: str = None,
+                        llm_semaphore: Optional[asyncio.Semaphore] = None) -> str:
+    """
+    Phiên bản bất đồng bộ của build_digest: các output được tóm lược bằng LLM đồng thời (xem
+    allm_digest), phần đếm token và tóm lược trích xuất chạy trong executor để không chặn
+    vòng lặp sự kiện
+
+    Args:
+        stage_outputs: Output theo tên công đoạn, theo thứ tự đưa vào context
+        budget: Tổng giới hạn token của bản tóm lược
+        mode: "extractive" hoặc "llm" (mặc định là CONTEXT_COMPRESSION)
+        llm_semaphore: Giới hạn số lời gọi LLM đồng thời
+
+    Returns:
+        Bản tóm lược, mỗi công đoạn một phần
+    """
+    mode = mode or config.CONTEXT_COMPRESSION
+    loop = asyncio.get_running_loop()
+    if mode != "llm":
+        return await loop.run_in_executor(None, build_digest, stage_outputs, budget, mode)
+
+    shares = await loop.run_in_executor(None, _digest_shares, stage_outputs, budget, mode)
+
+    async def digest(stage: str) -> str:
+        if shares[stage] is None:
+            return stage_outputs[stage].strip()
+        return await allm_digest(stage, stage_outputs[stage], shares[stage], llm_semaphore)
+
+    results = await asyncio.gather(*(digest(stage) for stage in shares))
+    return _join_digests(dict(zip(shares, results)))
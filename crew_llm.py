@@ -0,0 +1,62 @@
+"""
+LLM của tác tử CrewAI chạy qua ChatOpenAI của LangChain: CrewAI chuyển mọi LLM lạ (kể cả ChatOpenAI)
+thành crewai.LLM của riêng nó và bỏ cache/callbacks, nên tác tử được giao một BaseLLM bọc ChatOpenAI
+để bộ nhớ đệm LLM, thống kê token và streaming token vẫn hoạt động trên đường chạy crew
+"""
+
+from typing import Any, Dict, List, Optional, Union
+from crewai import BaseLLM
+
+# Cửa sổ ngữ cảnh báo cho CrewAI (dùng để cắt bớt lịch sử hội thoại khi quá dài)
+CONTEXT_WINDOW_SIZE = 128000
+
+class ChatModelLLM(BaseLLM):
+    """
+    BaseLLM của CrewAI gọi một mô hình chat LangChain (xem agents.get_llm)
+
+    Tác tử dùng định dạng ReAct bằng văn bản (không gọi hàm gốc), dừng theo stop words của CrewAI.
+    """
+
+    _chat_model: Any = None
+
+    def __init__(self, chat_model: Any, **kwargs: Any):
+        super().__init__(
+            model=getattr(chat_model, "model_name", None) or "openai",
+            temperature=getattr(chat_model, "temperature", None),
+            **kwargs
+        )
+        self._chat_model = chat_model
+
+    def _stop(self) -> Optional[List[str]]:
+        stop = getattr(self, "stop_sequences", None) or getattr(self, "stop", None)
+        return list(stop) if stop else None
+
+    def _content(self, message: Any) -> str:
+        # Token cũng được báo cho CrewAI (CrewOutput.token_usage); thống kê theo công đoạn của
+        # ứng dụng do token_usage.TokenUsageCallback của mô hình chat ghi nhận
+        usage = getattr(message, "usage_metadata", None)
+        track = getattr(self, "_track_token_usage_internal", None)
+        if usage and track is not None:
+            track(dict(usage))
+        return message.content
+
+    def call(self, messages: Union[str, List[Dict[str, Any]]], tools: Optional[List[Any]] = None,
+             callbacks: Optional[List[Any]] = None, available_functions: Optional[Dict[str, Any]] = None,
+             **kwargs: Any) -> str:
+        """Gọi mô hình chat (qua cache và callbacks của nó) và trả về nội dung văn bản"""
+        return self._content(self._chat_model.invoke(messages, stop=self._stop()))
+
+    async def acall(self, messages: Union[str, List[Dict[str, Any]]], tools: Optional[List[Any]] = None,
+                    callbacks: Optional[List[Any]] = None, available_functions: Optional[Dict[str, Any]] = None,
+                    **kwargs: Any) -> str:
+        """Phiên bản bất đồng bộ của call"""
+        return self._content(await self._chat_model.ainvoke(messages, stop=self._stop()))
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return True
+
+    def get_context_window_size(self) -> int:
+        return CONTEXT_WINDOW_SIZE
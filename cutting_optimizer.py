@@ -0,0 +1,213 @@
+"""
+Tối ưu chế độ cắt: tìm tốc độ cắt, lượng chạy dao và chiều sâu cắt trong khoảng khuyến nghị của
+catalog dụng cụ bằng lưới tham số tính vector hóa, với ràng buộc tuổi bền dao và độ nhám bề mặt
+"""
+
+import time
+import logging
+from typing import Dict, List, Any
+import numpy as np
+import config
+import machining
+
+logger = logging.getLogger(__name__)
+
+# Mục tiêu tối ưu: thời gian (cắt + thay dao) hoặc chi phí (máy + thay dao + lưỡi cắt) mỗi chi tiết
+OBJECTIVES = ("time", "cost")
+
+# Phương trình Taylor mở rộng Vc · T^n · f^a · ap^b = C, số mũ (n, a, b) theo vật liệu dao
+TAYLOR_EXPONENTS = {"carbide": (0.25, 0.5, 0.15), "hss": (0.125, 0.5, 0.15)}
+
+# Tuổi bền dao (phút) tại chế độ cắt giữa khoảng khuyến nghị của catalog, dùng để hiệu chỉnh C
+TAYLOR_REFERENCE_LIFE = 15.0
+
+# Dao ta rô bằng thép gió; đá mài không dùng mô hình mòn dao
+HSS_TOOLING = ("tapping",)
+NO_WEAR_TOOLING = ("external_grinding", "internal_grinding", "face_grinding")
+
+def surface_roughness(feed, nose_radius) -> np.ndarray:
+    """Độ nhám lý thuyết khi tiện Ra ≈ f² / (32·r) (µm), f tính bằng mm/vòng, r bằng mm"""
+    feed = np.asarray(feed, dtype=float)
+    return feed ** 2 / (32.0 * np.asarray(nose_radius, dtype=float)) * 1000.0
+
+def tool_life(cutting_speed, feed, depth_of_cut, reference_speed, reference_feed, reference_depth,
+              exponents=TAYLOR_EXPONENTS["carbide"], reference_life: float = TAYLOR_REFERENCE_LIFE) -> np.ndarray:
+    """
+    Tuổi bền dao theo phương trình Taylor mở rộng, hiệu chỉnh để bằng reference_life tại chế độ cắt tham chiếu
+
+    T = T_ref · (Vc_ref/Vc)^(1/n) · (f_ref/f)^(a/n) · (ap_ref/ap)^(b/n)
+
+    Returns:
+        Mảng tuổi bền dao (phút)
+    """
+    n, a, b = (np.asarray(value, dtype=float) for value in exponents)
+    return reference_life * (
+        (np.asarray(reference_speed, dtype=float) / np.asarray(cutting_speed, dtype=float)) ** (1 / n)
+        * (np.asarray(reference_feed, dtype=float) / np.asarray(feed, dtype=float)) ** (a / n)
+        * (np.asarray(reference_depth, dtype=float) / np.asarray(depth_of_cut, dtype=float)) ** (b / n)
+    )
+
+def optimize_operations(operations: List[Dict[str, Any]], tooling: Dict[str, Dict[str, Any]],
+                        objective: str = None, grid_points: int = None,
+                        min_tool_life: float = None) -> List[Dict[str, Any]]:
+    """
+    Tìm chế độ cắt tối ưu cho từng nguyên công trên lưới (tốc độ cắt × lượng chạy dao × chiều sâu cắt)
+
+    Toàn bộ lưới của mọi nguyên công được tính trong một lần (mảng nguyên công × G × G × G).
+    Điểm khả thi khi tuổi bền dao >= min_tool_life, độ nhám <= Ra yêu cầu của nguyên công và
+    số vòng quay <= OPTIMIZER_MAX_SPINDLE_SPEED; nếu không có điểm khả thi, chọn điểm vi phạm ít nhất.
+
+    Args:
+        operations: Danh sách nguyên công (xem machining.plan_operations)
+        tooling: Chế độ cắt theo khóa nguyên công (xem machining.load_tooling)
+        objective: "time" hoặc "cost"
+        grid_points: Số điểm lưới trên mỗi tham số
+        min_tool_life: Tuổi bền dao tối thiểu (phút)
+
+    Returns:
+        Danh sách chế độ cắt tối ưu theo nguyên công
+    """
+    objective = objective or config.OPTIMIZER_OBJECTIVE
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Mục tiêu tối ưu không hợp lệ: {objective} (chọn một trong {', '.join(OBJECTIVES)})")
+    grid_points = max(2, grid_points or config.OPTIMIZER_GRID_POINTS)
+    min_tool_life = config.OPTIMIZER_MIN_TOOL_LIFE if min_tool_life is None else min_tool_life
+    if not operations:
+        return []
+
+    # Cận dưới/cận trên và điểm giữa của khoảng khuyến nghị cho từng nguyên công
+    bounds = machining.operation_arrays(operations, tooling, position=np.array([0.0, 0.5, 1.0]))
+    column = lambda values: values.reshape(-1, 1, 1, 1)
+    grid = np.linspace(0.0, 1.0, grid_points)
+
+    def axis(field, shape):
+        low, high = bounds[field][0], bounds[field][2]
+        return column(low) + (column(high) - column(low)) * grid.reshape(shape)
+
+    cutting_speed = axis("cutting_speed", (1, -1, 1, 1))
+    feed = axis("feed", (1, 1, -1, 1))
+    depth_of_cut = axis("depth_of_cut", (1, 1, 1, -1))
+    geometry = {field: column(bounds[field][0]) for field in ("kind", "length", "diameter", "allowance", "teeth", "count")}
+
+    minutes = machining.cutting_time(
+        geometry["kind"], geometry["length"], geometry["diameter"], geometry["allowance"],
+        cutting_speed, feed, depth_of_cut, geometry["teeth"], geometry["count"]
+    )
+
+    exponents = np.array([
+        TAYLOR_EXPONENTS["hss" if operation["tooling"] in HSS_TOOLING else "carbide"] for operation in operations
+    ])
+    life = tool_life(
+        cutting_speed, feed, depth_of_cut,
+        column(bounds["cutting_speed"][1]), column(bounds["feed"][1]), column(bounds["depth_of_cut"][1]),
+        exponents=(column(exponents[:, 0]), column(exponents[:, 1]), column(exponents[:, 2]))
+    )
+    no_wear = column(np.array([operation["tooling"] in NO_WEAR_TOOLING for operation in operations]))
+    life = np.where(no_wear, np.inf, life)
+
+    nose_radius = column(np.array([
+        tooling.get(operation["tooling"], {}).get("nose_radius", np.nan) for operation in operations
+    ], dtype=float))
+    required_ra = column(np.array([
+        np.nan if operation.get("ra") is None else operation["ra"] for operation in operations
+    ], dtype=float))
+    roughness = np.where(np.isnan(nose_radius), np.nan, surface_roughness(feed, nose_radius))
+    spindle = machining.spindle_speed(cutting_speed, geometry["diameter"])
+
+    # Số lần thay dao cho mỗi chi tiết và mục tiêu tương ứng
+    tool_changes = minutes / life
+    total_minutes = minutes + config.TOOL_CHANGE_MINUTES * tool_changes
+    cost = config.MACHINE_RATE_PER_HOUR / 60.0 * total_minutes + config.TOOL_EDGE_COST * tool_changes
+    value = total_minutes if objective == "time" else cost
+
+    ra_limited = ~np.isnan(required_ra) & ~np.isnan(roughness)
+    with np.errstate(invalid="ignore"):
+        violation = (
+            np.maximum(0.0, min_tool_life / life - 1.0)
+            + np.where(ra_limited, np.maximum(0.0, roughness / required_ra - 1.0), 0.0)
+            + np.maximum(0.0, spindle / config.OPTIMIZER_MAX_SPINDLE_SPEED - 1.0)
+        )
+    feasible = violation <= 0.0
+
+    flat_value = np.where(feasible, value, np.inf).reshape(len(operations), -1)
+    best = np.argmin(flat_value, axis=1)
+    has_feasible = np.isfinite(flat_value[np.arange(len(operations)), best])
+    fallback = np.argmin(violation.reshape(len(operations), -1), axis=1)
+    best = np.where(has_feasible, best, fallback)
+
+    def pick(values):
+        values = np.broadcast_to(values, minutes.shape).reshape(len(operations), -1)
+        return values[np.arange(len(operations)), best]
+
+    # Thời gian cắt tại chế độ giữa khoảng khuyến nghị, để so sánh
+    baseline = machining.cutting_time(**{field: values[1] for field, values in bounds.items()})
+
+    chosen = {
+        "cutting_speed": pick(cutting_speed), "feed": pick(feed), "depth_of_cut": pick(depth_of_cut),
+        "spindle_speed": pick(spindle), "cutting_minutes": pick(minutes), "tool_life": pick(life),
+        "surface_roughness": pick(roughness), "cost": pick(cost)
+    }
+
+    results = []
+    for i, operation in enumerate(operations):
+        life_minutes = float(chosen["tool_life"][i])
+        roughness_value = float(chosen["surface_roughness"][i])
+        results.append({
+            "name": operation["name"],
+            "tooling": operation["tooling"],
+            "cutting_speed": round(float(chosen["cutting_speed"][i]), 1),
+            "feed": round(float(chosen["feed"][i]), 4),
+            "depth_of_cut": round(float(chosen["depth_of_cut"][i]), 3),
+            "spindle_speed": round(float(chosen["spindle_speed"][i])),
+            "cutting_minutes": round(float(chosen["cutting_minutes"][i]), 3),
+            "baseline_minutes": round(float(baseline[i]), 3),
+            "tool_life_minutes": None if np.isinf(life_minutes) else round(life_minutes, 1),
+            "surface_roughness": None if np.isnan(roughness_value) else round(roughness_value, 3),
+            "required_ra": operation.get("ra"),
+            "cost": round(float(chosen["cost"][i]), 3),
+            "feasible": bool(has_feasible[i])
+        })
+    return results
+
+def optimize_part(part_specs: Dict[str, Any], objective: str = None, grid_points: int = None,
+                  min_tool_life: float = None) -> Dict[str, Any]:
+    """
+    Tối ưu chế độ cắt cho mọi nguyên công của một chi tiết
+
+    Args:
+        part_specs: Thông số kỹ thuật của chi tiết (xem utils.extract_technical_specs)
+        objective: "time" hoặc "cost" (mặc định OPTIMIZER_OBJECTIVE)
+        grid_points: Số điểm lưới trên mỗi tham số (mặc định OPTIMIZER_GRID_POINTS)
+        min_tool_life: Tuổi bền dao tối thiểu, phút (mặc định OPTIMIZER_MIN_TOOL_LIFE)
+
+    Returns:
+        Dict gồm chế độ cắt theo nguyên công, tổng thời gian cắt so với chế độ giữa khoảng
+        khuyến nghị, tổng chi phí và thời gian tính
+    """
+    started = time.perf_counter()
+    part_number = part_specs.get("part_number") or None
+    operations = machining.plan_operations(part_specs)
+    results = optimize_operations(
+        operations, machining.tooling_for_part(part_number), objective, grid_points, min_tool_life
+    )
+    grid_points = max(2, grid_points or config.OPTIMIZER_GRID_POINTS)
+
+    summary = {
+        "part_number": part_number,
+        "objective": objective or config.OPTIMIZER_OBJECTIVE,
+        "operations": results,
+        "total_cutting_minutes": round(sum(result["cutting_minutes"] for result in results), 2),
+        "baseline_cutting_minutes": round(sum(result["baseline_minutes"] for result in results), 2),
+        "total_cost": round(sum(result["cost"] for result in results), 2),
+        "feasible": all(result["feasible"] for result in results),
+        "evaluated_points": len(operations) * grid_points ** 3,
+        "seconds": round(time.perf_counter() - started, 4)
+    }
+    infeasible = [result["name"] for result in results if not result["feasible"]]
+    if infeasible:
+        logger.warning(f"Không có chế độ cắt thỏa mãn mọi ràng buộc cho: {', '.join(infeasible)}")
+    logger.info(
+        f"Đã tối ưu {len(results)} nguyên công ({summary['evaluated_points']} điểm) trong {summary['seconds']}s: "
+        f"{summary['baseline_cutting_minutes']} -> {summary['total_cutting_minutes']} phút cắt"
+    )
+    return summary
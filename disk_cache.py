@@ -0,0 +1,166 @@
+"""
+Bộ nhớ đệm khóa-giá trị trên đĩa (SQLite) với loại bỏ LRU theo dung lượng và tuổi
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class DiskCache:
+    """
+    Kho khóa-giá trị bền vững dùng SQLite, an toàn khi dùng từ nhiều luồng
+
+    Mỗi mục lưu thời điểm tạo và lần truy cập cuối. Mục quá tuổi bị coi như không tồn tại;
+    khi tổng dung lượng vượt giới hạn, các mục ít được truy cập gần đây nhất bị xóa trước.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0, max_age_seconds: float = 0,
+                 read_only: bool = False):
+        """
+        Args:
+            path: Đường dẫn file SQLite
+            max_bytes: Dung lượng tối đa của các giá trị (0 = không giới hạn)
+            max_age_seconds: Tuổi tối đa của một mục (0 = không giới hạn)
+            read_only: Chỉ đọc, bỏ qua mọi thao tác ghi
+        """
+        self.path = path
+        self.max_bytes = int(max_bytes or 0)
+        self.max_age_seconds = float(max_age_seconds or 0)
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed)")
+
+    def _is_expired(self, created: float, now: float) -> bool:
+        return self.max_age_seconds > 0 and now - created > self.max_age_seconds
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Lấy giá trị theo khóa
+
+        Args:
+            key: Khóa cần tra cứu
+
+        Returns:
+            Giá trị đã lưu hoặc None nếu không có (hoặc đã hết hạn)
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or self._is_expired(row[1], now):
+                self._stats["misses"] += 1
+                return None
+
+            if not self.read_only:
+                self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self._stats["hits"] += 1
+            return row[0]
+
+    def set(self, key: str, value: bytes) -> None:
+        """
+        Lưu giá trị và loại bỏ các mục cũ nếu vượt giới hạn
+
+        Args:
+            key: Khóa
+            value: Giá trị dạng bytes
+        """
+        if self.read_only:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), now, now)
+            )
+            self._stats["writes"] += 1
+            self._evict(now)
+
+    def delete(self, key: str) -> None:
+        """Xóa một mục khỏi bộ nhớ đệm"""
+        if self.read_only:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, now: float) -> None:
+        """Xóa các mục hết hạn, sau đó xóa theo LRU cho tới khi dưới giới hạn dung lượng"""
+        if self.max_age_seconds > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM entries WHERE created < ?", (now - self.max_age_seconds,)
+            )
+            self._stats["evictions"] += max(cursor.rowcount, 0)
+
+        if self.max_bytes <= 0:
+            return
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+        self._stats["evictions"] += len(victims)
+
+    def clear(self) -> None:
+        """Xóa toàn bộ bộ nhớ đệm"""
+        if self.read_only:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê sử dụng bộ nhớ đệm
+
+        Returns:
+            Dict chứa số lần trúng/trượt, số lần ghi, số mục bị loại bỏ, số mục và dung lượng hiện tại
+        """
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            stats = dict(self._stats)
+
+        lookups = stats["hits"] + stats["misses"]
+        stats.update({
+            "entries": entries,
+            "bytes": total,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            "read_only": self.read_only,
+            "path": self.path
+        })
+        return stats
+
+    def close(self) -> None:
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.close()
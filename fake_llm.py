@@ -0,0 +1,220 @@
+"""
+LLM giả lập cục bộ: máy chủ HTTP tương thích API chat completions của OpenAI, trả lời tất định
+với độ trễ và độ dài output cấu hình được, dùng để đo hiệu năng mà không cần mạng
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Any
+import config
+import token_usage
+
+logger = logging.getLogger(__name__)
+
+# Từ vựng để sinh câu trả lời giả lập
+_VOCABULARY = [
+    "turning", "milling", "drilling", "grinding", "fixture", "spindle", "feed", "depth", "roughing",
+    "finishing", "tolerance", "inspection", "hardness", "coolant", "insert", "chuck", "keyway",
+    "bore", "chamfer", "thread", "setup", "operation", "tool", "speed", "surface", "datum"
+]
+
+# Tiền tố để bộ phân tích phản hồi của tác tử CrewAI nhận đây là câu trả lời cuối
+_ANSWER_PREFIX = "Thought: I now can give a great answer\nFinal Answer: "
+
+# Yêu cầu kế hoạch có cấu trúc (xem plan_schema.OUTPUT_INSTRUCTIONS) được trả lời bằng JSON hợp lệ
+_STRUCTURED_PLAN_MARKER = "inspection_points"
+
+def _fake_plan(words: List[str]) -> str:
+    """Kế hoạch JSON theo lược đồ ManufacturingPlanOutput, phần mô tả lấy từ các từ giả lập"""
+    plan = {
+        "part_number": "FAKE-001",
+        "material": "C45",
+        "setups": [{"id": "S1", "machine": "CNC lathe", "fixture": "3-jaw chuck", "description": "Turning"}],
+        "tools": [{"id": "CNMG 120408", "tool_type": "turning insert", "description": "Roughing insert"}],
+        "operations": [{
+            "sequence": 10, "name": "Rough turn OD", "setup": "S1", "machine": "CNC lathe", "tool": "CNMG 120408",
+            "parameters": {"cutting_speed": 180, "feed": 0.25, "depth_of_cut": 2.0, "spindle_speed": 1200},
+            "minutes": 6.5
+        }],
+        "inspection_points": [{
+            "feature": "OD", "characteristic": "diameter", "nominal": 50, "tolerance": 0.02, "unit": "mm",
+            "method": "micrometer", "frequency": "100%", "operation": 10
+        }],
+        "summary": " ".join(words)
+    }
+    return json.dumps(plan)
+
+def fake_completion(messages: List[Dict[str, Any]], output_tokens: int) -> str:
+    """
+    Sinh câu trả lời tất định từ nội dung hội thoại: cùng prompt luôn cho cùng output
+
+    Args:
+        messages: Các tin nhắn của yêu cầu chat completions
+        output_tokens: Số từ của câu trả lời (xấp xỉ số token)
+
+    Returns:
+        Nội dung câu trả lời
+    """
+    seed = hashlib.sha256(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode('utf-8')).digest()
+    words = []
+    while len(words) < output_tokens:
+        seed = hashlib.sha256(seed).digest()
+        words.extend(_VOCABULARY[byte % len(_VOCABULARY)] for byte in seed)
+    if any(_STRUCTURED_PLAN_MARKER in str(message.get("content") or "") for message in messages):
+        return _ANSWER_PREFIX + _fake_plan(words[:output_tokens])
+    lines = [" ".join(words[i:i + 12]) for i in range(0, output_tokens, 12)]
+    return _ANSWER_PREFIX + "\n".join(f"- {line}" for line in lines)
+
+class FakeLLMServer:
+    """
+    Máy chủ /v1/chat/completions giả lập chạy trên một luồng nền
+
+    Mỗi yêu cầu chờ `latency` giây rồi trả về `output_tokens` từ tất định (hỗ trợ cả stream=true),
+    nên chi phí đo được ngoài phần độ trễ này là chi phí của framework và của ứng dụng.
+    """
+
+    def __init__(self, latency: float = 0.0, output_tokens: int = 200, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            latency: Độ trễ giả lập của mỗi lời gọi (giây)
+            output_tokens: Số từ của mỗi câu trả lời
+            host: Địa chỉ lắng nghe
+            port: Cổng lắng nghe (0 là cổng trống bất kỳ)
+        """
+        self.latency = latency
+        self.output_tokens = output_tokens
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "latency_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+
+        handler = type("BoundFakeLLMRequestHandler", (_FakeLLMRequestHandler,), {"server_state": self})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        """Khởi động máy chủ, trả về base_url"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        logger.info(f"LLM giả lập đang lắng nghe tại {self.base_url} (độ trễ {self.latency}s, {self.output_tokens} token)")
+        return self.base_url
+
+    def stop(self) -> None:
+        """Dừng máy chủ"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def complete(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Xử lý một yêu cầu chat completions: chờ độ trễ giả lập và sinh câu trả lời"""
+        messages = request.get("messages", [])
+        model = request.get("model", config.DEFAULT_MODEL)
+        content = fake_completion(messages, self.output_tokens)
+        prompt_tokens = sum(token_usage.count_tokens(str(message.get("content") or ""), model) for message in messages)
+        completion_tokens = token_usage.count_tokens(content, model)
+
+        time.sleep(self.latency)
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["latency_seconds"] += self.latency
+            self._stats["prompt_tokens"] += prompt_tokens
+            self._stats["completion_tokens"] += completion_tokens
+
+        return {
+            "id": f"chatcmpl-fake-{hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Số yêu cầu, tổng độ trễ giả lập và số token đã phục vụ"""
+        with self._lock:
+            return dict(self._stats)
+
+class _FakeLLMRequestHandler(BaseHTTPRequestHandler):
+    """POST /v1/chat/completions theo định dạng của API OpenAI"""
+
+    server_state: FakeLLMServer = None
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, "application/json", json.dumps({"error": {"message": f"Không có đường dẫn {self.path}"}}))
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        response = self.server_state.complete(request)
+        if not request.get("stream"):
+            self._send(200, "application/json", json.dumps(response, ensure_ascii=False))
+            return
+
+        # Trả về dạng server-sent events như API OpenAI khi stream=true
+        chunk = {key: response[key] for key in ("id", "created", "model")}
+        events = []
+        for line in response["choices"][0]["message"]["content"].splitlines(keepends=True):
+            events.append({**chunk, "object": "chat.completion.chunk",
+                           "choices": [{"index": 0, "delta": {"content": line}, "finish_reason": None}]})
+        events.append({**chunk, "object": "chat.completion.chunk",
+                       "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": response["usage"]})
+        body = "".join(f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events) + "data: [DONE]\n\n"
+        self._send(200, "text/event-stream", body)
+
+    def _send(self, status: int, content_type: str, body: str) -> None:
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+@contextmanager
+def use_fake_llm(server: FakeLLMServer):
+    """
+    Chuyển mọi lời gọi LLM (agents.get_llm, config_list của AutoGen và LLM nội bộ của CrewAI)
+    sang máy chủ giả lập trong phạm vi khối lệnh
+
+    Args:
+        server: Máy chủ LLM giả lập đã khởi động
+    """
+    saved_config = (config.OPENAI_BASE_URL, config.OPENAI_API_KEY)
+    env_keys = ("OPENAI_BASE_URL", "OPENAI_API_BASE", "OPENAI_API_KEY")
+    saved_env = {key: os.environ.get(key) for key in env_keys}
+
+    config.OPENAI_BASE_URL = server.base_url
+    config.OPENAI_API_KEY = "fake-key"
+    os.environ.update({"OPENAI_BASE_URL": server.base_url, "OPENAI_API_BASE": server.base_url, "OPENAI_API_KEY": "fake-key"})
+    try:
+        yield server
+    finally:
+        config.OPENAI_BASE_URL, config.OPENAI_API_KEY = saved_config
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
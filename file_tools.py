@@ -0,0 +1,96 @@
+"""
+Công cụ đọc file có bộ nhớ đệm và danh sách cho phép cho các tác tử CrewAI
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, List, Any, Type
+from pydantic import BaseModel, Field
+from crewai.tools import BaseTool
+import catalogs
+import tracing
+
+logger = logging.getLogger(__name__)
+
+_tool_stats = {"calls": 0, "served": 0, "rejected": 0, "missing": 0}
+_tool_stats_lock = threading.Lock()
+
+def _count(key: str) -> None:
+    with _tool_stats_lock:
+        _tool_stats[key] += 1
+
+def _candidate_paths(file_path: str) -> List[str]:
+    """
+    Các cách hiểu của một đường dẫn do tác tử đưa ra
+
+    Tác tử thường viết đường dẫn tương đối với dấu "/" ở đầu ("/tooling_catalogs/x.txt"),
+    nên đường dẫn này được thử cả như đường dẫn tuyệt đối và tương đối so với thư mục làm việc.
+    """
+    cleaned = file_path.strip().strip('"\'')
+    candidates = [os.path.abspath(cleaned)]
+    relative = cleaned.lstrip('/\\')
+    if relative != cleaned:
+        candidates.append(os.path.abspath(relative))
+    return candidates
+
+class FileReadToolInput(BaseModel):
+    """Tham số đầu vào của CachedFileReadTool"""
+    file_path: str = Field(..., description="Path to the catalog file to read")
+
+class CachedFileReadTool(BaseTool):
+    """
+    Thay thế FileReadTool: phục vụ nội dung từ kho catalog dùng chung (tự làm mới khi
+    mtime/kích thước thay đổi) và từ chối trong code mọi đường dẫn ngoài danh sách cho phép
+    """
+
+    name: str = "Read a file's content"
+    description: str = "Reads the content of an authorized reference catalog file given its path."
+    args_schema: Type[BaseModel] = FileReadToolInput
+    allowed_paths: List[str] = Field(default_factory=list)
+
+    def _run(self, file_path: str, **kwargs: Any) -> str:
+        with tracing.span("tool:read_file", "tool", tool=self.name, path=file_path) as span:
+            result = self._read(file_path)
+            span.set(bytes=len(result.encode('utf-8')))
+            return result
+
+    def _read(self, file_path: str) -> str:
+        _count("calls")
+        allowed = {os.path.abspath(path): path for path in self.allowed_paths if path}
+
+        for candidate in _candidate_paths(file_path):
+            if candidate in allowed:
+                content = catalogs.read_catalog_text(candidate)
+                if content is None:
+                    _count("missing")
+                    return (
+                        f"The catalog file {allowed[candidate]} is not available. Do not try other files; "
+                        "rely on the context from previous agents and standard engineering knowledge."
+                    )
+                _count("served")
+                return content
+
+        _count("rejected")
+        logger.warning(f"Đã từ chối đọc file ngoài danh sách cho phép: {file_path}")
+        if allowed:
+            return (
+                f"Access to {file_path} is not permitted and the file must not be requested again. "
+                f"The only readable file is: {', '.join(allowed.values())}."
+            )
+        return (
+            f"Access to {file_path} is not permitted. No files are available to this agent; "
+            "use only the information provided in the task description and context."
+        )
+
+def tool_stats() -> Dict[str, Any]:
+    """
+    Thống kê các lần gọi công cụ đọc file và kho catalog dùng chung
+
+    Returns:
+        Dict số lần gọi, phục vụ, từ chối, thiếu file và thống kê kho catalog
+    """
+    with _tool_stats_lock:
+        stats = dict(_tool_stats)
+    stats["store"] = catalogs.store_stats()
+    return stats
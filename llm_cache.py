@@ -0,0 +1,139 @@
+"""
+Bộ nhớ đệm phản hồi LLM dùng chung cho tác tử CrewAI (LangChain) và AutoGen
+"""
+
+import hashlib
+import logging
+import pickle
+import threading
+from typing import Dict, Any, Optional, Sequence
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+import config
+from disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Các chế độ bộ nhớ đệm
+CACHE_MODES = ("off", "on", "replay")
+
+class LLMCacheMiss(RuntimeError):
+    """Phát sinh khi ở chế độ replay mà phản hồi chưa có trong bộ nhớ đệm"""
+
+_store: Optional[DiskCache] = None
+_store_lock = threading.Lock()
+
+def get_cache_store() -> Optional[DiskCache]:
+    """
+    Lấy kho đệm dùng chung theo cấu hình hiện tại (khởi tạo lần đầu khi cần)
+
+    Returns:
+        DiskCache hoặc None nếu bộ nhớ đệm bị tắt
+    """
+    global _store
+
+    mode = config.LLM_CACHE_MODE
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Chế độ bộ nhớ đệm LLM không hợp lệ: {mode} (hợp lệ: {', '.join(CACHE_MODES)})")
+    if mode == "off":
+        return None
+
+    with _store_lock:
+        if _store is None:
+            _store = DiskCache(
+                config.LLM_CACHE_PATH,
+                max_bytes=int(config.LLM_CACHE_MAX_MB * 1024 * 1024),
+                max_age_seconds=config.LLM_CACHE_MAX_AGE_HOURS * 3600,
+                read_only=(mode == "replay")
+            )
+            logger.info(f"Đã bật bộ nhớ đệm LLM ({mode}): {config.LLM_CACHE_PATH}")
+        return _store
+
+def make_cache_key(namespace: str, *parts: str) -> str:
+    """Tạo khóa đệm ổn định từ các thành phần của yêu cầu"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b"\x00")
+    return f"{namespace}:{digest.hexdigest()}"
+
+def cache_stats() -> Dict[str, Any]:
+    """
+    Thống kê sử dụng bộ nhớ đệm LLM
+
+    Returns:
+        Dict thống kê, hoặc {"mode": "off"} nếu bộ nhớ đệm bị tắt
+    """
+    store = get_cache_store()
+    if store is None:
+        return {"mode": "off"}
+    stats = store.stats()
+    stats["mode"] = config.LLM_CACHE_MODE
+    return stats
+
+class LangChainLLMCache(BaseCache):
+    """
+    Bộ nhớ đệm LangChain truyền vào ChatOpenAI trong agents.get_llm
+
+    LangChain gọi lookup/update với prompt là toàn bộ danh sách message đã tuần tự hóa và
+    llm_string chứa mô hình, nhiệt độ cùng các tham số khác, nên khóa bao phủ đủ cả ba.
+    """
+
+    def __init__(self, store: DiskCache):
+        self.store = store
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Any]]:
+        value = self.store.get(make_cache_key("langchain", llm_string, prompt))
+        if value is None:
+            if self.store.read_only:
+                raise LLMCacheMiss("Không tìm thấy phản hồi trong bộ nhớ đệm LLM (chế độ replay)")
+            return None
+        return [loads(generation) for generation in pickle.loads(value)]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Any]) -> None:
+        value = pickle.dumps([dumps(generation) for generation in return_val])
+        self.store.set(make_cache_key("langchain", llm_string, prompt), value)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+class AutoGenLLMCache:
+    """
+    Bộ nhớ đệm theo giao thức cache của AutoGen (get/set/close, context manager)
+
+    AutoGen tự tạo khóa từ toàn bộ cấu hình yêu cầu (mô hình, nhiệt độ, messages).
+    """
+
+    def __init__(self, store: DiskCache):
+        self.store = store
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        value = self.store.get(make_cache_key("autogen", key))
+        if value is None:
+            if self.store.read_only:
+                raise LLMCacheMiss("Không tìm thấy phản hồi trong bộ nhớ đệm LLM (chế độ replay)")
+            return default
+        return pickle.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        self.store.set(make_cache_key("autogen", key), pickle.dumps(value))
+
+    def close(self) -> None:
+        # Kho đệm được dùng chung trong tiến trình nên không đóng ở đây
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+def get_langchain_cache() -> Optional[LangChainLLMCache]:
+    """Bộ nhớ đệm cho ChatOpenAI, hoặc None nếu bị tắt"""
+    store = get_cache_store()
+    return LangChainLLMCache(store) if store is not None else None
+
+def get_autogen_cache() -> Optional[AutoGenLLMCache]:
+    """Bộ nhớ đệm cho initiate_chat của AutoGen, hoặc None nếu bị tắt"""
+    store = get_cache_store()
+    return AutoGenLLMCache(store) if store is not None else None
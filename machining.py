@@ -0,0 +1,486 @@
+"""
+Mô hình thời gian gia công: tính thời gian cắt của từng nguyên công từ hình học chi tiết
+(chiều dài, đường kính, lượng dư) và chế độ cắt trong catalog dụng cụ, vector hóa bằng NumPy
+"""
+
+import re
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+import config
+import catalogs
+import catalog_registry
+
+logger = logging.getLogger(__name__)
+
+# Kiểu nguyên công (mã số để tính vector hóa cho nhiều loại nguyên công cùng lúc)
+KIND_TURNING = 0   # tiện/doa/mài tròn dọc trục: hành trình = chiều dài
+KIND_FACING = 1    # tiện mặt đầu: hành trình = bán kính
+KIND_MILLING = 2   # phay: tốc độ theo đường kính dao, lượng chạy dao theo răng
+KIND_DRILLING = 3  # khoan: một lần cắt, cộng phần mũi khoan
+KIND_TAPPING = 4   # ta rô: lượng chạy dao bằng bước ren, đi vào và lùi ra
+
+# Nhóm máy của nguyên công (thời gian được cộng theo nhóm)
+OPERATION_GROUPS = ("turning", "milling", "drilling", "grinding")
+
+# Khoảng chạy vào/chạy quá của dao (mm)
+APPROACH_MM = 2.0
+
+# Lượng dư để lại cho tiện/doa tinh và cho mài (mm mỗi phía)
+FINISHING_ALLOWANCE_MM = 0.5
+GRINDING_ALLOWANCE_MM = 0.1
+
+# Bề mặt có Ra nhỏ hơn hoặc bằng ngưỡng này được mài sau khi gia công tinh (µm); bề mặt khác
+# phải đạt Ra ngay ở nguyên công tiện/doa tinh
+GRINDING_RA_THRESHOLD = 0.4
+
+# Lượng chạy dao dọc khi mài, tính theo bề rộng đá mài mỗi vòng quay chi tiết
+GRINDING_TRAVERSE_RATIO = 0.5
+
+# Thời gian không cắt (phút): gá đặt theo nhóm máy, nhiệt luyện, kiểm tra
+SETUP_MINUTES = {"turning": 30.0, "milling": 30.0, "drilling": 15.0, "grinding": 30.0}
+HEAT_TREATMENT_MINUTES = 120.0
+INSPECTION_MINUTES = 15.0
+
+# Bước ren hệ mét thô theo đường kính danh nghĩa (mm)
+METRIC_COARSE_PITCH = {3: 0.5, 4: 0.7, 5: 0.8, 6: 1.0, 8: 1.25, 10: 1.5, 12: 1.75, 16: 2.0, 20: 2.5, 24: 3.0}
+
+# Mục trong catalog dụng cụ -> khóa nguyên công (mục đầu tiên khớp được dùng)
+TOOLING_TITLES = (
+    ("rough_turning", "ROUGH TURNING"),
+    ("finish_turning", "FINISH TURNING"),
+    ("finish_boring", "FINISH BORING"),
+    ("rough_boring", "BORING"),
+    ("face_milling", "FACE MILLING"),
+    ("keyway_milling", "KEYWAY"),
+    ("tapping", "THREADING"),
+    ("drilling", "DRILLING"),
+    ("external_grinding", "CYLINDRICAL GRINDING"),
+    ("internal_grinding", "INTERNAL GRINDING"),
+    ("face_grinding", "FACE GRINDING")
+)
+
+# Chế độ cắt mặc định khi catalog không có mục tương ứng (thép hợp kim, dao hợp kim cứng)
+DEFAULT_TOOLING = {
+    "rough_turning": {"cutting_speed": (120.0, 150.0), "feed": (0.25, 0.40), "depth_of_cut": (2.0, 5.0), "nose_radius": 0.8},
+    "finish_turning": {"cutting_speed": (150.0, 180.0), "feed": (0.10, 0.20), "depth_of_cut": (0.5, 1.0), "nose_radius": 0.4},
+    "rough_boring": {"cutting_speed": (100.0, 130.0), "feed": (0.20, 0.30), "depth_of_cut": (1.0, 3.0), "nose_radius": 0.8},
+    "finish_boring": {"cutting_speed": (130.0, 160.0), "feed": (0.08, 0.15), "depth_of_cut": (0.3, 0.5), "nose_radius": 0.4},
+    "face_milling": {"cutting_speed": (120.0, 150.0), "feed": (0.10, 0.15), "depth_of_cut": (0.5, 2.0),
+                     "tool_diameter": 63.0, "teeth": 5},
+    "keyway_milling": {"cutting_speed": (100.0, 130.0), "feed": (0.05, 0.10), "depth_of_cut": (0.5, 1.0), "teeth": 4},
+    "drilling": {"cutting_speed": (70.0, 90.0), "feed": (0.08, 0.15)},
+    "tapping": {"cutting_speed": (15.0, 20.0)},
+    "external_grinding": {"cutting_speed": (25.0, 35.0), "depth_of_cut": (0.005, 0.02), "wheel_width": 40.0},
+    "internal_grinding": {"cutting_speed": (25.0, 30.0), "depth_of_cut": (0.003, 0.01), "wheel_width": 20.0},
+    "face_grinding": {"cutting_speed": (20.0, 30.0), "depth_of_cut": (0.005, 0.015), "wheel_width": 50.0}
+}
+
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+PARAMETER_RE = re.compile(
+    r'^[\s*-]*(Cutting Speed|Work Speed|Feed per Tooth|Feed Rate|Feed|Depth of Cut|Infeed|Pitch|Wheel Dimensions)\s*:\s*(.+)$',
+    re.IGNORECASE
+)
+TOOL_DIAMETER_RE = re.compile(r'Ø\s*(\d+(?:\.\d+)?)')
+# Mã mảnh cắt ISO (vd: CNMG 120408): hai chữ số cuối là bán kính mũi dao tính bằng 0.1 mm
+INSERT_RE = re.compile(r'\b[A-Z]{4}\s?\d{4}(\d{2})\b')
+TEETH_RE = re.compile(r'(\d+)\s*(?:Inserts|-?\s*flute)', re.IGNORECASE)
+THREADED_HOLES_RE = re.compile(r'(\d+)\s*[×x]\s*M(\d+)', re.IGNORECASE)
+RA_RE = re.compile(r'Ra\s*(\d+(?:\.\d+)?)', re.IGNORECASE)
+HARDNESS_RE = re.compile(r'\d+(?:\.\d+)?\s*(?:-\s*\d+(?:\.\d+)?\s*)?HR[BC]', re.IGNORECASE)
+
+# Tên thông số trong catalog -> trường chế độ cắt
+_PARAMETER_FIELDS = {
+    "cutting speed": "cutting_speed",
+    "work speed": "cutting_speed",
+    "feed per tooth": "feed",
+    "feed rate": "feed",
+    "feed": "feed",
+    "depth of cut": "depth_of_cut",
+    "infeed": "depth_of_cut",
+    "pitch": "pitch"
+}
+
+_tooling_cache: Dict[str, Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]] = {}
+
+def _parse_range(value: str) -> Optional[Tuple[float, float]]:
+    """Khoảng giá trị "120-150 m/min" -> (120.0, 150.0); một giá trị -> (x, x)"""
+    numbers = [float(number) for number in NUMBER_RE.findall(value)[:2]]
+    if not numbers:
+        return None
+    return (numbers[0], numbers[-1]) if numbers[0] <= numbers[-1] else (numbers[-1], numbers[0])
+
+def parse_tooling(index: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Lấy chế độ cắt (tốc độ cắt, lượng chạy dao, chiều sâu cắt, thông số dao) từ chỉ mục catalog dụng cụ
+
+    Args:
+        index: Chỉ mục catalog (xem catalogs.parse_catalog)
+
+    Returns:
+        Dict khóa nguyên công -> chế độ cắt (kèm tên dụng cụ "tool" nếu catalog có), bổ sung giá trị
+        mặc định cho trường thiếu
+    """
+    tooling: Dict[str, Dict[str, Any]] = {}
+    for section in index["sections"].values():
+        for subsection in section["subsections"].values():
+            title = subsection["title"].upper()
+            key = next((key for key, pattern in TOOLING_TITLES if pattern in title), None)
+            if key is None or key in tooling:
+                continue
+
+            entry: Dict[str, Any] = {}
+            for line in subsection["text"].splitlines():
+                parameter = PARAMETER_RE.match(line)
+                if parameter:
+                    name, value = parameter.group(1).lower(), parameter.group(2)
+                    if name == "wheel dimensions":
+                        numbers = NUMBER_RE.findall(value)
+                        if len(numbers) >= 2:
+                            entry["wheel_width"] = float(numbers[1])
+                    elif _parse_range(value):
+                        entry[_PARAMETER_FIELDS[name]] = _parse_range(value)
+                    continue
+                if "Tool:" in line or "Insert:" in line:
+                    insert = INSERT_RE.search(line)
+                    # Tên dụng cụ: ưu tiên mã mảnh cắt ISO, nếu không có thì lấy mô tả dụng cụ đầu tiên
+                    designation = insert.group(0) if insert else line.split(":", 1)[1].strip()
+                    if "tool" not in entry or (insert and not INSERT_RE.search(entry["tool"])):
+                        entry["tool"] = designation
+                    if insert and "nose_radius" not in entry:
+                        entry["nose_radius"] = int(insert.group(1)) / 10
+                    diameter = TOOL_DIAMETER_RE.search(line)
+                    if diameter and "tool_diameter" not in entry:
+                        entry["tool_diameter"] = float(diameter.group(1))
+                    teeth = TEETH_RE.search(line)
+                    if teeth:
+                        entry["teeth"] = int(teeth.group(1))
+            tooling[key] = entry
+
+    return {key: {**defaults, **tooling.get(key, {})} for key, defaults in DEFAULT_TOOLING.items()}
+
+def load_tooling(path: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Chế độ cắt từ một file catalog dụng cụ, chỉ phân tích lại khi catalog thay đổi
+
+    Args:
+        path: Đường dẫn catalog dụng cụ; None dùng chế độ cắt mặc định
+
+    Returns:
+        Dict khóa nguyên công -> chế độ cắt
+    """
+    index = catalogs.load_catalog_index(path) if path else None
+    if index is None:
+        return DEFAULT_TOOLING
+
+    cached = _tooling_cache.get(path)
+    # Chỉ mục được tạo mới mỗi khi file thay đổi nên so sánh theo đối tượng
+    if cached is None or cached[0] is not index:
+        cached = (index, parse_tooling(index))
+        _tooling_cache[path] = cached
+    return cached[1]
+
+def tooling_for_part(part_number: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Chế độ cắt theo catalog dụng cụ của mã chi tiết (tra cứu qua sổ đăng ký catalog)"""
+    return load_tooling(catalog_registry.get_catalog_path("tooling", part_number))
+
+def spindle_speed(cutting_speed, diameter) -> np.ndarray:
+    """Số vòng quay trục chính n = 1000·Vc / (π·D) (vòng/phút), Vc tính bằng m/phút, D bằng mm"""
+    return 1000.0 * np.asarray(cutting_speed, dtype=float) / (np.pi * np.asarray(diameter, dtype=float))
+
+def cutting_time(kind, length, diameter, allowance, cutting_speed, feed, depth_of_cut=1.0,
+                 teeth=1, count=1, approach: float = APPROACH_MM) -> np.ndarray:
+    """
+    Thời gian cắt (phút) theo công thức chuẩn, vector hóa cho mọi tham số
+
+    T = hành trình · số lần cắt / (lượng chạy dao · số răng · n) · số lượng, với
+    n = 1000·Vc/(π·D) và số lần cắt = ceil(lượng dư / chiều sâu cắt). Các tham số được
+    broadcast theo quy tắc NumPy, nên một lời gọi có thể tính (bộ chế độ cắt × chi tiết ×
+    nguyên công); phần tử có count = 0 (phần đệm) cho thời gian 0.
+
+    Args:
+        kind: Kiểu nguyên công (KIND_*)
+        length: Chiều dài cắt (mm); chiều sâu lỗ khi khoan/ta rô
+        diameter: Đường kính gia công (mm); đường kính dao khi phay
+        allowance: Lượng dư cần bóc (mm mỗi phía; chiều sâu rãnh khi phay)
+        cutting_speed: Tốc độ cắt Vc (m/phút)
+        feed: Lượng chạy dao (mm/vòng, mm/răng khi phay, bước ren khi ta rô)
+        depth_of_cut: Chiều sâu cắt mỗi lần (mm)
+        teeth: Số răng dao (phay)
+        count: Số lần lặp nguyên công (vd: số lỗ)
+        approach: Khoảng chạy vào/chạy quá (mm)
+
+    Returns:
+        Mảng thời gian cắt (phút)
+    """
+    kind, length, diameter, allowance, cutting_speed, feed, depth_of_cut, teeth, count = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in
+          (kind, length, diameter, allowance, cutting_speed, feed, depth_of_cut, teeth, count))
+    )
+    active = count > 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        feed_rate = feed * teeth * spindle_speed(cutting_speed, diameter)
+        single_pass = (kind == KIND_DRILLING) | (kind == KIND_TAPPING)
+        passes = np.where(single_pass, 1.0, np.maximum(1.0, np.ceil(allowance / depth_of_cut - 1e-9)))
+        travel = np.select(
+            [kind == KIND_FACING, kind == KIND_MILLING, kind == KIND_DRILLING, kind == KIND_TAPPING],
+            [diameter / 2 + approach, length + approach + diameter, length + approach + 0.3 * diameter,
+             2 * (length + approach)],
+            default=length + approach
+        )
+        minutes = travel * passes / feed_rate * count
+
+    return np.where(active, minutes, 0.0)
+
+def _text(value: Any) -> str:
+    """Văn bản của một giá trị thông số (chuỗi hoặc bản ghi có trường "text")"""
+    return str(value.get("text", "")) if isinstance(value, dict) else str(value)
+
+def _number(value: Any) -> Optional[float]:
+    """Số đầu tiên trong một giá trị thông số ("120mm ± 0.05mm" -> 120.0)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return _number(value.get("nominal"))
+    match = NUMBER_RE.search(str(value)) if value is not None else None
+    return float(match.group()) if match else None
+
+def _spec_items(part_specs: Dict[str, Any], *sections: str) -> List[Tuple[str, Any]]:
+    """Các cặp (tên, giá trị) trong những phần thông số đã cho, tên viết thường"""
+    items = []
+    for section in sections:
+        for key, value in (part_specs.get(section) or {}).items():
+            if key != "items":
+                items.append((key.lower(), value))
+    return items
+
+def _surface_ra(part_specs: Dict[str, Any], *keywords: str) -> Optional[float]:
+    """Ra (µm) yêu cầu cho bề mặt có tên chứa một trong các từ khóa"""
+    values = []
+    for key, value in _spec_items(part_specs, "surface_finish", "tolerances"):
+        if any(keyword in key for keyword in keywords):
+            ra = RA_RE.search(_text(value))
+            if ra:
+                values.append(float(ra.group(1)))
+    return min(values) if values else None
+
+def plan_operations(part_specs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Lập danh sách nguyên công cắt gọt từ thông số kỹ thuật của chi tiết
+
+    Phôi thanh tròn lớn hơn đường kính ngoài lớn nhất MACHINING_STOCK_ALLOWANCE mỗi phía:
+    tiện mặt đầu, tiện thô/tinh từng đường kính ngoài, khoan lỗ mồi rồi doa thô/tinh từng
+    lỗ, mài bề mặt có Ra <= GRINDING_RA_THRESHOLD, phay rãnh then, khoan và ta rô lỗ ren.
+
+    Args:
+        part_specs: Thông số kỹ thuật (xem utils.extract_technical_specs)
+
+    Returns:
+        Danh sách nguyên công (tên, nhóm máy, kiểu, khóa chế độ cắt, hình học và Ra yêu cầu)
+    """
+    stock = config.MACHINING_STOCK_ALLOWANCE
+    dimensions = _spec_items(part_specs, "dimensions")
+
+    length = next((_number(value) for key, value in dimensions if "overall length" in key), None)
+    outer_diameters = [_number(value) for key, value in dimensions
+                       if ("external diameter" in key or "outer diameter" in key) and _number(value)]
+    bores = [_number(value) for key, value in dimensions
+             if "bore" in key and "depth" not in key and _number(value)]
+    if not length or not outer_diameters:
+        logger.warning("Thiếu chiều dài tổng hoặc đường kính ngoài, không tính được thời gian tiện")
+        length = length or 0.0
+
+    operations: List[Dict[str, Any]] = []
+
+    def add(name, group, kind, tooling, length, diameter, allowance, count=1, ra=None):
+        operations.append({
+            "name": name, "group": group, "kind": kind, "tooling": tooling,
+            "length": length, "diameter": diameter, "allowance": allowance, "count": count, "ra": ra
+        })
+
+    if outer_diameters:
+        stock_diameter = max(outer_diameters) + 2 * stock
+        add("face_ends", "turning", KIND_FACING, "rough_turning", 0.0, stock_diameter, stock, count=2)
+        od_length = length / len(outer_diameters)
+        od_ra = _surface_ra(part_specs, "external", "outer")
+        od_ground = od_ra is not None and od_ra <= GRINDING_RA_THRESHOLD
+        for position, diameter in enumerate(outer_diameters, 1):
+            rough = (stock_diameter - diameter) / 2 - FINISHING_ALLOWANCE_MM
+            add(f"rough_turn_od_{position}", "turning", KIND_TURNING, "rough_turning", od_length, diameter + 2 * FINISHING_ALLOWANCE_MM, rough)
+            add(f"finish_turn_od_{position}", "turning", KIND_TURNING, "finish_turning", od_length, diameter,
+                FINISHING_ALLOWANCE_MM, ra=None if od_ground else od_ra)
+            if od_ground:
+                add(f"grind_od_{position}", "grinding", KIND_TURNING, "external_grinding", od_length, diameter, GRINDING_ALLOWANCE_MM, ra=od_ra)
+
+    if bores:
+        bore_length = length / len(bores)
+        bore_ra = _surface_ra(part_specs, "bore")
+        bore_ground = bore_ra is not None and bore_ra <= GRINDING_RA_THRESHOLD
+        pilot = max(min(bores) - 2 * stock, 5.0)
+        add("drill_pilot", "drilling", KIND_DRILLING, "drilling", length, pilot, 0.0)
+        for position, diameter in enumerate(bores, 1):
+            rough = (diameter - pilot) / 2 - FINISHING_ALLOWANCE_MM
+            add(f"rough_bore_{position}", "turning", KIND_TURNING, "rough_boring", bore_length, diameter - 2 * FINISHING_ALLOWANCE_MM, rough)
+            add(f"finish_bore_{position}", "turning", KIND_TURNING, "finish_boring", bore_length, diameter,
+                FINISHING_ALLOWANCE_MM, ra=None if bore_ground else bore_ra)
+            if bore_ground:
+                add(f"grind_bore_{position}", "grinding", KIND_TURNING, "internal_grinding", bore_length, diameter, GRINDING_ALLOWANCE_MM, ra=bore_ra)
+
+    # Rãnh then: "Keyway (Drive End): 8.0 × 4.0 × 25.0 mm" hoặc hai dòng Keyway Width/Keyway Depth
+    keyway_parts: Dict[str, float] = {}
+    for key, value in dimensions:
+        if "keyway" not in key:
+            continue
+        numbers = [float(number) for number in NUMBER_RE.findall(_text(value))]
+        if len(numbers) >= 3 and "×" in _text(value):
+            add(f"mill_{key.replace(' ', '_')}", "milling", KIND_MILLING, "keyway_milling", numbers[2], numbers[0], numbers[1])
+        elif "width" in key and numbers:
+            keyway_parts["width"] = numbers[0]
+        elif "depth" in key and numbers:
+            keyway_parts["depth"] = numbers[0]
+        elif "length" in key and numbers:
+            keyway_parts["length"] = numbers[0]
+    if "width" in keyway_parts and "depth" in keyway_parts:
+        add("mill_keyway", "milling", KIND_MILLING, "keyway_milling",
+            keyway_parts.get("length", length), keyway_parts["width"], keyway_parts["depth"])
+
+    # Lỗ ren: "6 × M6 threaded holes"; chiều sâu lỗ lấy bằng 2 lần đường kính danh nghĩa
+    for key, value in dimensions:
+        holes = THREADED_HOLES_RE.search(_text(value))
+        if not holes:
+            continue
+        count, nominal = int(holes.group(1)), int(holes.group(2))
+        pitch = METRIC_COARSE_PITCH.get(nominal, round(nominal * 0.15, 2))
+        name = key.replace(' ', '_')
+        add(f"drill_{name}", "drilling", KIND_DRILLING, "drilling", 2.0 * nominal, nominal - pitch, 0.0, count=count)
+        add(f"tap_{name}", "drilling", KIND_TAPPING, "tapping", 2.0 * nominal, float(nominal), 0.0, count=count)
+        operations[-1]["pitch"] = pitch
+
+    return operations
+
+def operation_arrays(operations: List[Dict[str, Any]], tooling, position=None) -> Dict[str, np.ndarray]:
+    """
+    Chuyển danh sách nguyên công thành các mảng tham số cho cutting_time
+
+    Args:
+        operations: Danh sách nguyên công (xem plan_operations)
+        tooling: Chế độ cắt theo khóa nguyên công (xem load_tooling), hoặc danh sách chế độ cắt
+            riêng cho từng nguyên công
+        position: Vị trí chế độ cắt trong khoảng của catalog (0 = cận dưới, 1 = cận trên);
+            một mảng S giá trị cho kết quả có thêm trục đầu S
+
+    Returns:
+        Dict mảng tham số (kind, length, diameter, allowance, cutting_speed, feed, depth_of_cut,
+        teeth, count), cùng kích thước [S ×] số nguyên công
+    """
+    position = np.asarray(config.MACHINING_PARAMETER_POSITION if position is None else position, dtype=float)
+    if position.ndim:
+        position = position.reshape(position.shape + (1,))
+    if isinstance(tooling, dict):
+        tooling = [tooling] * len(operations)
+
+    ranges = {field: np.empty((2, len(operations))) for field in ("cutting_speed", "feed", "depth_of_cut")}
+    diameter = np.empty(len(operations))
+    teeth = np.ones(len(operations))
+
+    for i, (operation, part_tooling) in enumerate(zip(operations, tooling)):
+        parameters = part_tooling.get(operation["tooling"], DEFAULT_TOOLING[operation["tooling"]])
+        feed = parameters.get("feed", (1.0, 1.0))
+        if operation["kind"] == KIND_TAPPING:
+            feed = (operation["pitch"], operation["pitch"])
+        elif operation["tooling"].endswith("grinding"):
+            traverse = parameters.get("wheel_width", 20.0) * GRINDING_TRAVERSE_RATIO
+            feed = (traverse, traverse)
+        ranges["cutting_speed"][:, i] = parameters["cutting_speed"]
+        ranges["feed"][:, i] = feed
+        ranges["depth_of_cut"][:, i] = parameters.get("depth_of_cut", (1.0, 1.0))
+        diameter[i] = operation["diameter"]
+        if operation["kind"] == KIND_MILLING:
+            teeth[i] = parameters.get("teeth", 4)
+
+    arrays = {field: low + position * (high - low) for field, (low, high) in ranges.items()}
+    arrays.update({
+        "kind": np.array([operation["kind"] for operation in operations], dtype=float),
+        "length": np.array([operation["length"] for operation in operations], dtype=float),
+        "diameter": diameter,
+        "allowance": np.array([operation["allowance"] for operation in operations], dtype=float),
+        "teeth": teeth,
+        "count": np.array([operation["count"] for operation in operations], dtype=float)
+    })
+    shape = arrays["cutting_speed"].shape
+    return {field: np.broadcast_to(values, shape) for field, values in arrays.items()}
+
+def estimate_order_book(parts: List[Dict[str, Any]], position=None) -> Dict[str, Any]:
+    """
+    Tính thời gian cắt cho nhiều chi tiết trong một lần gọi vector hóa
+
+    Nguyên công của mọi chi tiết được ghép thành một dãy, tính một lần bằng cutting_time
+    rồi xếp lại thành mảng (chi tiết × nguyên công), phần trống bằng 0.
+
+    Args:
+        parts: Danh sách thông số kỹ thuật chi tiết
+        position: Vị trí chế độ cắt trong khoảng của catalog (số hoặc mảng S giá trị)
+
+    Returns:
+        Dict gồm danh sách nguyên công theo chi tiết, mảng thời gian ([S ×] chi tiết × nguyên công,
+        phút) và mảng thời gian theo nhóm máy ([S ×] chi tiết × OPERATION_GROUPS)
+    """
+    operations = [plan_operations(part_specs) for part_specs in parts]
+    width = max((len(part_operations) for part_operations in operations), default=0)
+
+    flat, tooling, owner, slot, group = [], [], [], [], []
+    for p, (part_specs, part_operations) in enumerate(zip(parts, operations)):
+        part_tooling = tooling_for_part(part_specs.get("part_number") or None)
+        for o, operation in enumerate(part_operations):
+            flat.append(operation)
+            tooling.append(part_tooling)
+            owner.append(p)
+            slot.append(o)
+            group.append(OPERATION_GROUPS.index(operation["group"]))
+
+    flat_minutes = cutting_time(**operation_arrays(flat, tooling, position))
+    # Đưa trục nguyên công lên đầu để phân phối theo (chi tiết, nguyên công) và (chi tiết, nhóm)
+    by_operation = np.moveaxis(flat_minutes, -1, 0)
+    lead_shape = by_operation.shape[1:]
+
+    minutes = np.zeros((len(parts), width) + lead_shape)
+    minutes[owner, slot] = by_operation
+    group_minutes = np.zeros((len(parts), len(OPERATION_GROUPS)) + lead_shape)
+    np.add.at(group_minutes, (np.array(owner, dtype=int), np.array(group, dtype=int)), by_operation)
+
+    return {
+        "operations": operations,
+        "minutes": np.moveaxis(minutes, (0, 1), (-2, -1)),
+        "group_minutes": np.moveaxis(group_minutes, (0, 1), (-2, -1))
+    }
+
+def estimate_machining_time(part_specs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Thời gian gia công của một chi tiết theo nhóm máy, cộng thời gian gá đặt, nhiệt luyện và kiểm tra
+
+    Args:
+        part_specs: Thông số kỹ thuật của chi tiết
+
+    Returns:
+        Dict thời gian (phút): setup, turning, milling, drilling, grinding, heat_treatment,
+        inspection, total, và thời gian từng nguyên công trong "operations"
+    """
+    estimate = estimate_order_book([part_specs])
+    operations = estimate["operations"][0]
+    group_minutes = estimate["group_minutes"][0]
+
+    times = {"setup": 0.0}
+    for g, group in enumerate(OPERATION_GROUPS):
+        times[group] = round(float(group_minutes[g]), 2)
+        if any(operation["group"] == group for operation in operations):
+            times["setup"] += SETUP_MINUTES[group]
+    hardness = [value for _, value in _spec_items(part_specs, "heat_treatment") if HARDNESS_RE.search(_text(value))]
+    times["heat_treatment"] = HEAT_TREATMENT_MINUTES if hardness else 0.0
+    times["inspection"] = INSPECTION_MINUTES
+    times["total"] = round(sum(times.values()), 2)
+    times["operations"] = {
+        operation["name"]: round(float(minutes), 2)
+        for operation, minutes in zip(operations, estimate["minutes"][0])
+    }
+    return times
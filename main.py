@@ -5,15 +5,32 @@
 import os
 import sys
 import json
+import time
+import asyncio
 import argparse
+import functools
 import logging
-from typing import Dict, List, Any, Optional
-from crewai import Crew, Process
+from typing import Dict, List, Any, Optional, Callable, TYPE_CHECKING
 import config
 import utils
-import agents
+import llm_cache
+import plan_cache
+import plan_model
+import plan_index
+import batch
+import stages
+import pipeline
+import checkpoint
+import revisions
+import streaming
+import tracing
+import token_usage
+import async_planner
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from crewai import Crew
+
 # Tải biến môi trường
 load_dotenv()
 
@@ -33,6 +50,62 @@ def parse_arguments():
         help='Đường dẫn tới file bản vẽ kỹ thuật (PDF hoặc TXT)'
     )
     
+    parser.add_argument(
+        '--resume',
+        type=str,
+        default=None,
+        metavar='RUN_ID',
+        help='Tiếp tục một lượt chạy bị lỗi từ checkpoint, chỉ chạy lại các công đoạn chưa hoàn thành'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Lập lại kế hoạch tăng dần: chỉ chạy lại các công đoạn bị ảnh hưởng bởi phần bản vẽ đã thay đổi'
+    )
+    
+    parser.add_argument(
+        '--batch', '-b',
+        type=str,
+        default=None,
+        help='Lập kế hoạch hàng loạt: thư mục, mẫu glob hoặc file manifest (.json/.lst) chứa các bản vẽ'
+    )
+    
+    parser.add_argument(
+        '--concurrency', '-j',
+        type=int,
+        default=None,
+        help='Số bản vẽ được xử lý đồng thời trong chế độ hàng loạt '
+             '(mặc định BATCH_CONCURRENCY, hoặc ASYNC_MAX_CONCURRENT_PLANS với --async)'
+    )
+    
+    parser.add_argument(
+        '--async',
+        dest='use_async',
+        action='store_true',
+        help='Chạy bất đồng bộ trên một vòng lặp sự kiện với lời gọi LLM bất đồng bộ thay vì mỗi bản vẽ một luồng'
+    )
+    
+    parser.add_argument(
+        '--llm-concurrency',
+        type=int,
+        default=None,
+        help='Số lời gọi LLM đồng thời tối đa trong chế độ bất đồng bộ (mặc định ASYNC_MAX_CONCURRENT_LLM_CALLS)'
+    )
+    
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Chế độ hàng loạt dạng đường ống: mỗi công đoạn có nhóm luồng và hàng đợi riêng'
+    )
+    
+    parser.add_argument(
+        '--stage-concurrency',
+        type=str,
+        default=config.PIPELINE_STAGE_CONCURRENCY,
+        help='Số luồng cho từng công đoạn trong chế độ đường ống, vd: "process_plan=4,finalize_plan=2"'
+    )
+    
     parser.add_argument(
         '--output', '-o',
         type=str,
@@ -40,6 +113,65 @@ def parse_arguments():
         help='Tên file để lưu kết quả'
     )
     
+    parser.add_argument(
+        '--llm-cache',
+        type=str,
+        choices=['off', 'on', 'replay'],
+        default=None,
+        help='Bộ nhớ đệm phản hồi LLM: "off", "on" hoặc "replay" (chỉ đọc, lỗi nếu chưa có trong bộ nhớ đệm)'
+    )
+    
+    parser.add_argument(
+        '--plan-cache',
+        action='store_true',
+        help='Trả ngay kế hoạch đã lưu khi bản vẽ, catalog, prompt và cấu hình mô hình không đổi'
+    )
+    
+    parser.add_argument(
+        '--export-parquet',
+        action='store_true',
+        help='Ghi thêm kế hoạch vào bộ dữ liệu Parquet (PARQUET_EXPORT_PATH, phân vùng theo PARQUET_PARTITION_BY)'
+    )
+    
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Phát trực tiếp output từng công đoạn (và token LLM) ra màn hình và file NDJSON trong data/'
+    )
+    
+    parser.add_argument(
+        '--stream-path',
+        type=str,
+        default=None,
+        help='Đường dẫn file NDJSON cho chế độ phát trực tiếp'
+    )
+    
+    parser.add_argument(
+        '--context-compression',
+        type=str,
+        choices=['off', 'extractive', 'llm'],
+        default=None,
+        help='Nén output các công đoạn phía trước thành bản tóm lược trong giới hạn CONTEXT_TOKEN_BUDGET token'
+    )
+    
+    parser.add_argument(
+        '--skip-analysis',
+        action='store_true',
+        help='Bỏ qua công đoạn phân tích bản vẽ bằng LLM khi spec_parser đọc được đầy đủ thông số của bản vẽ'
+    )
+    
+    parser.add_argument(
+        '--trace',
+        action='store_true',
+        help='Ghi vết span (công đoạn, lời gọi LLM, công cụ, I/O) và xuất file Chrome trace cạnh file kết quả'
+    )
+    
+    parser.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help='Đo thời gian import theo mô-đun cho các kịch bản khởi động rồi thoát'
+    )
+    
     parser.add_argument(
         '--verbose', '-v',
         action='store_true',
@@ -48,23 +180,26 @@ def parse_arguments():
     
     return parser.parse_args()
 
-def create_manufacturing_crew(drawing_path: str) -> Crew:
+def create_manufacturing_crew(drawing_path: str,
+                              stage_callback: Optional[Callable[[str, Any], None]] = None,
+                              stage_agents: Optional[Dict[str, Any]] = None) -> "Crew":
     """
     Tạo nhóm các tác tử cho quy trình sản xuất
     
     Args:
         drawing_path: Đường dẫn đến file bản vẽ
+        stage_callback: Hàm gọi khi mỗi task hoàn thành, nhận (tên công đoạn, TaskOutput)
+        stage_agents: Các tác tử đã tạo sẵn theo công đoạn (vd: từ nhóm tác tử của chế độ dịch vụ)
         
     Returns:
         Crew: Nhóm tác tử đã cấu hình
     """
-    # Tạo các tác tử
-    design_analyzer = agents.create_design_analyzer_agent()
-    material_specialist = agents.create_material_selection_agent()
-    tooling_specialist = agents.create_tooling_selection_agent()
-    process_planner = agents.create_process_planning_agent()
-    quality_controller = agents.create_quality_control_agent()
-    orchestrator = agents.create_orchestrator_agent()
+    from crewai import Crew, Process
+    
+    # Tạo các tác tử với catalog tra cứu theo mã chi tiết ghi trên bản vẽ
+    part_number = stages.get_drawing_part_number(drawing_path)
+    if stage_agents is None:
+        stage_agents = {stage: stages.create_stage_agent(stage, part_number) for stage in stages.STAGE_ORDER}
     
     # Load drawing content directly to pass as context
     try:
@@ -76,52 +211,44 @@ def create_manufacturing_crew(drawing_path: str) -> Crew:
         print(f"Error loading drawing file: {str(e)}")
         drawing_content = ""
     
-    # Tạo các task
-    analyze_drawing_task = agents.create_analyze_drawing_task(
-        design_analyzer, drawing_path
-    )
-    
-    material_selection_task = agents.create_material_selection_task(
-        material_specialist,
-        context=[analyze_drawing_task]
-    )
-    
-    tooling_selection_task = agents.create_tooling_selection_task(
-        tooling_specialist,
-        context=[analyze_drawing_task, material_selection_task]
-    )
-    
-    process_plan_task = agents.create_process_plan_task(
-        process_planner, 
-        context=[analyze_drawing_task, material_selection_task, tooling_selection_task]
-    )
-    
-    quality_review_task = agents.create_quality_review_task(
-        quality_controller,
-        context=[process_plan_task, material_selection_task, tooling_selection_task]
-    )
-    
-    finalize_plan_task = agents.create_finalize_plan_task(
-        orchestrator,
-        context=[process_plan_task, quality_review_task, material_selection_task, tooling_selection_task]
-    )
+    # Tạo các task theo thứ tự công đoạn, mỗi task nhận các task phía trước làm context
+    stage_tasks = {}
+    for stage in stages.STAGE_ORDER:
+        stage_tasks[stage] = stages.create_stage_task(
+            stage,
+            stage_agents[stage],
+            drawing_path,
+            context=[stage_tasks[dep] for dep in stages.STAGE_CONTEXT[stage]],
+            part_number=part_number
+        )
+        if stage_callback is not None:
+            stage_tasks[stage].callback = functools.partial(stage_callback, stage)
     
     # Tạo crew
     manufacturing_crew = Crew(
-        agents=[design_analyzer, material_specialist, tooling_specialist, process_planner, quality_controller, orchestrator],
-        tasks=[analyze_drawing_task, material_selection_task, tooling_selection_task, process_plan_task, quality_review_task, finalize_plan_task],
+        agents=list(stage_agents.values()),
+        tasks=list(stage_tasks.values()),
         verbose=config.VERBOSE,
         process=Process.sequential  # Chạy tuần tự
     )
     
     return manufacturing_crew
 
-def run_manufacturing_planning(drawing_path: str) -> Dict[str, Any]:
+def complete_stage(run_id: str, drawing_path: str, stage: str, output: str) -> None:
+    """Lưu output của công đoạn vào checkpoint và phát trực tiếp nếu đang bật chế độ phát trực tiếp"""
+    checkpoint.save_stage_output(run_id, stage, output)
+    streaming.stage_completed(drawing_path, stage, output, run_id=run_id)
+
+def run_manufacturing_planning(drawing_path: str, stage_agents: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Chạy quy trình lập kế hoạch sản xuất
     
+    Output của mỗi công đoạn được lưu vào checkpoint ngay khi hoàn thành, nên nếu
+    quy trình lỗi giữa chừng có thể tiếp tục bằng resume_manufacturing_planning.
+    
     Args:
         drawing_path: Đường dẫn đến file bản vẽ
+        stage_agents: Các tác tử đã tạo sẵn theo công đoạn (mặc định tạo mới)
         
     Returns:
         Dict chứa kế hoạch sản xuất
@@ -133,55 +260,355 @@ def run_manufacturing_planning(drawing_path: str) -> Dict[str, Any]:
         logger.error(f"Không tìm thấy file bản vẽ: {drawing_path}")
         raise FileNotFoundError(f"Không tìm thấy file bản vẽ: {drawing_path}")
     
-    # Tạo nhóm tác tử
-    crew = create_manufacturing_crew(drawing_path)
+    # Bản vẽ gửi lại y hệt (cùng catalog, prompt và cấu hình mô hình) nhận ngay kế hoạch đã lưu
+    plan_key, cached_plan = plan_cache.lookup(drawing_path)
+    if cached_plan is not None:
+        # Lần dùng lại không gọi LLM: kế hoạch giữ run_id và token_usage của lượt chạy đã lập nó (plan_cache.hit)
+        return cached_plan
     
-    try:
-        # Chạy quy trình
-        logger.info("Đang chạy các tác tử AI...")
-        result = crew.kickoff()
+    # Thông tin bản vẽ được lấy lúc bắt đầu lập kế hoạch và lưu cùng kế hoạch
+    drawing_info = plan_index.drawing_metadata(drawing_path)
+    run_id = checkpoint.create_checkpoint(drawing_path)
+    streaming.current_run.set({"run_id": run_id, "drawing": drawing_path})
+    
+    # Task trong crew chạy tuần tự nên mỗi task kéo dài từ lúc task trước kết thúc
+    last_stage_end = {"time": time.perf_counter()}
+    
+    def save_stage(stage: str, task_output: Any) -> None:
+        now = time.perf_counter()
+        tracing.record_span(
+            f"stage:{stage}", last_stage_end["time"], now, category="stage",
+            stage=stage, agent_role=getattr(task_output, "agent", None), output_chars=len(task_output.raw)
+        )
+        last_stage_end["time"] = now
+        complete_stage(run_id, drawing_path, stage, task_output.raw)
+    
+    # Số token của kế hoạch chỉ tính các lời gọi LLM của lượt chạy này
+    with tracing.span("run", "run", drawing=drawing_path, run_id=run_id), token_usage.track_run(run_id):
+        try:
+            # Chạy quy trình
+            logger.info("Đang chạy các tác tử AI...")
+            if config.CONTEXT_COMPRESSION == "off" and not config.SKIP_ANALYZE_STAGE:
+                crew = create_manufacturing_crew(drawing_path, stage_callback=save_stage, stage_agents=stage_agents)
+                result = crew.kickoff()
+            else:
+                # Crew ghép nguyên văn output của các task phía trước vào context, nên khi nén
+                # context (hoặc thay công đoạn analyze_drawing bằng spec_parser) các công đoạn
+                # được chạy lần lượt
+                outputs = {}
+                for stage in stages.STAGE_ORDER:
+                    agent = stage_agents[stage] if stage_agents else None
+                    outputs[stage] = stages.execute_stage(stage, drawing_path, outputs, agent=agent)
+                    complete_stage(run_id, drawing_path, stage, outputs[stage])
+                result = outputs[stages.STAGE_ORDER[-1]]
+            checkpoint.update_status(run_id, "completed")
+            revisions.record_planned_revision(drawing_path, checkpoint.load_stage_outputs(run_id))
         
-        # Tạo cấu trúc dữ liệu kết quả
-        manufacturing_plan = {
-            "source_drawing": drawing_path,
-            "timestamp": utils.datetime.now().isoformat(),
-            "plan": result
-        }
+            # Tạo cấu trúc dữ liệu kết quả
+            manufacturing_plan = {
+                "source_drawing": drawing_path,
+                **drawing_info,
+                "run_id": run_id,
+                "timestamp": utils.datetime.now().isoformat(),
+                "plan": result,
+                "structured_plan": plan_model.structured_plan(result),
+                "token_usage": stages.stage_usage_report(run_id)
+            }
+            if plan_key is not None:
+                plan_cache.store_plan(plan_key, manufacturing_plan)
+        
+            logger.info("Đã hoàn thành quy trình lập kế hoạch sản xuất")
+            return manufacturing_plan
         
-        logger.info("Đã hoàn thành quy trình lập kế hoạch sản xuất")
-        return manufacturing_plan
+        except Exception as e:
+            checkpoint.update_status(run_id, "failed")
+            logger.error(f"Lỗi khi chạy quy trình: {str(e)}")
+            logger.error(f"Có thể tiếp tục lượt chạy với: --resume {run_id}")
+            raise
+
+def resume_manufacturing_planning(run_id: str) -> Dict[str, Any]:
+    """
+    Tiếp tục một lượt chạy từ checkpoint: tải output của các công đoạn đã hoàn thành
+    và chỉ chạy các công đoạn còn lại
+    
+    Args:
+        run_id: Mã lượt chạy cần tiếp tục
+        
+    Returns:
+        Dict chứa kế hoạch sản xuất
+    """
+    manifest = checkpoint.load_manifest(run_id)
+    drawing_path = manifest["drawing_path"]
+    outputs = checkpoint.load_stage_outputs(run_id)
+    remaining = [stage for stage in stages.STAGE_ORDER if stage not in outputs]
+    
+    logger.info(
+        f"Tiếp tục lượt chạy {run_id}: đã có {len(outputs)} công đoạn, "
+        f"còn lại: {', '.join(remaining) or 'không'}"
+    )
+    
+    if not os.path.exists(drawing_path):
+        logger.error(f"Không tìm thấy file bản vẽ: {drawing_path}")
+        raise FileNotFoundError(f"Không tìm thấy file bản vẽ: {drawing_path}")
+    
+    drawing_info = plan_index.drawing_metadata(drawing_path)
+    checkpoint.update_status(run_id, "running")
+    streaming.current_run.set({"run_id": run_id, "drawing": drawing_path})
+    with token_usage.track_run(run_id):
+        try:
+            for stage in remaining:
+                outputs[stage] = stages.execute_stage(stage, drawing_path, outputs)
+                complete_stage(run_id, drawing_path, stage, outputs[stage])
+            checkpoint.update_status(run_id, "completed")
+            revisions.record_planned_revision(drawing_path, outputs)
+        except Exception as e:
+            checkpoint.update_status(run_id, "failed")
+            logger.error(f"Lỗi khi chạy quy trình: {str(e)}")
+            logger.error(f"Có thể tiếp tục lượt chạy với: --resume {run_id}")
+            raise
+        usage = stages.stage_usage_report(run_id)
+    
+    logger.info("Đã hoàn thành quy trình lập kế hoạch sản xuất")
+    return {
+        "source_drawing": drawing_path,
+        **drawing_info,
+        "run_id": run_id,
+        "timestamp": utils.datetime.now().isoformat(),
+        "plan": outputs[stages.STAGE_ORDER[-1]],
+        "structured_plan": plan_model.structured_plan(outputs[stages.STAGE_ORDER[-1]]),
+        "stage_outputs": outputs,
+        "token_usage": usage
+    }
+
+def run_incremental_planning(drawing_path: str) -> Dict[str, Any]:
+    """
+    Lập lại kế hoạch cho phiên bản mới của bản vẽ: so sánh từng phần với phiên bản
+    đã lập kế hoạch gần nhất, chỉ chạy lại các công đoạn bị ảnh hưởng và dùng lại
+    output đã lưu cho các công đoạn còn lại
+    
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
         
+    Returns:
+        Dict chứa kế hoạch sản xuất
+    """
+    if not os.path.exists(drawing_path):
+        logger.error(f"Không tìm thấy file bản vẽ: {drawing_path}")
+        raise FileNotFoundError(f"Không tìm thấy file bản vẽ: {drawing_path}")
+    
+    drawing_text = utils.load_drawing_file(drawing_path)
+    part_number = revisions.get_part_number(drawing_text, drawing_path)
+    previous = revisions.load_revision_state(part_number)
+    if previous is None:
+        logger.info(f"Chưa có phiên bản nào của {part_number} được lập kế hoạch, chạy toàn bộ quy trình")
+        return run_manufacturing_planning(drawing_path)
+    
+    changes = revisions.diff_revision(drawing_text, previous)
+    logger.info(
+        f"So với phiên bản {previous.get('revision')}: các phần thay đổi: "
+        f"{', '.join(changes['changed_sections']) or 'không'}; "
+        f"chạy lại: {', '.join(changes['stages_to_run']) or 'không'}"
+    )
+    
+    drawing_info = plan_index.drawing_metadata(drawing_path)
+    # Lưu output dùng lại vào checkpoint để có thể --resume nếu công đoạn chạy lại bị lỗi
+    run_id = checkpoint.create_checkpoint(drawing_path)
+    streaming.current_run.set({"run_id": run_id, "drawing": drawing_path})
+    outputs = {}
+    for stage in stages.STAGE_ORDER:
+        if stage not in changes["stages_to_run"]:
+            outputs[stage] = previous["stage_outputs"][stage]
+            complete_stage(run_id, drawing_path, stage, outputs[stage])
+    
+    with token_usage.track_run(run_id):
+        try:
+            for stage in changes["stages_to_run"]:
+                outputs[stage] = stages.execute_stage(stage, drawing_path, outputs)
+                complete_stage(run_id, drawing_path, stage, outputs[stage])
+            checkpoint.update_status(run_id, "completed")
+            revisions.record_planned_revision(drawing_path, outputs)
+        except Exception as e:
+            checkpoint.update_status(run_id, "failed")
+            logger.error(f"Lỗi khi chạy quy trình: {str(e)}")
+            logger.error(f"Có thể tiếp tục lượt chạy với: --resume {run_id}")
+            raise
+        usage = stages.stage_usage_report(run_id)
+    
+    logger.info("Đã hoàn thành quy trình lập kế hoạch sản xuất")
+    return {
+        "source_drawing": drawing_path,
+        **drawing_info,
+        "run_id": run_id,
+        "timestamp": utils.datetime.now().isoformat(),
+        "plan": outputs[stages.STAGE_ORDER[-1]],
+        "structured_plan": plan_model.structured_plan(outputs[stages.STAGE_ORDER[-1]]),
+        "stage_outputs": outputs,
+        "token_usage": usage,
+        "incremental": {
+            "previous_revision": previous.get("revision"),
+            "changed_sections": changes["changed_sections"],
+            "rerun_stages": changes["stages_to_run"]
+        }
+    }
+
+def run_batch_mode(args):
+    """Chạy lập kế hoạch hàng loạt và hiển thị tóm tắt lô"""
+    try:
+        drawing_paths = batch.collect_drawing_paths(args.batch)
+        if args.pipeline:
+            stage_concurrency = pipeline.parse_stage_concurrency(args.stage_concurrency)
+            summary = pipeline.StagePipeline(stage_concurrency).run(drawing_paths)
+        elif args.use_async:
+            summary = asyncio.run(async_planner.run_batch_async(
+                drawing_paths, concurrency=args.concurrency, llm_concurrency=args.llm_concurrency
+            ))
+        else:
+            summary = batch.run_batch(drawing_paths, run_manufacturing_planning, concurrency=args.concurrency)
     except Exception as e:
-        logger.error(f"Lỗi khi chạy quy trình: {str(e)}")
-        raise
+        logger.error(f"Lỗi: {str(e)}")
+        print(f"Đã xảy ra lỗi: {str(e)}")
+        sys.exit(1)
+    
+    # Hiển thị tóm tắt
+    print("\n===== TÓM TẮT LẬP KẾ HOẠCH HÀNG LOẠT =====")
+    print(f"Số bản vẽ: {summary['total']} (thành công: {summary['succeeded']}, lỗi: {summary['failed']})")
+    if args.pipeline:
+        print(f"Thời gian thực: {summary['wall_time_seconds']}s, công đoạn nghẽn: {summary['bottleneck_stage']}")
+        for stage, report in summary["stages"].items():
+            print(
+                f"  - {stage}: {report['workers']} luồng, sử dụng {report['utilization']:.0%}, "
+                f"chờ trung bình {report['mean_queue_wait_seconds']}s"
+            )
+    else:
+        print(f"Thời gian thực: {summary['wall_time_seconds']}s, tăng tốc: {summary['speedup']}x")
+        print(f"Độ trễ trung bình mỗi bản vẽ: {summary['mean_latency_seconds']}s")
+    for record in summary["drawings"]:
+        if record["status"] != "succeeded":
+            print(f"  - Lỗi {record['source_drawing']}: {record['error']}")
+    print(f"Tóm tắt lô đã lưu vào: {summary['summary_path']}")
+    if args.export_parquet:
+        import plan_export
+        plan_export.export_plan_files(
+            [record["output_path"] for record in summary["drawings"] if record.get("output_path")],
+            partition_by=config.PARQUET_PARTITION_BY
+        )
+        print(f"Đã ghi thêm các kế hoạch vào bộ dữ liệu Parquet: {config.PARQUET_EXPORT_PATH}")
+    if config.TRACING:
+        print(f"File trace: {tracing.export_chrome_trace(tracing.trace_path_for(summary['summary_path']))}")
+    
+    if summary["failed"]:
+        sys.exit(1)
 
 def main():
     """Hàm chính của ứng dụng"""
     # Xử lý tham số dòng lệnh
     args = parse_arguments()
     
+    if args.profile_startup:
+        import startup_profile
+        startup_profile.print_startup_report()
+        return
+    
+    config.setup_logging()
+    
     # Ghi đè cấu hình nếu được chỉ định
     if args.verbose:
         config.VERBOSE = True
+    if args.llm_cache:
+        config.LLM_CACHE_MODE = args.llm_cache
+    if args.plan_cache:
+        config.PLAN_CACHE = True
+    if args.context_compression:
+        config.CONTEXT_COMPRESSION = args.context_compression
+    if args.trace:
+        config.TRACING = True
+    if args.skip_analysis:
+        config.SKIP_ANALYZE_STAGE = True
+    if args.stream or config.STREAM_OUTPUT:
+        config.STREAM_OUTPUT = True
+        # Token của nhiều bản vẽ chạy đồng thời xen kẽ nhau nên chỉ in ra màn hình khi chạy một bản vẽ
+        streaming.open_stream(args.stream_path, echo_tokens=not args.batch)
+    
+    if args.batch:
+        try:
+            run_batch_mode(args)
+        finally:
+            streaming.close_stream()
+        return
     
     try:
         # Chạy quy trình lập kế hoạch sản xuất
-        manufacturing_plan = run_manufacturing_planning(args.drawing)
+        if args.resume:
+            manufacturing_plan = resume_manufacturing_planning(args.resume)
+        elif args.incremental:
+            manufacturing_plan = run_incremental_planning(args.drawing)
+        elif args.use_async:
+            manufacturing_plan = asyncio.run(async_planner.run_manufacturing_planning_async(args.drawing))
+        else:
+            manufacturing_plan = run_manufacturing_planning(args.drawing)
         
         # Lưu kết quả
         output_path = utils.save_data(manufacturing_plan, args.output)
+        streaming.emit(
+            "plan_saved",
+            run_id=manufacturing_plan["run_id"],
+            drawing=manufacturing_plan["source_drawing"],
+            output_path=output_path
+        )
         print(f"\nĐã lưu kế hoạch sản xuất vào: {output_path}")
+        if args.export_parquet:
+            import plan_export
+            plan_export.export_plan_files([output_path], partition_by=config.PARQUET_PARTITION_BY)
+            print(f"Đã ghi thêm kế hoạch vào bộ dữ liệu Parquet: {config.PARQUET_EXPORT_PATH}")
         
         # Hiển thị tóm tắt
         print("\n===== TÓM TẮT KẾ HOẠCH SẢN XUẤT =====")
-        print(f"Bản vẽ nguồn: {args.drawing}")
+        print(f"Bản vẽ nguồn: {manufacturing_plan['source_drawing']}")
+        print(f"Mã lượt chạy: {manufacturing_plan['run_id']}")
         print(f"Kết quả:")
         print(manufacturing_plan["plan"])
         
+        if config.LLM_CACHE_MODE != "off":
+            stats = llm_cache.cache_stats()
+            print(f"Bộ nhớ đệm LLM ({stats['mode']}): {stats['hits']} trúng, {stats['misses']} trượt")
+        if config.PLAN_CACHE:
+            stats = plan_cache.cache_stats()
+            print(
+                f"Kho kế hoạch: {stats['hits']} trúng, {stats['misses']} trượt, "
+                f"{stats['entries']} kế hoạch ({stats['bytes'] / 1024 / 1024:.1f} MB, loại bỏ {stats['evictions']})"
+            )
+        
+        usage = manufacturing_plan["token_usage"]
+        print(
+            f"Token: {usage['prompt_tokens']} prompt, {usage['completion_tokens']} completion, "
+            f"tiết kiệm {usage['context_tokens_saved']} token context (nén: {usage['context_compression']})"
+        )
+        for stage, entry in usage["stages"].items():
+            if entry["llm_calls"]:
+                print(
+                    f"  - {stage}: {entry['prompt_tokens']} prompt / {entry['completion_tokens']} completion, "
+                    f"{entry['llm_calls']} lần gọi, trung bình {entry['mean_llm_seconds']}s"
+                )
+        
+        import file_tools
+        tool_stats = file_tools.tool_stats()
+        print(
+            f"Đọc catalog: {tool_stats['calls']} lần gọi công cụ ({tool_stats['rejected']} bị từ chối), "
+            f"tỉ lệ trúng kho catalog {tool_stats['store']['hit_rate']:.0%}"
+        )
+        
+        if config.TRACING:
+            print(f"File trace: {tracing.export_chrome_trace(tracing.trace_path_for(output_path))}")
+            for category, entry in tracing.summarize().items():
+                print(f"  - {category}: {entry['count']} span, {entry['seconds']}s")
+        
     except Exception as e:
+        streaming.emit("run_failed", error=str(e))
         logger.error(f"Lỗi: {str(e)}")
         print(f"Đã xảy ra lỗi: {str(e)}")
         sys.exit(1)
+    finally:
+        streaming.close_stream()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""
+Trích xuất văn bản PDF theo trang: chia khoảng trang cho nhóm tiến trình, lưu văn bản từng trang
+vào bộ nhớ đệm trên đĩa theo mã băm nội dung file, và trả trang theo thứ tự ngay khi trích xuất xong
+"""
+
+import os
+import time
+import hashlib
+import logging
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+import config
+import tracing
+from disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+_store: Optional[DiskCache] = None
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_lock = threading.Lock()
+
+def get_page_cache() -> Optional[DiskCache]:
+    """Kho đệm văn bản trang PDF dùng chung (None nếu PDF_CACHE tắt)"""
+    global _store
+
+    if not config.PDF_CACHE:
+        return None
+    with _lock:
+        if _store is None:
+            _store = DiskCache(config.PDF_CACHE_PATH, max_bytes=int(config.PDF_CACHE_MAX_MB * 1024 * 1024))
+        return _store
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Nhóm tiến trình trích xuất dùng chung, một nhóm cho mỗi số tiến trình
+
+    Nhóm cũ không bị đóng khi có lời gọi dùng số tiến trình khác, vì lời gọi đang chạy song song
+    có thể vẫn còn task trên đó. Tiến trình con được khởi tạo bằng "spawn" thay vì fork: tiến trình
+    chính có nhiều luồng (dịch vụ, lô) nên fork có thể sao chép một khóa đang bị giữ.
+    """
+    with _lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pools[workers]
+
+def file_digest(file_path: str) -> str:
+    """Mã băm SHA-256 nội dung file (khóa đệm không đổi khi file được đổi tên hay sao chép)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _page_key(digest: str, page: int) -> str:
+    return f"pdf:{digest}:{page}"
+
+def page_count(file_path: str) -> int:
+    """Số trang của file PDF"""
+    import fitz
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """
+    Trích xuất văn bản các trang [start, stop) (chạy trong tiến trình con của nhóm tiến trình)
+
+    Args:
+        file_path: Đường dẫn file PDF
+        start: Trang đầu (đánh số từ 0)
+        stop: Trang cuối (không bao gồm)
+
+    Returns:
+        Danh sách văn bản theo trang
+    """
+    # PyMuPDF chỉ được nạp khi cần đọc PDF
+    import fitz
+    with fitz.open(file_path) as doc:
+        return [doc.load_page(page).get_text() for page in range(start, stop)]
+
+def iter_pdf_pages(file_path: str, workers: int = None, pages_per_task: int = None,
+                   stats: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Trả lần lượt (số trang, văn bản) theo thứ tự trang ngay khi trang được trích xuất
+
+    Trang đã có trong bộ nhớ đệm được trả ngay; các khoảng trang còn thiếu được gửi cùng lúc cho
+    nhóm tiến trình, nên việc phân tích các trang đầu có thể bắt đầu trước khi đọc xong cả file.
+
+    Args:
+        file_path: Đường dẫn file PDF
+        workers: Số tiến trình (mặc định PDF_EXTRACT_WORKERS; 0 = số CPU, 1 = trong tiến trình hiện tại)
+        pages_per_task: Số trang mỗi khoảng gửi cho một tiến trình (mặc định PDF_PAGES_PER_TASK)
+        stats: Dict nhận thống kê pages, cached_pages, seconds, pages_per_second khi duyệt xong
+
+    Yields:
+        (số trang đánh số từ 0, văn bản trang)
+    """
+    started = time.perf_counter()
+    workers = config.PDF_EXTRACT_WORKERS if workers is None else workers
+    workers = workers or os.cpu_count() or 1
+    pages_per_task = max(1, pages_per_task or config.PDF_PAGES_PER_TASK)
+
+    store = get_page_cache()
+    digest = file_digest(file_path)
+    count = store.get(f"pdf:{digest}:pages") if store is not None else None
+    total = int(count) if count is not None else page_count(file_path)
+    if store is not None and count is None:
+        store.set(f"pdf:{digest}:pages", str(total).encode('utf-8'))
+
+    cached: Dict[int, str] = {}
+    if store is not None:
+        for page in range(total):
+            value = store.get(_page_key(digest, page))
+            if value is not None:
+                cached[page] = value.decode('utf-8')
+
+    ranges = []
+    for start in range(0, total, pages_per_task):
+        stop = min(start + pages_per_task, total)
+        if any(page not in cached for page in range(start, stop)):
+            ranges.append((start, stop))
+
+    # Tài liệu chỉ có một khoảng trang thì trích xuất ngay, không tốn chi phí gửi sang tiến trình con
+    pending = {}
+    if workers > 1 and len(ranges) > 1:
+        pool = _get_pool(workers)
+        pending = {start: pool.submit(extract_page_range, file_path, start, stop) for start, stop in ranges}
+    missing = dict(ranges)
+
+    for start in range(0, total, pages_per_task):
+        stop = min(start + pages_per_task, total)
+        if start in missing:
+            future = pending.get(start)
+            texts = future.result() if future is not None else extract_page_range(file_path, start, stop)
+            for page, text in enumerate(texts, start):
+                if store is not None:
+                    store.set(_page_key(digest, page), text.encode('utf-8'))
+                yield page, text
+        else:
+            for page in range(start, stop):
+                yield page, cached[page]
+
+    elapsed = time.perf_counter() - started
+    if stats is not None:
+        stats.update({
+            "pages": total,
+            "cached_pages": len(cached),
+            "workers": workers if pending else 1,
+            "seconds": round(elapsed, 4),
+            "pages_per_second": round(total / elapsed, 1) if elapsed > 0 else 0.0
+        })
+
+def extract_pdf_text(file_path: str, workers: int = None, pages_per_task: int = None) -> str:
+    """
+    Trích xuất toàn bộ văn bản của file PDF (xem iter_pdf_pages) và ghi nhận tốc độ trang/giây
+
+    Args:
+        file_path: Đường dẫn file PDF
+        workers: Số tiến trình trích xuất
+        pages_per_task: Số trang mỗi khoảng gửi cho một tiến trình
+
+    Returns:
+        Văn bản các trang nối theo thứ tự
+    """
+    stats: Dict[str, Any] = {}
+    with tracing.span("extract_pdf", "io", path=file_path) as span:
+        text = "".join(page_text for _, page_text in iter_pdf_pages(file_path, workers, pages_per_task, stats))
+        span.set(**stats)
+    logger.info(
+        f"Đã trích xuất {stats['pages']} trang PDF ({stats['cached_pages']} từ bộ nhớ đệm) trong "
+        f"{stats['seconds']}s ({stats['pages_per_second']} trang/giây): {file_path}"
+    )
+    return text
+
+def main():
+    """Trích xuất văn bản một hoặc nhiều file PDF và báo cáo tốc độ trang/giây"""
+    parser = argparse.ArgumentParser(description='Trích xuất văn bản PDF song song, có bộ nhớ đệm theo trang')
+    parser.add_argument('paths', nargs='+', help='Các file PDF')
+    parser.add_argument('--workers', '-j', type=int, default=None, help='Số tiến trình (0 = số CPU)')
+    parser.add_argument('--pages-per-task', type=int, default=None, help='Số trang mỗi khoảng gửi cho một tiến trình')
+    parser.add_argument('--no-cache', action='store_true', help='Không dùng bộ nhớ đệm văn bản trang')
+    args = parser.parse_args()
+
+    if args.no_cache:
+        config.PDF_CACHE = False
+
+    total_pages = 0
+    started = time.perf_counter()
+    for path in args.paths:
+        stats: Dict[str, Any] = {}
+        for _ in iter_pdf_pages(path, args.workers, args.pages_per_task, stats):
+            pass
+        total_pages += stats["pages"]
+        print(
+            f"{path}: {stats['pages']} trang ({stats['cached_pages']} từ bộ nhớ đệm), {stats['workers']} tiến trình, "
+            f"{stats['seconds']}s ({stats['pages_per_second']} trang/giây)"
+        )
+    elapsed = time.perf_counter() - started
+    if len(args.paths) > 1:
+        print(f"Tổng: {total_pages} trang trong {elapsed:.3f}s ({total_pages / elapsed if elapsed else 0:.1f} trang/giây)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Bộ lập lịch dạng đường ống: chạy các công đoạn cho nhiều bản vẽ gối đầu nhau
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional
+import config
+import utils
+import stages
+import plan_model
+import plan_index
+import checkpoint
+import streaming
+import token_usage
+
+logger = logging.getLogger(__name__)
+
+# Tín hiệu dừng cho các luồng làm việc
+_STOP = object()
+
+def parse_stage_concurrency(spec: Optional[str], default: int = None) -> Dict[str, int]:
+    """
+    Phân tích cấu hình số luồng cho từng công đoạn
+
+    Args:
+        spec: Chuỗi dạng "process_plan=4,finalize_plan=2"; công đoạn không nêu dùng giá trị mặc định
+        default: Số luồng mặc định cho mỗi công đoạn
+
+    Returns:
+        Dict số luồng theo tên công đoạn
+    """
+    default = max(1, default or config.PIPELINE_DEFAULT_STAGE_CONCURRENCY)
+    concurrency = {stage: default for stage in stages.STAGE_ORDER}
+
+    for item in (spec or "").split(','):
+        item = item.strip()
+        if not item:
+            continue
+        stage, _, value = item.partition('=')
+        stage = stage.strip()
+        if stage not in concurrency:
+            raise ValueError(f"Công đoạn không hợp lệ: {stage} (hợp lệ: {', '.join(stages.STAGE_ORDER)})")
+        concurrency[stage] = max(1, int(value))
+
+    return concurrency
+
+class StagePipeline:
+    """
+    Mỗi công đoạn là một nhóm luồng có hàng đợi riêng; bản vẽ đi qua các công đoạn theo thứ tự,
+    nên công đoạn k của bản vẽ A có thể chạy cùng lúc với công đoạn k+1 của bản vẽ B.
+    """
+
+    def __init__(self, stage_concurrency: Dict[str, int],
+                 stage_fn: Callable[..., str] = stages.execute_stage):
+        """
+        Args:
+            stage_concurrency: Số luồng cho từng công đoạn
+            stage_fn: Hàm thực thi một công đoạn (stage, drawing_path, outputs, agent, part_number) -> output
+        """
+        self.stage_concurrency = {stage: stage_concurrency.get(stage, 1) for stage in stages.STAGE_ORDER}
+        self.stage_fn = stage_fn
+        self._queues = {stage: queue.Queue() for stage in stages.STAGE_ORDER}
+        self._done = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {
+            stage: {"busy_seconds": 0.0, "wait_seconds": 0.0, "completed": 0, "failed": 0}
+            for stage in stages.STAGE_ORDER
+        }
+
+    def _next_queue(self, stage: str) -> queue.Queue:
+        index = stages.STAGE_ORDER.index(stage)
+        if index + 1 < len(stages.STAGE_ORDER):
+            return self._queues[stages.STAGE_ORDER[index + 1]]
+        return self._done
+
+    def _worker(self, stage: str) -> None:
+        """Vòng lặp của một luồng làm việc trong công đoạn"""
+        # Mỗi luồng giữ tác tử riêng theo mã chi tiết và dùng lại cho các bản vẽ nó xử lý
+        agents_by_part = {}
+        inbox = self._queues[stage]
+        outbox = self._next_queue(stage)
+
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                break
+
+            if job["error"] is None:
+                started = time.perf_counter()
+                waited = started - job["enqueued_at"]
+                try:
+                    streaming.current_run.set({"run_id": job["run_id"], "drawing": job["drawing_path"]})
+                    token_usage.current_run_id.set(job["run_id"])
+                    part_number = job["part_number"]
+                    if part_number not in agents_by_part:
+                        agents_by_part[part_number] = stages.create_stage_agent(stage, part_number)
+                    job["outputs"][stage] = self.stage_fn(
+                        stage, job["drawing_path"], job["outputs"],
+                        agent=agents_by_part[part_number], part_number=part_number
+                    )
+                    checkpoint.save_stage_output(job["run_id"], stage, job["outputs"][stage])
+                    streaming.stage_completed(job["drawing_path"], stage, job["outputs"][stage], run_id=job["run_id"])
+                    failed = False
+                except Exception as e:
+                    logger.error(f"Lỗi ở công đoạn {stage} cho bản vẽ {job['drawing_path']}: {str(e)}")
+                    job["error"] = f"{stage}: {str(e)}"
+                    failed = True
+                elapsed = time.perf_counter() - started
+
+                job["stage_seconds"][stage] = round(elapsed, 3)
+                with self._lock:
+                    stats = self._stats[stage]
+                    stats["busy_seconds"] += elapsed
+                    stats["wait_seconds"] += waited
+                    stats["failed" if failed else "completed"] += 1
+
+            job["enqueued_at"] = time.perf_counter()
+            outbox.put(job)
+
+    def run(self, drawing_paths: List[str], output_dir: str = None) -> Dict[str, Any]:
+        """
+        Đưa các bản vẽ qua đường ống và chờ tất cả hoàn thành
+
+        Args:
+            drawing_paths: Danh sách đường dẫn bản vẽ
+            output_dir: Thư mục lưu kết quả; mặc định là một thư mục pipeline mới trong DATA_PATH
+
+        Returns:
+            Dict tóm tắt: thời gian thực, kết quả từng bản vẽ và mức sử dụng từng công đoạn
+        """
+        started_at = datetime.now()
+        if output_dir is None:
+            output_dir = os.path.join(config.DATA_PATH, f"pipeline_{started_at.strftime('%Y%m%d_%H%M%S')}")
+        os.makedirs(output_dir, exist_ok=True)
+
+        logger.info(
+            f"Bắt đầu đường ống cho {len(drawing_paths)} bản vẽ, số luồng mỗi công đoạn: {self.stage_concurrency}"
+        )
+
+        threads = []
+        for stage in stages.STAGE_ORDER:
+            for i in range(self.stage_concurrency[stage]):
+                thread = threading.Thread(target=self._worker, args=(stage,), name=f"{stage}-{i}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        wall_start = time.perf_counter()
+        first_queue = self._queues[stages.STAGE_ORDER[0]]
+        for index, path in enumerate(drawing_paths):
+            # Mỗi bản vẽ có checkpoint riêng như một lượt chạy đơn lẻ (có thể --resume nếu lỗi)
+            first_queue.put({
+                "index": index,
+                "run_id": checkpoint.create_checkpoint(path),
+                "drawing_path": path,
+                "part_number": stages.get_drawing_part_number(path),
+                "drawing_info": plan_index.drawing_metadata(path),
+                "outputs": {},
+                "stage_seconds": {},
+                "error": None,
+                "submitted_at": time.perf_counter(),
+                "enqueued_at": time.perf_counter()
+            })
+
+        records = []
+        for _ in drawing_paths:
+            job = self._done.get()
+            records.append(self._save_result(job, output_dir))
+            logger.info(
+                f"[{len(records)}/{len(drawing_paths)}] {job['drawing_path']}: {records[-1]['status']}"
+            )
+        wall_time = time.perf_counter() - wall_start
+
+        # Dừng các luồng làm việc
+        for stage in stages.STAGE_ORDER:
+            for _ in range(self.stage_concurrency[stage]):
+                self._queues[stage].put(_STOP)
+        for thread in threads:
+            thread.join()
+
+        records.sort(key=lambda r: r["index"])
+        stage_report = self._stage_report(wall_time)
+        bottleneck = max(stage_report, key=lambda stage: stage_report[stage]["utilization"]) if records else None
+
+        summary = {
+            "started_at": started_at.isoformat(),
+            "finished_at": datetime.now().isoformat(),
+            "total": len(records),
+            "succeeded": sum(1 for r in records if r["status"] == "succeeded"),
+            "failed": sum(1 for r in records if r["status"] != "succeeded"),
+            "wall_time_seconds": round(wall_time, 3),
+            "stage_concurrency": self.stage_concurrency,
+            "stages": stage_report,
+            "bottleneck_stage": bottleneck,
+            "token_usage": stages.stage_usage_report(),
+            "output_dir": output_dir,
+            "drawings": records
+        }
+        summary["summary_path"] = utils.save_data(summary, "pipeline_summary.json", directory=output_dir)
+        logger.info(f"Hoàn thành đường ống trong {summary['wall_time_seconds']}s, công đoạn nghẽn: {bottleneck}")
+        return summary
+
+    def _save_result(self, job: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+        """Lưu kế hoạch của một bản vẽ đã đi hết đường ống"""
+        # Số token các luồng công đoạn đã ghi cho lượt chạy của bản vẽ này
+        usage = stages.stage_usage_report(job["run_id"])
+        token_usage.release_run(job["run_id"])
+        record = {
+            "index": job["index"],
+            "source_drawing": job["drawing_path"],
+            "status": "failed" if job["error"] else "succeeded",
+            "error": job["error"],
+            "output_path": None,
+            "latency_seconds": round(time.perf_counter() - job["submitted_at"], 3),
+            "stage_seconds": job["stage_seconds"]
+        }
+
+        if job["error"] is None:
+            checkpoint.update_status(job["run_id"], "completed")
+            manufacturing_plan = {
+                "source_drawing": job["drawing_path"],
+                **job["drawing_info"],
+                "run_id": job["run_id"],
+                "timestamp": datetime.now().isoformat(),
+                "plan": job["outputs"][stages.STAGE_ORDER[-1]],
+                "structured_plan": plan_model.structured_plan(job["outputs"][stages.STAGE_ORDER[-1]]),
+                "stage_outputs": job["outputs"],
+                "token_usage": usage
+            }
+            stem = os.path.splitext(os.path.basename(job["drawing_path"]))[0]
+            record["output_path"] = utils.save_data(
+                manufacturing_plan, f"{job['index']:04d}_{stem}_plan.json", directory=output_dir
+            )
+            streaming.emit("plan_saved", run_id=job["run_id"], drawing=job["drawing_path"], output_path=record["output_path"])
+        else:
+            checkpoint.update_status(job["run_id"], "failed")
+            logger.error(f"Có thể tiếp tục lượt chạy với: --resume {job['run_id']}")
+            streaming.emit("run_failed", run_id=job["run_id"], drawing=job["drawing_path"], error=job["error"])
+
+        return record
+
+    def _stage_report(self, wall_time: float) -> Dict[str, Dict[str, Any]]:
+        """Mức sử dụng mỗi công đoạn = thời gian bận / (số luồng × thời gian thực)"""
+        report = {}
+        for stage in stages.STAGE_ORDER:
+            stats = self._stats[stage]
+            workers = self.stage_concurrency[stage]
+            processed = stats["completed"] + stats["failed"]
+            report[stage] = {
+                "workers": workers,
+                "completed": stats["completed"],
+                "failed": stats["failed"],
+                "busy_seconds": round(stats["busy_seconds"], 3),
+                "mean_service_seconds": round(stats["busy_seconds"] / processed, 3) if processed else 0.0,
+                "mean_queue_wait_seconds": round(stats["wait_seconds"] / processed, 3) if processed else 0.0,
+                "utilization": round(stats["busy_seconds"] / (workers * wall_time), 4) if wall_time > 0 else 0.0
+            }
+        return report
@@ -0,0 +1,155 @@
+"""
+Kho kế hoạch sản xuất định địa chỉ theo nội dung: kế hoạch được lưu theo mã băm của văn bản bản vẽ,
+các file catalog của mã chi tiết, mã nguồn prompt trong agents.py và cấu hình mô hình, nên bản vẽ
+gửi lại y hệt nhận ngay kế hoạch đã lưu, còn mọi thay đổi đầu vào tự động tạo khóa mới
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+import config
+import utils
+import catalog_registry
+from disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi cấu trúc kế hoạch thay đổi để bỏ qua các mục cũ
+PLAN_CACHE_VERSION = 1
+
+# File mã nguồn chứa prompt của các tác tử và task
+PROMPT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agents.py")
+
+# Cấu hình ảnh hưởng tới nội dung kế hoạch
+KEY_SETTINGS = (
+    "DEFAULT_MODEL", "TEMPERATURE", "MAX_ITERATIONS", "OPENAI_BASE_URL", "CATALOG_INJECTION",
+    "CONTEXT_COMPRESSION", "CONTEXT_TOKEN_BUDGET", "SKIP_ANALYZE_STAGE", "STRUCTURED_PLAN"
+)
+
+_store: Optional[DiskCache] = None
+_store_lock = threading.Lock()
+
+def get_plan_store() -> Optional[DiskCache]:
+    """
+    Lấy kho kế hoạch dùng chung (khởi tạo lần đầu khi cần)
+
+    Returns:
+        DiskCache hoặc None nếu PLAN_CACHE tắt
+    """
+    global _store
+
+    if not config.PLAN_CACHE:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = DiskCache(
+                config.PLAN_CACHE_PATH,
+                max_bytes=int(config.PLAN_CACHE_MAX_MB * 1024 * 1024),
+                max_age_seconds=config.PLAN_CACHE_MAX_AGE_HOURS * 3600
+            )
+            logger.info(f"Đã bật kho kế hoạch theo nội dung: {config.PLAN_CACHE_PATH}")
+        return _store
+
+def plan_key(drawing_path: str) -> str:
+    """
+    Khóa nội dung của kế hoạch cho một bản vẽ
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+
+    Returns:
+        Khóa dạng "plan:v<phiên bản>:<sha256>"
+    """
+    digest = hashlib.sha256()
+
+    def update(label: str, data: bytes) -> None:
+        digest.update(label.encode('utf-8'))
+        digest.update(b"\x00")
+        digest.update(data)
+        digest.update(b"\x00")
+
+    drawing_text = utils.load_drawing_file(drawing_path)
+    update("drawing", drawing_text.encode('utf-8'))
+
+    part_number = utils.extract_part_number(drawing_text)
+    catalogs = catalog_registry.resolve_catalogs(part_number) if part_number else {}
+    for kind in sorted(catalogs):
+        with open(catalogs[kind], 'rb') as f:
+            update(f"catalog:{kind}", f.read())
+
+    with open(PROMPT_SOURCE, 'rb') as f:
+        update("prompts", f.read())
+
+    settings = {name: getattr(config, name, None) for name in KEY_SETTINGS}
+    update("settings", json.dumps(settings, sort_keys=True).encode('utf-8'))
+    return f"plan:v{PLAN_CACHE_VERSION}:{digest.hexdigest()}"
+
+def get_plan(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Lấy kế hoạch đã lưu theo khóa nội dung
+
+    Args:
+        key: Khóa nội dung (xem plan_key)
+
+    Returns:
+        Kế hoạch đã lưu (kèm "plan_cache" mô tả lần trúng) hoặc None nếu chưa có hay kho bị tắt
+    """
+    store = get_plan_store()
+    value = store.get(key) if store is not None else None
+    if value is None:
+        return None
+    plan = json.loads(value.decode('utf-8'))
+    plan["plan_cache"] = {"hit": True, "key": key, "cached_at": plan.get("timestamp")}
+    logger.info(f"Dùng kế hoạch đã lưu của lượt chạy {plan.get('run_id')} (khóa {key})")
+    return plan
+
+def store_plan(key: str, plan: Dict[str, Any]) -> None:
+    """
+    Lưu kế hoạch vào kho theo khóa nội dung
+
+    Args:
+        key: Khóa nội dung (xem plan_key)
+        plan: Kế hoạch sản xuất (dữ liệu JSON, cho phép CrewOutput qua utils.CustomJSONEncoder)
+    """
+    store = get_plan_store()
+    if store is None:
+        return
+    plan = {name: value for name, value in plan.items() if name != "plan_cache"}
+    store.set(key, json.dumps(plan, ensure_ascii=False, cls=utils.CustomJSONEncoder).encode('utf-8'))
+
+def lookup(drawing_path: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Tra cứu kế hoạch đã lưu cho một bản vẽ
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+
+    Returns:
+        (khóa nội dung, kế hoạch đã lưu với source_drawing và timestamp của lần gửi này);
+        kế hoạch là None nếu chưa có, cả hai là None nếu kho bị tắt
+    """
+    if get_plan_store() is None:
+        return None, None
+    key = plan_key(drawing_path)
+    plan = get_plan(key)
+    if plan is not None:
+        plan.update({"source_drawing": drawing_path, "timestamp": datetime.now().isoformat()})
+    return key, plan
+
+def cache_stats() -> Dict[str, Any]:
+    """
+    Thống kê sử dụng kho kế hoạch
+
+    Returns:
+        Dict thống kê (xem DiskCache.stats), hoặc {"enabled": False} nếu kho bị tắt
+    """
+    store = get_plan_store()
+    if store is None:
+        return {"enabled": False}
+    stats = store.stats()
+    stats["enabled"] = True
+    return stats
@@ -0,0 +1,379 @@
+"""
+Xuất kế hoạch sản xuất sang các bảng Parquet dạng cột (runs, stage_outputs, operations, tools,
+times, token_usage) để phân tích trên nhiều chi tiết mà chỉ đọc các cột cần dùng
+"""
+
+import os
+import glob
+import json
+import uuid
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Iterable
+import config
+import plan_model
+import checkpoint
+
+logger = logging.getLogger(__name__)
+
+# Các bảng được xuất; mọi bảng có run_id, part_number và date để nối và phân vùng
+TABLES = ("runs", "stage_outputs", "operations", "tools", "times", "token_usage")
+
+# Cột dùng để phân vùng thư mục (vd: runs/part_number=SC-2023-A001/...)
+PARTITION_COLUMNS = ("date", "part_number")
+
+# Lược đồ cố định của từng bảng (cột, kiểu): mọi lần ghi được ép về đúng lược đồ này để các file
+# của cùng một bảng luôn đọc chung được, kể cả khi một cột toàn rỗng trong một lần ghi
+KEY_COLUMNS = (("run_id", "string"), ("part_number", "string"), ("date", "string"))
+TABLE_COLUMNS = {
+    "runs": KEY_COLUMNS + (
+        ("source_drawing", "string"), ("drawing_hash", "string"), ("revision", "string"), ("material", "string"),
+        ("timestamp", "timestamp"), ("plan_chars", "int64"), ("plan_minutes", "float64"), ("cached", "bool"),
+        ("model", "string"), ("prompt_tokens", "int64"), ("completion_tokens", "int64"),
+        ("context_tokens_saved", "int64")
+    ),
+    "stage_outputs": KEY_COLUMNS + (("stage", "string"), ("output", "string"), ("output_chars", "int64")),
+    "operations": KEY_COLUMNS + (
+        ("sequence", "int64"), ("operation", "string"), ("setup", "string"), ("machine", "string"),
+        ("tool", "string"), ("cutting_speed", "float64"), ("feed", "float64"), ("depth_of_cut", "float64"),
+        ("spindle_speed", "float64"), ("minutes", "float64")
+    ),
+    "tools": KEY_COLUMNS + (
+        ("tool", "string"), ("tool_type", "string"), ("description", "string"), ("operations", "int64")
+    ),
+    "times": KEY_COLUMNS + (
+        ("setup", "string"), ("machine", "string"), ("operations", "int64"), ("minutes", "float64")
+    ),
+    "token_usage": KEY_COLUMNS + (
+        ("stage", "string"), ("llm_calls", "int64"), ("prompt_tokens", "int64"), ("completion_tokens", "int64"),
+        ("llm_seconds", "float64"), ("mean_llm_seconds", "float64"), ("context_tokens_original", "int64"),
+        ("context_tokens_sent", "int64"), ("context_tokens_saved", "int64"), ("compression_seconds", "float64")
+    )
+}
+
+def table_schema(table: str):
+    """Lược đồ pyarrow của một bảng (xem TABLE_COLUMNS)"""
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(), "int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us")
+    }
+    return pa.schema([(name, types[type_name]) for name, type_name in TABLE_COLUMNS[table]])
+
+def _plan_text(plan: Any) -> str:
+    """Văn bản kế hoạch (CrewOutput đã lưu JSON là dict có "raw")"""
+    if isinstance(plan, dict):
+        return plan.get("raw") or ""
+    return getattr(plan, "raw", None) or str(plan or "")
+
+def _structured_rows(keys: Dict[str, Any], structured: "plan_model.CompactPlan") -> Dict[str, List[Dict[str, Any]]]:
+    """Dòng các bảng operations, tools và times lấy từ kế hoạch có cấu trúc đã lập"""
+    rows: Dict[str, List[Dict[str, Any]]] = {"operations": [], "tools": [], "times": []}
+    for operation in sorted(structured.operations, key=lambda op: op.sequence):
+        rows["operations"].append({
+            **keys,
+            "sequence": operation.sequence,
+            "operation": operation.name,
+            "setup": operation.setup,
+            "machine": operation.machine,
+            "tool": operation.tool,
+            **{field: getattr(operation, field) for field in plan_model.CUTTING_FIELDS},
+            "minutes": operation.minutes
+        })
+
+    used: Dict[str, int] = {}
+    for operation in structured.operations:
+        used[operation.tool] = used.get(operation.tool, 0) + 1
+    for tool in structured.tools:
+        rows["tools"].append({
+            **keys, "tool": tool.id, "tool_type": tool.tool_type, "description": tool.description,
+            "operations": used.get(tool.id, 0)
+        })
+
+    machines = {setup.id: setup.machine for setup in structured.setups}
+    for setup, operations in structured.operations_by_setup().items():
+        rows["times"].append({
+            **keys,
+            "setup": setup,
+            "machine": machines.get(setup) or operations[0].machine,
+            "operations": len(operations),
+            "minutes": sum(operation.minutes or 0.0 for operation in operations)
+        })
+    return rows
+
+def plan_run_id(plan: Dict[str, Any]) -> str:
+    """
+    Mã lượt chạy của kế hoạch dùng làm khóa các bảng
+
+    Kế hoạch lưu không có run_id (file cũ) nhận mã ổn định suy ra từ bản vẽ và thời điểm lập, nên hai
+    kế hoạch khác nhau không bị coi là cùng một lượt chạy và xuất lại cùng file vẫn được bỏ qua.
+
+    Args:
+        plan: Kế hoạch sản xuất
+
+    Returns:
+        run_id, mã suy ra dạng "plan-<băm>", hoặc "" nếu kế hoạch không có cả thời điểm lập
+    """
+    if plan.get("run_id"):
+        return plan["run_id"]
+    if not plan.get("timestamp"):
+        return ""
+    source = plan.get("drawing_hash") or plan.get("source_drawing") or ""
+    return "plan-" + hashlib.sha256(f"{source}|{plan['timestamp']}".encode("utf-8")).hexdigest()[:16]
+
+def flatten_plan(plan: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Làm phẳng một kế hoạch thành các dòng của từng bảng
+
+    Output công đoạn lấy từ "stage_outputs" của kế hoạch, nếu không có thì từ checkpoint của lượt
+    chạy; nguyên công, dụng cụ và thời gian lấy từ kế hoạch có cấu trúc ("structured_plan", xem
+    plan_model), mã chi tiết và mã băm bản vẽ từ thông tin bản vẽ lưu cùng kế hoạch lúc lập
+    (xem plan_index.drawing_metadata). Bản vẽ nguồn không được đọc lại.
+
+    Args:
+        plan: Kế hoạch sản xuất (dict trả về từ run_manufacturing_planning hoặc file JSON đã lưu)
+
+    Returns:
+        Dict tên bảng -> danh sách dòng
+    """
+    drawing_path = plan.get("source_drawing") or ""
+    timestamp = plan.get("timestamp") or datetime.now().isoformat()
+    try:
+        structured = plan_model.load_plan(plan)
+    except Exception as e:
+        logger.warning(f"Không đọc được kế hoạch có cấu trúc của {drawing_path}: {str(e)}")
+        structured = None
+    part_number = plan.get("part_number") or (structured.part_number if structured is not None else None)
+    keys = {
+        "run_id": plan_run_id(plan),
+        "part_number": part_number or "unknown",
+        "date": timestamp[:10]
+    }
+
+    usage = plan.get("token_usage") or {}
+    tables: Dict[str, List[Dict[str, Any]]] = {table: [] for table in TABLES}
+    tables["runs"].append({
+        **keys,
+        "source_drawing": drawing_path,
+        "drawing_hash": plan.get("drawing_hash"),
+        "revision": plan.get("revision"),
+        "material": structured.material if structured is not None else None,
+        "timestamp": timestamp,
+        "plan_chars": len(_plan_text(plan.get("plan"))),
+        "plan_minutes": structured.total_minutes() if structured is not None else None,
+        "cached": bool((plan.get("plan_cache") or {}).get("hit")),
+        "model": usage.get("model"),
+        "prompt_tokens": int(usage.get("prompt_tokens", 0)),
+        "completion_tokens": int(usage.get("completion_tokens", 0)),
+        "context_tokens_saved": int(usage.get("context_tokens_saved", 0))
+    })
+
+    outputs = plan.get("stage_outputs") or (checkpoint.load_stage_outputs(plan["run_id"]) if plan.get("run_id") else {})
+    for stage, output in outputs.items():
+        tables["stage_outputs"].append({**keys, "stage": stage, "output": output, "output_chars": len(output)})
+
+    for stage, entry in (usage.get("stages") or {}).items():
+        tables["token_usage"].append({
+            **keys, "stage": stage,
+            **{name: value for name, value in entry.items() if isinstance(value, (int, float))}
+        })
+
+    if structured is not None:
+        for table, rows in _structured_rows(keys, structured).items():
+            tables[table].extend(rows)
+    else:
+        logger.info(f"Kế hoạch của {drawing_path} không có kế hoạch có cấu trúc, bỏ qua nguyên công, dụng cụ và thời gian")
+    return tables
+
+def _arrow_table(table: str, rows: List[Dict[str, Any]]):
+    """Bảng pyarrow của các dòng, ép về lược đồ cố định của bảng"""
+    import pyarrow as pa
+
+    schema = table_schema(table)
+    unknown = {name for row in rows for name in row} - set(schema.names)
+    if unknown:
+        logger.warning(f"Bỏ qua các cột không có trong lược đồ bảng {table}: {', '.join(sorted(unknown))}")
+
+    columns = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_timestamp(field.type):
+            values = [datetime.fromisoformat(value) if isinstance(value, str) else value for value in values]
+        columns.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def dataset_partitioning(output_dir: str) -> Optional[str]:
+    """
+    Cách phân vùng của bộ dữ liệu đã có, nhận ra từ các thư mục cột=giá trị và file Parquet
+
+    Args:
+        output_dir: Thư mục bộ dữ liệu
+
+    Returns:
+        Cột phân vùng, "" nếu không phân vùng hoặc None nếu chưa có dữ liệu
+    """
+    found = set()
+    for table in TABLES:
+        path = os.path.join(output_dir, table)
+        if not os.path.isdir(path):
+            continue
+        for name in os.listdir(path):
+            if name.endswith(".parquet"):
+                found.add("")
+            elif "=" in name and os.path.isdir(os.path.join(path, name)):
+                found.add(name.split("=", 1)[0])
+    if len(found) > 1:
+        raise ValueError(f"Bộ dữ liệu {output_dir} trộn nhiều cách phân vùng: {', '.join(sorted(name or 'không phân vùng' for name in found))}")
+    return found.pop() if found else None
+
+def _exported_run_ids(output_dir: str) -> set:
+    """run_id đã có trong bảng runs (chỉ đọc cột run_id)"""
+    if not os.path.isdir(os.path.join(output_dir, "runs")):
+        return set()
+    return set(read_table("runs", columns=["run_id"], output_dir=output_dir)["run_id"])
+
+def export_plans(plans: Iterable[Dict[str, Any]], output_dir: str = None,
+                 partition_by: Optional[str] = None) -> Dict[str, int]:
+    """
+    Ghi thêm các kế hoạch vào bộ dữ liệu Parquet
+
+    Mỗi lần ghi tạo file mới trong thư mục của từng bảng (và từng phân vùng), nên có thể ghi thêm
+    nhiều lần; lượt chạy đã có trong bảng runs được bỏ qua (theo plan_run_id; kế hoạch không xác định
+    được mã luôn được ghi). Các dòng được ép về lược đồ cố định
+    của bảng (xem TABLE_COLUMNS); phải dùng cùng một cách phân vùng cho cả bộ dữ liệu.
+
+    Args:
+        plans: Các kế hoạch sản xuất
+        output_dir: Thư mục bộ dữ liệu (mặc định PARQUET_EXPORT_PATH)
+        partition_by: Cột phân vùng: "date", "part_number" hoặc None
+
+    Returns:
+        Số dòng đã ghi theo bảng
+
+    Raises:
+        ValueError: Cột phân vùng không hợp lệ hoặc khác cách phân vùng của bộ dữ liệu đã có
+    """
+    import pyarrow.parquet as pq
+
+    if partition_by is not None and partition_by not in PARTITION_COLUMNS:
+        raise ValueError(f"Cột phân vùng không hợp lệ: {partition_by} (chọn một trong {', '.join(PARTITION_COLUMNS)})")
+    output_dir = output_dir or config.PARQUET_EXPORT_PATH
+    existing = dataset_partitioning(output_dir)
+    if existing is not None and existing != (partition_by or ""):
+        def layout(column: Optional[str]) -> str:
+            return f"phân vùng theo {column}" if column else "không phân vùng"
+        raise ValueError(
+            f"Bộ dữ liệu {output_dir} được ghi {layout(existing)}, không thể ghi thêm {layout(partition_by)}"
+        )
+    exported = _exported_run_ids(output_dir)
+
+    rows: Dict[str, List[Dict[str, Any]]] = {table: [] for table in TABLES}
+    for plan in plans:
+        run_id = plan_run_id(plan)
+        if run_id and run_id in exported:
+            logger.info(f"Bỏ qua lượt chạy đã xuất: {run_id}")
+            continue
+        if run_id:
+            exported.add(run_id)
+        for table, table_rows in flatten_plan(plan).items():
+            rows[table].extend(table_rows)
+
+    counts = {}
+    # Tên file riêng cho mỗi lần ghi để các lần ghi thêm không ghi đè lên nhau
+    batch_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}-{{i}}.parquet"
+    for table, table_rows in rows.items():
+        counts[table] = len(table_rows)
+        if not table_rows:
+            continue
+        arrow_table = _arrow_table(table, table_rows)
+        path = os.path.join(output_dir, table)
+        os.makedirs(path, exist_ok=True)
+        if partition_by:
+            pq.write_to_dataset(
+                arrow_table, path, partition_cols=[partition_by], basename_template=batch_name,
+                existing_data_behavior="overwrite_or_ignore"
+            )
+        else:
+            pq.write_table(arrow_table, os.path.join(path, batch_name.format(i=0)))
+
+    logger.info(f"Đã xuất Parquet vào {output_dir}: " + ", ".join(f"{table} {count}" for table, count in counts.items()))
+    return counts
+
+def export_plan_files(paths: Iterable[str], output_dir: str = None,
+                      partition_by: Optional[str] = None) -> Dict[str, int]:
+    """
+    Ghi thêm các file kế hoạch JSON (xem utils.save_data) vào bộ dữ liệu Parquet
+
+    File JSON không phải kế hoạch (tóm tắt lô, benchmark...) được bỏ qua.
+
+    Args:
+        paths: Đường dẫn file JSON
+        output_dir: Thư mục bộ dữ liệu
+        partition_by: Cột phân vùng: "date", "part_number" hoặc None
+
+    Returns:
+        Số dòng đã ghi theo bảng
+    """
+    def plans():
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and "source_drawing" in data and "plan" in data:
+                yield data
+
+    return export_plans(plans(), output_dir, partition_by)
+
+def read_table(table: str, columns: Optional[List[str]] = None, filters: Optional[List[Any]] = None,
+               output_dir: str = None):
+    """
+    Đọc một bảng của bộ dữ liệu, chỉ các cột và phân vùng cần dùng
+
+    Args:
+        table: Tên bảng trong TABLES
+        columns: Các cột cần đọc (mặc định tất cả)
+        filters: Bộ lọc pyarrow, vd: [("part_number", "=", "SC-2023-A001")]
+        output_dir: Thư mục bộ dữ liệu
+
+    Returns:
+        pandas.DataFrame theo lược đồ của bảng (cột thiếu trong các file cũ có giá trị rỗng)
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    if table not in TABLES:
+        raise ValueError(f"Bảng không hợp lệ: {table} (chọn một trong {', '.join(TABLES)})")
+    output_dir = output_dir or config.PARQUET_EXPORT_PATH
+    schema = table_schema(table)
+    # Giá trị phân vùng đọc theo kiểu trong lược đồ (vd: mã chi tiết toàn số vẫn là chuỗi)
+    partition_by = dataset_partitioning(output_dir)
+    partitioning = ds.partitioning(pa.schema([schema.field(partition_by)]), flavor="hive") if partition_by else None
+    dataset = ds.dataset(os.path.join(output_dir, table), schema=schema, format="parquet", partitioning=partitioning)
+    result = dataset.to_table(columns=columns, filter=pq.filters_to_expression(filters) if filters else None)
+    return result.to_pandas()
+
+def main():
+    """Xuất các file kế hoạch JSON sang bộ dữ liệu Parquet"""
+    parser = argparse.ArgumentParser(description='Xuất kế hoạch sản xuất sang các bảng Parquet dạng cột')
+    parser.add_argument('source', nargs='?', default=config.DATA_PATH,
+                        help='Thư mục (tìm đệ quy *.json) hoặc mẫu glob của các file kế hoạch')
+    parser.add_argument('--output', '-o', type=str, default=None, help='Thư mục bộ dữ liệu (mặc định PARQUET_EXPORT_PATH)')
+    parser.add_argument('--partition-by', choices=PARTITION_COLUMNS, default=None, help='Cột phân vùng')
+    args = parser.parse_args()
+
+    config.setup_logging()
+    if os.path.isdir(args.source):
+        paths = sorted(glob.glob(os.path.join(args.source, "**", "*.json"), recursive=True))
+    else:
+        paths = sorted(glob.glob(args.source, recursive=True))
+
+    counts = export_plan_files(paths, args.output, args.partition_by)
+    print(f"Đã xuất vào {args.output or config.PARQUET_EXPORT_PATH}:")
+    for table, count in counts.items():
+        print(f"  - {table}: {count} dòng")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+"""
+Chỉ mục SQLite của các kế hoạch đã lưu trong data/: tra cứu theo mã chi tiết, phiên bản, mã băm
+bản vẽ, vật liệu, dụng cụ, trạng thái và thời gian mà không cần mở từng file JSON
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from typing import Dict, List, Any, Optional
+import config
+import utils
+import spec_parser
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi thay đổi cách trích xuất thông tin để rebuild lập chỉ mục lại mọi file
+INDEX_VERSION = 2
+
+# Mác vật liệu chuẩn hóa, vd: "AISI 4140 Alloy Steel" -> "AISI 4140"
+MATERIAL_GRADE_RE = re.compile(r'\b(AISI|SAE|ASTM|DIN|EN|JIS)\s*([A-Z]?\d[\w.-]*)', re.IGNORECASE)
+
+# Dụng cụ được nhắc tới trong kế hoạch: mảnh cắt ISO, mũi khoan/dao phay theo đường kính, ta rô
+TOOL_PATTERNS = (
+    re.compile(r'\b[A-Z]{4}\s?\d{4}(?:\d{2}|[A-Z]{4})\b'),
+    re.compile(r'\b(?:Drill|End Mill|Face Mill|Reamer)\s*Ø\s*\d+(?:\.\d+)?\s*mm\b', re.IGNORECASE),
+    re.compile(r'Ø\s*\d+(?:\.\d+)?\s*mm\s+(?:Drill|End Mill|Face Mill|Reamer)\b', re.IGNORECASE),
+    re.compile(r'\bM\d+\s*[x×]\s*\d+(?:\.\d+)?\s*(?:Machine\s+)?Tap\b', re.IGNORECASE)
+)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS plans ("
+    " id INTEGER PRIMARY KEY,"
+    " path TEXT NOT NULL UNIQUE,"
+    " mtime REAL NOT NULL,"
+    " version INTEGER NOT NULL,"
+    " run_id TEXT,"
+    " source_drawing TEXT,"
+    " drawing_hash TEXT,"
+    " part_number TEXT,"
+    " revision TEXT,"
+    " material TEXT,"
+    " material_grade TEXT,"
+    " status TEXT,"
+    " created TEXT,"
+    " indexed REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS plan_tools ("
+    " plan_id INTEGER NOT NULL REFERENCES plans(id) ON DELETE CASCADE,"
+    " tool TEXT NOT NULL,"
+    " PRIMARY KEY (plan_id, tool))",
+    "CREATE INDEX IF NOT EXISTS idx_plans_part ON plans(part_number, created)",
+    "CREATE INDEX IF NOT EXISTS idx_plans_hash ON plans(drawing_hash, created)",
+    "CREATE INDEX IF NOT EXISTS idx_plans_grade ON plans(material_grade, created)",
+    "CREATE INDEX IF NOT EXISTS idx_plans_run ON plans(run_id)",
+    "CREATE INDEX IF NOT EXISTS idx_plans_created ON plans(created)",
+    "CREATE INDEX IF NOT EXISTS idx_tools_tool ON plan_tools(tool, plan_id)"
+)
+
+# Thông tin bản vẽ lưu cùng kế hoạch lúc lập (xem drawing_metadata)
+DRAWING_FIELDS = ("drawing_hash", "part_number", "revision", "material")
+
+# Các cột trả về trong kết quả tra cứu
+RESULT_COLUMNS = (
+    "path", "run_id", "source_drawing", "drawing_hash", "part_number", "revision",
+    "material", "material_grade", "status", "created"
+)
+
+def material_grade(material: Optional[str]) -> Optional[str]:
+    """Mác vật liệu chuẩn hóa (vd: "AISI 4140"), None nếu không nhận ra"""
+    match = MATERIAL_GRADE_RE.search(material or "")
+    return f"{match.group(1).upper()} {match.group(2).upper()}" if match else None
+
+def referenced_tools(text: str) -> List[str]:
+    """Các dụng cụ được nhắc tới trong văn bản kế hoạch, đã chuẩn hóa khoảng trắng"""
+    tools = set()
+    for pattern in TOOL_PATTERNS:
+        for match in pattern.finditer(text):
+            tools.add(" ".join(match.group(0).split()))
+    return sorted(tools)
+
+def drawing_file_hash(drawing_path: str) -> Optional[str]:
+    """Mã băm SHA-256 nội dung file bản vẽ, None nếu không còn file"""
+    if not drawing_path or not os.path.exists(drawing_path):
+        return None
+    digest = hashlib.sha256()
+    with open(drawing_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def drawing_metadata(drawing_path: str) -> Dict[str, Optional[str]]:
+    """
+    Thông tin bản vẽ tại thời điểm lập kế hoạch, lưu cùng kế hoạch để lập chỉ mục (và xuất dữ liệu)
+    đúng với bản vẽ đã dùng dù file bản vẽ sau đó bị sửa hay xóa
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+
+    Returns:
+        Dict gồm drawing_hash, part_number, revision và material (vật liệu ghi trên bản vẽ);
+        giá trị None nếu không đọc được
+    """
+    metadata = {"drawing_hash": drawing_file_hash(drawing_path), "part_number": None, "revision": None, "material": None}
+    if metadata["drawing_hash"] is None:
+        return metadata
+    try:
+        text = utils.load_drawing_file(drawing_path)
+        specs = spec_parser.parse_specs(text)
+    except Exception as e:
+        logger.warning(f"Không đọc được bản vẽ {drawing_path}: {str(e)}")
+        return metadata
+    # Cùng mã chi tiết dùng để tra cứu catalog và lưu lịch sử phiên bản
+    metadata["part_number"] = utils.extract_part_number(text) or specs.get("part_number") or None
+    metadata["revision"] = specs.get("revision") or None
+    metadata["material"] = specs.get("material") or None
+    return metadata
+
+def _plan_text(plan: Any) -> str:
+    """Văn bản kế hoạch (CrewOutput đã lưu JSON là dict có "raw")"""
+    if isinstance(plan, dict):
+        return plan.get("raw") or ""
+    return str(plan or "")
+
+def _plan_status(plan: Dict[str, Any]) -> str:
+    """Trạng thái kế hoạch: cached (lấy từ kho kế hoạch), trạng thái checkpoint hoặc completed"""
+    if (plan.get("plan_cache") or {}).get("hit"):
+        return "cached"
+    run_id = plan.get("run_id")
+    manifest_path = os.path.join(config.CHECKPOINT_PATH, run_id or "", "manifest.json")
+    if run_id and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("status", "completed")
+    return "completed"
+
+def describe_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Trích xuất thông tin lập chỉ mục của một kế hoạch
+
+    Mã băm, mã chi tiết, phiên bản và vật liệu lấy từ thông tin bản vẽ lưu cùng kế hoạch lúc lập
+    (xem drawing_metadata); kế hoạch lưu trước khi có các trường này thì đọc lại từ file bản vẽ.
+    Dụng cụ được tìm trong văn bản kế hoạch và output các công đoạn.
+
+    Args:
+        plan: Kế hoạch sản xuất (dict đã lưu bằng utils.save_data)
+
+    Returns:
+        Dict gồm các cột của bảng plans (trừ path, mtime) và "tools"
+    """
+    drawing_path = plan.get("source_drawing") or ""
+    if "drawing_hash" in plan:
+        metadata = {field: plan.get(field) for field in DRAWING_FIELDS}
+    else:
+        metadata = drawing_metadata(drawing_path)
+
+    text = _plan_text(plan.get("plan"))
+    text += "\n".join((plan.get("stage_outputs") or {}).values())
+    material = metadata["material"]
+    return {
+        "run_id": plan.get("run_id"),
+        "source_drawing": drawing_path,
+        "drawing_hash": metadata["drawing_hash"],
+        "part_number": metadata["part_number"],
+        "revision": metadata["revision"],
+        "material": material,
+        "material_grade": material_grade(material),
+        "status": _plan_status(plan),
+        "created": plan.get("timestamp"),
+        "tools": referenced_tools(text)
+    }
+
+def _is_plan(data: Any) -> bool:
+    return isinstance(data, dict) and "source_drawing" in data and "plan" in data
+
+class PlanIndex:
+    """
+    Chỉ mục SQLite của các file kế hoạch, an toàn khi dùng từ nhiều luồng
+
+    Mỗi file kế hoạch là một dòng của bảng plans (khóa là đường dẫn file), các dụng cụ được nhắc
+    tới nằm trong bảng plan_tools; các truy vấn thường dùng đều có chỉ mục.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path: Đường dẫn file SQLite (mặc định PLAN_INDEX_PATH)
+        """
+        self.path = path or config.PLAN_INDEX_PATH
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+
+    def add(self, file_path: str, plan: Dict[str, Any]) -> None:
+        """
+        Lập chỉ mục (hoặc lập lại) một file kế hoạch
+
+        Args:
+            file_path: Đường dẫn file kế hoạch
+            plan: Nội dung kế hoạch
+        """
+        file_path = os.path.abspath(file_path)
+        info = describe_plan(plan)
+        tools = info.pop("tools")
+        columns = ["path", "mtime", "version", "indexed"] + list(info)
+        values = [file_path, os.path.getmtime(file_path), INDEX_VERSION, time.time()] + list(info.values())
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM plans WHERE path = ?", (file_path,))
+                cursor = self._conn.execute(
+                    f"INSERT INTO plans ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", values
+                )
+                self._conn.executemany(
+                    "INSERT INTO plan_tools (plan_id, tool) VALUES (?, ?)",
+                    [(cursor.lastrowid, tool) for tool in tools]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def rebuild(self, directory: str = None, full: bool = False) -> Dict[str, int]:
+        """
+        Lập chỉ mục các file kế hoạch có sẵn trong một thư mục (tìm đệ quy *.json)
+
+        Chỉ file mới hoặc đã thay đổi (theo mtime) được đọc lại; dòng của file không còn tồn tại bị xóa.
+
+        Args:
+            directory: Thư mục kế hoạch (mặc định DATA_PATH)
+            full: Xóa toàn bộ chỉ mục và lập lại từ đầu
+
+        Returns:
+            Số file đã lập chỉ mục, bỏ qua (không đổi hoặc không phải kế hoạch) và đã xóa khỏi chỉ mục
+        """
+        directory = directory or config.DATA_PATH
+        with self._lock:
+            if full:
+                self._conn.execute("DELETE FROM plans")
+            known = {
+                row["path"]: (row["mtime"], row["version"])
+                for row in self._conn.execute("SELECT path, mtime, version FROM plans")
+            }
+
+        # Checkpoint, trạng thái phiên bản và bộ dữ liệu phân tích không chứa file kế hoạch
+        excluded = tuple(
+            os.path.abspath(path) + os.sep
+            for path in (config.CHECKPOINT_PATH, config.REVISIONS_PATH, config.PARQUET_EXPORT_PATH)
+        )
+        counts = {"indexed": 0, "skipped": 0, "removed": 0}
+        seen = set()
+        for file_path in glob.glob(os.path.join(directory, "**", "*.json"), recursive=True):
+            file_path = os.path.abspath(file_path)
+            if file_path.startswith(excluded):
+                continue
+            seen.add(file_path)
+            if known.get(file_path) == (os.path.getmtime(file_path), INDEX_VERSION):
+                counts["skipped"] += 1
+                continue
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Bỏ qua file không đọc được {file_path}: {str(e)}")
+                counts["skipped"] += 1
+                continue
+            if not _is_plan(data):
+                counts["skipped"] += 1
+                continue
+            self.add(file_path, data)
+            counts["indexed"] += 1
+
+        root = os.path.abspath(directory) + os.sep
+        removed = [(path,) for path in known if path.startswith(root) and path not in seen]
+        with self._lock:
+            self._conn.executemany("DELETE FROM plans WHERE path = ?", removed)
+            # Cập nhật thống kê để SQLite chọn đúng chỉ mục khi kết hợp nhiều điều kiện
+            self._conn.execute("ANALYZE")
+        counts["removed"] = len(removed)
+        logger.info(
+            f"Đã cập nhật chỉ mục kế hoạch từ {directory}: {counts['indexed']} lập chỉ mục, "
+            f"{counts['skipped']} bỏ qua, {counts['removed']} xóa"
+        )
+        return counts
+
+    def find(self, part_number: str = None, revision: str = None, material: str = None,
+             drawing_hash: str = None, tool: str = None, status: str = None,
+             since: str = None, until: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Tra cứu kế hoạch, mới nhất trước
+
+        Args:
+            part_number: Mã chi tiết
+            revision: Phiên bản bản vẽ
+            material: Mác vật liệu (vd: "AISI 4140", so khớp chính xác sau chuẩn hóa) hoặc một phần tên vật liệu
+            drawing_hash: Mã băm nội dung bản vẽ (xem drawing_file_hash)
+            tool: Dụng cụ được nhắc tới (vd: "CNMG 120408")
+            status: Trạng thái (completed, cached, failed...)
+            since: Thời điểm sớm nhất (ISO 8601, vd: "2024-01-01")
+            until: Thời điểm muộn nhất (ISO 8601)
+            limit: Số kết quả tối đa
+
+        Returns:
+            Danh sách kế hoạch (các cột trong RESULT_COLUMNS và "tools")
+        """
+        conditions, parameters = [], []
+        for column, value in (("part_number", part_number), ("revision", revision),
+                              ("drawing_hash", drawing_hash), ("status", status)):
+            if value is not None:
+                conditions.append(f"p.{column} = ?")
+                parameters.append(value)
+        if material is not None:
+            grade = material_grade(material)
+            if grade:
+                conditions.append("p.material_grade = ?")
+                parameters.append(grade)
+            else:
+                conditions.append("p.material LIKE ?")
+                parameters.append(f"%{material}%")
+        if tool is not None:
+            conditions.append("p.id IN (SELECT plan_id FROM plan_tools WHERE tool = ?)")
+            parameters.append(" ".join(tool.split()))
+        if since is not None:
+            conditions.append("p.created >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("p.created <= ?")
+            parameters.append(until)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = (
+            f"SELECT p.id, {', '.join('p.' + column for column in RESULT_COLUMNS)} FROM plans p {where} "
+            "ORDER BY p.created DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(query, parameters + [limit]).fetchall()
+            results = []
+            for row in rows:
+                record = {column: row[column] for column in RESULT_COLUMNS}
+                record["tools"] = [
+                    tool_row["tool"] for tool_row in
+                    self._conn.execute("SELECT tool FROM plan_tools WHERE plan_id = ? ORDER BY tool", (row["id"],))
+                ]
+                results.append(record)
+        return results
+
+    def latest(self, drawing_path: str = None, drawing_hash: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Kế hoạch mới nhất cho một bản vẽ (theo nội dung, không theo tên file)
+
+        Args:
+            drawing_path: Đường dẫn bản vẽ (dùng để tính mã băm)
+            drawing_hash: Mã băm nội dung bản vẽ
+
+        Returns:
+            Kế hoạch mới nhất hoặc None
+        """
+        drawing_hash = drawing_hash or drawing_file_hash(drawing_path)
+        if drawing_hash is None:
+            return None
+        results = self.find(drawing_hash=drawing_hash, limit=1)
+        return results[0] if results else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Số kế hoạch, số mã chi tiết, số dụng cụ và kế hoạch mới nhất trong chỉ mục"""
+        with self._lock:
+            plans, parts, latest = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT part_number), MAX(created) FROM plans"
+            ).fetchone()
+            tools = self._conn.execute("SELECT COUNT(DISTINCT tool) FROM plan_tools").fetchone()[0]
+        return {"plans": plans, "part_numbers": parts, "tools": tools, "latest": latest, "path": self.path}
+
+    def close(self) -> None:
+        """Đóng kết nối SQLite"""
+        with self._lock:
+            self._conn.execute("PRAGMA optimize")
+            self._conn.close()
+
+_index: Optional[PlanIndex] = None
+_index_lock = threading.Lock()
+
+def get_plan_index() -> PlanIndex:
+    """Chỉ mục kế hoạch dùng chung (khởi tạo lần đầu khi cần)"""
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            _index = PlanIndex()
+        return _index
+
+def index_saved_data(file_path: str, data: Any) -> None:
+    """
+    Lập chỉ mục file vừa được utils.save_data ghi, nếu đó là một kế hoạch và PLAN_INDEX bật
+
+    Args:
+        file_path: Đường dẫn file đã lưu
+        data: Dữ liệu đã lưu
+    """
+    if not config.PLAN_INDEX or not _is_plan(data):
+        return
+    try:
+        get_plan_index().add(file_path, json.loads(json.dumps(data, cls=utils.CustomJSONEncoder)))
+    except Exception as e:
+        # Lỗi lập chỉ mục không làm hỏng việc lưu kế hoạch; có thể lập lại bằng "rebuild"
+        logger.warning(f"Không lập chỉ mục được kế hoạch {file_path}: {str(e)}")
+
+def main():
+    """Lập chỉ mục và tra cứu kế hoạch đã lưu"""
+    parser = argparse.ArgumentParser(description='Chỉ mục SQLite của các kế hoạch sản xuất đã lưu')
+    parser.add_argument('--index', type=str, default=None, help='File chỉ mục (mặc định PLAN_INDEX_PATH)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rebuild = commands.add_parser('rebuild', help='Lập chỉ mục các file kế hoạch có sẵn')
+    rebuild.add_argument('directory', nargs='?', default=None, help='Thư mục kế hoạch (mặc định DATA_PATH)')
+    rebuild.add_argument('--full', action='store_true', help='Xóa chỉ mục và lập lại từ đầu')
+
+    query = commands.add_parser('query', help='Tra cứu kế hoạch, mới nhất trước')
+    query.add_argument('--part', dest='part_number', help='Mã chi tiết')
+    query.add_argument('--revision', help='Phiên bản bản vẽ')
+    query.add_argument('--material', help='Mác vật liệu (vd: "AISI 4140") hoặc một phần tên vật liệu')
+    query.add_argument('--drawing', help='File bản vẽ (so khớp theo nội dung)')
+    query.add_argument('--hash', dest='drawing_hash', help='Mã băm nội dung bản vẽ')
+    query.add_argument('--tool', help='Dụng cụ được nhắc tới (vd: "CNMG 120408")')
+    query.add_argument('--status', help='Trạng thái (completed, cached...)')
+    query.add_argument('--since', help='Từ thời điểm (ISO 8601)')
+    query.add_argument('--until', help='Đến thời điểm (ISO 8601)')
+    query.add_argument('--limit', type=int, default=50, help='Số kết quả tối đa')
+    query.add_argument('--latest', action='store_true', help='Chỉ kế hoạch mới nhất')
+    query.add_argument('--json', action='store_true', help='In kết quả dạng JSON')
+
+    commands.add_parser('stats', help='Thống kê chỉ mục')
+    args = parser.parse_args()
+
+    config.setup_logging()
+    index = PlanIndex(args.index)
+
+    if args.command == 'rebuild':
+        started = time.perf_counter()
+        counts = index.rebuild(args.directory, full=args.full)
+        print(
+            f"Đã lập chỉ mục {counts['indexed']} kế hoạch, bỏ qua {counts['skipped']} file, "
+            f"xóa {counts['removed']} trong {time.perf_counter() - started:.2f}s"
+        )
+    elif args.command == 'stats':
+        print(json.dumps(index.stats(), ensure_ascii=False, indent=2))
+    else:
+        started = time.perf_counter()
+        digest = args.drawing_hash or (drawing_file_hash(args.drawing) if args.drawing else None)
+        if args.drawing and digest is None:
+            print(f"Không tìm thấy file bản vẽ: {args.drawing}")
+            sys.exit(1)
+        results = index.find(
+            part_number=args.part_number, revision=args.revision, material=args.material,
+            drawing_hash=digest, tool=args.tool, status=args.status, since=args.since,
+            until=args.until, limit=1 if args.latest else args.limit
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=2))
+        else:
+            for record in results:
+                print(
+                    f"{record['created']}  {record['part_number']} rev {record['revision']}  "
+                    f"{record['material_grade'] or record['material']}  [{record['status']}]  {record['path']}"
+                )
+            print(f"{len(results)} kế hoạch ({elapsed_ms:.1f} ms)")
+    index.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Mô hình kế hoạch sản xuất gọn có kiểu: nguyên công (kèm chế độ cắt), gá đặt, dụng cụ và điểm kiểm tra
+được lấy trực tiếp từ đầu ra có cấu trúc của task finalize_plan (xem plan_schema), lưu bằng các lớp
+__slots__ và tuần tự hóa thành bảng dòng theo cột, để xử lý hàng loạt kế hoạch mà không phải đọc lại văn bản
+"""
+
+import re
+import sys
+import json
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple
+import utils
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi thứ tự cột của bản ghi thay đổi
+RECORD_VERSION = 1
+
+# Thứ tự cột khi tuần tự hóa từng bảng
+SETUP_COLUMNS = ("id", "machine", "fixture", "description")
+TOOL_COLUMNS = ("id", "tool_type", "description")
+OPERATION_COLUMNS = (
+    "sequence", "name", "setup", "machine", "tool",
+    "cutting_speed", "feed", "depth_of_cut", "spindle_speed", "minutes"
+)
+INSPECTION_COLUMNS = ("feature", "characteristic", "nominal", "tolerance", "unit", "method", "frequency", "operation")
+
+# Thông số chế độ cắt (được làm phẳng vào dòng nguyên công)
+CUTTING_FIELDS = ("cutting_speed", "feed", "depth_of_cut", "spindle_speed")
+
+# Số có dấu phẩy phân cách hàng nghìn (vd: "1,200 rpm", như spec_parser._NUM) hoặc số thập phân
+# dùng dấu chấm/dấu phẩy (vd: "0,15 mm/rev")
+_NUMBER_RE = re.compile(r"[-+]?(?:(?P<grouped>[1-9]\d{0,2}(?:,\d{3})+(?:\.\d+)?)|\d+(?:[.,]\d+)?)")
+
+@dataclass
+class Setup:
+    __slots__ = SETUP_COLUMNS
+    id: str
+    machine: str
+    fixture: str
+    description: str
+
+@dataclass
+class Tool:
+    __slots__ = TOOL_COLUMNS
+    id: str
+    tool_type: str
+    description: str
+
+@dataclass
+class Operation:
+    __slots__ = OPERATION_COLUMNS
+    sequence: int
+    name: str
+    setup: str
+    machine: str
+    tool: str
+    cutting_speed: Optional[float]
+    feed: Optional[float]
+    depth_of_cut: Optional[float]
+    spindle_speed: Optional[float]
+    minutes: Optional[float]
+
+@dataclass
+class InspectionPoint:
+    __slots__ = INSPECTION_COLUMNS
+    feature: str
+    characteristic: str
+    nominal: Optional[float]
+    tolerance: Optional[float]
+    unit: str
+    method: str
+    frequency: str
+    operation: Optional[int]
+
+@dataclass
+class CompactPlan:
+    __slots__ = ("part_number", "material", "setups", "tools", "operations", "inspection_points", "summary")
+    part_number: str
+    material: str
+    setups: List[Setup]
+    tools: List[Tool]
+    operations: List[Operation]
+    inspection_points: List[InspectionPoint]
+    summary: str
+
+    def total_minutes(self) -> float:
+        """Tổng thời gian ước tính của các nguyên công (phút)"""
+        return sum(operation.minutes or 0.0 for operation in self.operations)
+
+    def operations_by_setup(self) -> Dict[str, List[Operation]]:
+        """Nguyên công theo gá đặt, giữ thứ tự thực hiện"""
+        groups: Dict[str, List[Operation]] = {}
+        for operation in sorted(self.operations, key=lambda op: op.sequence):
+            groups.setdefault(operation.setup, []).append(operation)
+        return groups
+
+def _text(value: Any) -> str:
+    # Các giá trị lặp lại nhiều (tên máy, mã dụng cụ, gá đặt) dùng chung một đối tượng chuỗi
+    return sys.intern(str(value).strip()) if value is not None else ""
+
+def _number(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value))
+    if match is None:
+        return None
+    if match.group("grouped"):
+        return float(match.group(0).replace(",", ""))
+    return float(match.group(0).replace(",", "."))
+
+def _integer(value: Any) -> Optional[int]:
+    number = _number(value)
+    return int(number) if number is not None else None
+
+def from_dict(data: Dict[str, Any]) -> CompactPlan:
+    """
+    Tạo kế hoạch gọn từ dict theo lược đồ ManufacturingPlanOutput
+
+    Trường thiếu được để trống; số có kèm đơn vị (vd: "150 m/min") được đọc lấy phần số.
+
+    Args:
+        data: Dict kế hoạch (từ model_dump() hoặc JSON do LLM trả về)
+
+    Returns:
+        CompactPlan
+    """
+    setups = [
+        Setup(*(_text(item.get(column)) for column in SETUP_COLUMNS))
+        for item in data.get("setups") or [] if isinstance(item, dict)
+    ]
+    tools = [
+        Tool(*(_text(item.get(column)) for column in TOOL_COLUMNS))
+        for item in data.get("tools") or [] if isinstance(item, dict)
+    ]
+
+    operations = []
+    for i, item in enumerate(data.get("operations") or []):
+        if not isinstance(item, dict):
+            continue
+        parameters = item.get("parameters") if isinstance(item.get("parameters"), dict) else item
+        sequence = _integer(item.get("sequence"))
+        operations.append(Operation(
+            sequence if sequence is not None else i + 1,
+            _text(item.get("name")), _text(item.get("setup")), _text(item.get("machine")), _text(item.get("tool")),
+            *(_number(parameters.get(field)) for field in CUTTING_FIELDS),
+            _number(item.get("minutes"))
+        ))
+
+    inspection_points = []
+    for item in data.get("inspection_points") or []:
+        if not isinstance(item, dict):
+            continue
+        inspection_points.append(InspectionPoint(
+            _text(item.get("feature")), _text(item.get("characteristic")),
+            _number(item.get("nominal")), _number(item.get("tolerance")),
+            _text(item.get("unit")), _text(item.get("method")), _text(item.get("frequency")),
+            _integer(item.get("operation"))
+        ))
+
+    return CompactPlan(
+        _text(data.get("part_number")), _text(data.get("material")),
+        setups, tools, operations, inspection_points, str(data.get("summary") or "")
+    )
+
+def _json_object(text: str) -> Optional[Dict[str, Any]]:
+    """Đối tượng JSON trong văn bản đầu ra (cho phép khối ```json hoặc văn bản bao quanh)"""
+    text = text.strip()
+    candidates = [text]
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end and (start, end) != (0, len(text) - 1):
+        candidates.append(text[start:end + 1])
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+def from_output(output: Any) -> Optional[CompactPlan]:
+    """
+    Tạo kế hoạch gọn từ đầu ra của task hoặc crew
+
+    Ưu tiên đối tượng pydantic (output_pydantic), rồi json_dict (output_json), cuối cùng là JSON
+    trong văn bản raw.
+
+    Args:
+        output: CrewOutput, TaskOutput, dict kế hoạch, dict CrewOutput đã lưu hoặc văn bản
+
+    Returns:
+        CompactPlan hoặc None nếu đầu ra không có kế hoạch có cấu trúc
+    """
+    if output is None:
+        return None
+    pydantic_output = getattr(output, "pydantic", None)
+    if pydantic_output is not None and hasattr(pydantic_output, "model_dump"):
+        return from_dict(pydantic_output.model_dump())
+    json_output = getattr(output, "json_dict", None)
+    if isinstance(json_output, dict):
+        return from_dict(json_output)
+
+    if isinstance(output, dict):
+        if "operations" in output or "setups" in output:
+            return from_dict(output)
+        for field in ("pydantic", "json_dict"):
+            if isinstance(output.get(field), dict):
+                return from_dict(output[field])
+        output = output.get("raw") or ""
+
+    text = output if isinstance(output, str) else (getattr(output, "raw", None) or str(output))
+    data = _json_object(text) if text else None
+    if data is None or not ("operations" in data or "setups" in data):
+        return None
+    return from_dict(data)
+
+def to_record(plan: CompactPlan) -> Dict[str, Any]:
+    """
+    Tuần tự hóa kế hoạch gọn thành bản ghi dạng bảng: mỗi bảng là danh sách dòng theo thứ tự cột
+    cố định (xem *_COLUMNS), không lặp lại tên trường trên mỗi dòng
+
+    Args:
+        plan: Kế hoạch gọn
+
+    Returns:
+        Dict JSON được
+    """
+    return {
+        "v": RECORD_VERSION,
+        "part_number": plan.part_number,
+        "material": plan.material,
+        "setups": [[getattr(row, column) for column in SETUP_COLUMNS] for row in plan.setups],
+        "tools": [[getattr(row, column) for column in TOOL_COLUMNS] for row in plan.tools],
+        "operations": [[getattr(row, column) for column in OPERATION_COLUMNS] for row in plan.operations],
+        "inspection_points": [[getattr(row, column) for column in INSPECTION_COLUMNS] for row in plan.inspection_points],
+        "summary": plan.summary
+    }
+
+def from_record(record: Dict[str, Any]) -> CompactPlan:
+    """
+    Khôi phục kế hoạch gọn từ bản ghi dạng bảng (xem to_record)
+
+    Args:
+        record: Bản ghi
+
+    Returns:
+        CompactPlan
+    """
+    if record.get("v") != RECORD_VERSION:
+        raise ValueError(f"Phiên bản bản ghi kế hoạch không hỗ trợ: {record.get('v')}")
+
+    def rows(cls, table: str) -> List[Any]:
+        return [cls(*(sys.intern(value) if isinstance(value, str) else value for value in row))
+                for row in record.get(table) or []]
+
+    return CompactPlan(
+        sys.intern(record.get("part_number") or ""), sys.intern(record.get("material") or ""),
+        rows(Setup, "setups"), rows(Tool, "tools"), rows(Operation, "operations"),
+        rows(InspectionPoint, "inspection_points"), record.get("summary") or ""
+    )
+
+def dumps(plan: CompactPlan) -> str:
+    """JSON gọn (không khoảng trắng) của bản ghi kế hoạch"""
+    return json.dumps(to_record(plan), ensure_ascii=False, separators=(",", ":"))
+
+def loads(text: str) -> CompactPlan:
+    """Đọc kế hoạch gọn từ JSON của dumps"""
+    return from_record(json.loads(text))
+
+def structured_plan(output: Any) -> Optional[Dict[str, Any]]:
+    """
+    Bản ghi kế hoạch có cấu trúc để lưu cùng kế hoạch sản xuất (khóa "structured_plan")
+
+    Args:
+        output: Đầu ra của crew/task hoặc văn bản kế hoạch
+
+    Returns:
+        Bản ghi (xem to_record) hoặc None nếu đầu ra không có kế hoạch có cấu trúc
+    """
+    try:
+        plan = from_output(output)
+    except Exception as e:
+        logger.warning(f"Không đọc được kế hoạch có cấu trúc: {str(e)}")
+        return None
+    if plan is None:
+        logger.debug("Đầu ra không chứa kế hoạch có cấu trúc")
+        return None
+    return to_record(plan)
+
+def load_plan(data: Dict[str, Any]) -> Optional[CompactPlan]:
+    """
+    Kế hoạch gọn của một kế hoạch sản xuất đã lưu (file JSON của utils.save_data hoặc dict kết quả)
+
+    Dùng bản ghi "structured_plan" nếu có, nếu không thì đọc lại từ đầu ra "plan".
+
+    Args:
+        data: Kế hoạch sản xuất
+
+    Returns:
+        CompactPlan hoặc None
+    """
+    record = data.get("structured_plan")
+    if isinstance(record, dict):
+        return from_record(record)
+    return from_output(data.get("plan"))
+
+def load_plan_files(paths: List[str]) -> List[Tuple[str, CompactPlan]]:
+    """
+    Đọc hàng loạt kế hoạch gọn từ các file JSON đã lưu, bỏ qua file không có kế hoạch có cấu trúc
+
+    Args:
+        paths: Đường dẫn file JSON
+
+    Returns:
+        Danh sách (đường dẫn, CompactPlan)
+    """
+    plans = []
+    for path in paths:
+        try:
+            data = utils.load_data(path)
+        except Exception as e:
+            logger.warning(f"Không đọc được file kế hoạch {path}: {str(e)}")
+            continue
+        plan = load_plan(data) if isinstance(data, dict) else None
+        if plan is not None:
+            plans.append((path, plan))
+    return plans
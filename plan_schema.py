@@ -0,0 +1,61 @@
+"""
+Lược đồ đầu ra có cấu trúc (pydantic) của công đoạn finalize_plan, dùng làm output_pydantic của task
+"""
+
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+class CuttingParametersOutput(BaseModel):
+    cutting_speed: Optional[float] = Field(None, description="Cutting speed Vc in m/min")
+    feed: Optional[float] = Field(None, description="Feed in mm/rev (mm/tooth for milling)")
+    depth_of_cut: Optional[float] = Field(None, description="Depth of cut ap in mm")
+    spindle_speed: Optional[float] = Field(None, description="Spindle speed in rpm")
+
+class SetupOutput(BaseModel):
+    id: str = Field(description="Setup identifier, e.g. S1")
+    machine: str = Field(description="Machine or machine type, e.g. CNC lathe")
+    fixture: str = Field("", description="Workholding / fixture used")
+    description: str = Field("", description="Short description of the setup")
+
+class ToolOutput(BaseModel):
+    id: str = Field(description="Tool designation, e.g. CNMG 120408 or Drill Ø6.8mm")
+    tool_type: str = Field("", description="Tool type, e.g. turning insert, drill, tap, grinding wheel")
+    description: str = Field("", description="Short description")
+
+class OperationOutput(BaseModel):
+    sequence: int = Field(description="Operation number in execution order, starting at 10 or 1")
+    name: str = Field(description="Operation name, e.g. Rough turn OD")
+    setup: str = Field("", description="Setup identifier this operation runs in")
+    machine: str = Field("", description="Machine used")
+    tool: str = Field("", description="Tool designation (one of the tools ids)")
+    parameters: CuttingParametersOutput = Field(default_factory=CuttingParametersOutput)
+    minutes: Optional[float] = Field(None, description="Estimated operation time in minutes")
+
+class InspectionPointOutput(BaseModel):
+    feature: str = Field(description="Feature inspected, e.g. Inner bore Ø30")
+    characteristic: str = Field("", description="Characteristic, e.g. diameter, Ra, concentricity")
+    nominal: Optional[float] = Field(None, description="Nominal value")
+    tolerance: Optional[float] = Field(None, description="Symmetric tolerance (±)")
+    unit: str = Field("", description="Unit, e.g. mm, µm, HRC")
+    method: str = Field("", description="Measurement method or instrument")
+    frequency: str = Field("", description="Sampling frequency, e.g. 100%, first article, 1 in 10")
+    operation: Optional[int] = Field(None, description="Sequence of the operation after which it is checked")
+
+class ManufacturingPlanOutput(BaseModel):
+    part_number: str = Field("", description="Part number")
+    material: str = Field("", description="Selected material")
+    setups: List[SetupOutput] = Field(default_factory=list)
+    tools: List[ToolOutput] = Field(default_factory=list)
+    operations: List[OperationOutput] = Field(default_factory=list)
+    inspection_points: List[InspectionPointOutput] = Field(default_factory=list)
+    summary: str = Field("", description="Plan narrative: material decision, timeline, bill of materials, responsibilities")
+
+# Hướng dẫn định dạng thêm vào expected_output, để cả lời gọi LLM trực tiếp (async) cũng trả về JSON
+OUTPUT_INSTRUCTIONS = (
+    "Return the plan as a single JSON object with the keys: part_number, material, "
+    "setups [{id, machine, fixture, description}], tools [{id, tool_type, description}], "
+    "operations [{sequence, name, setup, machine, tool, parameters {cutting_speed, feed, depth_of_cut, "
+    "spindle_speed}, minutes}], inspection_points [{feature, characteristic, nominal, tolerance, unit, "
+    "method, frequency, operation}] and summary (the narrative: material decision, bill of materials, "
+    "timeline and responsibilities). Numbers must be plain numbers without units."
+)
@@ -0,0 +1,197 @@
+"""
+So sánh các phiên bản bản vẽ theo từng phần để lập lại kế hoạch tăng dần
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+import config
+import utils
+import stages
+
+logger = logging.getLogger(__name__)
+
+# Tiêu đề phần dạng "==== DIMENSIONAL SPECIFICATIONS ===="
+SECTION_HEADER_RE = re.compile(r'^=+\s*(.+?)\s*=+$')
+
+# Tiêu đề phần dạng cũ "DIMENSIONS:" (toàn chữ hoa, không có giá trị phía sau)
+LEGACY_HEADER_RE = re.compile(r'^([A-Z][A-Z0-9 /&()-]*):$')
+
+# Trường ở phần đầu bản vẽ dạng "PART NUMBER: SC-2023-A001"
+HEADER_FIELD_RE = re.compile(r'^([A-Z][A-Z ]*[A-Z]):\s*(.+)$')
+
+# Các trường thay đổi ở mọi phiên bản, không ảnh hưởng tới kế hoạch
+VOLATILE_FIELDS = {"DOCUMENT", "REVISION", "DATE"}
+
+_ALL_STAGES = list(stages.STAGE_ORDER)
+
+# Các công đoạn chịu ảnh hưởng khi một phần của bản vẽ thay đổi.
+# Hoàn thiện kế hoạch luôn chạy lại khi có thay đổi; phần không có trong bảng sẽ chạy lại tất cả.
+SECTION_STAGE_IMPACT = {
+    "GENERAL DESCRIPTION": ["analyze_drawing", "material_selection", "finalize_plan"],
+    "DIMENSIONAL SPECIFICATIONS": ["analyze_drawing", "tooling_selection", "process_plan", "quality_review", "finalize_plan"],
+    "DIMENSIONS": ["analyze_drawing", "tooling_selection", "process_plan", "quality_review", "finalize_plan"],
+    "TOLERANCE SPECIFICATIONS": ["analyze_drawing", "tooling_selection", "process_plan", "quality_review", "finalize_plan"],
+    "TOLERANCES": ["analyze_drawing", "tooling_selection", "process_plan", "quality_review", "finalize_plan"],
+    "SURFACE FINISH": ["analyze_drawing", "tooling_selection", "process_plan", "quality_review", "finalize_plan"],
+    "MATERIAL SPECIFICATIONS": _ALL_STAGES,
+    "MATERIAL": _ALL_STAGES,
+    "HEAT TREATMENT": ["analyze_drawing", "material_selection", "process_plan", "quality_review", "finalize_plan"],
+    "LOAD REQUIREMENTS": ["analyze_drawing", "material_selection", "finalize_plan"],
+    "SPECIAL REQUIREMENTS": ["analyze_drawing", "process_plan", "quality_review", "finalize_plan"],
+    "CRITICAL DIMENSIONS": ["analyze_drawing", "process_plan", "quality_review", "finalize_plan"],
+    "MANUFACTURING NOTES": ["analyze_drawing", "process_plan", "finalize_plan"],
+    "NOTES": ["analyze_drawing", "process_plan", "quality_review", "finalize_plan"],
+    "QUALITY ASSURANCE REQUIREMENTS": ["analyze_drawing", "quality_review", "finalize_plan"],
+    "ADDITIONAL INFORMATION": ["analyze_drawing", "finalize_plan"],
+    "PART NAME": ["analyze_drawing", "finalize_plan"],
+    "PROJECT": ["finalize_plan"],
+    "APPROVAL": ["finalize_plan"]
+}
+
+def split_sections(drawing_text: str) -> Dict[str, str]:
+    """
+    Tách bản vẽ thành các phần theo tiêu đề "==== X ====" hoặc "X:"
+
+    Các trường ở phần đầu ("PART NAME: ...") được tách thành phần riêng theo tên trường;
+    các trường thay đổi ở mọi phiên bản (DOCUMENT, REVISION, DATE) bị bỏ qua.
+
+    Args:
+        drawing_text: Văn bản của bản vẽ kỹ thuật
+
+    Returns:
+        Dict nội dung đã chuẩn hóa khoảng trắng theo tên phần
+    """
+    sections: Dict[str, List[str]] = {}
+    current = None
+
+    for raw_line in drawing_text.splitlines():
+        line = " ".join(raw_line.split())
+        if not line or set(line) == {"="}:
+            continue
+
+        header = SECTION_HEADER_RE.match(line) or LEGACY_HEADER_RE.match(line)
+        if header:
+            current = header.group(1).strip().upper()
+            sections.setdefault(current, [])
+            continue
+
+        if current is None:
+            field = HEADER_FIELD_RE.match(line)
+            if field:
+                name = field.group(1).strip()
+                if name not in VOLATILE_FIELDS:
+                    sections[name] = [field.group(2).strip()]
+            continue
+
+        sections[current].append(line)
+
+    return {name: "\n".join(lines) for name, lines in sections.items()}
+
+def section_hashes(drawing_text: str) -> Dict[str, str]:
+    """Băm nội dung từng phần của bản vẽ"""
+    return {
+        name: hashlib.sha256(content.encode('utf-8')).hexdigest()
+        for name, content in split_sections(drawing_text).items()
+    }
+
+def get_part_number(drawing_text: str, drawing_path: str) -> str:
+    """
+    Xác định mã chi tiết từ dòng "PART NUMBER:"; nếu không có thì dùng tên file bỏ hậu tố phiên bản
+
+    Args:
+        drawing_text: Văn bản của bản vẽ
+        drawing_path: Đường dẫn đến file bản vẽ
+
+    Returns:
+        Mã chi tiết
+    """
+    part_number = utils.extract_part_number(drawing_text)
+    if part_number:
+        return part_number
+    stem = os.path.splitext(os.path.basename(drawing_path))[0]
+    return re.sub(r'[_-]v\d+$', '', stem, flags=re.IGNORECASE)
+
+def _state_path(part_number: str) -> str:
+    safe_name = re.sub(r'[^A-Za-z0-9._-]', '_', part_number)
+    return os.path.join(config.REVISIONS_PATH, f"{safe_name}.json")
+
+def load_revision_state(part_number: str) -> Optional[Dict[str, Any]]:
+    """
+    Tải trạng thái của phiên bản đã lập kế hoạch gần nhất
+
+    Args:
+        part_number: Mã chi tiết
+
+    Returns:
+        Dict trạng thái hoặc None nếu chưa có
+    """
+    path = _state_path(part_number)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def record_planned_revision(drawing_path: str, stage_outputs: Dict[str, str]) -> None:
+    """
+    Lưu mã băm các phần và output các công đoạn của phiên bản vừa lập kế hoạch
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+        stage_outputs: Output của tất cả công đoạn
+    """
+    if any(stage not in stage_outputs for stage in stages.STAGE_ORDER):
+        logger.warning(f"Không lưu trạng thái phiên bản vì thiếu output công đoạn: {drawing_path}")
+        return
+
+    drawing_text = utils.load_drawing_file(drawing_path)
+    part_number = get_part_number(drawing_text, drawing_path)
+    revision = re.search(r'^\s*REVISION:\s*(\S+)', drawing_text, re.MULTILINE)
+    state = {
+        "part_number": part_number,
+        "revision": revision.group(1) if revision else None,
+        "drawing_path": os.path.abspath(drawing_path),
+        "section_hashes": section_hashes(drawing_text),
+        "stage_outputs": {stage: stage_outputs[stage] for stage in stages.STAGE_ORDER},
+        "updated_at": datetime.now().isoformat()
+    }
+
+    os.makedirs(config.REVISIONS_PATH, exist_ok=True)
+    path = _state_path(part_number)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(f"Đã lưu trạng thái phiên bản {state['revision']} của chi tiết {part_number}")
+
+def diff_revision(drawing_text: str, previous_state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    So sánh bản vẽ mới với phiên bản đã lập kế hoạch và xác định các công đoạn cần chạy lại
+
+    Args:
+        drawing_text: Văn bản của bản vẽ mới
+        previous_state: Trạng thái của phiên bản trước (từ load_revision_state)
+
+    Returns:
+        Dict gồm các phần đã thay đổi và các công đoạn cần chạy lại (theo thứ tự công đoạn)
+    """
+    new_hashes = section_hashes(drawing_text)
+    old_hashes = previous_state.get("section_hashes", {})
+
+    changed = sorted(
+        name for name in set(new_hashes) | set(old_hashes)
+        if new_hashes.get(name) != old_hashes.get(name)
+    )
+
+    affected = set()
+    for name in changed:
+        affected.update(SECTION_STAGE_IMPACT.get(name, _ALL_STAGES))
+
+    return {
+        "changed_sections": changed,
+        "stages_to_run": [stage for stage in stages.STAGE_ORDER if stage in affected]
+    }
@@ -11,6 +11,8 @@ from typing import Dict, Any
 from dotenv import load_dotenv
 import config
 import utils
+import llm_cache
+import tracing
 import autogen_agents
 
 # Tải biến môi trường
@@ -19,6 +21,9 @@ load_dotenv()
 # Thiết lập logging
 logger = logging.getLogger(__name__)
 
+# Engine của tác tử thực thi mã (xem run_code_execution_agent)
+CODE_AGENT_ENGINES = ("builtin", "llm")
+
 def parse_arguments():
     """Xử lý tham số dòng lệnh"""
     parser = argparse.ArgumentParser(
@@ -40,6 +45,22 @@ def parse_arguments():
         help='Chế độ chạy: "code" (tác tử thực thi mã) hoặc "team" (nhóm tác tử giao tiếp)'
     )
     
+    parser.add_argument(
+        '--engine',
+        type=str,
+        choices=CODE_AGENT_ENGINES,
+        default=None,
+        help='Chế độ "code": "builtin" (tối ưu chế độ cắt tất định bằng cutting_optimizer) hoặc "llm" (tác tử AutoGen viết và chạy mã)'
+    )
+    
+    parser.add_argument(
+        '--objective',
+        type=str,
+        choices=['time', 'cost'],
+        default=None,
+        help='Mục tiêu tối ưu chế độ cắt của engine "builtin": "time" hoặc "cost"'
+    )
+    
     parser.add_argument(
         '--output', '-o',
         type=str,
@@ -47,6 +68,20 @@ def parse_arguments():
         help='Tên file để lưu kết quả'
     )
     
+    parser.add_argument(
+        '--llm-cache',
+        type=str,
+        choices=['off', 'on', 'replay'],
+        default=None,
+        help='Bộ nhớ đệm phản hồi LLM: "off", "on" hoặc "replay" (chỉ đọc, lỗi nếu chưa có trong bộ nhớ đệm)'
+    )
+    
+    parser.add_argument(
+        '--trace',
+        action='store_true',
+        help='Ghi vết từng lượt trả lời của tác tử và xuất file Chrome trace cạnh file kết quả'
+    )
+    
     parser.add_argument(
         '--verbose', '-v',
         action='store_true',
@@ -55,18 +90,28 @@ def parse_arguments():
     
     return parser.parse_args()
 
-def run_code_execution_agent(drawing_path: str) -> Dict[str, Any]:
+def run_code_execution_agent(drawing_path: str, engine: str = None, objective: str = None) -> Dict[str, Any]:
     """
     Chạy tác tử AutoGen thực thi mã
     
     Args:
         drawing_path: Đường dẫn đến file bản vẽ
+        engine: "builtin" (cutting_optimizer, không gọi LLM) hoặc "llm"; mặc định CODE_AGENT_ENGINE
+        objective: Mục tiêu tối ưu của engine "builtin" ("time" hoặc "cost")
         
     Returns:
         Dict chứa kết quả tối ưu hóa
+        
+    Raises:
+        ValueError: Engine không thuộc CODE_AGENT_ENGINES
     """
     logger.info(f"Chạy tác tử AutoGen thực thi mã với bản vẽ: {drawing_path}")
     
+    # Giá trị CODE_AGENT_ENGINE gõ sai không được lặng lẽ chuyển sang engine "llm"
+    engine = engine or config.CODE_AGENT_ENGINE
+    if engine not in CODE_AGENT_ENGINES:
+        raise ValueError(f"Engine không hợp lệ: {engine} (chọn một trong {', '.join(CODE_AGENT_ENGINES)})")
+    
     # Kiểm tra file bản vẽ
     if not os.path.exists(drawing_path):
         logger.error(f"Không tìm thấy file bản vẽ: {drawing_path}")
@@ -78,8 +123,14 @@ def run_code_execution_agent(drawing_path: str) -> Dict[str, Any]:
     # Trích xuất thông số kỹ thuật
     part_specs = utils.extract_technical_specs(drawing_text)
     
-    # Chạy tác tử thực thi mã
-    result = autogen_agents.create_code_execution_agent(part_specs)
+    with tracing.span("code_execution", "stage", drawing=drawing_path, engine=engine):
+        if engine == "builtin":
+            # Tối ưu chế độ cắt tất định thay cho vòng lặp LLM viết và chạy mã
+            import cutting_optimizer
+            result = cutting_optimizer.optimize_part(part_specs, objective=objective)
+        else:
+            # Chạy tác tử thực thi mã (engine "llm")
+            result = autogen_agents.create_code_execution_agent(part_specs)
     
     return {
         "source_drawing": drawing_path,
@@ -105,7 +156,8 @@ def run_team_chat(drawing_path: str) -> Dict[str, Any]:
         raise FileNotFoundError(f"Không tìm thấy file bản vẽ: {drawing_path}")
     
     # Chạy nhóm tác tử
-    result = autogen_agents.create_manufacturing_team_chat(drawing_path)
+    with tracing.span("team_chat", "stage", drawing=drawing_path):
+        result = autogen_agents.create_manufacturing_team_chat(drawing_path)
     
     return {
         "source_drawing": drawing_path,
@@ -117,16 +169,23 @@ def main():
     # Xử lý tham số dòng lệnh
     args = parse_arguments()
     
+    config.setup_logging()
+    
     # Ghi đè cấu hình nếu được chỉ định
     if args.verbose:
         config.VERBOSE = True
+    if args.llm_cache:
+        config.LLM_CACHE_MODE = args.llm_cache
+    if args.trace:
+        config.TRACING = True
     
     try:
         # Chạy tác tử phù hợp với chế độ đã chọn
-        if args.mode == 'code':
-            result = run_code_execution_agent(args.drawing)
-        else:  # mode == 'team'
-            result = run_team_chat(args.drawing)
+        with tracing.span("run", "run", drawing=args.drawing, mode=args.mode):
+            if args.mode == 'code':
+                result = run_code_execution_agent(args.drawing, engine=args.engine, objective=args.objective)
+            else:  # mode == 'team'
+                result = run_team_chat(args.drawing)
         
         # Lưu kết quả
         output_path = utils.save_data(result, args.output)
@@ -137,8 +196,21 @@ def main():
         print(f"Bản vẽ nguồn: {args.drawing}")
         
         if args.mode == 'code':
-            if "error" in result.get("optimization_result", {}):
-                print(f"Lỗi: {result['optimization_result']['error']}")
+            optimization = result.get("optimization_result", {})
+            if "error" in optimization:
+                print(f"Lỗi: {optimization['error']}")
+            elif "operations" in optimization:
+                print(
+                    f"Chế độ cắt tối ưu ({optimization['objective']}) cho {len(optimization['operations'])} nguyên công "
+                    f"trong {optimization['seconds']}s: {optimization['baseline_cutting_minutes']} -> "
+                    f"{optimization['total_cutting_minutes']} phút cắt, chi phí {optimization['total_cost']}"
+                )
+                for operation in optimization["operations"]:
+                    print(
+                        f"  - {operation['name']}: Vc {operation['cutting_speed']} m/min, f {operation['feed']}, "
+                        f"ap {operation['depth_of_cut']} mm, {operation['cutting_minutes']} phút"
+                        + ("" if operation["feasible"] else " (không thỏa ràng buộc)")
+                    )
             else:
                 print("Quá trình tối ưu hóa đã hoàn thành thành công")
         else:  # mode == 'team'
@@ -147,6 +219,13 @@ def main():
             else:
                 print("Cuộc thảo luận nhóm đã hoàn thành nhưng không tìm thấy kế hoạch cuối cùng rõ ràng")
         
+        if config.LLM_CACHE_MODE != "off":
+            stats = llm_cache.cache_stats()
+            print(f"Bộ nhớ đệm LLM ({stats['mode']}): {stats['hits']} trúng, {stats['misses']} trượt")
+        
+        if config.TRACING:
+            print(f"File trace: {tracing.export_chrome_trace(tracing.trace_path_for(output_path))}")
+        
     except Exception as e:
         logger.error(f"Lỗi: {str(e)}")
         print(f"Đã xảy ra lỗi: {str(e)}")
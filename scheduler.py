@@ -0,0 +1,524 @@
+"""
+Lập lịch xưởng (job shop) từ các kế hoạch sản xuất: mỗi kế hoạch là một công việc gồm các bước theo
+thứ tự trên từng loại máy; lịch được tạo bằng điều độ theo hàng đợi ưu tiên (heapq) trên mô phỏng sự
+kiện, cải thiện bằng tìm kiếm cục bộ trên đường găng, và xuất ra JSON cho biểu đồ Gantt
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import heapq
+import random
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+import config
+import utils
+import plan_model
+
+logger = logging.getLogger(__name__)
+
+# Loại máy chuẩn và từ nhận dạng trong tên máy/nguyên công (kiểm tra theo thứ tự); mỗi mẫu khớp
+# nguyên từ, để "Taper turning" không bị nhận là taro hay "Surface ... check" là khỏa mặt
+MACHINE_TYPES = (
+    ("Heat Treatment", (r"heat", r"furnace", r"harden(s|ed|ing)?", r"quench(es|ed|ing)?", r"temper(s|ed|ing)?",
+                        r"nhiệt luyện")),
+    ("Cylindrical Grinder", (r"grind(s|er|ers|ing)?", r"mài")),
+    ("Inspection", (r"inspect(s|ed|ing|ion|ions)?", r"cmm", r"check(s|ed|ing)?", r"kiểm tra")),
+    ("CNC Mill", (r"mill(s|ed|er|ing)?", r"machining cent(er|re)s?", r"vmc", r"hmc", r"drill(s|ed|ing)?",
+                  r"tap(s|ped|ping)?", r"keyways?", r"phay", r"khoan")),
+    ("CNC Lathe", (r"lathes?", r"turn(s|ed|ing)?", r"bor(e|es|ed|ing)", r"fac(e|es|ed|ing)", r"tiện"))
+)
+
+_MACHINE_PATTERNS = [
+    (canonical, re.compile(r"\b(?:" + "|".join(words) + r")\b"))
+    for canonical, words in MACHINE_TYPES
+]
+
+# Nhóm máy của mô hình thời gian gia công (machining.py) -> loại máy
+GROUP_MACHINES = {
+    "turning": "CNC Lathe",
+    "milling": "CNC Mill",
+    "drilling": "CNC Mill",
+    "grinding": "Cylindrical Grinder"
+}
+
+# Quy tắc điều độ: mwkr = nhiều công việc còn lại nhất trước, lwkr = ít nhất trước,
+# spt/lpt = bước ngắn/dài nhất trước, fifo = sẵn sàng trước làm trước
+DISPATCH_RULES = ("mwkr", "lwkr", "spt", "lpt", "fifo")
+
+# Số lần thử liên tiếp không giảm makespan thì dừng tìm kiếm cục bộ
+SEARCH_PATIENCE = 5000
+
+def parse_machines(value: Any) -> Dict[str, int]:
+    """
+    Đọc danh sách máy của xưởng
+
+    Args:
+        value: Dict loại máy -> số máy, chuỗi "CNC Lathe=2,CNC Mill=2" hoặc đường dẫn file JSON
+
+    Returns:
+        Dict loại máy -> số máy
+    """
+    if isinstance(value, dict):
+        machines = value
+    elif isinstance(value, str) and os.path.isfile(value):
+        with open(value, 'r', encoding='utf-8') as f:
+            machines = json.load(f)
+    else:
+        machines = {}
+        for item in str(value or "").split(","):
+            if not item.strip():
+                continue
+            name, _, count = item.partition("=")
+            machines[name.strip()] = count.strip() or 1
+    result = {machine_type(name): int(count) for name, count in machines.items()}
+    for name, count in result.items():
+        if count < 1:
+            raise ValueError(f"Số máy phải lớn hơn 0: {name}={count}")
+    return result
+
+def machine_type(name: str) -> str:
+    """Loại máy chuẩn của một tên máy hoặc nguyên công (giữ nguyên tên nếu không nhận dạng được)"""
+    lowered = (name or "").lower()
+    for canonical, pattern in _MACHINE_PATTERNS:
+        if canonical.lower() == lowered or pattern.search(lowered):
+            return canonical
+    return (name or "").strip()
+
+def _merge_steps(steps: List[Tuple[str, str, float]]) -> List[Dict[str, Any]]:
+    """Gộp các bước liên tiếp trên cùng loại máy thành một bước (một lần gá)"""
+    route: List[Dict[str, Any]] = []
+    for machine, name, minutes in steps:
+        if route and route[-1]["machine"] == machine:
+            route[-1]["name"] += f", {name}"
+            route[-1]["minutes"] += minutes
+        else:
+            route.append({"machine": machine, "name": name, "minutes": minutes})
+    for step in route:
+        step["minutes"] = round(step["minutes"], 2)
+    return route
+
+def route_from_structured(plan: "plan_model.CompactPlan") -> Optional[List[Dict[str, Any]]]:
+    """
+    Các bước của công việc lấy từ kế hoạch có cấu trúc (máy và thời gian ước tính của từng nguyên công)
+
+    Args:
+        plan: Kế hoạch gọn
+
+    Returns:
+        Danh sách bước, hoặc None nếu có nguyên công thiếu thời gian hay máy
+    """
+    setups = {setup.id: setup.machine for setup in plan.setups}
+    steps = []
+    for operation in sorted(plan.operations, key=lambda op: op.sequence):
+        machine = operation.machine or setups.get(operation.setup) or operation.name
+        if operation.minutes is None or not machine:
+            return None
+        steps.append((machine_type(machine), operation.name, operation.minutes))
+    return _merge_steps(steps) if steps else None
+
+def route_from_drawing(drawing_path: str) -> List[Dict[str, Any]]:
+    """
+    Các bước của công việc tính từ bản vẽ bằng mô hình thời gian gia công, theo trình tự của tiêu chuẩn
+    quy trình: tiện, phay/khoan, nhiệt luyện, mài, kiểm tra (mỗi bước cộng thời gian gá đặt)
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+
+    Returns:
+        Danh sách bước
+    """
+    # NumPy chỉ được nạp khi cần tính thời gian gia công
+    import machining
+
+    times = machining.estimate_machining_time(utils.extract_technical_specs(utils.load_drawing_file(drawing_path)))
+    steps = []
+    for group in ("turning", "milling", "drilling"):
+        if times[group] > 0:
+            steps.append((GROUP_MACHINES[group], group, times[group] + machining.SETUP_MINUTES[group]))
+    if times["heat_treatment"] > 0:
+        steps.append(("Heat Treatment", "heat_treatment", times["heat_treatment"]))
+    if times["grinding"] > 0:
+        steps.append((GROUP_MACHINES["grinding"], "grinding", times["grinding"] + machining.SETUP_MINUTES["grinding"]))
+    steps.append(("Inspection", "inspection", times["inspection"]))
+    return _merge_steps(steps)
+
+def jobs_from_plans(plans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Tạo công việc từ các kế hoạch sản xuất
+
+    Dùng nguyên công của kế hoạch có cấu trúc nếu đủ máy và thời gian, nếu không thì tính từ bản vẽ
+    nguồn (mỗi bản vẽ chỉ tính một lần).
+
+    Args:
+        plans: Kế hoạch sản xuất (dict kết quả hoặc file JSON đã lưu)
+
+    Returns:
+        Danh sách công việc {id, part_number, source, operations}
+    """
+    jobs = []
+    routes: Dict[str, List[Dict[str, Any]]] = {}
+    for i, plan in enumerate(plans):
+        drawing_path = plan.get("source_drawing") or ""
+        compact = plan_model.load_plan(plan)
+        route = route_from_structured(compact) if compact is not None else None
+        part_number = compact.part_number if compact is not None else ""
+        if route is None:
+            if not os.path.exists(drawing_path):
+                logger.warning(f"Bỏ qua kế hoạch không có nguyên công và bản vẽ nguồn: {plan.get('run_id') or i}")
+                continue
+            if drawing_path not in routes:
+                routes[drawing_path] = route_from_drawing(drawing_path)
+            route = [dict(step) for step in routes[drawing_path]]
+        if not part_number and os.path.exists(drawing_path):
+            part_number = utils.extract_part_number(utils.load_drawing_file(drawing_path)) or ""
+        jobs.append({
+            "id": plan.get("run_id") or f"job-{i + 1}",
+            "part_number": part_number or "unknown",
+            "source": drawing_path,
+            "operations": route
+        })
+    return jobs
+
+def _dispatch(durations: List[float], machine_of: List[int], next_of: List[int], firsts: List[int],
+              counts: List[int], priority: List[float]) -> Tuple[List[float], List[int], List[int]]:
+    """
+    Lịch không trễ (non-delay): mô phỏng sự kiện, mỗi khi máy rảnh thì chọn bước sẵn sàng có độ ưu tiên
+    nhỏ nhất trong hàng đợi heapq của loại máy đó
+
+    Returns:
+        (thời điểm bắt đầu, máy thực hiện, bước chạy trước trên cùng máy) của từng bước
+    """
+    size = len(durations)
+    start = [0.0] * size
+    assigned = [-1] * size
+    previous = [-1] * size
+
+    # Máy thực tế đánh số liên tiếp theo loại máy
+    offsets, total = [], 0
+    for count in counts:
+        offsets.append(total)
+        total += count
+    idle = [list(range(offset, offset + count)) for offset, count in zip(offsets, counts)]
+    last = [-1] * total
+    # Hàng đợi theo (độ ưu tiên, thời điểm sẵn sàng, bước): cùng độ ưu tiên thì bước chờ lâu hơn trước
+    queues: List[List[Tuple[float, float, int]]] = [[] for _ in counts]
+    events: List[Tuple[float, int]] = []
+
+    def run(kind: int, now: float) -> None:
+        queue, free = queues[kind], idle[kind]
+        while queue and free:
+            _, _, op = heapq.heappop(queue)
+            machine = heapq.heappop(free)
+            start[op] = now
+            assigned[op] = machine
+            previous[op] = last[machine]
+            last[machine] = op
+            heapq.heappush(events, (now + durations[op], op))
+
+    for op in firsts:
+        heapq.heappush(queues[machine_of[op]], (priority[op], 0.0, op))
+    for kind in range(len(counts)):
+        run(kind, 0.0)
+
+    while events:
+        now = events[0][0]
+        touched = set()
+        # Xử lý mọi sự kiện cùng thời điểm trước khi điều độ để lựa chọn không phụ thuộc thứ tự sự kiện
+        while events and events[0][0] == now:
+            _, op = heapq.heappop(events)
+            kind = machine_of[op]
+            heapq.heappush(idle[kind], assigned[op])
+            touched.add(kind)
+            following = next_of[op]
+            if following >= 0:
+                heapq.heappush(queues[machine_of[following]], (priority[following], now, following))
+                touched.add(machine_of[following])
+        for kind in sorted(touched):
+            run(kind, now)
+    return start, assigned, previous
+
+def _rule_priority(rule: str, durations: List[float], next_of: List[int], firsts: List[int]) -> List[float]:
+    """Độ ưu tiên của từng bước theo quy tắc điều độ (nhỏ hơn được chọn trước)"""
+    if rule not in DISPATCH_RULES:
+        raise ValueError(f"Quy tắc điều độ không hợp lệ: {rule} (chọn một trong {', '.join(DISPATCH_RULES)})")
+    if rule == "spt":
+        return list(durations)
+    if rule == "lpt":
+        return [-minutes for minutes in durations]
+    if rule == "fifo":
+        return [0.0] * len(durations)
+    remaining = [0.0] * len(durations)
+    for first in firsts:
+        chain = []
+        op = first
+        while op >= 0:
+            chain.append(op)
+            op = next_of[op]
+        work = 0.0
+        for op in reversed(chain):
+            work += durations[op]
+            remaining[op] = work
+    return [-work for work in remaining] if rule == "mwkr" else remaining
+
+def _critical_swaps(start: List[float], durations: List[float], previous: List[int],
+                    previous_job: List[int]) -> List[Tuple[int, int]]:
+    """Các cặp bước liền kề trên cùng máy nằm trên đường găng (hoán đổi được để giảm makespan)"""
+    swaps = []
+    op = max(range(len(start)), key=lambda i: start[i] + durations[i])
+    while op >= 0 and start[op] > 0:
+        before = previous[op]
+        on_machine = before >= 0 and abs(start[before] + durations[before] - start[op]) < 1e-9
+        if on_machine:
+            swaps.append((before, op))
+        predecessor = previous_job[op]
+        if predecessor >= 0 and abs(start[predecessor] + durations[predecessor] - start[op]) < 1e-9:
+            op = predecessor
+        elif on_machine:
+            op = before
+        else:
+            break
+    return swaps
+
+def lower_bound(jobs: List[Dict[str, Any]], machines: Dict[str, int]) -> float:
+    """
+    Cận dưới của makespan: công việc dài nhất, hoặc với từng loại máy: phần đầu ngắn nhất trước máy đó
+    + tải của máy chia số máy + phần đuôi ngắn nhất sau máy đó
+    """
+    load: Dict[str, float] = {}
+    head: Dict[str, float] = {}
+    tail: Dict[str, float] = {}
+    longest = 0.0
+    for job in jobs:
+        total = sum(step["minutes"] for step in job["operations"])
+        longest = max(longest, total)
+        before = 0.0
+        for step in job["operations"]:
+            kind = step["machine"]
+            load[kind] = load.get(kind, 0.0) + step["minutes"]
+            head[kind] = min(head.get(kind, before), before)
+            tail[kind] = min(tail.get(kind, total), total - before - step["minutes"])
+            before += step["minutes"]
+    return max([longest] + [head[kind] + minutes / machines.get(kind, 1) + tail[kind] for kind, minutes in load.items()])
+
+def schedule(jobs: List[Dict[str, Any]], machines: Dict[str, int], rules: Optional[List[str]] = None,
+             search_seconds: float = None, seed: int = 0, start_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Lập lịch giảm makespan cho các công việc trên danh sách máy
+
+    Thử từng quy tắc điều độ và giữ lịch tốt nhất, sau đó (nếu search_seconds > 0) tìm kiếm cục bộ:
+    hoán đổi độ ưu tiên của hai bước liền kề trên cùng máy thuộc đường găng, giữ lại nếu makespan không tăng.
+
+    Args:
+        jobs: Công việc (xem jobs_from_plans), mỗi bước có machine, name, minutes
+        machines: Loại máy -> số máy; loại máy chưa có được coi là 1 máy
+        rules: Các quy tắc điều độ cần thử (mặc định tất cả DISPATCH_RULES)
+        search_seconds: Thời gian tìm kiếm cục bộ (mặc định SCHEDULER_SEARCH_SECONDS; 0 = tắt)
+        seed: Hạt giống ngẫu nhiên của tìm kiếm cục bộ
+        start_at: Thời điểm bắt đầu lịch để thêm thời gian thực vào các bước
+
+    Returns:
+        Lịch dạng JSON cho biểu đồ Gantt: makespan, lower_bound, machines, jobs và tasks (phút từ lúc bắt đầu)
+    """
+    started = time.perf_counter()
+    search_seconds = config.SCHEDULER_SEARCH_SECONDS if search_seconds is None else search_seconds
+    machines = dict(machines)
+    for job in jobs:
+        for step in job["operations"]:
+            if step["machine"] not in machines:
+                logger.warning(f"Loại máy không có trong danh sách máy, coi là 1 máy: {step['machine']}")
+                machines[step["machine"]] = 1
+    kinds = sorted(machines)
+    kind_index = {kind: k for k, kind in enumerate(kinds)}
+    counts = [machines[kind] for kind in kinds]
+
+    # Các bước của mọi công việc được xếp liên tiếp trong các danh sách phẳng
+    durations: List[float] = []
+    machine_of: List[int] = []
+    owner: List[int] = []
+    next_of: List[int] = []
+    previous_job: List[int] = []
+    firsts: List[int] = []
+    first_of: Dict[int, int] = {}
+    for j, job in enumerate(jobs):
+        for position, step in enumerate(job["operations"]):
+            op = len(durations)
+            if position == 0:
+                firsts.append(op)
+                first_of[j] = op
+                previous_job.append(-1)
+            else:
+                next_of[op - 1] = op
+                previous_job.append(op - 1)
+            durations.append(float(step["minutes"]))
+            machine_of.append(kind_index[step["machine"]])
+            owner.append(j)
+            next_of.append(-1)
+
+    best = None
+    for rule in rules or DISPATCH_RULES:
+        priority = _rule_priority(rule, durations, next_of, firsts)
+        start, assigned, previous = _dispatch(durations, machine_of, next_of, firsts, counts, priority)
+        makespan = max((s + d for s, d in zip(start, durations)), default=0.0)
+        if best is None or makespan < best["makespan"]:
+            best = {"rule": rule, "makespan": makespan, "priority": priority,
+                    "start": start, "assigned": assigned, "previous": previous}
+    rule_makespan = best["makespan"]
+
+    iterations = improvements = stalled = 0
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + max(search_seconds, 0.0)
+    bound = lower_bound(jobs, machines)
+    while (durations and time.perf_counter() < deadline and best["makespan"] > bound + 1e-9
+           and stalled < SEARCH_PATIENCE):
+        swaps = _critical_swaps(best["start"], durations, best["previous"], previous_job)
+        if not swaps:
+            break
+        iterations += 1
+        first, second = rng.choice(swaps)
+        priority = list(best["priority"])
+        priority[first], priority[second] = priority[second], priority[first]
+        if priority[first] == priority[second]:
+            priority[second] = priority[first] - 1e-6
+        start, assigned, previous = _dispatch(durations, machine_of, next_of, firsts, counts, priority)
+        makespan = max(s + d for s, d in zip(start, durations))
+        stalled += 1
+        if makespan <= best["makespan"]:
+            if makespan < best["makespan"]:
+                improvements += 1
+                stalled = 0
+            best.update(makespan=makespan, priority=priority, start=start, assigned=assigned, previous=previous)
+
+    # Tên máy thực tế, vd: "CNC Lathe #2"
+    names = [f"{kind} #{number}" for kind, count in zip(kinds, counts) for number in range(1, count + 1)]
+    busy = [0.0] * len(names)
+    tasks = []
+    for op, (begin, machine) in enumerate(zip(best["start"], best["assigned"])):
+        job = jobs[owner[op]]
+        step = job["operations"][op - first_of[owner[op]]]
+        end = begin + durations[op]
+        busy[machine] += durations[op]
+        task = {
+            "job": job["id"], "part_number": job["part_number"], "operation": step["name"],
+            "machine": names[machine], "machine_type": step["machine"],
+            "start": round(begin, 2), "end": round(end, 2)
+        }
+        if start_at is not None:
+            task["start_at"] = (start_at + timedelta(minutes=begin)).isoformat(timespec="minutes")
+            task["end_at"] = (start_at + timedelta(minutes=end)).isoformat(timespec="minutes")
+        tasks.append(task)
+    tasks.sort(key=lambda task: (task["machine"], task["start"]))
+
+    makespan = best["makespan"]
+    job_rows = []
+    for j, job in enumerate(jobs):
+        if j not in first_of:
+            continue
+        first = first_of[j]
+        last = first + len(job["operations"]) - 1
+        job_rows.append({
+            "id": job["id"], "part_number": job["part_number"], "source": job["source"],
+            "start": round(best["start"][first], 2), "completion": round(best["start"][last] + durations[last], 2)
+        })
+
+    elapsed = time.perf_counter() - started
+    result = {
+        "start_at": start_at.isoformat(timespec="minutes") if start_at is not None else None,
+        "makespan": round(makespan, 2),
+        "lower_bound": round(bound, 2),
+        "gap": round((makespan - bound) / bound, 4) if bound else 0.0,
+        "rule": best["rule"],
+        "rule_makespan": round(rule_makespan, 2),
+        "search": {"iterations": iterations, "improvements": improvements},
+        "seconds": round(elapsed, 3),
+        "machines": [
+            {"id": name, "type": name.rsplit(" #", 1)[0], "busy": round(minutes, 2),
+             "utilization": round(minutes / makespan, 4) if makespan else 0.0}
+            for name, minutes in zip(names, busy)
+        ],
+        "jobs": job_rows,
+        "tasks": tasks
+    }
+    logger.info(
+        f"Đã lập lịch {len(job_rows)} công việc, {len(tasks)} bước trong {elapsed:.2f}s: makespan "
+        f"{makespan:.1f} phút (quy tắc {best['rule']}: {rule_makespan:.1f}, cận dưới {bound:.1f})"
+    )
+    return result
+
+def load_plan_files(source: str) -> List[Dict[str, Any]]:
+    """
+    Đọc các file kế hoạch JSON (xem utils.save_data), bỏ qua file không phải kế hoạch
+
+    Args:
+        source: Thư mục (tìm đệ quy *.json) hoặc mẫu glob
+
+    Returns:
+        Danh sách kế hoạch
+    """
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, "**", "*.json"), recursive=True))
+    else:
+        paths = sorted(glob.glob(source, recursive=True))
+    plans = []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Không đọc được file {path}: {str(e)}")
+            continue
+        if isinstance(data, dict) and "source_drawing" in data and "plan" in data:
+            plans.append(data)
+    return plans
+
+def main():
+    """Lập lịch xưởng cho các kế hoạch đã lưu và ghi JSON cho biểu đồ Gantt"""
+    parser = argparse.ArgumentParser(description='Lập lịch máy (job shop) từ các kế hoạch sản xuất')
+    parser.add_argument('source', nargs='?', default=config.DATA_PATH,
+                        help='Thư mục (tìm đệ quy *.json) hoặc mẫu glob của các file kế hoạch')
+    parser.add_argument('--jobs', type=str, default=None,
+                        help='File JSON danh sách công việc (bỏ qua source), mỗi công việc có operations [{machine, name, minutes}]')
+    parser.add_argument('--machines', type=str, default=None,
+                        help='Danh sách máy "CNC Lathe=2,CNC Mill=2" hoặc file JSON (mặc định SCHEDULER_MACHINES)')
+    parser.add_argument('--rule', choices=DISPATCH_RULES, action='append', default=None,
+                        help='Quy tắc điều độ (lặp lại để thử nhiều quy tắc; mặc định thử tất cả)')
+    parser.add_argument('--search-seconds', type=float, default=None, help='Thời gian tìm kiếm cục bộ (0 = tắt)')
+    parser.add_argument('--seed', type=int, default=0, help='Hạt giống ngẫu nhiên của tìm kiếm cục bộ')
+    parser.add_argument('--start', type=str, default=None, help='Thời điểm bắt đầu lịch (ISO 8601, vd: 2024-06-03T07:00)')
+    parser.add_argument('--output', '-o', type=str, default=None, help='File JSON lịch (mặc định in ra màn hình)')
+    args = parser.parse_args()
+
+    config.setup_logging()
+    if args.jobs:
+        with open(args.jobs, 'r', encoding='utf-8') as f:
+            jobs = json.load(f)
+        for i, job in enumerate(jobs):
+            job.setdefault("id", f"job-{i + 1}")
+            job.setdefault("part_number", "unknown")
+            job.setdefault("source", "")
+            for step in job["operations"]:
+                step["machine"] = machine_type(step["machine"])
+    else:
+        jobs = jobs_from_plans(load_plan_files(args.source))
+
+    machines = parse_machines(args.machines or config.SCHEDULER_MACHINES)
+    start_at = datetime.fromisoformat(args.start) if args.start else None
+    result = schedule(jobs, machines, args.rule, args.search_seconds, args.seed, start_at)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, separators=(",", ":"))
+        print(
+            f"Đã lập lịch {len(result['jobs'])} công việc ({len(result['tasks'])} bước) trong {result['seconds']}s: "
+            f"makespan {result['makespan'] / 60:.1f} giờ, cận dưới {result['lower_bound'] / 60:.1f} giờ "
+            f"(quy tắc {result['rule']}, chênh lệch {result['gap']:.1%}) -> {args.output}"
+        )
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Chế độ dịch vụ: máy chủ HTTP/JSON cục bộ giữ sẵn một nhóm tác tử và LLM đã khởi tạo,
+nhận bản vẽ và trả về kế hoạch hoặc mã công việc
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Any, Optional
+import config
+import utils
+import stages
+import llm_cache
+import plan_cache
+import file_tools
+import main as planner
+
+logger = logging.getLogger(__name__)
+
+class AgentPool:
+    """
+    Nhóm các bộ tác tử (mỗi bộ gồm tác tử của sáu công đoạn) đã tạo sẵn theo mã chi tiết
+
+    Mỗi công việc mượn riêng một bộ trong suốt lượt chạy rồi trả lại, nên tác tử, LLM client
+    và backstory/restriction đã dựng được dùng lại thay vì tạo mới cho mỗi yêu cầu.
+    """
+
+    def __init__(self, max_idle_per_part: int):
+        """
+        Args:
+            max_idle_per_part: Số bộ tác tử rảnh tối đa giữ lại cho mỗi mã chi tiết
+        """
+        self.max_idle_per_part = max(1, max_idle_per_part)
+        self._idle: Dict[Optional[str], queue.LifoQueue] = {}
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "in_use": 0}
+
+    def _idle_queue(self, part_number: Optional[str]) -> queue.LifoQueue:
+        with self._lock:
+            if part_number not in self._idle:
+                self._idle[part_number] = queue.LifoQueue(maxsize=self.max_idle_per_part)
+            return self._idle[part_number]
+
+    def _create(self, part_number: Optional[str]) -> Dict[str, Any]:
+        agent_set = {stage: stages.create_stage_agent(stage, part_number) for stage in stages.STAGE_ORDER}
+        with self._lock:
+            self._stats["created"] += 1
+        return agent_set
+
+    def warm(self, part_numbers: List[Optional[str]], count: int) -> None:
+        """Tạo trước `count` bộ tác tử cho mỗi mã chi tiết"""
+        for part_number in part_numbers:
+            idle = self._idle_queue(part_number)
+            for _ in range(min(count, self.max_idle_per_part) - idle.qsize()):
+                idle.put_nowait(self._create(part_number))
+            logger.info(f"Đã khởi tạo sẵn {idle.qsize()} bộ tác tử cho mã chi tiết {part_number}")
+
+    def acquire(self, part_number: Optional[str]) -> Dict[str, Any]:
+        """Mượn một bộ tác tử (tạo mới nếu không còn bộ rảnh)"""
+        try:
+            agent_set = self._idle_queue(part_number).get_nowait()
+            reused = True
+        except queue.Empty:
+            agent_set = self._create(part_number)
+            reused = False
+        with self._lock:
+            self._stats["in_use"] += 1
+            if reused:
+                self._stats["reused"] += 1
+        return agent_set
+
+    def release(self, part_number: Optional[str], agent_set: Dict[str, Any]) -> None:
+        """Trả lại bộ tác tử; bỏ đi nếu nhóm đã đủ bộ rảnh"""
+        with self._lock:
+            self._stats["in_use"] -= 1
+        try:
+            self._idle_queue(part_number).put_nowait(agent_set)
+        except queue.Full:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["idle"] = {str(part): idle.qsize() for part, idle in self._idle.items()}
+        return stats
+
+class PlanningService:
+    """Hàng đợi công việc lập kế hoạch chạy trên nhóm luồng với nhóm tác tử dùng chung"""
+
+    def __init__(self, workers: int, warm_parts: List[str] = None, max_jobs: int = None):
+        """
+        Args:
+            workers: Số công việc chạy đồng thời
+            warm_parts: Các mã chi tiết cần khởi tạo sẵn bộ tác tử
+            max_jobs: Số công việc đã xong được giữ lại để tra cứu
+        """
+        self.workers = max(1, workers)
+        self.max_jobs = max_jobs or config.SERVICE_MAX_JOBS
+        self.pool = AgentPool(self.workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="service")
+        self.started_at = time.time()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {"submitted": 0, "completed": 0, "failed": 0, "latency_seconds": []}
+
+        if warm_parts:
+            self.pool.warm(warm_parts, self.workers)
+
+    def submit(self, drawing_path: str) -> Dict[str, Any]:
+        """
+        Đưa một bản vẽ vào hàng đợi
+
+        Args:
+            drawing_path: Đường dẫn đến file bản vẽ
+
+        Returns:
+            Bản ghi công việc
+        """
+        if not os.path.exists(drawing_path):
+            raise FileNotFoundError(f"Không tìm thấy file bản vẽ: {drawing_path}")
+
+        job = {
+            "job_id": uuid.uuid4().hex[:12],
+            "drawing_path": drawing_path,
+            "status": "queued",
+            "submitted_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "latency_seconds": None,
+            "output_path": None,
+            "error": None,
+            "result": None
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            self._metrics["submitted"] += 1
+            self._prune()
+        job["future"] = self.executor.submit(self._run, job)
+        return job
+
+    def _prune(self) -> None:
+        """Bỏ các công việc đã xong cũ nhất khi vượt quá số lượng giữ lại"""
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("succeeded", "failed")]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        started = time.perf_counter()
+        job["status"] = "running"
+        part_number = stages.get_drawing_part_number(job["drawing_path"])
+        agent_set = self.pool.acquire(part_number)
+        try:
+            plan = planner.run_manufacturing_planning(job["drawing_path"], stage_agents=agent_set)
+            job["output_path"] = utils.save_data(plan, f"service_{job['job_id']}_plan.json")
+            job["result"] = plan
+            job["status"] = "succeeded"
+        except Exception as e:
+            logger.error(f"Công việc {job['job_id']} lỗi: {str(e)}")
+            job["error"] = str(e)
+            job["status"] = "failed"
+        finally:
+            self.pool.release(part_number, agent_set)
+
+        job["latency_seconds"] = round(time.perf_counter() - started, 3)
+        job["finished_at"] = datetime.now().isoformat()
+        with self._lock:
+            self._metrics["completed" if job["status"] == "succeeded" else "failed"] += 1
+            self._metrics["latency_seconds"].append(job["latency_seconds"])
+            del self._metrics["latency_seconds"][:-1000]
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "workers": self.workers,
+            "active_jobs": active
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = {key: value for key, value in self._metrics.items() if key != "latency_seconds"}
+            latencies = sorted(self._metrics["latency_seconds"])
+            metrics["queued"] = sum(1 for job in self._jobs.values() if job["status"] == "queued")
+            metrics["running"] = sum(1 for job in self._jobs.values() if job["status"] == "running")
+        metrics["latency_mean_seconds"] = round(sum(latencies) / len(latencies), 3) if latencies else 0.0
+        metrics["latency_p95_seconds"] = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+        metrics["agent_pool"] = self.pool.stats()
+        metrics["llm_cache"] = llm_cache.cache_stats()
+        metrics["plan_cache"] = plan_cache.cache_stats()
+        metrics["file_tools"] = file_tools.tool_stats()
+        metrics["token_usage"] = stages.stage_usage_report()
+        return metrics
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Bản ghi công việc trả về cho client (không gồm future)"""
+    return {key: value for key, value in job.items() if key != "future"}
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /plan            {"drawing_path": "..."} hoặc {"drawing_text": "...", "file_name": "..."},
+                          thêm "wait": true để chờ kế hoạch; trả về mã công việc nếu không chờ
+    GET  /jobs/<job_id>   trạng thái và kết quả công việc
+    GET  /health          tình trạng dịch vụ
+    GET  /metrics         số liệu công việc, nhóm tác tử, bộ nhớ đệm LLM và token
+    """
+
+    service: PlanningService = None
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload, ensure_ascii=False, cls=utils.CustomJSONEncoder).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._send_json(200, self.service.health())
+        elif self.path == "/metrics":
+            self._send_json(200, self.service.metrics())
+        elif self.path.startswith("/jobs/"):
+            job = self.service.get_job(self.path[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {"error": "Không tìm thấy công việc"})
+            else:
+                self._send_json(200, _job_view(job))
+        else:
+            self._send_json(404, {"error": f"Không có đường dẫn {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path != "/plan":
+            self._send_json(404, {"error": f"Không có đường dẫn {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            drawing_path = request.get("drawing_path")
+            if not drawing_path and request.get("drawing_text"):
+                # Bản vẽ gửi kèm nội dung được lưu thành file để đi qua cùng luồng xử lý; mỗi lần
+                # tải lên có thư mục riêng nên hai yêu cầu trùng tên file không ghi đè lên nhau
+                upload_dir = os.path.join(config.DATA_PATH, "service_uploads", uuid.uuid4().hex)
+                os.makedirs(upload_dir, exist_ok=True)
+                file_name = os.path.basename(request.get("file_name") or "")
+                if file_name in ("", ".", ".."):
+                    file_name = "drawing.txt"
+                drawing_path = os.path.join(upload_dir, file_name)
+                with open(drawing_path, 'w', encoding='utf-8') as f:
+                    f.write(request["drawing_text"])
+            if not drawing_path:
+                self._send_json(400, {"error": "Cần drawing_path hoặc drawing_text"})
+                return
+            job = self.service.submit(drawing_path)
+        except FileNotFoundError as e:
+            self._send_json(404, {"error": str(e)})
+            return
+        except (ValueError, OSError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        if request.get("wait"):
+            job["future"].result()
+            self._send_json(200 if job["status"] == "succeeded" else 500, _job_view(job))
+        else:
+            self._send_json(202, {"job_id": job["job_id"], "status": job["status"]})
+
+def serve(host: str, port: int, workers: int, warm_parts: List[str] = None) -> None:
+    """
+    Chạy dịch vụ cho đến khi bị dừng (Ctrl+C)
+
+    Args:
+        host: Địa chỉ lắng nghe
+        port: Cổng lắng nghe
+        workers: Số công việc chạy đồng thời
+        warm_parts: Các mã chi tiết cần khởi tạo sẵn bộ tác tử
+    """
+    service = PlanningService(workers, warm_parts=warm_parts)
+    handler = type("BoundServiceRequestHandler", (ServiceRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    logger.info(f"Dịch vụ lập kế hoạch đang lắng nghe tại http://{host}:{port} với {workers} luồng")
+    print(f"Dịch vụ lập kế hoạch đang lắng nghe tại http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+def main():
+    """Khởi động dịch vụ từ dòng lệnh"""
+    parser = argparse.ArgumentParser(description='Dịch vụ HTTP/JSON lập kế hoạch sản xuất')
+    parser.add_argument('--host', type=str, default=config.SERVICE_HOST, help='Địa chỉ lắng nghe')
+    parser.add_argument('--port', type=int, default=config.SERVICE_PORT, help='Cổng lắng nghe')
+    parser.add_argument('--workers', type=int, default=config.SERVICE_WORKERS, help='Số công việc chạy đồng thời')
+    parser.add_argument(
+        '--warm', type=str, default=config.SERVICE_WARM_PARTS,
+        help='Các mã chi tiết cần khởi tạo sẵn bộ tác tử, phân cách bằng dấu phẩy'
+    )
+    parser.add_argument(
+        '--llm-cache', type=str, choices=['off', 'on', 'replay'], default=None,
+        help='Bộ nhớ đệm phản hồi LLM'
+    )
+    args = parser.parse_args()
+
+    config.setup_logging()
+
+    if args.llm_cache:
+        config.LLM_CACHE_MODE = args.llm_cache
+    warm_parts = [part.strip() for part in (args.warm or "").split(',') if part.strip()]
+    serve(args.host, args.port, args.workers, warm_parts)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Giảm thời gian gá đặt và thay dao bằng cách gom nguyên công của nhiều chi tiết: các lần gá được nhóm
+theo (máy, đồ gá, bộ dụng cụ), rồi sắp thứ tự trên từng loại máy (láng giềng gần nhất + dời vị trí)
+để tổng thời gian chuyển đổi nhỏ nhất; báo cáo số giờ gá đặt tiết kiệm so với gá lại từ đầu cho mỗi chi tiết
+"""
+
+import time
+import json
+import logging
+import argparse
+from typing import Dict, List, Any, Optional, Tuple
+import config
+import utils
+import catalogs
+import catalog_registry
+import plan_model
+import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Khóa chế độ cắt -> mục đồ gá trong phần WORKHOLDING DEVICES của catalog dụng cụ
+WORKHOLDING_STAGES = {
+    "rough_turning": "ROUGH MACHINING",
+    "rough_boring": "ROUGH MACHINING",
+    "finish_turning": "FINISH MACHINING",
+    "finish_boring": "FINISH MACHINING",
+    "face_milling": "MILLING OPERATIONS",
+    "keyway_milling": "MILLING OPERATIONS",
+    "drilling": "MILLING OPERATIONS",
+    "tapping": "MILLING OPERATIONS",
+    "external_grinding": "GRINDING OPERATIONS",
+    "internal_grinding": "GRINDING OPERATIONS",
+    "face_grinding": "GRINDING OPERATIONS"
+}
+
+# Đồ gá mặc định khi catalog không có phần WORKHOLDING DEVICES (theo tiêu chuẩn quy trình)
+DEFAULT_WORKHOLDING = {
+    "ROUGH MACHINING": "3-jaw chuck",
+    "FINISH MACHINING": "4-jaw chuck",
+    "MILLING OPERATIONS": "Fixture plate with locating pins",
+    "GRINDING OPERATIONS": "Between centers"
+}
+
+# Số nhóm xuất phát thử cho thuật toán láng giềng gần nhất
+NEAREST_NEIGHBOUR_STARTS = 16
+
+def full_setup_minutes(machine: str) -> float:
+    """Thời gian gá đặt từ đầu trên một loại máy (thời gian gá đặt lớn nhất của các nhóm máy tương ứng)"""
+    # NumPy chỉ được nạp khi cần mô hình thời gian gia công
+    import machining
+
+    minutes = [machining.SETUP_MINUTES[group] for group, kind in scheduler.GROUP_MACHINES.items() if kind == machine]
+    return max(minutes) if minutes else config.SETUP_FULL_MINUTES
+
+def workholding_for_part(part_number: Optional[str]) -> Dict[str, str]:
+    """
+    Đồ gá theo giai đoạn gia công từ catalog dụng cụ của mã chi tiết
+
+    Args:
+        part_number: Mã chi tiết
+
+    Returns:
+        Dict mục đồ gá (xem DEFAULT_WORKHOLDING) -> tên đồ gá
+    """
+    devices = dict(DEFAULT_WORKHOLDING)
+    path = catalog_registry.get_catalog_path("tooling", part_number)
+    index = catalogs.load_catalog_index(path) if path else None
+    section = (index or {}).get("sections", {}).get("WORKHOLDING DEVICES")
+    for subsection in (section or {}).get("subsections", {}).values():
+        title = subsection["title"].upper().rstrip(":")
+        for line in subsection["text"].splitlines():
+            if "Device:" in line and title in devices:
+                devices[title] = line.split(":", 1)[1].strip()
+                break
+    return devices
+
+def _batch(part: str, machine: str, fixture: str, tools: List[str], minutes: float,
+           setup_minutes: float) -> Dict[str, Any]:
+    return {
+        "part": part, "machine": machine, "fixture": fixture,
+        "tools": tuple(sorted(set(tool for tool in tools if tool))), "minutes": round(minutes, 2),
+        "setup_minutes": round(setup_minutes, 2)
+    }
+
+def batches_from_structured(part: str, plan: "plan_model.CompactPlan") -> List[Dict[str, Any]]:
+    """
+    Các lần gá của một chi tiết từ kế hoạch có cấu trúc: nguyên công được nhóm theo gá đặt của kế hoạch,
+    mỗi gá đặt của kế hoạch tính một lần gá từ đầu trên loại máy của nó
+
+    Args:
+        part: Mã nhận dạng chi tiết/công việc
+        plan: Kế hoạch gọn
+
+    Returns:
+        Danh sách lần gá {part, machine, fixture, tools, minutes, setup_minutes}
+    """
+    setups = {setup.id: setup for setup in plan.setups}
+    groups: Dict[str, List[Any]] = {}
+    for operation in sorted(plan.operations, key=lambda op: op.sequence):
+        groups.setdefault(operation.setup or operation.machine, []).append(operation)
+
+    batches = []
+    for key, operations in groups.items():
+        setup = setups.get(key)
+        machine = scheduler.machine_type((setup.machine if setup else "") or operations[0].machine or operations[0].name)
+        fixture = setup.fixture if setup else ""
+        batches.append(_batch(
+            part, machine, fixture, [operation.tool for operation in operations],
+            sum(operation.minutes or 0.0 for operation in operations), full_setup_minutes(machine)
+        ))
+    return batches
+
+def batches_from_drawing(part: str, drawing_path: str) -> List[Dict[str, Any]]:
+    """
+    Các lần gá của một chi tiết tính từ bản vẽ: nguyên công của mô hình thời gian gia công được nhóm theo
+    loại máy và đồ gá của catalog dụng cụ (gá thô, gá tinh, gá phay, gá mài)
+
+    Thời gian gá đặt như mô hình thời gian gia công: SETUP_MINUTES của mỗi nhóm nguyên công chi tiết dùng,
+    chia đều cho các lần gá có nguyên công của nhóm đó.
+
+    Args:
+        part: Mã nhận dạng chi tiết/công việc
+        drawing_path: Đường dẫn đến file bản vẽ
+
+    Returns:
+        Danh sách lần gá {part, machine, fixture, tools, minutes, setup_minutes}
+    """
+    import machining
+
+    part_specs = utils.extract_technical_specs(utils.load_drawing_file(drawing_path))
+    part_number = part_specs.get("part_number") or None
+    tooling = machining.tooling_for_part(part_number)
+    devices = workholding_for_part(part_number)
+    times = machining.estimate_machining_time(part_specs)["operations"]
+
+    groups: Dict[Tuple[str, str], Tuple[List[str], List[float], set]] = {}
+    for operation in machining.plan_operations(part_specs):
+        machine = scheduler.GROUP_MACHINES[operation["group"]]
+        fixture = devices[WORKHOLDING_STAGES[operation["tooling"]]]
+        tools, minutes, operation_groups = groups.setdefault((machine, fixture), ([], [], set()))
+        tools.append(tooling.get(operation["tooling"], {}).get("tool") or operation["tooling"])
+        minutes.append(times.get(operation["name"], 0.0))
+        operation_groups.add(operation["group"])
+
+    # Số lần gá có nguyên công của mỗi nhóm
+    shares: Dict[str, int] = {}
+    for _, _, operation_groups in groups.values():
+        for group in operation_groups:
+            shares[group] = shares.get(group, 0) + 1
+    return [
+        _batch(part, machine, fixture, tools, sum(minutes),
+               sum(machining.SETUP_MINUTES[group] / shares[group] for group in operation_groups))
+        for (machine, fixture), (tools, minutes, operation_groups) in groups.items()
+    ]
+
+def batches_from_plans(plans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Các lần gá của mọi kế hoạch (kế hoạch có cấu trúc nếu có, nếu không thì tính từ bản vẽ nguồn;
+    mỗi bản vẽ chỉ tính một lần)
+
+    Args:
+        plans: Kế hoạch sản xuất
+
+    Returns:
+        Danh sách lần gá
+    """
+    batches = []
+    by_drawing: Dict[str, List[Dict[str, Any]]] = {}
+    for i, plan in enumerate(plans):
+        part = plan.get("run_id") or f"part-{i + 1}"
+        compact = plan_model.load_plan(plan)
+        if compact is not None and compact.operations:
+            batches.extend(batches_from_structured(part, compact))
+            continue
+        drawing_path = plan.get("source_drawing") or ""
+        try:
+            if drawing_path not in by_drawing:
+                by_drawing[drawing_path] = batches_from_drawing(part, drawing_path)
+        except Exception as e:
+            logger.warning(f"Bỏ qua kế hoạch {part}: không tính được nguyên công từ bản vẽ {drawing_path}: {str(e)}")
+            continue
+        batches.extend({**batch, "part": part} for batch in by_drawing[drawing_path])
+    return batches
+
+def changeover_matrix(groups: List[Tuple[str, Tuple[str, ...]]], setup_minutes: List[float]):
+    """
+    Thời gian chuyển đổi giữa các nhóm gá trên cùng loại máy
+
+    Chuyển từ nhóm i sang nhóm j: đổi đồ gá nếu khác (SETUP_FIXTURE_MINUTES) cộng thay từng dụng cụ
+    j cần mà i chưa lắp (SETUP_TOOL_MINUTES), tối đa bằng thời gian gá đặt từ đầu của j; cùng đồ gá và
+    bộ dụng cụ của j đã có sẵn thì bằng 0. Ma trận không đối xứng.
+
+    Args:
+        groups: Danh sách (đồ gá, bộ dụng cụ)
+        setup_minutes: Thời gian gá đặt từ đầu của từng nhóm
+
+    Returns:
+        numpy.ndarray n × n (phút)
+    """
+    import numpy as np
+
+    tools = sorted({tool for _, group_tools in groups for tool in group_tools})
+    position = {tool: t for t, tool in enumerate(tools)}
+    loaded = np.zeros((len(groups), len(tools)), dtype=np.float32)
+    for g, (_, group_tools) in enumerate(groups):
+        loaded[g, [position[tool] for tool in group_tools]] = 1.0
+    fixtures = {fixture: f for f, fixture in enumerate(sorted({fixture for fixture, _ in groups}))}
+    fixture_ids = np.array([fixtures[fixture] for fixture, _ in groups])
+
+    # Số dụng cụ j cần mà i chưa có = |j| - |i ∩ j|
+    missing = loaded.sum(axis=1)[None, :] - loaded @ loaded.T
+    costs = (fixture_ids[:, None] != fixture_ids[None, :]) * config.SETUP_FIXTURE_MINUTES
+    costs = np.minimum(costs + missing * config.SETUP_TOOL_MINUTES, np.asarray(setup_minutes, dtype=np.float32)[None, :])
+    np.fill_diagonal(costs, 0.0)
+    return costs
+
+def sequence_groups(costs, start_costs, search_seconds: float) -> Tuple[List[int], float]:
+    """
+    Thứ tự nhóm gá có tổng thời gian chuyển đổi nhỏ
+
+    Láng giềng gần nhất theo ma trận chuyển đổi (thử nhiều nhóm xuất phát), sau đó dời từng nhóm sang vị trí tốt hơn (Or-opt)
+    cho tới khi không cải thiện hoặc hết thời gian.
+
+    Args:
+        costs: Ma trận chuyển đổi (xem changeover_matrix)
+        start_costs: Thời gian gá từng nhóm khi là nhóm đầu tiên (máy chưa gá)
+        search_seconds: Thời gian cải thiện tối đa
+
+    Returns:
+        (thứ tự nhóm, tổng thời gian chuyển đổi gồm cả lần gá đầu)
+    """
+    import numpy as np
+
+    n = len(costs)
+    if n == 0:
+        return [], 0.0
+    start_costs = np.asarray(start_costs, dtype=float)
+    def path_cost(path) -> float:
+        return float(start_costs[path[0]] + costs[path[:-1], path[1:]].sum())
+
+    def nearest_neighbour(first: int):
+        path = [first]
+        visited = np.zeros(n, dtype=bool)
+        visited[first] = True
+        for _ in range(n - 1):
+            following = int(np.argmin(np.where(visited, np.inf, costs[path[-1]])))
+            visited[following] = True
+            path.append(following)
+        return np.array(path)
+
+    # Láng giềng gần nhất từ các nhóm có chi phí rời đi nhỏ nhất, giữ thứ tự tốt nhất
+    deadline = time.perf_counter() + search_seconds
+    order = None
+    for first in np.argsort(costs.sum(axis=1), kind="stable")[:NEAREST_NEIGHBOUR_STARTS]:
+        path = nearest_neighbour(int(first))
+        if order is None or path_cost(path) < path_cost(order):
+            order = path
+        if time.perf_counter() >= deadline:
+            break
+
+    improved = n > 2
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(n):
+            node = order[i]
+            # Nhóm đứng đầu dãy mang thời gian gá từ đầu thay cho thời gian chuyển đổi
+            removed = ((costs[order[i - 1], node] if i > 0 else start_costs[node] - start_costs[order[1]])
+                       + (costs[node, order[i + 1]] if i + 1 < n else 0.0)
+                       - (costs[order[i - 1], order[i + 1]] if 0 < i < n - 1 else 0.0))
+            rest = np.delete(order, i)
+            # Chi phí chèn nhóm vào từng vị trí của dãy còn lại: đầu dãy, giữa hai nhóm, cuối dãy
+            added = np.empty(n)
+            added[0] = costs[node, rest[0]] + start_costs[node] - start_costs[rest[0]]
+            added[1:-1] = costs[rest[:-1], node] + costs[node, rest[1:]] - costs[rest[:-1], rest[1:]]
+            added[-1] = costs[rest[-1], node]
+            position = int(np.argmin(added))
+            if removed - added[position] > 1e-9:
+                order = np.insert(rest, position, node)
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+
+    return order.tolist(), path_cost(order)
+
+def optimize_setups(batches: List[Dict[str, Any]], search_seconds: float = None) -> Dict[str, Any]:
+    """
+    Gom và sắp thứ tự các lần gá để giảm tổng thời gian chuyển đổi
+
+    Đường cơ sở là thời gian gá đặt của từng lần gá (setup_minutes, như mô hình thời gian gia công);
+    sau khi gom, các chi tiết cùng (máy, đồ gá, bộ dụng cụ) chạy liền nhau không mất thời gian chuyển đổi.
+
+    Args:
+        batches: Các lần gá (xem batches_from_plans)
+        search_seconds: Thời gian cải thiện thứ tự cho mỗi loại máy (mặc định SETUP_SEARCH_SECONDS)
+
+    Returns:
+        Báo cáo: giờ gá đặt cơ sở, sau tối ưu, tiết kiệm, và thứ tự nhóm gá theo loại máy
+    """
+    started = time.perf_counter()
+    search_seconds = config.SETUP_SEARCH_SECONDS if search_seconds is None else search_seconds
+
+    by_machine: Dict[str, Dict[Tuple[str, Tuple[str, ...]], List[Dict[str, Any]]]] = {}
+    for batch in batches:
+        by_machine.setdefault(batch["machine"], {}).setdefault((batch["fixture"], batch["tools"]), []).append(batch)
+
+    machines = {}
+    baseline_total = optimized_total = 0.0
+    for machine, grouped in sorted(by_machine.items()):
+        groups = list(grouped)
+        # Các lần gá cùng nhóm dùng chung đồ gá và bộ dụng cụ: gá từ đầu một lần, lâu nhất trong nhóm
+        setup_minutes = [max(member["setup_minutes"] for member in grouped[group]) for group in groups]
+        costs = changeover_matrix(groups, setup_minutes)
+        order, optimized = sequence_groups(costs, setup_minutes, search_seconds)
+        count = sum(len(members) for members in grouped.values())
+        baseline = sum(member["setup_minutes"] for members in grouped.values() for member in members)
+
+        sequence = []
+        for position, g in enumerate(order):
+            fixture, tools = groups[g]
+            members = grouped[groups[g]]
+            sequence.append({
+                "fixture": fixture,
+                "tools": list(tools),
+                "parts": [member["part"] for member in members],
+                "run_minutes": round(sum(member["minutes"] for member in members), 2),
+                "changeover_minutes": round(float(costs[order[position - 1], g]) if position else setup_minutes[g], 2)
+            })
+        machines[machine] = {
+            "batches": count,
+            "setup_groups": len(groups),
+            "baseline_minutes": round(baseline, 2),
+            "optimized_minutes": round(optimized, 2),
+            "saved_hours": round((baseline - optimized) / 60, 2),
+            "sequence": sequence
+        }
+        baseline_total += baseline
+        optimized_total += optimized
+
+    elapsed = time.perf_counter() - started
+    saved = baseline_total - optimized_total
+    report = {
+        "parts": len({batch["part"] for batch in batches}),
+        "batches": len(batches),
+        "baseline_hours": round(baseline_total / 60, 2),
+        "optimized_hours": round(optimized_total / 60, 2),
+        "saved_hours": round(saved / 60, 2),
+        "saved_percent": round(100 * saved / baseline_total, 1) if baseline_total else 0.0,
+        "seconds": round(elapsed, 3),
+        "machines": machines
+    }
+    logger.info(
+        f"Đã tối ưu {len(batches)} lần gá trong {elapsed:.2f}s: gá đặt {report['baseline_hours']} giờ -> "
+        f"{report['optimized_hours']} giờ (tiết kiệm {report['saved_hours']} giờ, {report['saved_percent']}%)"
+    )
+    return report
+
+def main():
+    """Gom các lần gá của các kế hoạch đã lưu và báo cáo số giờ gá đặt tiết kiệm"""
+    parser = argparse.ArgumentParser(description='Giảm thời gian gá đặt và thay dao bằng cách gom nguyên công của nhiều chi tiết')
+    parser.add_argument('source', nargs='?', default=config.DATA_PATH,
+                        help='Thư mục (tìm đệ quy *.json) hoặc mẫu glob của các file kế hoạch')
+    parser.add_argument('--batches', type=str, default=None,
+                        help='File JSON danh sách lần gá [{part, machine, fixture, tools, minutes, setup_minutes}] (bỏ qua source)')
+    parser.add_argument('--search-seconds', type=float, default=None, help='Thời gian cải thiện thứ tự cho mỗi loại máy')
+    parser.add_argument('--output', '-o', type=str, default=None, help='File JSON báo cáo (mặc định chỉ in tóm tắt)')
+    args = parser.parse_args()
+
+    config.setup_logging()
+    if args.batches:
+        with open(args.batches, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        batches = []
+        for item in items:
+            machine = scheduler.machine_type(item["machine"])
+            batches.append(_batch(
+                item["part"], machine, item.get("fixture", ""), item.get("tools", []),
+                float(item.get("minutes", 0.0)), float(item.get("setup_minutes", full_setup_minutes(machine)))
+            ))
+    else:
+        batches = batches_from_plans(scheduler.load_plan_files(args.source))
+
+    report = optimize_setups(batches, args.search_seconds)
+    print(
+        f"{report['parts']} chi tiết, {report['batches']} lần gá: gá đặt {report['baseline_hours']} giờ -> "
+        f"{report['optimized_hours']} giờ, tiết kiệm {report['saved_hours']} giờ ({report['saved_percent']}%) "
+        f"trong {report['seconds']}s"
+    )
+    for machine, summary in report["machines"].items():
+        print(
+            f"  - {machine}: {summary['batches']} lần gá, {summary['setup_groups']} nhóm gá, "
+            f"tiết kiệm {summary['saved_hours']} giờ"
+        )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi báo cáo: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Bộ phân tích thông số bản vẽ: đọc bản vẽ văn bản trong một lượt bằng biểu thức chính quy biên dịch
+sẵn, hỗ trợ cả tiêu đề dạng "DIMENSIONS:" và "==== DIMENSIONAL SPECIFICATIONS ====", và chuyển giá
+trị thành bản ghi số có kiểu (danh nghĩa, dung sai, đơn vị)
+"""
+
+import json
+import time
+import logging
+import argparse
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tên phần trong bản vẽ -> khóa trong thông số; phần khác được giữ nguyên trong "sections"
+SECTION_ALIASES = {
+    "DIMENSIONS": "dimensions",
+    "DIMENSIONAL SPECIFICATIONS": "dimensions",
+    "SURFACE FINISH": "surface_finish",
+    "SURFACE FINISH SPECIFICATIONS": "surface_finish",
+    "TOLERANCES": "tolerances",
+    "TOLERANCE SPECIFICATIONS": "tolerances",
+    "HEAT TREATMENT": "heat_treatment",
+    "MATERIAL": "material_specifications",
+    "MATERIAL SPECIFICATIONS": "material_specifications",
+    "NOTES": "notes",
+    "MANUFACTURING NOTES": "notes",
+    "APPROVAL": "approval"
+}
+
+# Trường ở phần đầu bản vẽ -> khóa trong thông số
+HEADER_FIELDS = {
+    "PART NAME": "name",
+    "PART NUMBER": "part_number",
+    "REVISION": "revision",
+    "MATERIAL": "material",
+    "DOCUMENT": "document",
+    "DATE": "date",
+    "PROJECT": "project"
+}
+
+# Các phần có giá trị phải phân tích được thành số để bản vẽ được coi là phân tích sạch
+QUANTITATIVE_SECTIONS = ("dimensions", "surface_finish", "tolerances", "heat_treatment")
+
+# Một dòng bản vẽ: tiêu đề "==== X ====", tiêu đề/trường "X:" hoặc mục "- x" / "1. x"
+LINE_RE = re.compile(
+    r'^\s*(?:'
+    r'=+\s*(?P<banner>[^=]*?[^=\s])\s*=+'
+    r'|(?P<field>[A-Z][A-Z0-9 &/()-]*?)\s*:\s*(?P<field_value>.*?)'
+    r'|(?:[-*•]|\d+[.)])\s+(?P<item>.+?)'
+    r')\s*$'
+)
+
+_NUM = r'(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)'
+_UNIT = r'mm|µm|μm|um|°C|°|N·m|Nm|RPM|rpm|MPa|kg|m/min|mm/rev'
+
+# Giá trị thông số, thử theo thứ tự: dung sai ±, dung sai +/-, độ nhám, độ cứng, số lượng × ren,
+# kích thước a × b × c, khoảng, cấp dung sai lắp ghép, đại lượng đơn
+VALUE_RE = re.compile(
+    rf'(?P<tol_nominal>{_NUM})\s*(?:{_UNIT})?\s*±\s*(?P<tol>{_NUM})\s*(?P<tol_unit>{_UNIT})?'
+    rf'|(?P<dev_nominal>{_NUM})\s*(?:{_UNIT})?\s*\+\s*(?P<dev_plus>{_NUM})\s*/\s*-\s*(?P<dev_minus>{_NUM})\s*(?P<dev_unit>{_UNIT})?'
+    rf'|\bR(?P<ra_kind>[az])\s*(?P<ra>{_NUM})\s*(?P<ra_unit>µm|μm|um)?'
+    rf'|(?P<hard_low>{_NUM})\s*(?:(?:-|–|to)\s*(?P<hard_high>{_NUM})\s*)?(?P<hard_unit>HRC|HRB|HB|HV)\b'
+    rf'|(?:(?P<count>\d+)\s*[×x]\s*)?(?P<thread>\bM(?P<thread_size>{_NUM})(?:\s*[×x]\s*{_NUM})?)'
+    rf'|(?P<size>{_NUM}(?:\s*[×x]\s*{_NUM})+)\s*(?P<size_unit>{_UNIT})?'
+    rf'|(?P<range_low>[-+]?{_NUM})\s*(?:{_UNIT})?\s*(?:-|–|to)\s*(?P<range_high>[-+]?{_NUM})\s*(?P<range_unit>{_UNIT})'
+    rf'|^\s*(?P<fit>\d+[A-Za-z]{{1,2}}|[A-Za-z]\d+(?:/[a-z]\d+)?)\s*$'
+    rf'|(?P<quantity>{_NUM})\s*(?P<quantity_unit>{_UNIT})?'
+)
+
+_SPLIT_RE = re.compile(r'\s*[×x]\s*')
+
+def _to_float(text: str) -> float:
+    return float(text.replace(",", ""))
+
+def _unit(unit: Optional[str]) -> Optional[str]:
+    return "µm" if unit in ("μm", "um") else unit
+
+@dataclass
+class SpecValue:
+    """
+    Giá trị một thông số bản vẽ
+
+    kind: tolerance (danh nghĩa ± dung sai), roughness, hardness, threaded_holes, size (a × b × c),
+    range, quantity (đại lượng đơn; trong phần dung sai là dung sai hình học), fit (cấp dung sai) hoặc text
+    """
+    text: str
+    kind: str = "text"
+    nominal: Optional[float] = None
+    tolerance: Optional[float] = None
+    lower: Optional[float] = None
+    upper: Optional[float] = None
+    unit: Optional[str] = None
+    count: Optional[int] = None
+    designation: Optional[str] = None
+    values: Optional[List[float]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        # vars() thay cho dataclasses.asdict (sao chép sâu), chậm hơn nhiều khi phân tích hàng loạt
+        return {key: value for key, value in vars(self).items() if value is not None}
+
+def parse_value(text: str) -> SpecValue:
+    """
+    Phân tích giá trị một thông số thành bản ghi có kiểu
+
+    Ví dụ: "75.0 ± 0.2 mm" -> tolerance(75.0, ±0.2, mm); "Ra 0.8 µm" -> roughness(0.8, µm);
+    "6 × M6 threaded holes" -> threaded_holes(6, M6); "28-32 HRC" -> hardness(28..32, HRC)
+
+    Args:
+        text: Giá trị dạng văn bản
+
+    Returns:
+        SpecValue; kind = "text" nếu không nhận ra giá trị số
+    """
+    match = VALUE_RE.search(text)
+    if match is None:
+        return SpecValue(text)
+    group = match.group
+
+    if group("tol_nominal"):
+        nominal, tolerance = _to_float(group("tol_nominal")), _to_float(group("tol"))
+        return SpecValue(text, "tolerance", nominal, tolerance, nominal - tolerance, nominal + tolerance,
+                         _unit(group("tol_unit")) or "mm")
+    if group("dev_nominal"):
+        nominal = _to_float(group("dev_nominal"))
+        return SpecValue(text, "tolerance", nominal, None, nominal - _to_float(group("dev_minus")),
+                         nominal + _to_float(group("dev_plus")), _unit(group("dev_unit")) or "mm")
+    if group("ra"):
+        return SpecValue(text, "roughness", _to_float(group("ra")), unit=_unit(group("ra_unit")) or "µm",
+                         designation=f"R{group('ra_kind')}")
+    if group("hard_unit"):
+        low = _to_float(group("hard_low"))
+        high = _to_float(group("hard_high")) if group("hard_high") else low
+        return SpecValue(text, "hardness", (low + high) / 2, lower=low, upper=high, unit=group("hard_unit"))
+    if group("thread"):
+        return SpecValue(text, "threaded_holes", _to_float(group("thread_size")), unit="mm",
+                         count=int(group("count") or 1), designation=group("thread").replace(" ", ""))
+    if group("size"):
+        values = [_to_float(value) for value in _SPLIT_RE.split(group("size"))]
+        return SpecValue(text, "size", values[0], unit=_unit(group("size_unit")) or "mm", values=values)
+    if group("range_low"):
+        low, high = _to_float(group("range_low")), _to_float(group("range_high"))
+        return SpecValue(text, "range", (low + high) / 2, lower=low, upper=high, unit=_unit(group("range_unit")))
+    if group("fit"):
+        return SpecValue(text, "fit", designation=group("fit"))
+    return SpecValue(text, "quantity", _to_float(group("quantity")), unit=_unit(group("quantity_unit")))
+
+def parse_specs(drawing_text: str) -> Dict[str, Any]:
+    """
+    Phân tích văn bản bản vẽ thành thông số kỹ thuật có kiểu trong một lượt
+
+    Args:
+        drawing_text: Văn bản của bản vẽ kỹ thuật
+
+    Returns:
+        Dict gồm trường phần đầu (name, part_number, revision, material...), các phần
+        dimensions/surface_finish/tolerances/heat_treatment/material_specifications (tên -> bản ghi
+        SpecValue dạng dict), notes, approval, các phần khác trong "sections", cùng "clean" và
+        "issues" (các giá trị không phân tích được)
+    """
+    specs: Dict[str, Any] = {
+        "name": "", "part_number": "", "revision": "", "material": "",
+        "dimensions": {}, "surface_finish": {}, "tolerances": {}, "heat_treatment": {},
+        "material_specifications": {}, "notes": [], "approval": {}, "sections": {}, "issues": []
+    }
+    section: Optional[str] = None
+    other: Optional[List[str]] = None
+
+    for line in drawing_text.splitlines():
+        match = LINE_RE.match(line)
+        if match is None:
+            # Văn bản tự do thuộc một phần khác (vd: GENERAL DESCRIPTION)
+            if other is not None and line.strip():
+                other.append(line.strip())
+            continue
+
+        banner, field, item = match.group("banner"), match.group("field"), match.group("item")
+        if banner is not None or (field is not None and not match.group("field_value") and field.upper() == field):
+            name = (banner or field).upper()
+            section = SECTION_ALIASES.get(name)
+            other = specs["sections"].setdefault(name, []) if section is None else None
+            continue
+
+        if field is not None and field.upper() in HEADER_FIELDS:
+            specs[HEADER_FIELDS[field.upper()]] = match.group("field_value")
+            continue
+        if section is None and other is None:
+            continue
+
+        entry = item if item is not None else f"{field}: {match.group('field_value')}"
+        if other is not None:
+            other.append(entry)
+            continue
+        if section == "notes":
+            specs["notes"].append(entry)
+            continue
+
+        key, separator, value = entry.partition(":")
+        key, value = key.strip(), value.strip()
+        if not separator:
+            specs[section].setdefault("items", []).append(entry)
+            continue
+        if section == "approval":
+            specs["approval"][key] = value
+            continue
+
+        record = parse_value(value)
+        target = section
+        if section == "material_specifications":
+            # Mác vật liệu như "AISI 4140" không phải đại lượng; chỉ giữ độ cứng dạng số
+            lowered = key.lower()
+            if "material" in lowered and not specs["material"]:
+                specs["material"] = value
+            if record.kind == "hardness" or "heat treatment" in lowered:
+                target = "heat_treatment"
+            elif record.kind != "hardness":
+                record = SpecValue(value)
+        if record.kind == "text" and target in QUANTITATIVE_SECTIONS:
+            specs["issues"].append(f"{target}: {key}: {value}")
+        specs[target][key] = record.to_dict()
+
+    specs["clean"] = bool(specs["part_number"] and specs["material"] and specs["dimensions"] and not specs["issues"])
+    return specs
+
+def _format_record(record: Dict[str, Any]) -> str:
+    """Dạng hiển thị ngắn của một bản ghi giá trị"""
+    unit = f" {record['unit']}" if record.get("unit") else ""
+    kind = record.get("kind")
+    if kind == "tolerance":
+        if record.get("tolerance") is not None:
+            return f"{record['nominal']:g} ± {record['tolerance']:g}{unit}"
+        return f"{record['nominal']:g} (+{record['upper'] - record['nominal']:g}/-{record['nominal'] - record['lower']:g}){unit}"
+    if kind == "roughness":
+        return f"{record['designation']} {record['nominal']:g}{unit}"
+    if kind in ("hardness", "range"):
+        return f"{record['lower']:g}-{record['upper']:g}{unit}"
+    if kind == "threaded_holes":
+        return f"{record['count']} × {record['designation']}"
+    if kind == "size":
+        return " × ".join(f"{value:g}" for value in record["values"]) + unit
+    if kind == "quantity":
+        return f"{record['nominal']:g}{unit}"
+    return record["text"]
+
+def render_analysis(specs: Dict[str, Any]) -> str:
+    """
+    Tạo bản phân tích bản vẽ (thay cho output của công đoạn analyze_drawing) từ thông số đã phân tích
+
+    Args:
+        specs: Thông số kỹ thuật (xem parse_specs)
+
+    Returns:
+        Bản phân tích dạng Markdown
+    """
+    lines = [
+        f"# Design Analysis: {specs['name'] or specs['part_number']}",
+        "",
+        f"- Part number: {specs['part_number']}",
+        f"- Revision: {specs['revision'] or 'n/a'}",
+        f"- Material: {specs['material']}"
+    ]
+
+    titles = (
+        ("dimensions", "Dimensions and Tolerances"),
+        ("surface_finish", "Surface Finish Requirements"),
+        ("tolerances", "Geometric Tolerances"),
+        ("heat_treatment", "Heat Treatment and Hardness"),
+        ("material_specifications", "Material Specifications")
+    )
+    for section, title in titles:
+        if not specs[section]:
+            continue
+        lines += ["", f"## {title}", "", "| Feature | Requirement | Lower | Upper |", "|---|---|---|---|"]
+        for key, record in specs[section].items():
+            if key == "items":
+                continue
+            lower = f"{record['lower']:g}" if "lower" in record else ""
+            upper = f"{record['upper']:g}" if "upper" in record else ""
+            lines.append(f"| {key} | {_format_record(record)} | {lower} | {upper} |")
+        for item in specs[section].get("items", []):
+            lines.append(f"| {item} | | | |")
+
+    if specs["notes"]:
+        lines += ["", "## Manufacturing Notes", ""] + [f"- {note}" for note in specs["notes"]]
+    for name, content in specs["sections"].items():
+        if content:
+            lines += ["", f"## {name.title()}", ""] + [f"- {entry}" for entry in content]
+    return "\n".join(lines)
+
+def main():
+    """Phân tích một thư mục/mẫu glob/manifest bản vẽ, ghi JSONL và báo cáo tốc độ"""
+    import batch
+
+    parser = argparse.ArgumentParser(description='Phân tích thông số kỹ thuật của nhiều bản vẽ văn bản')
+    parser.add_argument('source', help='Thư mục, mẫu glob (vd: "drawings/*.txt") hoặc file manifest')
+    parser.add_argument('--output', '-o', type=str, default=None, help='File JSONL kết quả (mặc định: không ghi)')
+    args = parser.parse_args()
+
+    paths = [path for path in batch.collect_drawing_paths(args.source) if not path.lower().endswith('.pdf')]
+    started = time.perf_counter()
+    clean = 0
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    try:
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                specs = parse_specs(f.read())
+            clean += specs["clean"]
+            if output:
+                output.write(json.dumps({"source_drawing": path, **specs}, ensure_ascii=False) + "\n")
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - started
+
+    print(f"Đã phân tích {len(paths)} bản vẽ trong {elapsed:.3f}s ({len(paths) / elapsed if elapsed else 0:.0f} bản vẽ/giây)")
+    print(f"Phân tích sạch (có thể bỏ qua công đoạn analyze_drawing): {clean}/{len(paths)}")
+    if args.output:
+        print(f"Kết quả đã lưu vào: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Các công đoạn của quy trình lập kế hoạch sản xuất và thực thi từng công đoạn độc lập
+"""
+
+import time
+import asyncio
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+import config
+import agents
+import utils
+import token_usage
+import context_digest
+import tracing
+import spec_parser
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự các công đoạn (khớp với Process.sequential của crew)
+STAGE_ORDER = [
+    "analyze_drawing",
+    "material_selection",
+    "tooling_selection",
+    "process_plan",
+    "quality_review",
+    "finalize_plan"
+]
+
+# Các công đoạn phía trước mà mỗi công đoạn nhận làm context
+STAGE_CONTEXT = {
+    "analyze_drawing": [],
+    "material_selection": ["analyze_drawing"],
+    "tooling_selection": ["analyze_drawing", "material_selection"],
+    "process_plan": ["analyze_drawing", "material_selection", "tooling_selection"],
+    "quality_review": ["process_plan", "material_selection", "tooling_selection"],
+    "finalize_plan": ["process_plan", "quality_review", "material_selection", "tooling_selection"]
+}
+
+STAGE_AGENT_FACTORIES = {
+    "analyze_drawing": agents.create_design_analyzer_agent,
+    "material_selection": agents.create_material_selection_agent,
+    "tooling_selection": agents.create_tooling_selection_agent,
+    "process_plan": agents.create_process_planning_agent,
+    "quality_review": agents.create_quality_control_agent,
+    "finalize_plan": agents.create_orchestrator_agent
+}
+
+# Loại tác tử của mỗi công đoạn (nhãn thống kê token của công đoạn)
+STAGE_AGENT_TYPES = {
+    "analyze_drawing": agents.AGENT_TYPES["DESIGN_ANALYZER"],
+    "material_selection": agents.AGENT_TYPES["MATERIALS_ENGINEER"],
+    "tooling_selection": agents.AGENT_TYPES["TOOLING_SPECIALIST"],
+    "process_plan": agents.AGENT_TYPES["PROCESS_PLANNER"],
+    "quality_review": agents.AGENT_TYPES["QUALITY_ENGINEER"],
+    "finalize_plan": agents.AGENT_TYPES["PROJECT_MANAGER"]
+}
+
+STAGE_TASK_FACTORIES = {
+    "material_selection": agents.create_material_selection_task,
+    "tooling_selection": agents.create_tooling_selection_task,
+    "process_plan": agents.create_process_plan_task,
+    "quality_review": agents.create_quality_review_task,
+    "finalize_plan": agents.create_finalize_plan_task
+}
+
+# Dấu phân cách giữa các output trong context (giống cách CrewAI ghép output của các task)
+CONTEXT_DIVIDER = "\n\n----------\n\n"
+
+def get_drawing_part_number(drawing_path: str) -> Optional[str]:
+    """
+    Lấy mã chi tiết từ phần đầu bản vẽ để tra cứu catalog
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+
+    Returns:
+        Mã chi tiết hoặc None nếu không đọc được
+    """
+    try:
+        return utils.extract_part_number(utils.load_drawing_file(drawing_path))
+    except Exception as e:
+        logger.warning(f"Không xác định được mã chi tiết của bản vẽ {drawing_path}: {str(e)}")
+        return None
+
+def parsed_drawing_analysis(drawing_path: str) -> Optional[str]:
+    """
+    Bản phân tích bản vẽ dựng trực tiếp từ thông số do spec_parser đọc được, dùng thay cho output
+    của công đoạn analyze_drawing khi bật SKIP_ANALYZE_STAGE
+
+    Args:
+        drawing_path: Đường dẫn đến file bản vẽ
+
+    Returns:
+        Bản phân tích, hoặc None nếu không bật SKIP_ANALYZE_STAGE hay bản vẽ chưa phân tích sạch
+        (khi đó công đoạn chạy bằng LLM như bình thường)
+    """
+    if not config.SKIP_ANALYZE_STAGE:
+        return None
+    try:
+        specs = spec_parser.parse_specs(utils.load_drawing_file(drawing_path))
+    except Exception as e:
+        logger.warning(f"Không phân tích được thông số của bản vẽ {drawing_path}: {str(e)}")
+        return None
+    if not specs["clean"]:
+        logger.info(
+            f"Bản vẽ {drawing_path} chưa phân tích sạch ({len(specs['issues'])} giá trị không đọc được), "
+            "chạy công đoạn analyze_drawing bằng LLM"
+        )
+        return None
+    return spec_parser.render_analysis(specs)
+
+def create_stage_agent(stage: str, part_number: Optional[str] = None):
+    """Tạo tác tử phụ trách một công đoạn, với catalog của mã chi tiết"""
+    return STAGE_AGENT_FACTORIES[stage](part_number=part_number)
+
+def create_stage_task(stage: str, agent, drawing_path: str, context: Optional[List[Any]] = None,
+                      part_number: Optional[str] = None):
+    """
+    Tạo task cho một công đoạn
+
+    Args:
+        stage: Tên công đoạn trong STAGE_ORDER
+        agent: Tác tử thực hiện task
+        drawing_path: Đường dẫn đến file bản vẽ
+        context: Danh sách task phía trước làm context (khi chạy trong crew)
+        part_number: Mã chi tiết dùng để tra cứu catalog
+
+    Returns:
+        Task: Task đã cấu hình
+    """
+    if stage == "analyze_drawing":
+        return agents.create_analyze_drawing_task(agent, drawing_path)
+    return STAGE_TASK_FACTORIES[stage](agent, context=context, part_number=part_number)
+
+def format_stage_context(stage: str, outputs: Dict[str, str]) -> str:
+    """
+    Ghép output của các công đoạn phía trước thành context cho một công đoạn
+
+    Args:
+        stage: Tên công đoạn
+        outputs: Output đã có của các công đoạn, theo tên công đoạn
+
+    Returns:
+        Chuỗi context
+    """
+    missing = [dep for dep in STAGE_CONTEXT[stage] if dep not in outputs]
+    if missing:
+        raise ValueError(f"Công đoạn {stage} thiếu output của: {', '.join(missing)}")
+    return CONTEXT_DIVIDER.join(outputs[dep] for dep in STAGE_CONTEXT[stage])
+
+def prepare_stage_context(stage: str, outputs: Dict[str, str]) -> str:
+    """
+    Tạo context cho một công đoạn, nén thành bản tóm lược khi bật CONTEXT_COMPRESSION và
+    context vượt CONTEXT_TOKEN_BUDGET; ghi nhận số token trước/sau khi nén
+
+    Args:
+        stage: Tên công đoạn
+        outputs: Output đã có của các công đoạn, theo tên công đoạn
+
+    Returns:
+        Chuỗi context gửi cho tác tử
+    """
+    context, original_tokens = _uncompressed_context(stage, outputs)
+    if context is not None:
+        return context
+
+    started = time.perf_counter()
+    with tracing.span(f"compress_context:{stage}", "context", mode=config.CONTEXT_COMPRESSION):
+        digest = context_digest.build_digest(
+            {dep: outputs[dep] for dep in STAGE_CONTEXT[stage]},
+            config.CONTEXT_TOKEN_BUDGET
+        )
+    return _record_digest(stage, original_tokens, digest, time.perf_counter() - started)
+
+async def aprepare_stage_context(stage: str, outputs: Dict[str, str],
+                                 llm_semaphore: Optional[asyncio.Semaphore] = None) -> str:
+    """
+    Phiên bản bất đồng bộ của prepare_stage_context: đếm token chạy trong executor, tóm lược
+    bằng LLM gọi ainvoke trong giới hạn của llm_semaphore (xem context_digest.abuild_digest)
+
+    Args:
+        stage: Tên công đoạn
+        outputs: Output đã có của các công đoạn, theo tên công đoạn
+        llm_semaphore: Giới hạn số lời gọi LLM đồng thời
+
+    Returns:
+        Chuỗi context gửi cho tác tử
+    """
+    loop = asyncio.get_running_loop()
+    context, original_tokens = await loop.run_in_executor(None, _uncompressed_context, stage, outputs)
+    if context is not None:
+        return context
+
+    started = time.perf_counter()
+    with tracing.span(f"compress_context:{stage}", "context", mode=config.CONTEXT_COMPRESSION):
+        digest = await context_digest.abuild_digest(
+            {dep: outputs[dep] for dep in STAGE_CONTEXT[stage]},
+            config.CONTEXT_TOKEN_BUDGET, llm_semaphore=llm_semaphore
+        )
+    elapsed = time.perf_counter() - started
+    return await loop.run_in_executor(None, _record_digest, stage, original_tokens, digest, elapsed)
+
+def _uncompressed_context(stage: str, outputs: Dict[str, str]) -> Tuple[Optional[str], int]:
+    """
+    Context nguyên văn và số token của nó; context là None nếu cần nén (bật CONTEXT_COMPRESSION
+    và vượt CONTEXT_TOKEN_BUDGET), nếu không thì đã ghi nhận số token gửi đi
+    """
+    context = format_stage_context(stage, outputs)
+    original_tokens = token_usage.count_tokens(context)
+    if config.CONTEXT_COMPRESSION == "off" or original_tokens <= config.CONTEXT_TOKEN_BUDGET:
+        token_usage.record_context(STAGE_AGENT_TYPES[stage], original_tokens, original_tokens)
+        return context, original_tokens
+    return None, original_tokens
+
+def _record_digest(stage: str, original_tokens: int, digest: str, elapsed: float) -> str:
+    """Ghi nhận số token trước/sau khi nén context của một công đoạn"""
+    sent_tokens = token_usage.count_tokens(digest)
+    token_usage.record_context(STAGE_AGENT_TYPES[stage], original_tokens, sent_tokens, elapsed)
+    logger.info(
+        f"Đã nén context của {stage}: {original_tokens} -> {sent_tokens} token "
+        f"({config.CONTEXT_COMPRESSION}, {elapsed:.2f}s)"
+    )
+    return digest
+
+def stage_usage_report(run_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Báo cáo token theo công đoạn: token prompt/completion, thời gian gọi LLM và số token
+    context tiết kiệm được nhờ nén
+
+    Args:
+        run_id: Chỉ báo cáo lượt chạy này (xem token_usage.track_run); mặc định cả tiến trình
+
+    Returns:
+        Dict báo cáo (xem token_usage.usage_report) với số liệu theo tên công đoạn; các lần gọi
+        LLM ngoài công đoạn (vd: tóm lược context bằng LLM) nằm trong "other"
+    """
+    report = token_usage.usage_report([STAGE_AGENT_TYPES[stage] for stage in STAGE_ORDER], run_id=run_id)
+    entries = report.pop("entries")
+    report["stages"] = {stage: entries.pop(STAGE_AGENT_TYPES[stage]) for stage in STAGE_ORDER}
+    report["other"] = entries
+    return report
+
+def build_stage_messages(stage: str, agent, task, context: str) -> List[Dict[str, str]]:
+    """
+    Tạo prompt của một công đoạn cho lần gọi LLM trực tiếp (không qua vòng lặp tác tử CrewAI),
+    theo cách CrewAI ghép vai trò, mục tiêu, mô tả task và context
+
+    Args:
+        stage: Tên công đoạn
+        agent: Tác tử của công đoạn
+        task: Task của công đoạn
+        context: Context đã chuẩn bị (xem prepare_stage_context)
+
+    Returns:
+        Danh sách message dạng {"role", "content"}
+    """
+    system = f"You are {agent.role}. {agent.backstory}\nYour personal goal is: {agent.goal}"
+    user = (
+        f"{task.description}\n\nThis is the expected criteria for your final answer: {task.expected_output}\n"
+        "You MUST return the actual complete content as the final answer, not a summary."
+    )
+    if context:
+        user += f"\n\nThis is the context you're working with:\n{context}"
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+def execute_stage(stage: str, drawing_path: str, outputs: Dict[str, str], agent=None,
+                  part_number: Optional[str] = None) -> str:
+    """
+    Thực thi một công đoạn bên ngoài crew, với context lấy từ output đã có
+
+    Args:
+        stage: Tên công đoạn
+        drawing_path: Đường dẫn đến file bản vẽ
+        outputs: Output của các công đoạn phía trước
+        agent: Tác tử dùng lại (tạo mới nếu không truyền vào)
+        part_number: Mã chi tiết (đọc từ bản vẽ nếu không truyền vào)
+
+    Returns:
+        Output dạng văn bản của công đoạn
+    """
+    with tracing.span(f"stage:{stage}", "stage", stage=stage, drawing=drawing_path) as span:
+        analysis = parsed_drawing_analysis(drawing_path) if stage == "analyze_drawing" else None
+        if analysis is not None:
+            logger.info(f"Bỏ qua công đoạn {stage} bằng LLM: đã phân tích sạch bản vẽ {drawing_path}")
+            span.set(parsed=True, output_chars=len(analysis))
+            return analysis
+
+        part_number = part_number or get_drawing_part_number(drawing_path)
+        agent = agent or create_stage_agent(stage, part_number)
+        task = create_stage_task(stage, agent, drawing_path, part_number=part_number)
+        context = prepare_stage_context(stage, outputs)
+        span.set(agent_role=agent.role, context_chars=len(context))
+
+        logger.info(f"Đang chạy công đoạn {stage} cho bản vẽ: {drawing_path}")
+        result = task.execute_sync(agent=agent, context=context or None)
+        span.set(output_chars=len(result.raw))
+        return result.raw
@@ -0,0 +1,94 @@
+"""
+Đo thời gian khởi động: phân tích thời gian import theo mô-đun bằng `python -X importtime`
+"""
+
+import sys
+import subprocess
+from typing import Dict, List, Any
+
+# Các kịch bản khởi động: những gì mỗi lệnh thực sự import
+STARTUP_SCENARIOS = {
+    # `main.py --help`, trích xuất thông số từ bản vẽ .txt
+    "cli": ["main"],
+    # Một lượt lập kế hoạch: thêm CrewAI, LangChain OpenAI và công cụ đọc file
+    "planning": ["main", "crewai", "langchain_openai", "file_tools"],
+    # Đọc bản vẽ PDF
+    "pdf": ["main", "fitz"]
+}
+
+def profile_imports(modules: List[str]) -> Dict[str, Any]:
+    """
+    Đo thời gian import một danh sách mô-đun trong một tiến trình Python mới
+
+    Args:
+        modules: Tên các mô-đun cần import theo thứ tự
+
+    Returns:
+        Dict gồm tổng thời gian import (ms), thời gian theo gói cấp cao nhất và danh sách
+        mô-đun (thời gian riêng và tích lũy, ms); "error" nếu tiến trình import lỗi
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True
+    )
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        entries.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000
+        })
+
+    # Thời gian theo gói cấp cao nhất (crewai, langchain_core, openai...), cộng dồn thời gian riêng
+    packages: Dict[str, float] = {}
+    for entry in entries:
+        package = entry["module"].split(".")[0]
+        packages[package] = packages.get(package, 0.0) + entry["self_ms"]
+
+    return {
+        "modules": modules,
+        "error": completed.stderr.strip().splitlines()[-1] if completed.returncode else None,
+        "total_ms": round(sum(entry["self_ms"] for entry in entries), 1),
+        "packages": dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)),
+        "entries": entries
+    }
+
+def startup_report(top: int = 15) -> Dict[str, Any]:
+    """
+    Đo tất cả các kịch bản khởi động
+
+    Args:
+        top: Số gói tốn thời gian nhất được giữ lại cho mỗi kịch bản
+
+    Returns:
+        Dict kết quả theo tên kịch bản
+    """
+    report = {}
+    for scenario, modules in STARTUP_SCENARIOS.items():
+        profile = profile_imports(modules)
+        report[scenario] = {
+            "modules": modules,
+            "error": profile["error"],
+            "total_ms": profile["total_ms"],
+            "top_packages": {
+                package: round(ms, 1) for package, ms in list(profile["packages"].items())[:top]
+            }
+        }
+    return report
+
+def print_startup_report(top: int = 15) -> None:
+    """In báo cáo thời gian import theo kịch bản và theo gói"""
+    report = startup_report(top)
+    for scenario, result in report.items():
+        print(f"\n===== KHỞI ĐỘNG: {scenario} ({' + '.join(result['modules'])}) =====")
+        if result["error"]:
+            print(f"Lỗi khi import: {result['error']}")
+        print(f"Tổng thời gian import: {result['total_ms']:.1f} ms")
+        for package, ms in result["top_packages"].items():
+            print(f"  {package:<30} {ms:>9.1f} ms")
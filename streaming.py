@@ -0,0 +1,124 @@
+"""
+Phát trực tiếp output từng công đoạn và token LLM ra màn hình và file NDJSON chỉ ghi nối
+"""
+
+import os
+import sys
+import json
+import logging
+import threading
+import contextvars
+from datetime import datetime
+from typing import Any, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+import config
+
+logger = logging.getLogger(__name__)
+
+# Lượt chạy (mã lượt chạy, bản vẽ) của luồng hiện tại, gắn vào các sự kiện token
+current_run: contextvars.ContextVar = contextvars.ContextVar("current_run", default=None)
+
+_stream: Optional["NDJSONStream"] = None
+
+class NDJSONStream:
+    """
+    Luồng sự kiện: mỗi sự kiện là một dòng JSON được ghi nối và flush ngay vào file,
+    đồng thời in ra màn hình. An toàn khi nhiều luồng cùng ghi (chế độ hàng loạt/đường ống).
+    """
+
+    def __init__(self, path: str, echo: bool = True, echo_tokens: bool = True):
+        """
+        Args:
+            path: Đường dẫn file NDJSON
+            echo: In sự kiện công đoạn ra màn hình
+            echo_tokens: In token LLM ra màn hình khi chúng đến
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.echo = echo
+        self.echo_tokens = echo_tokens
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """Ghi một sự kiện vào file NDJSON"""
+        record = {"event": event, "timestamp": datetime.now().isoformat(), **fields}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def stage_completed(self, drawing_path: str, stage: str, output: str, run_id: str = None) -> None:
+        """Phát output của một công đoạn vừa hoàn thành"""
+        self.emit("stage_completed", run_id=run_id, drawing=drawing_path, stage=stage, output=output)
+        if self.echo:
+            with self._lock:
+                sys.stdout.write(f"\n===== [{stage}] {drawing_path} =====\n{output}\n")
+                sys.stdout.flush()
+
+    def token(self, agent: str, text: str) -> None:
+        """Phát một token LLM"""
+        run = current_run.get() or {}
+        self.emit("token", run_id=run.get("run_id"), drawing=run.get("drawing"), agent=agent, text=text)
+        if self.echo_tokens:
+            with self._lock:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+def open_stream(path: str = None, echo: bool = True, echo_tokens: bool = True) -> NDJSONStream:
+    """
+    Bật chế độ phát trực tiếp cho tiến trình
+
+    Args:
+        path: Đường dẫn file NDJSON (mặc định là file mới trong DATA_PATH)
+        echo: In output công đoạn ra màn hình
+        echo_tokens: In token LLM ra màn hình
+
+    Returns:
+        NDJSONStream đang hoạt động
+    """
+    global _stream
+
+    if path is None:
+        path = os.path.join(config.DATA_PATH, f"stream_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson")
+    close_stream()
+    _stream = NDJSONStream(path, echo=echo, echo_tokens=echo_tokens)
+    logger.info(f"Đang phát trực tiếp output vào: {path}")
+    return _stream
+
+def get_stream() -> Optional[NDJSONStream]:
+    """Luồng sự kiện đang hoạt động, hoặc None nếu không bật chế độ phát trực tiếp"""
+    return _stream
+
+def close_stream() -> None:
+    """Tắt chế độ phát trực tiếp"""
+    global _stream
+
+    if _stream is not None:
+        _stream.close()
+        _stream = None
+
+def emit(event: str, **fields: Any) -> None:
+    """Ghi một sự kiện nếu đang bật chế độ phát trực tiếp"""
+    if _stream is not None:
+        _stream.emit(event, **fields)
+
+def stage_completed(drawing_path: str, stage: str, output: str, run_id: str = None) -> None:
+    """Phát output của một công đoạn nếu đang bật chế độ phát trực tiếp"""
+    if _stream is not None:
+        _stream.stage_completed(drawing_path, stage, output, run_id=run_id)
+
+class TokenStreamCallback(BaseCallbackHandler):
+    """Callback LangChain chuyển token LLM (khi gọi với streaming=True) vào luồng sự kiện"""
+
+    def __init__(self, tag: str):
+        super().__init__()
+        self.tag = tag
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if _stream is not None and token:
+            _stream.token(self.tag, token)
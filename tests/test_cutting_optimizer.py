@@ -0,0 +1,60 @@
+"""
+Kiểm tra tối ưu chế độ cắt: các ràng buộc độ nhám, tuổi bền dao và số vòng quay của bản vẽ mẫu
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import config
+import utils
+import machining
+import cutting_optimizer
+
+DRAWING = "drawings/sample_part.txt"
+
+@pytest.fixture(scope="module")
+def part_specs():
+    return utils.extract_technical_specs(utils.load_drawing_file(DRAWING))
+
+@pytest.fixture(scope="module")
+def result(part_specs):
+    return cutting_optimizer.optimize_part(part_specs)
+
+def test_surface_roughness():
+    # Ra = f² / (32·r): 0.1 mm/vòng, mũi dao 0.8 mm -> 0.39 µm
+    assert float(cutting_optimizer.surface_roughness(0.1, 0.8)) == pytest.approx(0.01 / 25.6 * 1000)
+
+def test_ra_08_bore_stays_feasible(result):
+    bores = [operation for operation in result["operations"] if operation["required_ra"] == 0.8]
+
+    assert [operation["tooling"] for operation in bores] == ["finish_boring"]
+    bore = bores[0]
+    assert bore["feasible"]
+    assert bore["surface_roughness"] <= 0.8
+    assert bore["tool_life_minutes"] >= config.OPTIMIZER_MIN_TOOL_LIFE
+    assert bore["spindle_speed"] <= config.OPTIMIZER_MAX_SPINDLE_SPEED
+
+def test_every_operation_meets_its_constraints(result):
+    assert result["feasible"]
+    for operation in result["operations"]:
+        if operation["required_ra"] is not None and operation["surface_roughness"] is not None:
+            assert operation["surface_roughness"] <= operation["required_ra"]
+        if operation["tool_life_minutes"] is not None:
+            assert operation["tool_life_minutes"] >= config.OPTIMIZER_MIN_TOOL_LIFE
+    assert result["total_cutting_minutes"] <= result["baseline_cutting_minutes"]
+
+def test_unreachable_ra_is_reported_infeasible(part_specs):
+    operations = [
+        dict(operation, ra=0.01) for operation in machining.plan_operations(part_specs)
+        if operation["tooling"] == "finish_boring"
+    ]
+    tooling = machining.tooling_for_part(part_specs.get("part_number") or None)
+
+    results = cutting_optimizer.optimize_operations(operations, tooling)
+
+    assert results and not any(operation["feasible"] for operation in results)
+
+def test_rejects_unknown_objective(part_specs):
+    with pytest.raises(ValueError):
+        cutting_optimizer.optimize_operations(machining.plan_operations(part_specs), {}, objective="speed")
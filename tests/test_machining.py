@@ -0,0 +1,60 @@
+"""
+Kiểm tra mô hình thời gian gia công: thời gian cắt so với tính tay theo công thức chuẩn
+"""
+
+import math
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import machining
+
+def _speed(diameter, rpm):
+    """Tốc độ cắt (m/phút) cho số vòng quay rpm trên đường kính diameter"""
+    return math.pi * diameter * rpm / 1000.0
+
+def test_spindle_speed():
+    assert machining.spindle_speed(_speed(50, 1000), 50) == pytest.approx(1000.0)
+
+def test_turning_time():
+    # Hành trình 100 + 2 = 102 mm, lượng dư 3 / chiều sâu 1.5 = 2 lần cắt, 0.2 mm/vòng × 1000 vòng/phút
+    minutes = machining.cutting_time(machining.KIND_TURNING, 100, 50, 3.0, _speed(50, 1000), 0.2, depth_of_cut=1.5)
+    assert float(minutes) == pytest.approx(102 * 2 / 200)
+
+def test_turning_rounds_passes_up():
+    # Lượng dư 3.1 / chiều sâu 1.5 cần 3 lần cắt
+    minutes = machining.cutting_time(machining.KIND_TURNING, 100, 50, 3.1, _speed(50, 1000), 0.2, depth_of_cut=1.5)
+    assert float(minutes) == pytest.approx(102 * 3 / 200)
+
+def test_facing_time():
+    # Hành trình bằng bán kính 25 + 2 = 27 mm, một lần cắt
+    minutes = machining.cutting_time(machining.KIND_FACING, 0, 50, 1.0, _speed(50, 1000), 0.2, depth_of_cut=1.0)
+    assert float(minutes) == pytest.approx(27 / 200)
+
+def test_tapping_time():
+    # 4 lỗ M8 sâu 15 mm: đi vào và lùi ra 2 × (15 + 2) = 34 mm, bước ren 1.25 mm × 500 vòng/phút
+    minutes = machining.cutting_time(machining.KIND_TAPPING, 15, 8, 0.0, _speed(8, 500), 1.25, count=4)
+    assert float(minutes) == pytest.approx(4 * 34 / (1.25 * 500))
+
+def test_drilling_time():
+    # Hành trình 20 + 2 + 0.3 × 10 (mũi khoan) = 25 mm, một lần cắt dù lượng dư lớn
+    minutes = machining.cutting_time(machining.KIND_DRILLING, 20, 10, 5.0, _speed(10, 1000), 0.1)
+    assert float(minutes) == pytest.approx(25 / 100)
+
+def test_milling_time():
+    # Hành trình 50 + 2 + 10 = 62 mm, 3 lần cắt, 0.05 mm/răng × 4 răng × 1000 vòng/phút
+    minutes = machining.cutting_time(
+        machining.KIND_MILLING, 50, 10, 6.0, _speed(10, 1000), 0.05, depth_of_cut=2.0, teeth=4
+    )
+    assert float(minutes) == pytest.approx(62 * 3 / 200)
+
+def test_cutting_time_broadcasts_and_ignores_padding():
+    kinds = np.array([machining.KIND_TURNING, machining.KIND_FACING, machining.KIND_TURNING])
+    counts = np.array([1, 1, 0])
+    # Hai bộ chế độ cắt × ba nguyên công
+    speeds = np.array([[_speed(50, 1000)], [_speed(50, 2000)]])
+    minutes = machining.cutting_time(kinds, 100, 50, 1.0, speeds, 0.2, count=counts)
+
+    assert minutes.shape == (2, 3)
+    assert minutes[0] == pytest.approx([102 / 200, 27 / 200, 0.0])
+    assert minutes[1] == pytest.approx([102 / 400, 27 / 400, 0.0])
@@ -0,0 +1,47 @@
+"""
+Kiểm tra xuất kế hoạch sang Parquet: khóa lượt chạy và bỏ qua lượt chạy đã xuất
+"""
+
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("pandas")
+
+import plan_export
+
+def _plan(timestamp, run_id=None, drawing_hash="a1b2"):
+    plan = {
+        "source_drawing": "drawings/sample_part.txt",
+        "drawing_hash": drawing_hash,
+        "part_number": "SC-2023-A001",
+        "timestamp": timestamp,
+        "plan": "Final plan",
+        "stage_outputs": {"finalize_plan": "Final plan"}
+    }
+    if run_id is not None:
+        plan["run_id"] = run_id
+    return plan
+
+def test_plans_without_run_id_are_all_exported(tmp_path):
+    plans = [_plan("2026-10-01T08:00:00"), _plan("2026-10-01T09:00:00"), _plan("2026-10-01T08:00:00", drawing_hash="c3d4")]
+
+    counts = plan_export.export_plans(plans, output_dir=str(tmp_path))
+
+    assert counts["runs"] == 3
+    run_ids = plan_export.read_table("runs", columns=["run_id"], output_dir=str(tmp_path))["run_id"]
+    assert len(set(run_ids)) == 3
+    assert all(run_id.startswith("plan-") for run_id in run_ids)
+
+def test_reexport_skips_exported_runs(tmp_path):
+    plans = [_plan("2026-10-01T08:00:00"), _plan("2026-10-01T09:00:00", run_id="20261001_090000_abcd1234")]
+    plan_export.export_plans(plans, output_dir=str(tmp_path))
+
+    counts = plan_export.export_plans(plans + [_plan("2026-10-02T08:00:00")], output_dir=str(tmp_path))
+
+    assert counts["runs"] == 1
+    assert len(plan_export.read_table("runs", output_dir=str(tmp_path))) == 3
+
+def test_plan_run_id():
+    assert plan_export.plan_run_id(_plan("2026-10-01T08:00:00", run_id="run-1")) == "run-1"
+    assert plan_export.plan_run_id(_plan("2026-10-01T08:00:00")) == plan_export.plan_run_id(_plan("2026-10-01T08:00:00"))
+    assert plan_export.plan_run_id({"source_drawing": "x.txt"}) == ""
@@ -0,0 +1,73 @@
+"""
+Kiểm tra mô hình kế hoạch gọn: đọc số từ văn bản và tuần tự hóa from_dict -> dumps -> loads
+"""
+
+import pytest
+import plan_model
+
+PLAN = {
+    "part_number": "SHAFT-001",
+    "material": "C45",
+    "setups": [
+        {"id": "S1", "machine": "CNC Lathe", "fixture": "3-jaw chuck", "description": "Turn OD"},
+        {"id": "S2", "machine": "VMC", "fixture": "Vise", "description": "Mill keyway"}
+    ],
+    "tools": [
+        {"id": "CNMG 120408", "tool_type": "insert", "description": "Roughing insert"},
+        {"id": "EM-8", "tool_type": "end mill", "description": "8 mm end mill"}
+    ],
+    "operations": [
+        {"sequence": 10, "name": "Rough turn", "setup": "S1", "machine": "CNC Lathe", "tool": "CNMG 120408",
+         "parameters": {"cutting_speed": "180 m/min", "feed": "0,25 mm/rev", "depth_of_cut": 2,
+                        "spindle_speed": "1,200 rpm"},
+         "minutes": "6.5 min"},
+        {"sequence": "20", "name": "Mill keyway", "setup": "S2", "machine": "VMC", "tool": "EM-8",
+         "parameters": {"spindle_speed": "12,000 rpm", "feed": None},
+         "minutes": 4}
+    ],
+    "inspection_points": [
+        {"feature": "Ø40 h6", "characteristic": "diameter", "nominal": "40 mm", "tolerance": "0.016",
+         "unit": "mm", "method": "micrometer", "frequency": "every part", "operation": 10}
+    ],
+    "summary": "Turn and mill"
+}
+
+def test_number_thousands_separator():
+    assert plan_model._number("1,200 rpm") == 1200.0
+    assert plan_model._number("12,000") == 12000.0
+    assert plan_model._number("-1,200.5 mm") == -1200.5
+
+def test_number_decimal_comma():
+    assert plan_model._number("0,25 mm/rev") == 0.25
+    assert plan_model._number("1,20") == 1.2
+    assert plan_model._number("180 m/min") == 180.0
+    assert plan_model._number("n/a") is None
+    assert plan_model._number(True) is None
+
+def test_from_dict():
+    plan = plan_model.from_dict(PLAN)
+
+    assert plan.part_number == "SHAFT-001"
+    assert [setup.id for setup in plan.setups] == ["S1", "S2"]
+    first, second = plan.operations
+    assert (first.cutting_speed, first.feed, first.depth_of_cut, first.spindle_speed) == (180.0, 0.25, 2.0, 1200.0)
+    assert first.minutes == 6.5
+    assert second.sequence == 20
+    assert second.spindle_speed == 12000.0
+    assert second.feed is None
+    assert plan.inspection_points[0].nominal == 40.0
+    assert plan.total_minutes() == 10.5
+
+def test_round_trip():
+    plan = plan_model.from_dict(PLAN)
+
+    restored = plan_model.loads(plan_model.dumps(plan))
+
+    assert restored == plan
+    assert plan_model.dumps(restored) == plan_model.dumps(plan)
+
+def test_loads_rejects_other_record_version():
+    record = plan_model.to_record(plan_model.from_dict(PLAN))
+    record["v"] = plan_model.RECORD_VERSION + 1
+    with pytest.raises(ValueError):
+        plan_model.from_record(record)
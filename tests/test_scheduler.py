@@ -0,0 +1,79 @@
+"""
+Kiểm tra lập lịch xưởng: nhận dạng loại máy từ tên máy/nguyên công, lịch không chồng lấn trên máy
+và đúng thứ tự bước của công việc
+"""
+
+import random
+import pytest
+import scheduler
+
+MACHINES = {"CNC Lathe": 2, "CNC Mill": 1, "Inspection": 1}
+
+def _jobs(count, seed=1):
+    """Công việc ngẫu nhiên với thời gian nguyên (phút) để thời điểm làm tròn trong lịch vẫn chính xác"""
+    rng = random.Random(seed)
+    jobs = []
+    for j in range(count):
+        route = [("CNC Lathe", "turning"), ("CNC Mill", "milling"), ("CNC Lathe", "finish_turning")]
+        route = route[:rng.randint(1, 3)] + [("Inspection", "inspection")]
+        jobs.append({
+            "id": f"job-{j + 1}", "part_number": f"P-{j + 1}", "source": "",
+            "operations": [{"machine": machine, "name": name, "minutes": rng.randint(5, 60)} for machine, name in route]
+        })
+    return jobs
+
+@pytest.mark.parametrize("name, machine", [
+    ("Taper turning", "CNC Lathe"),
+    ("Surface roughness check", "Inspection"),
+    ("Facing", "CNC Lathe"),
+    ("Rough boring", "CNC Lathe"),
+    ("Tapping M8", "CNC Mill"),
+    ("Face milling", "CNC Mill"),
+    ("Keyway milling", "CNC Mill"),
+    ("Drilling", "CNC Mill"),
+    ("Cylindrical grinding", "Cylindrical Grinder"),
+    ("Hardening", "Heat Treatment"),
+    ("CMM inspection", "Inspection"),
+    ("Tiện thô", "CNC Lathe"),
+    ("Phay rãnh then", "CNC Mill"),
+    ("CNC Lathe", "CNC Lathe")
+])
+def test_machine_type(name, machine):
+    assert scheduler.machine_type(name) == machine
+
+def test_machine_type_keeps_unknown_names():
+    assert scheduler.machine_type(" Deburring bench ") == "Deburring bench"
+    assert scheduler.machine_type("Millimeter gauge") == "Millimeter gauge"
+
+@pytest.mark.parametrize("search_seconds", [0, 0.2])
+def test_schedule_has_no_machine_overlap(search_seconds):
+    result = scheduler.schedule(_jobs(12), MACHINES, search_seconds=search_seconds)
+
+    by_machine = {}
+    for task in result["tasks"]:
+        by_machine.setdefault(task["machine"], []).append((task["start"], task["end"]))
+    assert set(by_machine) <= {"CNC Lathe #1", "CNC Lathe #2", "CNC Mill #1", "Inspection #1"}
+    for intervals in by_machine.values():
+        intervals.sort()
+        assert all(end <= begin for (_, end), (begin, _) in zip(intervals, intervals[1:]))
+
+@pytest.mark.parametrize("search_seconds", [0, 0.2])
+def test_schedule_keeps_job_precedence(search_seconds):
+    jobs = _jobs(12)
+    result = scheduler.schedule(jobs, MACHINES, search_seconds=search_seconds)
+
+    tasks = {(task["job"], task["operation"]): task for task in result["tasks"]}
+    assert len(tasks) == sum(len(job["operations"]) for job in jobs)
+    for job in jobs:
+        steps = [tasks[job["id"], step["name"]] for step in job["operations"]]
+        for step, task in zip(job["operations"], steps):
+            assert task["machine_type"] == step["machine"]
+            assert task["end"] - task["start"] == step["minutes"]
+        assert all(before["end"] <= after["start"] for before, after in zip(steps, steps[1:]))
+
+def test_schedule_makespan_bounds():
+    jobs = _jobs(12)
+    result = scheduler.schedule(jobs, MACHINES, search_seconds=0)
+
+    assert result["makespan"] == max(task["end"] for task in result["tasks"])
+    assert result["makespan"] >= result["lower_bound"] == round(scheduler.lower_bound(jobs, MACHINES), 2)
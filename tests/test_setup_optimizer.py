@@ -0,0 +1,66 @@
+"""
+Kiểm tra gom lần gá: chi tiết giống nhau gộp thành một lần gá, ma trận chuyển đổi và thứ tự nhóm gá
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import config
+import setup_optimizer
+
+DRAWING = "drawings/sample_part.txt"
+
+def test_identical_parts_collapse_into_one_setup():
+    batches = [
+        setup_optimizer._batch(f"part-{i}", "CNC Lathe", "3-jaw chuck", ["CNMG 120408", "CCMT 060204"], 5.0, 15.0)
+        for i in range(4)
+    ]
+
+    report = setup_optimizer.optimize_setups(batches, search_seconds=0.1)
+
+    lathe = report["machines"]["CNC Lathe"]
+    assert (lathe["batches"], lathe["setup_groups"]) == (4, 1)
+    assert lathe["baseline_minutes"] == 60.0
+    assert lathe["optimized_minutes"] == 15.0
+    assert lathe["sequence"][0]["parts"] == ["part-0", "part-1", "part-2", "part-3"]
+    assert lathe["sequence"][0]["run_minutes"] == 20.0
+    assert report["saved_hours"] == 0.75
+
+def test_identical_drawings_share_setups():
+    single = setup_optimizer.optimize_setups(setup_optimizer.batches_from_drawing("part-1", DRAWING), search_seconds=0.1)
+    batches = [batch for i in range(5) for batch in setup_optimizer.batches_from_drawing(f"part-{i + 1}", DRAWING)]
+
+    report = setup_optimizer.optimize_setups(batches, search_seconds=0.1)
+
+    assert report["parts"] == 5
+    assert report["baseline_hours"] == pytest.approx(5 * single["baseline_hours"])
+    assert report["optimized_hours"] == single["optimized_hours"]
+    for machine, summary in report["machines"].items():
+        assert summary["setup_groups"] == single["machines"][machine]["setup_groups"]
+        assert all(len(group["parts"]) == 5 for group in summary["sequence"])
+
+def test_changeover_matrix():
+    groups = [("chuck", ("A", "B")), ("chuck", ("A",)), ("plate", ("A", "B", "C"))]
+
+    costs = setup_optimizer.changeover_matrix(groups, [15.0, 15.0, 25.0])
+
+    assert np.diag(costs).tolist() == [0.0, 0.0, 0.0]
+    # Cùng đồ gá, dụng cụ đã lắp sẵn
+    assert costs[0, 1] == 0.0
+    # Cùng đồ gá, thiếu một dụng cụ
+    assert costs[1, 0] == config.SETUP_TOOL_MINUTES
+    # Đổi đồ gá và lắp thêm dụng cụ, tối đa bằng thời gian gá từ đầu
+    assert costs[0, 2] == min(config.SETUP_FIXTURE_MINUTES + config.SETUP_TOOL_MINUTES, 25.0)
+    assert costs[2, 0] == min(config.SETUP_FIXTURE_MINUTES, 15.0)
+
+def test_sequence_groups_is_a_permutation():
+    groups = [("chuck", ("A",)), ("plate", ("B",)), ("chuck", ("A", "C")), ("plate", ("B", "D"))]
+    setup_minutes = [15.0, 45.0, 15.0, 45.0]
+    costs = setup_optimizer.changeover_matrix(groups, setup_minutes)
+
+    order, total = setup_optimizer.sequence_groups(costs, setup_minutes, 0.1)
+
+    assert sorted(order) == [0, 1, 2, 3]
+    assert total == pytest.approx(setup_minutes[order[0]] + sum(costs[a, b] for a, b in zip(order, order[1:])))
+    assert total <= sum(setup_minutes)
@@ -0,0 +1,73 @@
+"""
+Kiểm tra bộ phân tích thông số bản vẽ: bản ghi có kiểu của bản vẽ mẫu và các dạng giá trị
+"""
+
+import pytest
+import spec_parser
+
+DRAWING = "drawings/sample_part.txt"
+
+@pytest.fixture(scope="module")
+def specs():
+    with open(DRAWING, encoding="utf-8") as drawing:
+        return spec_parser.parse_specs(drawing.read())
+
+def test_header_fields(specs):
+    assert specs["name"] == "Shaft Coupling"
+    assert specs["part_number"] == "SC-2023-A001"
+    assert specs["revision"] == "B"
+    assert specs["material"] == "AISI 4140 Steel (Heat Treated)"
+    assert specs["clean"]
+    assert specs["issues"] == []
+
+def test_dimensions_are_toleranced(specs):
+    assert len(specs["dimensions"]) == 7
+    assert all(record["kind"] == "tolerance" and record["unit"] == "mm" for record in specs["dimensions"].values())
+
+    bore = specs["dimensions"]["Internal Bore"]
+    assert (bore["nominal"], bore["tolerance"]) == (40.0, 0.01)
+    assert (bore["lower"], bore["upper"]) == pytest.approx((39.99, 40.01))
+
+def test_surface_finish_is_roughness(specs):
+    finish = specs["surface_finish"]
+    assert {key: record["nominal"] for key, record in finish.items()} == {
+        "External Surfaces": 1.6, "Internal Bore": 0.8, "Keyway": 3.2
+    }
+    assert all(record["kind"] == "roughness" and record["designation"] == "Ra" and record["unit"] == "µm"
+               for record in finish.values())
+
+def test_geometric_tolerances_and_hardness(specs):
+    concentricity = specs["tolerances"]["Concentricity of Bore to External Diameter"]
+    assert (concentricity["kind"], concentricity["nominal"], concentricity["unit"]) == ("quantity", 0.015, "mm")
+
+    hardness = specs["heat_treatment"]["Hardness"]
+    assert (hardness["kind"], hardness["lower"], hardness["upper"], hardness["unit"]) == ("hardness", 30.0, 35.0, "HRC")
+
+def test_notes_and_approval(specs):
+    assert len(specs["notes"]) == 4
+    assert specs["approval"] == {"Designed by": "J. Smith", "Approved by": "K. Johnson", "Date": "2023-05-15"}
+
+def test_banner_headers():
+    specs = spec_parser.parse_specs(
+        "PART NUMBER: P-1\nMATERIAL: C45\n"
+        "==== DIMENSIONAL SPECIFICATIONS ====\n- Length: 75.0 ± 0.2 mm\n"
+        "==== TOLERANCE SPECIFICATIONS ====\n- Bore Fit: H7\n"
+    )
+
+    assert specs["dimensions"]["Length"]["nominal"] == 75.0
+    assert specs["tolerances"]["Bore Fit"] == {"text": "H7", "kind": "fit", "designation": "H7"}
+    assert specs["clean"]
+
+@pytest.mark.parametrize("text, kind, nominal, extra", [
+    ("50 +0.1/-0.2 mm", "tolerance", 50.0, {"lower": 49.8, "upper": 50.1}),
+    ("6 × M6 threaded holes", "threaded_holes", 6.0, {"count": 6, "designation": "M6"}),
+    ("100 x 50 x 20 mm", "size", 100.0, {"values": [100.0, 50.0, 20.0]}),
+    ("1,200 rpm", "quantity", 1200.0, {"unit": "rpm"}),
+    ("as required", "text", None, {}),
+])
+def test_parse_value(text, kind, nominal, extra):
+    record = spec_parser.parse_value(text)
+
+    assert (record.kind, record.nominal) == (kind, nominal)
+    for key, value in extra.items():
+        assert getattr(record, key) == value
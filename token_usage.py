@@ -0,0 +1,216 @@
+"""
+Đếm token và thống kê token/thời gian gọi LLM theo từng loại tác tử và từng công đoạn,
+cho cả tiến trình và cho từng lượt chạy
+"""
+
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Iterator
+from langchain_core.callbacks import BaseCallbackHandler
+import config
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Ước lượng khi không có tiktoken: khoảng 4 ký tự mỗi token với văn bản tiếng Anh
+CHARS_PER_TOKEN = 4
+
+_encodings: Dict[str, Any] = {}
+_usage: Dict[str, Dict[str, float]] = {}
+_usage_lock = threading.Lock()
+
+# Lượt chạy của luồng/task hiện tại (như streaming.current_run): số liệu được ghi thêm vào mục
+# riêng của lượt chạy đó, để báo cáo của một kế hoạch không lẫn lời gọi của các lượt chạy khác
+current_run_id: contextvars.ContextVar = contextvars.ContextVar("usage_run_id", default=None)
+_run_usage: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+def _get_encoding(model: Optional[str]):
+    """Bộ mã hóa tiktoken cho mô hình, hoặc None nếu không cài tiktoken"""
+    model = model or config.DEFAULT_MODEL
+    if model not in _encodings:
+        try:
+            import tiktoken
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _encodings[model] = None
+    return _encodings[model]
+
+def count_tokens(text: Optional[str], model: str = None) -> int:
+    """
+    Đếm số token của một đoạn văn bản
+
+    Args:
+        text: Văn bản cần đếm
+        model: Tên mô hình (mặc định là DEFAULT_MODEL)
+
+    Returns:
+        Số token (dùng tiktoken nếu có, nếu không thì ước lượng theo số ký tự)
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def _new_entry() -> Dict[str, float]:
+    return {
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "llm_seconds": 0.0,
+        "context_tokens_original": 0,
+        "context_tokens_sent": 0,
+        "compression_seconds": 0.0
+    }
+
+def _entries(tag: str) -> List[Dict[str, float]]:
+    """Mục của nhãn cho cả tiến trình và cho lượt chạy hiện tại (nếu có)"""
+    entries = [_usage.setdefault(tag, _new_entry())]
+    run_id = current_run_id.get()
+    if run_id is not None:
+        entries.append(_run_usage.setdefault(run_id, {}).setdefault(tag, _new_entry()))
+    return entries
+
+def record_llm_call(tag: str, prompt_tokens: int, completion_tokens: int, seconds: float) -> None:
+    """Ghi nhận một lần gọi LLM của một loại tác tử"""
+    with _usage_lock:
+        for entry in _entries(tag):
+            entry["llm_calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["llm_seconds"] += seconds
+
+def record_context(tag: str, original_tokens: int, sent_tokens: int, seconds: float = 0.0) -> None:
+    """
+    Ghi nhận kích thước context của công đoạn trước và sau khi nén
+
+    Args:
+        tag: Nhãn thống kê (loại tác tử của công đoạn)
+        original_tokens: Số token của output các công đoạn phía trước
+        sent_tokens: Số token context thực sự gửi cho tác tử
+        seconds: Thời gian nén context
+    """
+    with _usage_lock:
+        for entry in _entries(tag):
+            entry["context_tokens_original"] += original_tokens
+            entry["context_tokens_sent"] += sent_tokens
+            entry["compression_seconds"] += seconds
+
+def usage_report(tags: List[str] = None, run_id: str = None) -> Dict[str, Any]:
+    """
+    Báo cáo token và thời gian theo từng nhãn
+
+    Args:
+        tags: Các nhãn báo cáo trước theo thứ tự (kể cả khi chưa có số liệu); các nhãn
+            khác đã ghi nhận được báo cáo sau
+        run_id: Chỉ báo cáo số liệu của lượt chạy này (mặc định: cả tiến trình)
+
+    Returns:
+        Dict gồm số liệu từng nhãn (thêm số token tiết kiệm được và thời gian trung bình mỗi
+        lần gọi LLM) và tổng số token prompt/completion
+    """
+    with _usage_lock:
+        usage = _usage if run_id is None else _run_usage.get(run_id, {})
+        snapshot = {tag: dict(entry) for tag, entry in usage.items()}
+
+    report = {}
+    tags = list(tags or [])
+    for tag in tags + [tag for tag in snapshot if tag not in tags]:
+        entry = snapshot.get(tag) or _new_entry()
+        entry["context_tokens_saved"] = entry["context_tokens_original"] - entry["context_tokens_sent"]
+        entry["mean_llm_seconds"] = round(entry["llm_seconds"] / entry["llm_calls"], 3) if entry["llm_calls"] else 0.0
+        entry["llm_seconds"] = round(entry["llm_seconds"], 3)
+        entry["compression_seconds"] = round(entry["compression_seconds"], 3)
+        report[tag] = entry
+
+    return {
+        "model": config.DEFAULT_MODEL,
+        "context_compression": config.CONTEXT_COMPRESSION,
+        "entries": report,
+        "prompt_tokens": sum(entry["prompt_tokens"] for entry in report.values()),
+        "completion_tokens": sum(entry["completion_tokens"] for entry in report.values()),
+        "context_tokens_saved": sum(entry["context_tokens_saved"] for entry in report.values())
+    }
+
+def reset_usage() -> None:
+    """Xóa số liệu đã ghi nhận"""
+    with _usage_lock:
+        _usage.clear()
+        _run_usage.clear()
+
+def release_run(run_id: str) -> None:
+    """Bỏ số liệu riêng của một lượt chạy đã báo cáo xong (số liệu của tiến trình được giữ)"""
+    with _usage_lock:
+        _run_usage.pop(run_id, None)
+
+@contextmanager
+def track_run(run_id: str) -> Iterator[None]:
+    """
+    Ghi số liệu của các lời gọi LLM trong khối (kể cả trong luồng executor nhận bản sao context)
+    vào mục riêng của lượt chạy; số liệu riêng được bỏ khi ra khỏi khối
+
+    Args:
+        run_id: Mã lượt chạy
+    """
+    token = current_run_id.set(run_id)
+    try:
+        yield
+    finally:
+        current_run_id.reset(token)
+        release_run(run_id)
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Callback LangChain ghi nhận token prompt/completion và thời gian mỗi lần gọi LLM
+
+    Dùng số token do API trả về (llm_output["token_usage"]); khi không có (vd: phản hồi từ
+    bộ nhớ đệm) thì đếm lại từ prompt và văn bản sinh ra.
+    """
+
+    def __init__(self, tag: str, model: str = None):
+        super().__init__()
+        self.tag = tag
+        self.model = model
+        self._started: Dict[Any, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        prompt = "\n".join(str(message.content) for batch in messages for message in batch)
+        self._started[run_id] = (time.perf_counter(), prompt)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._started[run_id] = (time.perf_counter(), "\n".join(prompts))
+
+    @staticmethod
+    def _stream_usage(response) -> Dict[str, int]:
+        # Khi stream, số token của API nằm trong usage_metadata của message thay vì llm_output
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    return {"prompt_tokens": usage.get("input_tokens"), "completion_tokens": usage.get("output_tokens")}
+        return {}
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        started, prompt = self._started.pop(run_id, (time.perf_counter(), ""))
+        ended = time.perf_counter()
+        usage = (response.llm_output or {}).get("token_usage") or self._stream_usage(response)
+        completion = "".join(
+            generation.text for generations in response.generations for generation in generations
+        )
+        prompt_tokens = usage.get("prompt_tokens") or count_tokens(prompt, self.model)
+        completion_tokens = usage.get("completion_tokens") or count_tokens(completion, self.model)
+        record_llm_call(self.tag, prompt_tokens, completion_tokens, ended - started)
+        tracing.record_span(
+            f"llm:{self.tag}", started, ended, category="llm", agent=self.tag, model=self.model,
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._started.pop(run_id, None)
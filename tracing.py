@@ -0,0 +1,229 @@
+"""
+Ghi vết theo span lồng nhau (lượt chạy, công đoạn, lời gọi LLM, lời gọi công cụ) và xuất
+ra định dạng Chrome trace / Perfetto (JSON)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+# Span đang mở của luồng/task hiện tại (làm cha của span mới)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+_events: List[Dict[str, Any]] = []
+_events_lock = threading.Lock()
+_next_id = 0
+_origin = time.perf_counter()
+
+def is_enabled() -> bool:
+    """Có đang bật ghi vết hay không (config.TRACING, bật bằng --trace)"""
+    return config.TRACING
+
+def _new_span_id() -> int:
+    global _next_id
+    with _events_lock:
+        _next_id += 1
+        return _next_id
+
+def _to_us(timestamp: float) -> int:
+    """Đổi mốc perf_counter thành micro giây tính từ lúc nạp mô-đun"""
+    return int((timestamp - _origin) * 1_000_000)
+
+class Span:
+    """Một span đang mở; thuộc tính có thể được bổ sung trước khi span kết thúc"""
+
+    def __init__(self, name: str, category: str, attributes: Dict[str, Any], parent_id: Optional[int]):
+        self.name = name
+        self.category = category
+        self.attributes = dict(attributes)
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.thread_id = threading.get_ident()
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self, end: float = None) -> None:
+        record_span(
+            self.name, self.start, end or time.perf_counter(), category=self.category,
+            span_id=self.span_id, parent_id=self.parent_id, thread_id=self.thread_id, **self.attributes
+        )
+
+class _NoopSpan:
+    """Span thay thế khi tắt ghi vết"""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+@contextmanager
+def span(name: str, category: str = "app", **attributes: Any):
+    """
+    Mở một span bao quanh một khối lệnh; span mở bên trong khối là span con
+
+    Args:
+        name: Tên span
+        category: Nhóm span (run, stage, llm, tool, io...)
+        **attributes: Thuộc tính gắn vào span
+
+    Yields:
+        Span (hoặc span rỗng khi tắt ghi vết) để bổ sung thuộc tính
+    """
+    if not is_enabled():
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(name, category, attributes, parent.span_id if parent else None)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+def start_span(name: str, category: str = "app", **attributes: Any) -> Optional[Span]:
+    """
+    Mở một span sẽ được đóng ở nơi khác (vd: giữa hai callback); không đổi span hiện tại
+
+    Returns:
+        Span đang mở, hoặc None khi tắt ghi vết
+    """
+    if not is_enabled():
+        return None
+    parent = _current_span.get()
+    return Span(name, category, attributes, parent.span_id if parent else None)
+
+def record_span(name: str, start: float, end: float, category: str = "app", span_id: int = None,
+                parent_id: int = None, thread_id: int = None, **attributes: Any) -> None:
+    """
+    Ghi một span đã biết thời điểm bắt đầu và kết thúc (mốc time.perf_counter)
+
+    Args:
+        name: Tên span
+        start: Thời điểm bắt đầu
+        end: Thời điểm kết thúc
+        category: Nhóm span
+        span_id: Mã span (tự cấp nếu không truyền)
+        parent_id: Mã span cha (mặc định là span đang mở)
+        thread_id: Luồng của span (mặc định là luồng hiện tại)
+        **attributes: Thuộc tính gắn vào span
+    """
+    if not is_enabled():
+        return
+    if parent_id is None:
+        parent = _current_span.get()
+        parent_id = parent.span_id if parent else None
+
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": _to_us(start),
+        "dur": max(0, _to_us(end) - _to_us(start)),
+        "pid": os.getpid(),
+        "tid": thread_id or threading.get_ident(),
+        "args": {"span_id": span_id or _new_span_id(), "parent_id": parent_id, **attributes}
+    }
+    with _events_lock:
+        _events.append(event)
+
+def get_events() -> List[Dict[str, Any]]:
+    """Bản sao các span đã ghi"""
+    with _events_lock:
+        return list(_events)
+
+def reset() -> None:
+    """Xóa các span đã ghi"""
+    with _events_lock:
+        _events.clear()
+
+def summarize(events: List[Dict[str, Any]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Tổng thời gian theo nhóm span
+
+    Returns:
+        Dict nhóm -> số span và tổng thời gian (giây)
+    """
+    summary: Dict[str, Dict[str, float]] = {}
+    for event in events if events is not None else get_events():
+        entry = summary.setdefault(event["cat"], {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] = round(entry["seconds"] + event["dur"] / 1_000_000, 3)
+    return summary
+
+def export_chrome_trace(path: str) -> str:
+    """
+    Xuất các span ra file JSON theo định dạng Chrome trace (mở bằng chrome://tracing hoặc Perfetto)
+
+    Args:
+        path: Đường dẫn file trace
+
+    Returns:
+        Đường dẫn file đã ghi
+    """
+    events = get_events()
+    thread_names = {}
+    for thread in threading.enumerate():
+        thread_names[thread.ident] = thread.name
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": thread_names[tid]}}
+        for tid in {event["tid"] for event in events} if tid in thread_names
+    ]
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(
+            {"traceEvents": metadata + sorted(events, key=lambda event: event["ts"]), "displayTimeUnit": "ms"},
+            f, ensure_ascii=False, default=str
+        )
+    logger.info(f"Đã xuất {len(events)} span vào: {path}")
+    return path
+
+def trace_path_for(output_path: str) -> str:
+    """Đường dẫn file trace đặt cạnh file kết quả (vd: plan_20250101.json -> plan_20250101_trace.json)"""
+    return f"{os.path.splitext(output_path)[0]}_trace.json"
+
+def register_autogen_agents(agents: List[Any]) -> None:
+    """
+    Ghi vết từng lượt trả lời của các tác tử AutoGen
+
+    Dùng hook "process_message_before_send": mỗi tin nhắn gửi đi kết thúc một span tính từ
+    tin nhắn trước đó trong cuộc trò chuyện (thời gian tác tử sinh câu trả lời, gồm gọi LLM).
+
+    Args:
+        agents: Các tác tử AutoGen (ConversableAgent)
+    """
+    if not is_enabled():
+        return
+
+    last_message = {"time": time.perf_counter()}
+    lock = threading.Lock()
+
+    def hook(sender, message, recipient, silent):
+        now = time.perf_counter()
+        content = message.get("content") if isinstance(message, dict) else message
+        with lock:
+            started, last_message["time"] = last_message["time"], now
+        record_span(
+            f"autogen:{sender.name}", started, now, category="llm",
+            agent=sender.name, recipient=getattr(recipient, "name", None),
+            message_chars=len(content or "") if isinstance(content, str) else None
+        )
+        return message
+
+    for agent in agents:
+        agent.register_hook("process_message_before_send", hook)
@@ -7,8 +7,9 @@ import json
 import logging
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Union
-import fitz  # PyMuPDF
 import config
+import tracing
+import spec_parser
 
 logger = logging.getLogger(__name__)
 
@@ -33,17 +34,21 @@ def load_drawing_file(file_path: str) -> str:
     """
     logger.info(f"Đang tải file bản vẽ từ: {file_path}")
     
+    with tracing.span("load_drawing", "io", path=file_path) as span:
+        text = _read_drawing(file_path)
+        span.set(chars=len(text))
+        return text
+
+def _read_drawing(file_path: str) -> str:
+    """Đọc nội dung file bản vẽ theo định dạng"""
     try:
         # Kiểm tra loại file
         ext = os.path.splitext(file_path)[1].lower()
         
         if ext == '.pdf':
-            # Xử lý file PDF
-            with fitz.open(file_path) as doc:
-                text = ""
-                for page in doc:
-                    text += page.get_text()
-                return text
+            # Xử lý file PDF (trích xuất song song theo khoảng trang, có bộ nhớ đệm theo trang)
+            import pdf_extract
+            return pdf_extract.extract_pdf_text(file_path)
         elif ext in ['.txt', '.md']:
             # Xử lý file văn bản
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -76,10 +81,13 @@ def save_data(data: Any, file_name: str, directory: str = config.DATA_PATH) -> s
     file_path = os.path.join(directory, file_name)
     
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with tracing.span("save_data", "io", path=file_path), open(file_path, 'w', encoding='utf-8') as f:
             # Use the custom encoder to handle CrewOutput objects
             json.dump(data, f, ensure_ascii=False, indent=2, cls=CustomJSONEncoder)
         logger.info(f"Đã lưu dữ liệu vào: {file_path}")
+        if config.PLAN_INDEX:
+            import plan_index
+            plan_index.index_saved_data(file_path, data)
         return file_path
     except Exception as e:
         logger.error(f"Lỗi khi lưu dữ liệu: {str(e)}")
@@ -113,125 +121,49 @@ def load_data(file_path: str) -> Any:
         logger.error(f"Lỗi khi tải dữ liệu: {str(e)}")
         raise
 
-def extract_technical_specs(drawing_text: str) -> Dict[str, Any]:
+def extract_part_number(drawing_text: str) -> Optional[str]:
     """
-    Trích xuất thông số kỹ thuật từ văn bản bản vẽ
-    (Trong phiên bản MVP, đây là hàm mô phỏng đơn giản)
+    Lấy mã chi tiết từ dòng "PART NUMBER:" ở phần đầu bản vẽ
     
     Args:
         drawing_text: Văn bản của bản vẽ kỹ thuật
         
     Returns:
-        Dict chứa các thông số kỹ thuật
+        Mã chi tiết hoặc None nếu bản vẽ không có dòng này
     """
-    specs = {
-        "name": "",
-        "part_number": "",
-        "revision": "",
-        "material": "",
-        "dimensions": {},
-        "surface_finish": {},
-        "tolerances": {},
-        "heat_treatment": {},
-        "notes": []
-    }
-    
-    # Phân tích cơ bản - trong thực tế sẽ cần AI tinh vi hơn
-    lines = drawing_text.split('\n')
-    current_section = None
+    for line in drawing_text.split('\n'):
+        if "PART NUMBER:" in line:
+            part_number = line.split("PART NUMBER:")[1].strip()
+            return part_number.split()[0] if part_number else None
+    return None
+
+def extract_technical_specs(drawing_text: str) -> Dict[str, Any]:
+    """
+    Trích xuất thông số kỹ thuật từ văn bản bản vẽ (xem spec_parser.parse_specs)
     
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith('=='): 
-            continue
-            
-        # Xác định phần
-        if "PART NAME:" in line:
-            specs["name"] = line.split("PART NAME:")[1].strip()
-        elif "PART NUMBER:" in line:
-            specs["part_number"] = line.split("PART NUMBER:")[1].strip()
-        elif "REVISION:" in line:
-            specs["revision"] = line.split("REVISION:")[1].strip()
-        elif "MATERIAL:" in line:
-            specs["material"] = line.split("MATERIAL:")[1].strip()
+    Args:
+        drawing_text: Văn bản của bản vẽ kỹ thuật
         
-        # Xác định section
-        elif line == "DIMENSIONS:":
-            current_section = "dimensions"
-        elif line == "SURFACE FINISH:":
-            current_section = "surface_finish"
-        elif line == "TOLERANCES:":
-            current_section = "tolerances"
-        elif line == "HEAT TREATMENT:":
-            current_section = "heat_treatment"
-        elif line == "NOTES:":
-            current_section = "notes"
-        elif line == "APPROVAL:":
-            current_section = "approval"
-            
-        # Xử lý mục trong section
-        elif current_section and line.startswith("- "):
-            item = line[2:].strip()
-            
-            if current_section == "notes":
-                specs["notes"].append(item)
-            elif current_section in ["dimensions", "surface_finish", "tolerances", "heat_treatment"]:
-                if ":" in item:
-                    key, value = item.split(":", 1)
-                    specs[current_section][key.strip()] = value.strip()
-                else:
-                    # Thêm như một mục không có key
-                    if "items" not in specs[current_section]:
-                        specs[current_section]["items"] = []
-                    specs[current_section]["items"].append(item)
-    
-    return specs
+    Returns:
+        Dict chứa các thông số kỹ thuật; mỗi giá trị trong dimensions/surface_finish/tolerances/
+        heat_treatment là bản ghi gồm text, kind, nominal, tolerance, lower, upper, unit...
+    """
+    return spec_parser.parse_specs(drawing_text)
 
 def calculate_machining_time(part_specs: Dict[str, Any]) -> Dict[str, float]:
     """
     Tính toán thời gian gia công dựa trên thông số kỹ thuật
-    (Trong phiên bản MVP, đây là hàm mô phỏng đơn giản)
+    (thời gian cắt theo hình học và chế độ cắt của catalog dụng cụ, xem machining.py)
     
     Args:
         part_specs: Thông số kỹ thuật của chi tiết
         
     Returns:
-        Dict chứa thời gian gia công cho từng công đoạn
+        Dict chứa thời gian gia công cho từng công đoạn (phút)
     """
-    # Mô phỏng tính toán thời gian gia công
-    # Trong thực tế sẽ cần các công thức phức tạp dựa trên
-    # vật liệu, kích thước, dung sai, v.v.
-    
-    times = {
-        "setup": 30.0,  # phút
-        "turning": 0.0,
-        "milling": 0.0,
-        "drilling": 0.0,
-        "grinding": 0.0,
-        "heat_treatment": 0.0,
-        "inspection": 0.0,
-        "total": 0.0
-    }
-    
-    # Mô phỏng tính toán thời gian tiện
-    if part_specs.get("dimensions", {}).get("Overall Length"):
-        length_str = part_specs["dimensions"]["Overall Length"]
-        # Trích xuất số từ chuỗi, ví dụ "120mm ± 0.05mm" -> 120
-        import re
-        length_match = re.search(r'(\d+\.?\d*)', length_str)
-        if length_match:
-            length = float(length_match.group(1))
-            times["turning"] = length * 0.5  # Mô phỏng: 0.5 phút/mm
-    
-    # Mô phỏng tính toán thời gian phay
-    if "Keyway Width" in part_specs.get("dimensions", {}):
-        times["milling"] = 45.0  # Mô phỏng: 45 phút cho phay then
-    
-    # Tính toán tổng thời gian
-    times["heat_treatment"] = 120.0 if "hardness" in part_specs.get("heat_treatment", {}) else 0.0
-    times["inspection"] = 15.0  # Mô phỏng: 15 phút cho kiểm tra
-    
-    # Tổng thời gian
-    times["total"] = sum(v for k, v in times.items() if k != "total")
+    # NumPy chỉ được nạp khi cần tính thời gian gia công
+    import machining
     
-    return times 
\ No newline at end of file
+    times = machining.estimate_machining_time(part_specs)
+    times.pop("operations")
+    return times